@@ -168,22 +168,17 @@ async def get_abuse_trends(
         end_date = date.today()
         start_date = end_date - timedelta(days=days-1)
         
-        # 按天计算趋势数据
-        trend_data = []
-        current_date = start_date
-        
-        while current_date <= end_date:
-            daily_metrics = await abuse_monitor.calculate_abuse_metrics(current_date, current_date, db)
-            
-            trend_data.append({
-                "date": current_date.isoformat(),
+        # 按天计算趋势数据（读取天汇总，整个时间段一次取回）
+        trend_data = [
+            {
+                "date": daily_metrics.period_start.isoformat(),
                 "total_uploads": daily_metrics.total_batch_uploads,
                 "abusive_uploads": daily_metrics.abusive_uploads,
                 "abuse_rate": round(daily_metrics.abuse_rate * 100, 2),
                 "credits_prevented": daily_metrics.credits_prevented_abuse
-            })
-            
-            current_date += timedelta(days=1)
+            }
+            for daily_metrics in await abuse_monitor.calculate_daily_abuse_metrics(start_date, end_date, db)
+        ]
         
         # 计算趋势指标
         recent_7_days = trend_data[-7:]
@@ -10,6 +10,7 @@ from uuid import UUID
 import logging
 
 from app.core.deps import get_current_user, get_db
+from app.core.system_metrics import system_metrics_sampler
 from app.services.config_service import SystemConfigService
 from app.services.access_log_processor import get_access_log_queue_status
 from app.services.user_activity_processor import get_user_activity_queue_status
@@ -17,7 +18,6 @@ from app.services.user_activity_tracker import get_user_activity_stats
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 import redis
-import psutil
 import asyncio
 from datetime import datetime
 
@@ -488,7 +488,7 @@ async def get_real_overview(
         today_visitors_query = text("""
         SELECT COUNT(*) as today_visitors 
         FROM access_logs 
-        WHERE DATE(created_at) = CURRENT_DATE
+        WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + INTERVAL '1 day'
         """)
         today_visitors_result = await db.execute(today_visitors_query)
         today_visitors = today_visitors_result.scalar() or 0
@@ -819,7 +819,7 @@ async def get_access_log_queue_status_api(
         today_logs_query = text("""
             SELECT COUNT(*) as today_count
             FROM access_logs 
-            WHERE DATE(created_at) = CURRENT_DATE
+            WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + INTERVAL '1 day'
         """)
         today_result = await db.execute(today_logs_query)
         today_count = today_result.scalar() or 0
@@ -989,7 +989,7 @@ async def get_user_activity_queue_status_api(
         today_activities_query = text("""
             SELECT COUNT(*) as today_count
             FROM user_activity_logs 
-            WHERE DATE(created_at) = CURRENT_DATE
+            WHERE created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + INTERVAL '1 day'
         """)
         today_result = await db.execute(today_activities_query)
         today_count = today_result.scalar() or 0
@@ -1251,25 +1251,16 @@ async def check_system_resources() -> HealthCheckResult:
     """检查系统资源"""
     start_time = time.time()
     try:
-        # CPU使用率
-        cpu_percent = psutil.cpu_percent(interval=1)
-        
-        # 内存使用情况
-        memory = psutil.virtual_memory()
-        
-        # 磁盘使用情况
-        disk = psutil.disk_usage('/')
-        
-        # 网络连接数
-        connections = len(psutil.net_connections())
+        # 读取后台采样器的最新样本
+        sample = await system_metrics_sampler.current()
         
         response_time = time.time() - start_time
         
         # 判断系统是否健康
         healthy = (
-            cpu_percent < 80 and
-            memory.percent < 85 and
-            disk.percent < 90
+            sample["cpu_percent"] < 80 and
+            sample["memory_percent"] < 85 and
+            sample["disk_percent"] < 90
         )
         
         return HealthCheckResult(
@@ -1277,12 +1268,13 @@ async def check_system_resources() -> HealthCheckResult:
             healthy=healthy,
             response_time=response_time,
             details={
-                "cpu_percent": cpu_percent,
-                "memory_percent": memory.percent,
-                "memory_available_gb": round(memory.available / (1024**3), 2),
-                "disk_percent": disk.percent,
-                "disk_free_gb": round(disk.free / (1024**3), 2),
-                "network_connections": connections
+                "cpu_percent": sample["cpu_percent"],
+                "memory_percent": sample["memory_percent"],
+                "memory_available_gb": round(sample["memory_available_mb"] / 1024, 2),
+                "disk_percent": sample["disk_percent"],
+                "disk_free_gb": round(sample["disk_free_gb"], 2),
+                "load_1m": round(sample["load_1m"], 2),
+                "process_open_fds": int(sample["process_open_fds"])
             }
         )
     except Exception as e:
@@ -1509,9 +1501,9 @@ async def get_performance_metrics(
         api_stats = api_result.first()
         
         # 系统资源使用情况
-        cpu_percent = psutil.cpu_percent()
-        memory = psutil.virtual_memory()
-        disk = psutil.disk_usage('/')
+        sample = await system_metrics_sampler.current()
+        
+        from app.core.query_profiler import query_profiler_stats
         
         # 数据库连接池状态
         pool_info = {
@@ -1531,15 +1523,22 @@ async def get_performance_metrics(
                 "slow_request_ratio": (api_stats.slow_requests / api_stats.total_requests * 100) if api_stats.total_requests else 0
             },
             "system_resources": {
-                "cpu_percent": cpu_percent,
-                "memory_percent": memory.percent,
-                "memory_used_gb": round((memory.total - memory.available) / (1024**3), 2),
-                "memory_total_gb": round(memory.total / (1024**3), 2),
-                "disk_percent": disk.percent,
-                "disk_used_gb": round((disk.total - disk.free) / (1024**3), 2),
-                "disk_total_gb": round(disk.total / (1024**3), 2)
+                "cpu_percent": sample["cpu_percent"],
+                "memory_percent": sample["memory_percent"],
+                "memory_used_gb": round((sample["memory_total_mb"] - sample["memory_available_mb"]) / 1024, 2),
+                "memory_total_gb": round(sample["memory_total_mb"] / 1024, 2),
+                "disk_percent": sample["disk_percent"],
+                "disk_used_gb": round(sample["disk_total_gb"] - sample["disk_free_gb"], 2),
+                "disk_total_gb": round(sample["disk_total_gb"], 2),
+                "network_sent_kbps": round(sample["net_sent_kbps"], 1),
+                "network_recv_kbps": round(sample["net_recv_kbps"], 1),
+                "process_rss_mb": round(sample["process_rss_mb"], 1)
             },
-            "database_pool": pool_info
+            "system_history": system_metrics_sampler.history(
+                3600, ["cpu_percent", "memory_percent", "net_recv_kbps"], max_points=120
+            ),
+            "database_pool": pool_info,
+            "database_queries_by_route": query_profiler_stats.get_stats(10)
         }
         
     except Exception as e:
@@ -1549,4 +1548,57 @@ async def get_performance_metrics(
             detail=f"获取性能指标失败: {str(e)}"
         )
 
+
+class SlowCallbackToggleRequest(BaseModel):
+    enabled: bool = Field(..., description="是否开启慢回调检测")
+    reset: bool = Field(False, description="是否清空已聚合的阻塞位置")
+
+
+@router.get("/performance/event-loop")
+async def get_event_loop_metrics(
+    limit: int = Query(10, ge=1, le=50, description="返回的阻塞位置数量"),
+    _: Dict[str, Any] = Depends(require_admin)
+):
+    """获取事件循环延迟与主要阻塞来源"""
+    from app.core.loop_monitor import loop_lag_monitor
+
+    stats = loop_lag_monitor.get_stats()
+    return {
+        "timestamp": datetime.now().isoformat(),
+        "loop_lag": {
+            "samples": stats['samples'],
+            "last_lag_ms": round(stats['last_lag_ms'], 1),
+            "avg_lag_ms": round(stats['avg_lag_ms'], 1),
+            "max_lag_ms": round(stats['max_lag_ms'], 1),
+            "threshold_ms": stats['threshold_ms'],
+            "blocked_events": stats['blocked_events'],
+            "running": stats['running']
+        },
+        "top_blocking_handlers": stats['top_blocking_handlers'],
+        "recent_blocks": stats['recent_blocks'],
+        "slow_callbacks": loop_lag_monitor.slow_callbacks.get_stats(limit)
+    }
+
+
+@router.post("/performance/event-loop/slow-callbacks")
+async def toggle_slow_callback_detection(
+    request: SlowCallbackToggleRequest,
+    _: Dict[str, Any] = Depends(require_admin)
+):
+    """开启或关闭慢回调检测"""
+    from app.core.loop_monitor import loop_lag_monitor
+
+    if request.reset:
+        loop_lag_monitor.slow_callbacks.reset()
+    if request.enabled:
+        loop_lag_monitor.enable_slow_callback_detection()
+    else:
+        loop_lag_monitor.disable_slow_callback_detection()
+
+    return {
+        "code": 200,
+        "message": "慢回调检测已开启" if request.enabled else "慢回调检测已关闭",
+        "data": loop_lag_monitor.slow_callbacks.get_stats()
+    }
+
 import time
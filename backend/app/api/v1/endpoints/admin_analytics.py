@@ -11,10 +11,14 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text, func, and_, or_
 import logging
 import json
-import psutil
 import os
 
 from app.core.deps import get_current_user, get_db
+from app.core.database_backup import BackupError, database_backup_engine
+from app.core.pagination import InvalidCursorError
+from app.core.system_metrics import system_metrics_sampler
+from app.services.lawyer_stats import RANKING_COLUMNS, load_lawyer_ranking
+from app.services.system_logs import query_system_logs
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -317,63 +321,46 @@ async def get_dashboard_overview(
 @router.get("/dashboard/charts", response_model=ChartDataResponse)
 async def get_dashboard_charts(
     period: str = Query("30d", description="时间周期: 7d, 30d, 90d"),
-    chart_type: str = Query("user_growth", description="图表类型: user_growth, revenue, visitors"),
+    chart_type: str = Query("user_growth", description="图表类型: user_growth, revenue, visitors, errors, latency"),
+    granularity: str = Query("day", regex="^(day|hour)$", description="粒度: day, hour"),
     db: AsyncSession = Depends(get_db),
     _: Dict[str, Any] = Depends(require_admin)
 ):
-    """获取仪表盘图表数据"""
+    """获取仪表盘图表数据（读取指标汇总表）"""
     try:
+        from app.services.metric_rollups import load_rollup_series
+        
         # 根据周期确定查询范围
         days = {"7d": 7, "30d": 30, "90d": 90}.get(period, 30)
+        metric = {
+            "user_growth": "signups",
+            "revenue": "revenue",
+            "visitors": "pv",
+            "errors": "errors",
+            "latency": "avg_latency_ms"
+        }.get(chart_type, "signups")
         
-        if chart_type == "user_growth":
-            query = """
-            SELECT 
-                DATE(created_at) as date,
-                COUNT(*) as count
-            FROM users 
-            WHERE created_at >= CURRENT_DATE - INTERVAL '%s days'
-            GROUP BY DATE(created_at)
-            ORDER BY date
-            """ % days
-            
-        elif chart_type == "revenue":
-            query = """
-            SELECT 
-                DATE(created_at) as date,
-                COALESCE(SUM(amount), 0) as count
-            FROM transactions 
-            WHERE status = 'COMPLETED' 
-            AND created_at >= CURRENT_DATE - INTERVAL '%s days'
-            GROUP BY DATE(created_at)
-            ORDER BY date
-            """ % days
-            
-        elif chart_type == "visitors":
-            query = """
-            SELECT 
-                stat_date as date,
-                COALESCE(total_pv, 0) as count
-            FROM daily_statistics 
-            WHERE stat_date >= CURRENT_DATE - INTERVAL '%s days'
-            ORDER BY stat_date
-            """ % days
-        
-        result = await execute_query(db, query)
-        rows = result.fetchall()
+        rows = await load_rollup_series(db, metric, days, granularity)
+        label_format = "%m-%d %H:00" if granularity == "hour" else "%m-%d"
         
         labels = []
         data = []
-        for row in rows:
-            labels.append(row[0].strftime("%m-%d"))
-            data.append(float(row[1]) if row[1] else 0)
+        for bucket, value in rows:
+            labels.append(bucket.strftime(label_format))
+            data.append(value)
         
         chart_data = {
             "chartType": "line",
             "period": period,
             "labels": labels,
             "datasets": [{
-                "label": {"user_growth": "用户增长", "revenue": "收入", "visitors": "访问量"}.get(chart_type, "数据"),
+                "label": {
+                    "user_growth": "用户增长",
+                    "revenue": "收入",
+                    "visitors": "访问量",
+                    "errors": "错误数",
+                    "latency": "平均响应时间(ms)"
+                }.get(chart_type, "数据"),
                 "data": data
             }]
         }
@@ -676,33 +663,20 @@ async def get_analytics_trends(
     db: AsyncSession = Depends(get_db),
     _: Dict[str, Any] = Depends(require_admin)
 ):
-    """获取访问趋势数据"""
+    """获取访问趋势数据（读取指标汇总表）"""
     try:
-        days = {"7d": 7, "30d": 30}.get(period, 7)
+        from app.services.metric_rollups import load_rollup_series
         
-        metric_column = {
-            "pv": "total_pv",
-            "uv": "total_uv", 
-            "ip": "unique_ips"
-        }.get(metric, "total_pv")
+        days = {"7d": 7, "30d": 30}.get(period, 7)
+        rollup_metric = {"pv": "pv", "uv": "uv", "ip": "unique_ips"}.get(metric, "pv")
         
-        query = f"""
-        SELECT 
-            stat_date,
-            COALESCE({metric_column}, 0) as value
-        FROM daily_statistics 
-        WHERE stat_date >= CURRENT_DATE - INTERVAL '{days} days'
-        ORDER BY stat_date
-        """
-        
-        result = await execute_query(db, query)
-        rows = result.fetchall()
+        rows = await load_rollup_series(db, rollup_metric, days)
         
         labels = []
         data = []
-        for row in rows:
-            labels.append(row[0].strftime("%m-%d"))
-            data.append(int(row[1]) if row[1] else 0)
+        for bucket, value in rows:
+            labels.append(bucket.strftime("%m-%d"))
+            data.append(int(value))
         
         chart_data = {
             "labels": labels,
@@ -733,55 +707,26 @@ async def get_lawyer_rankings(
     db: AsyncSession = Depends(get_db),
     _: Dict[str, Any] = Depends(require_admin)
 ):
-    """获取律师排行榜"""
+    """获取律师排行榜（读取 lawyer_stats，按排序列的索引取一页）"""
     try:
-        # 简化版实现，使用现有数据
         offset = (page - 1) * limit
+        if ranking_type not in RANKING_COLUMNS:
+            ranking_type = "rating"
         
-        if ranking_type == "cases":
-            order_column = "cases_handled"
-        elif ranking_type == "revenue":
-            order_column = "total_revenue"
-        else:
-            order_column = "client_satisfaction"
-        
-        # 模拟数据查询（后续可替换为真实业绩统计表）
-        query = f"""
-        SELECT 
-            u.id as lawyer_id,
-            u.name,
-            COALESCE(u.region, '未知') as region,
-            COALESCE((SELECT COUNT(*) FROM tasks WHERE lawyer_id = u.id AND status = 'completed'), 0) as cases_handled,
-            COALESCE((SELECT SUM(amount) FROM transactions t 
-                     JOIN tasks ta ON t.task_id = ta.id 
-                     WHERE ta.lawyer_id = u.id AND t.status = 'completed'), 0) as total_revenue,
-            4.5 as client_rating,
-            95.5 as completion_rate
-        FROM users u
-        WHERE u.user_type = 'lawyer'
-        ORDER BY cases_handled DESC
-        LIMIT {limit} OFFSET {offset}
-        """
-        
-        result = await execute_query(db, query)
-        rows = result.fetchall()
-        
-        # 获取总数
-        count_query = "SELECT COUNT(*) FROM users WHERE user_type = 'lawyer'"
-        count_result = await execute_query(db, count_query)
-        total = count_result.scalar()
+        ranking = await load_lawyer_ranking(db, ranking_type, limit, offset)
+        total = ranking["total"]
         
         items = []
-        for i, row in enumerate(rows):
+        for i, row in enumerate(ranking["items"]):
             items.append({
                 "rank": offset + i + 1,
-                "lawyerId": row[0],
-                "name": row[1],
-                "region": row[2],
-                "casesHandled": row[3],
-                "totalRevenue": float(row[4]),
-                "clientRating": float(row[5]),
-                "completionRate": float(row[6])
+                "lawyerId": str(row["lawyer_id"]),
+                "name": row["name"],
+                "region": row["region"] or "未知",
+                "casesHandled": row["cases_completed"],
+                "totalRevenue": float(row["revenue"]),
+                "clientRating": 4.5,  # 暂无评价数据，沿用固定值
+                "completionRate": round(float(row["completion_rate"]) * 100, 1)
             })
         
         return RankingResponse(data={
@@ -866,44 +811,51 @@ async def get_user_rankings(
 @router.get("/operations/metrics", response_model=SystemMetricsResponse)
 async def get_system_metrics(
     latest: bool = Query(True, description="是否获取最新数据"),
+    hours: float = Query(1, gt=0, le=168, description="历史数据时长（小时），latest=false 时有效"),
+    db: AsyncSession = Depends(get_db),
     _: Dict[str, Any] = Depends(require_admin)
 ):
-    """获取系统监控指标"""
+    """获取系统监控指标（读取后台采样器，不在请求中采样）"""
     try:
+        # 模拟活跃用户数（可以从session或其他地方获取）
+        active_users = 23
+        
+        def metric(value: Optional[float]) -> Dict[str, Any]:
+            if value is None:
+                return {"value": None, "unit": "%", "status": "unknown"}
+            return {
+                "value": round(value, 1),
+                "unit": "%",
+                "status": "normal" if value < 80 else "warning"
+            }
+        
         if latest:
             # 获取实时系统指标
-            cpu_percent = psutil.cpu_percent(interval=1)
-            memory = psutil.virtual_memory()
-            disk = psutil.disk_usage('/')
-            
-            # 模拟活跃用户数（可以从session或其他地方获取）
-            active_users = 23
-            
+            sample = await system_metrics_sampler.current()
             data = {
-                "cpu": {
-                    "value": round(cpu_percent, 1),
-                    "unit": "%",
-                    "status": "normal" if cpu_percent < 80 else "warning"
-                },
-                "memory": {
-                    "value": round(memory.percent, 1),
-                    "unit": "%",
-                    "status": "normal" if memory.percent < 80 else "warning"
-                },
-                "disk": {
-                    "value": round(disk.percent, 1),
-                    "unit": "%",
-                    "status": "normal" if disk.percent < 80 else "warning"
-                },
-                "activeUsers": active_users
+                "cpu": metric(sample["cpu_percent"]),
+                "memory": metric(sample["memory_percent"]),
+                "disk": metric(sample["disk_percent"]),
+                "activeUsers": active_users,
+                "sampledAt": datetime.fromtimestamp(sample["timestamp"]).isoformat()
             }
         else:
-            # 从数据库获取历史数据
+            # 从数据库获取历史数据（按分钟持久化的采样均值）
+            history = await system_metrics_sampler.load_history(
+                db, hours, ["cpu_usage", "memory_usage", "disk_usage"]
+            )
+            
+            def average(name: str) -> Optional[float]:
+                points = history.get(name) or []
+                return sum(value for _, value in points) / len(points) if points else None
+            
             data = {
-                "cpu": {"value": 15.5, "unit": "%", "status": "normal"},
-                "memory": {"value": 48.2, "unit": "%", "status": "normal"},
-                "disk": {"value": 32.1, "unit": "%", "status": "normal"},
-                "activeUsers": 23
+                "cpu": metric(average("cpu_usage")),
+                "memory": metric(average("memory_usage")),
+                "disk": metric(average("disk_usage")),
+                "activeUsers": active_users,
+                "hours": hours,
+                "history": history
             }
         
         return SystemMetricsResponse(data=data)
@@ -920,66 +872,36 @@ async def get_system_metrics(
 async def get_system_logs(
     level: str = Query("all", description="日志级别: all, error, warning, info"),
     source: str = Query("all", description="日志来源: all, backend, frontend, database"),
+    category: Optional[str] = Query(None, description="日志分类（后端日志为 logger 名称）"),
+    q: Optional[str] = Query(None, max_length=200, description="日志内容关键词"),
+    since: Optional[datetime] = Query(None, description="起始时间（含）"),
+    until: Optional[datetime] = Query(None, description="截止时间（不含）"),
     page: int = Query(1, ge=1),
     limit: int = Query(50, ge=1, le=100),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor），提供时忽略页码"),
+    count: str = Query("estimate", regex="^(auto|exact|estimate|none)$", description="总数计算方式"),
     db: AsyncSession = Depends(get_db),
     _: Dict[str, Any] = Depends(require_admin)
 ):
-    """获取系统日志"""
+    """获取系统日志（键集分页，总数默认为估算值）"""
     try:
-        where_conditions = []
-        params = {}
-        
-        if level != "all":
-            where_conditions.append("log_level = :level")
-            params["level"] = level.upper()
-        
-        if source != "all":
-            where_conditions.append("log_source = :source")
-            params["source"] = source
-        
-        where_clause = "WHERE " + " AND ".join(where_conditions) if where_conditions else ""
-        
-        offset = (page - 1) * limit
-        
-        # 获取日志数据
-        query = f"""
-        SELECT 
-            id, log_level, log_source, log_category, 
-            log_message, created_at, log_details
-        FROM system_logs
-        {where_clause}
-        ORDER BY created_at DESC
-        LIMIT {limit} OFFSET {offset}
-        """
-        
-        result = await execute_query(db, query, params)
-        rows = result.fetchall()
-        
-        # 获取总数
-        count_query = f"SELECT COUNT(*) FROM system_logs {where_clause}"
-        count_result = await execute_query(db, count_query, params)
-        total = count_result.scalar()
-        
-        items = []
-        for row in rows:
-            items.append({
-                "id": row[0],
-                "level": row[1],
-                "source": row[2],
-                "category": row[3],
-                "message": row[4],
-                "createdAt": row[5].isoformat() if row[5] else None,
-                "details": json.loads(row[6]) if row[6] else {}
-            })
-        
-        return LogsResponse(data={
-            "items": items,
-            "total": total,
-            "page": page,
-            "pages": (total + limit - 1) // limit
-        })
+        data = await query_system_logs(
+            db,
+            level=level,
+            source=source,
+            category=category,
+            keyword=q.strip() if q else None,
+            since=since,
+            until=until,
+            cursor=cursor,
+            page=page,
+            limit=limit,
+            count=count
+        )
+        return LogsResponse(data=data)
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         logger.error(f"获取系统日志失败: {str(e)}")
         raise HTTPException(
@@ -995,31 +917,36 @@ async def create_backup(
     db: AsyncSession = Depends(get_db),
     admin: Dict[str, Any] = Depends(require_admin)
 ):
-    """创建数据备份"""
+    """创建数据备份（后台并行导出，进度见备份列表）"""
+    if database_backup_engine.running:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="已有备份正在进行"
+        )
     try:
-        # 生成备份文件名
+        # 目录格式备份，每个备份一个子目录
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"lawsker_backup_{timestamp}.sql"
+        filename = f"lawsker_backup_{timestamp}"
         
         # 插入备份记录
         insert_query = """
         INSERT INTO backup_records 
-        (backup_type, backup_status, file_name, created_by)
-        VALUES (:backup_type, 'running', :filename, :created_by)
+        (backup_type, backup_status, file_name, description, created_by)
+        VALUES (:backup_type, 'running', :filename, :description, :created_by)
         RETURNING id
         """
         
         result = await execute_query(db, insert_query, {
             "backup_type": backup_type,
             "filename": filename,
+            "description": description,
             "created_by": admin.get("user_id")
         })
         
         backup_id = result.scalar()
         await db.commit()
         
-        # 这里可以异步执行实际的备份操作
-        # 暂时返回成功状态
+        database_backup_engine.submit(backup_id)
         
         return BackupResponse(data={
             "backupId": backup_id,
@@ -1036,6 +963,33 @@ async def create_backup(
         )
 
 
+@router.post("/operations/backups/{backup_id}/verify", response_model=BackupResponse)
+async def verify_backup_record(
+    backup_id: int,
+    _: Dict[str, Any] = Depends(require_admin)
+):
+    """按清单校验备份文件的完整性"""
+    try:
+        result = await database_backup_engine.verify_record(backup_id)
+    except BackupError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    except Exception as e:
+        logger.error(f"校验备份失败: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="校验备份失败"
+        )
+    
+    return BackupResponse(data={
+        "backupId": backup_id,
+        "verified": result["ok"],
+        "files": result["files"],
+        "missing": result["missing"],
+        "mismatched": result["mismatched"],
+        "missingData": result["missing_data"]
+    })
+
+
 @router.get("/operations/backups")
 async def get_backup_list(
     page: int = Query(1, ge=1),
@@ -1051,7 +1005,8 @@ async def get_backup_list(
         SELECT 
             br.id, br.backup_type, br.backup_status, br.file_name,
             br.file_size, br.backup_duration, br.created_at, br.completed_at,
-            u.name as created_by_name
+            u.name as created_by_name, br.progress_percent, br.compression,
+            br.verify_status, br.error_message
         FROM backup_records br
         LEFT JOIN users u ON br.created_by = u.id
         ORDER BY br.created_at DESC
@@ -1076,7 +1031,11 @@ async def get_backup_list(
                 "duration": row[5],
                 "createdAt": row[6].isoformat() if row[6] else None,
                 "completedAt": row[7].isoformat() if row[7] else None,
-                "createdBy": row[8]
+                "createdBy": row[8],
+                "progress": row[9],
+                "compression": row[10],
+                "verifyStatus": row[11],
+                "error": row[12]
             })
         
         return {
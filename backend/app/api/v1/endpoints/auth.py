@@ -13,7 +13,12 @@ import redis
 import json
 from datetime import datetime, timedelta
 
-from app.core.security import security_manager, get_current_user
+from app.core.security import (
+    security_manager,
+    get_current_user,
+    password_overloaded_exception,
+    PasswordHasherOverloaded,
+)
 from app.services.auth_service import AuthService
 from app.core.deps import get_auth_service
 from app.services.user_activity_tracker import track_login, track_logout
@@ -277,7 +282,7 @@ async def login(
         # 临时解决方案：直接使用SQL查询用户
         from sqlalchemy import text
         from app.core.database import AsyncSessionLocal
-        from app.core.security import verify_password, create_access_token
+        from app.core.security import verify_and_update_password, create_access_token
         
         async with AsyncSessionLocal() as session:
             # 支持用户名或邮箱登录
@@ -310,7 +315,8 @@ async def login(
             
             # 验证密码
             logger.info("开始密码验证")
-            if not verify_password(user_data.password, user_row.password_hash):
+            verified, new_hash = await verify_and_update_password(user_data.password, user_row.password_hash)
+            if not verified:
                 logger.warning("密码验证失败", username=user_data.username)
                 raise HTTPException(
                     status_code=status.HTTP_401_UNAUTHORIZED,
@@ -327,6 +333,14 @@ async def login(
                     detail="用户账户已停用"
                 )
             
+            if new_hash:
+                # 哈希成本参数已调整，透明地写回新哈希（仅对允许登录的账户）
+                await session.execute(
+                    text("UPDATE users SET password_hash = :password_hash WHERE id = :user_id"),
+                    {"password_hash": new_hash, "user_id": user_row.id}
+                )
+                await session.commit()
+            
             # 获取用户角色，如果没有角色则默认为user
             user_role = user_row.role_name if user_row.role_name else "user"
             
@@ -376,6 +390,9 @@ async def login(
         
     except HTTPException:
         raise
+    except PasswordHasherOverloaded:
+        logger.warning("密码哈希线程池过载，拒绝登录请求", username=user_data.username)
+        raise password_overloaded_exception()
     except Exception as e:
         logger.error("用户登录失败", error=str(e), username=user_data.username)
         raise HTTPException(
@@ -45,6 +45,7 @@ class AutomationRuleRequest(BaseModel):
     cooldown_minutes: int = Field(30, description="冷却时间（分钟）")
     max_executions_per_hour: int = Field(5, description="每小时最大执行次数")
     priority: int = Field(1, ge=1, le=10, description="优先级（1-10）")
+    max_concurrent_actions: int = Field(1, ge=1, le=10, description="规则内并发执行的动作数（1为顺序执行）")
 
 class AutomationRuleResponse(BaseModel):
     """自动化规则响应模型"""
@@ -57,6 +58,7 @@ class AutomationRuleResponse(BaseModel):
     cooldown_minutes: int
     max_executions_per_hour: int
     priority: int
+    max_concurrent_actions: int = 1
 
 # 健康监控相关API
 @router.get("/health", response_model=HealthCheckResponse, summary="获取系统健康状态")
@@ -259,7 +261,8 @@ async def get_automation_rules(
                 actions=rule.actions,
                 cooldown_minutes=rule.cooldown_minutes,
                 max_executions_per_hour=rule.max_executions_per_hour,
-                priority=rule.priority
+                priority=rule.priority,
+                max_concurrent_actions=rule.max_concurrent_actions
             )
             for rule in rules
         ]
@@ -286,7 +289,8 @@ async def create_automation_rule(
             actions=request.actions,
             cooldown_minutes=request.cooldown_minutes,
             max_executions_per_hour=request.max_executions_per_hour,
-            priority=request.priority
+            priority=request.priority,
+            max_concurrent_actions=request.max_concurrent_actions
         )
         
         alert_automation.add_rule(rule)
@@ -300,7 +304,8 @@ async def create_automation_rule(
             actions=rule.actions,
             cooldown_minutes=rule.cooldown_minutes,
             max_executions_per_hour=rule.max_executions_per_hour,
-            priority=rule.priority
+            priority=rule.priority,
+            max_concurrent_actions=rule.max_concurrent_actions
         )
     except Exception as e:
         logger.error(f"Failed to create automation rule: {str(e)}")
@@ -327,7 +332,8 @@ async def get_automation_rule(
             actions=rule.actions,
             cooldown_minutes=rule.cooldown_minutes,
             max_executions_per_hour=rule.max_executions_per_hour,
-            priority=rule.priority
+            priority=rule.priority,
+            max_concurrent_actions=rule.max_concurrent_actions
         )
     except HTTPException:
         raise
@@ -357,7 +363,8 @@ async def update_automation_rule(
             actions=request.actions,
             cooldown_minutes=request.cooldown_minutes,
             max_executions_per_hour=request.max_executions_per_hour,
-            priority=request.priority
+            priority=request.priority,
+            max_concurrent_actions=request.max_concurrent_actions
         )
         
         alert_automation.add_rule(updated_rule)  # 这会覆盖现有规则
@@ -371,7 +378,8 @@ async def update_automation_rule(
             actions=updated_rule.actions,
             cooldown_minutes=updated_rule.cooldown_minutes,
             max_executions_per_hour=updated_rule.max_executions_per_hour,
-            priority=updated_rule.priority
+            priority=updated_rule.priority,
+            max_concurrent_actions=updated_rule.max_concurrent_actions
         )
     except HTTPException:
         raise
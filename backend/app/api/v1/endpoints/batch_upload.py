@@ -17,7 +17,7 @@ from app.core.deps import get_db, get_current_user
 from app.services.user_credits_service import UserCreditsService, InsufficientCreditsError, create_user_credits_service
 from app.services.config_service import SystemConfigService
 from app.services.payment_service import create_wechat_pay_service
-from app.services.batch_abuse_monitor import BatchAbuseMonitor, create_batch_abuse_monitor
+from app.services.batch_abuse_monitor import BatchAbuseMonitor, create_batch_abuse_monitor, hash_upload_files
 
 logger = logging.getLogger(__name__)
 
@@ -371,35 +371,38 @@ async def create_batch_upload_task(
         batch_task_id = str(uuid.uuid4())
         file_names = [file.filename for file in files]
         total_size = sum(file.size or 0 for file in files)
+        # 文件内容哈希用于重复上传检测，触发器据此更新滥用计数
+        content_hashes = await hash_upload_files(files)
         
         insert_query = text("""
             INSERT INTO batch_upload_tasks (
                 id, user_id, task_type, file_name, file_size,
                 total_records, processed_records, success_records, error_records,
-                credits_cost, status, created_at
+                credits_cost, status, content_hashes, created_at
             ) VALUES (
                 :id, :user_id, :task_type, :file_name, :file_size,
                 :total_records, 0, 0, 0,
-                :credits_cost, 'pending', NOW()
+                :credits_cost, 'pending', CAST(:content_hashes AS TEXT[]), NOW()
             )
         """)
         
-        db.execute(insert_query, {
+        await db.execute(insert_query, {
             "id": batch_task_id,
             "user_id": str(user_id),
             "task_type": data_type,
             "file_name": f"批量上传 {len(files)} 个文件: {', '.join(file_names[:3])}{'...' if len(files) > 3 else ''}",
             "file_size": total_size,
             "total_records": len(files),  # 暂时用文件数量作为记录数
-            "credits_cost": credits_cost
+            "credits_cost": credits_cost,
+            "content_hashes": content_hashes
         })
         
-        db.commit()
+        await db.commit()
         
         return batch_task_id
         
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"创建批量上传任务失败: {str(e)}")
         raise
 
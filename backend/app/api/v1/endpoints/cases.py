@@ -11,6 +11,7 @@ from pydantic import BaseModel, Field
 from datetime import datetime, date
 
 from app.core.deps import get_current_user, get_db, require_roles
+from app.core.pagination import InvalidCursorError
 from app.services.case_service import CaseService
 from app.models.case import CaseStatus
 from app.services.user_activity_tracker import track_case_action
@@ -87,6 +88,9 @@ class CaseListResponse(BaseModel):
     page: int
     page_size: int
     total_pages: int
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    total_is_estimate: bool = False
 
 
 @router.post("/", response_model=CaseResponse)
@@ -166,6 +170,9 @@ async def get_cases_list(
     amount_min: Optional[float] = Query(None, description="最小金额"),
     amount_max: Optional[float] = Query(None, description="最大金额"),
     keyword: Optional[str] = Query(None, description="关键词搜索"),
+    sort: str = Query("created", regex="^(created|relevance)$", description="排序方式：created 按创建时间，relevance 按关键词相关度"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor），提供时忽略页码"),
+    count: str = Query("auto", regex="^(auto|exact|estimate|none)$", description="总数计算方式"),
     current_user: Dict[str, Any] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
@@ -193,7 +200,10 @@ async def get_cases_list(
             tenant_id=current_user["tenant_id"],
             page=page,
             page_size=page_size,
-            filters=filters if filters else None
+            filters=filters if filters else None,
+            cursor=cursor,
+            count=count,
+            sort=sort
         )
         
         return CaseListResponse(
@@ -201,9 +211,17 @@ async def get_cases_list(
             total=result["total"],
             page=result["page"],
             page_size=result["page_size"],
-            total_pages=result["total_pages"]
+            total_pages=result["total_pages"],
+            next_cursor=result["next_cursor"],
+            has_more=result["has_more"],
+            total_is_estimate=result["total_is_estimate"]
         )
         
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         # 记录具体错误信息以便调试
         import traceback
@@ -10,6 +10,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 from app.core.deps import get_db, get_current_user
+from app.core.pagination import InvalidCursorError
 from app.services.user_credits_service import UserCreditsService, InsufficientCreditsError, create_user_credits_service
 from app.services.config_service import SystemConfigService
 from app.services.payment_service import create_wechat_pay_service
@@ -402,6 +403,8 @@ async def confirm_credits_purchase(
 async def get_credits_usage_history(
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(20, ge=1, le=100, description="页大小"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor），提供时忽略页码"),
+    count: str = Query("auto", regex="^(auto|exact|estimate|none)$", description="总数计算方式"),
     current_user: Dict[str, Any] = Depends(get_current_user),
     db: Session = Depends(get_db)
 ):
@@ -412,7 +415,7 @@ async def get_credits_usage_history(
         credits_service = get_credits_service()
         user_id = UUID(current_user["id"])
         
-        result = await credits_service.get_credits_usage_history(user_id, page, size, db)
+        result = await credits_service.get_credits_usage_history(user_id, page, size, db, cursor=cursor, count=count)
         
         return {
             "success": True,
@@ -420,6 +423,8 @@ async def get_credits_usage_history(
             "message": "获取使用历史成功"
         }
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取Credits使用历史失败: {str(e)}")
         raise HTTPException(status_code=500, detail=f"获取使用历史失败: {str(e)}")
@@ -18,6 +18,7 @@ from sqlalchemy.orm import sessionmaker
 
 from app.core.deps import get_db, get_current_user, get_config_service
 from app.core.config import settings
+from app.core.pagination import InvalidCursorError, SqlFilter, paginate_sql
 # User model import removed as we now use Dict[str, Any] for current_user
 from app.models.finance import Transaction, Wallet, WithdrawalRequest, PaymentStatus, WithdrawalStatus
 from app.services.payment_service import WeChatPayService, WithdrawalService, WeChatPayError, WithdrawalError
@@ -148,6 +149,9 @@ class WithdrawalListResponse(BaseModel):
     page: int
     size: int
     pages: int
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    total_is_estimate: bool = False
 
 
 class WithdrawalStatsResponse(BaseModel):
@@ -189,6 +193,9 @@ class TransactionListResponse(BaseModel):
     page: int
     page_size: int
     total_pages: int
+    next_cursor: Optional[str] = None
+    has_more: bool = False
+    total_is_estimate: bool = False
 
 
 @router.post("/payment/create", response_model=PaymentResponse)
@@ -514,61 +521,68 @@ async def get_transactions(
     page_size: int = Query(20, ge=1, le=100, description="每页数量"),
     transaction_type: Optional[str] = Query(None, description="交易类型过滤"),
     status_filter: Optional[str] = Query(None, description="状态过滤"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor），提供时忽略页码"),
+    count: str = Query("auto", regex="^(auto|exact|estimate|none)$", description="总数计算方式"),
     current_user: Dict[str, Any] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     """获取交易记录"""
     
     try:
-        from sqlalchemy import select, and_, func
-        from sqlalchemy.orm import selectinload
-        
-        # 构建查询条件
-        conditions = []
-        
-        # 查询用户相关的交易
-        conditions.append(Transaction.user_id == current_user["id"])
-        
+        # 交易挂在案件上，按用户承办或负责销售的案件过滤；状态和类型是枚举，按文本比较
+        sql_filter = SqlFilter().add(
+            "(c.assigned_to_user_id = CAST(:user_id AS UUID) OR c.sales_user_id = CAST(:user_id AS UUID))",
+            user_id=str(current_user["id"])
+        )
         if transaction_type:
-            conditions.append(Transaction.transaction_type == transaction_type)
+            sql_filter.add("CAST(t.transaction_type AS TEXT) = :transaction_type", transaction_type=transaction_type.upper())
         if status_filter:
-            conditions.append(Transaction.status == status_filter)
-        
-        # 查询交易列表
-        offset = (page - 1) * page_size
-        query = select(Transaction).where(and_(*conditions)).order_by(
-            Transaction.created_at.desc()
-        ).offset(offset).limit(page_size)
-        
-        result = await db.execute(query)
-        transactions = result.scalars().all()
+            sql_filter.add("CAST(t.status AS TEXT) = :status", status=status_filter.upper())
         
-        # 查询总数
-        count_query = select(func.count()).select_from(Transaction).where(and_(*conditions))
-        count_result = await db.execute(count_query)
-        total = count_result.scalar() or 0
+        result = await paginate_sql(
+            db,
+            columns="t.id, t.case_id, t.amount, t.transaction_type, t.status, t.description, t.created_at",
+            from_sql="FROM transactions t JOIN cases c ON c.id = t.case_id",
+            sql_filter=sql_filter,
+            created_column="t.created_at",
+            id_column="t.id",
+            cursor=cursor,
+            limit=page_size,
+            offset=(page - 1) * page_size,
+            count=count
+        )
         
         # 构建响应数据
-        items = []
-        for transaction in transactions:
-            items.append(TransactionResponse(
-                id=str(transaction.id),
-                case_id=str(transaction.case_id),
-                amount=float(transaction.amount),  # type: ignore
-                transaction_type=transaction.transaction_type.value,  # type: ignore
-                status=transaction.status.value,  # type: ignore
-                description=transaction.description,  # type: ignore
-                created_at=transaction.created_at.isoformat()
-            ))
+        items = [
+            TransactionResponse(
+                id=str(row["id"]),
+                case_id=str(row["case_id"]),
+                amount=float(row["amount"]),
+                transaction_type=str(row["transaction_type"]),
+                status=str(row["status"]),
+                description=row["description"],
+                created_at=row["created_at"].isoformat()
+            )
+            for row in result.items
+        ]
         
+        total = result.total or 0
         return TransactionListResponse(
             items=items,
             total=total,
             page=page,
             page_size=page_size,
-            total_pages=(total + page_size - 1) // page_size
+            total_pages=result.total_pages(page_size),
+            next_cursor=result.next_cursor,
+            has_more=result.has_more,
+            total_is_estimate=result.total_is_estimate
         )
         
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=http_status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -634,12 +648,40 @@ async def get_withdrawal_history(
     page: int = Query(1, ge=1, description="页码"),
     page_size: int = Query(20, ge=1, le=100, description="每页条数"),
     status: Optional[str] = Query(None, description="提现状态过滤"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor），提供时忽略页码"),
+    count: str = Query("auto", regex="^(auto|exact|estimate|none)$", description="总数计算方式"),
     current_user: Dict[str, Any] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     config_service: SystemConfigService = Depends(get_config_service)
 ):
     """获取用户提现历史记录（别名）"""
-    return await get_user_withdrawal_requests(page, page_size, status, current_user, db, config_service)
+    return await get_user_withdrawal_requests(page, page_size, status, current_user, db, config_service, cursor, count)
+
+def _parse_withdrawal_status(status: Optional[str]) -> Optional[WithdrawalStatus]:
+    """转换状态参数"""
+    if not status:
+        return None
+    try:
+        return WithdrawalStatus(status)
+    except ValueError:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail="无效的状态参数"
+        )
+
+
+def _build_withdrawal_list_response(result: Dict[str, Any]) -> WithdrawalListResponse:
+    return WithdrawalListResponse(
+        items=[WithdrawalDetailResponse(**item) for item in result["items"]],
+        total=result["total"],
+        page=result["page"],
+        size=result["size"],
+        pages=result["pages"],
+        next_cursor=result["next_cursor"],
+        has_more=result["has_more"],
+        total_is_estimate=result["total_is_estimate"]
+    )
+
 
 async def get_user_withdrawal_requests(
     page: int,
@@ -647,69 +689,32 @@ async def get_user_withdrawal_requests(
     status: Optional[str],
     current_user: Dict[str, Any],
     db: AsyncSession,
-    config_service: SystemConfigService
+    config_service: SystemConfigService,
+    cursor: Optional[str] = None,
+    count: str = "auto"
 ):
     """获取用户提现申请列表"""
     
+    status_filter = _parse_withdrawal_status(status)
+    
     try:
         withdrawal_service = WithdrawalService(config_service)
+        result = await withdrawal_service.get_withdrawal_requests(
+            user_id=UUID(str(current_user["id"])),
+            status=status_filter,
+            page=page,
+            size=size,
+            db=db,
+            cursor=cursor,
+            count=count
+        )
+        return _build_withdrawal_list_response(result)
         
-        # 转换状态参数
-        status_filter = None
-        if status:
-            try:
-                status_filter = WithdrawalStatus(status)
-            except ValueError:
-                raise HTTPException(
-                    status_code=http_status.HTTP_400_BAD_REQUEST,
-                    detail="无效的状态参数"
-                )
-        
-        # 使用同步数据库会话
-        sync_session = SyncSessionLocal()
-        
-        try:
-            result = await withdrawal_service.get_withdrawal_requests(
-                user_id=UUID(str(current_user["id"])),
-                status=status_filter,
-                page=page,
-                size=size,
-                db=sync_session
-            )
-            
-            items = [
-                WithdrawalDetailResponse(
-                    id=item["id"],
-                    request_number=item["request_number"],
-                    user_id=item["user_id"],
-                    user_name=item["user_name"],
-                    amount=item["amount"],
-                    fee=item["fee"],
-                    actual_amount=item["actual_amount"],
-                    bank_account=item["bank_account"],
-                    bank_name=item["bank_name"],
-                    account_holder=item["account_holder"],
-                    status=item["status"],
-                    risk_score=item["risk_score"],
-                    auto_approved=item["auto_approved"],
-                    admin_notes=item["admin_notes"],
-                    created_at=item["created_at"],
-                    processed_at=item["processed_at"]
-                )
-                for item in result["items"]
-            ]
-            
-            return WithdrawalListResponse(
-                items=items,
-                total=result["total"],
-                page=result["page"],
-                size=result["size"],
-                pages=result["pages"]
-            )
-            
-        finally:
-            sync_session.close()
-        
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=http_status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -722,6 +727,8 @@ async def get_admin_withdrawal_requests(
     page: int = Query(1, ge=1, description="页码"),
     size: int = Query(20, ge=1, le=100, description="每页数量"),
     status: Optional[str] = Query(None, description="状态筛选"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页返回的next_cursor），提供时忽略页码"),
+    count: str = Query("auto", regex="^(auto|exact|estimate|none)$", description="总数计算方式"),
     current_user: Dict[str, Any] = Depends(get_current_user),
     db: AsyncSession = Depends(get_db),
     config_service: SystemConfigService = Depends(get_config_service)
@@ -735,65 +742,26 @@ async def get_admin_withdrawal_requests(
             detail="仅管理员可访问"
         )
     
+    status_filter = _parse_withdrawal_status(status)
+    
     try:
         withdrawal_service = WithdrawalService(config_service)
+        result = await withdrawal_service.get_withdrawal_requests(
+            user_id=None,  # 管理员查看所有用户
+            status=status_filter,
+            page=page,
+            size=size,
+            db=db,
+            cursor=cursor,
+            count=count
+        )
+        return _build_withdrawal_list_response(result)
         
-        # 转换状态参数
-        status_filter = None
-        if status:
-            try:
-                status_filter = WithdrawalStatus(status)
-            except ValueError:
-                raise HTTPException(
-                    status_code=http_status.HTTP_400_BAD_REQUEST,
-                    detail="无效的状态参数"
-                )
-        
-        # 使用同步数据库会话
-        sync_session = SyncSessionLocal()
-        
-        try:
-            result = await withdrawal_service.get_withdrawal_requests(
-                user_id=None,  # 管理员查看所有用户
-                status=status_filter,
-                page=page,
-                size=size,
-                db=sync_session
-            )
-            
-            items = [
-                WithdrawalDetailResponse(
-                    id=item["id"],
-                    request_number=item["request_number"],
-                    user_id=item["user_id"],
-                    user_name=item["user_name"],
-                    amount=item["amount"],
-                    fee=item["fee"],
-                    actual_amount=item["actual_amount"],
-                    bank_account=item["bank_account"],
-                    bank_name=item["bank_name"],
-                    account_holder=item["account_holder"],
-                    status=item["status"],
-                    risk_score=item["risk_score"],
-                    auto_approved=item["auto_approved"],
-                    admin_notes=item["admin_notes"],
-                    created_at=item["created_at"],
-                    processed_at=item["processed_at"]
-                )
-                for item in result["items"]
-            ]
-            
-            return WithdrawalListResponse(
-                items=items,
-                total=result["total"],
-                page=result["page"],
-                size=result["size"],
-                pages=result["pages"]
-            )
-            
-        finally:
-            sync_session.close()
-        
+    except InvalidCursorError as e:
+        raise HTTPException(
+            status_code=http_status.HTTP_400_BAD_REQUEST,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=http_status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -8,11 +8,11 @@ from sqlalchemy import text
 from datetime import datetime
 import asyncio
 import redis
-import psutil
 import time
 from typing import Dict, Any, List
 
 from app.core.deps import get_db
+from app.core.system_metrics import system_metrics_sampler
 from app.core.logging import get_logger
 
 router = APIRouter()
@@ -85,37 +85,29 @@ async def check_system_resources() -> Dict[str, Any]:
     """检查系统资源"""
     start_time = time.time()
     try:
-        # CPU使用率
-        cpu_percent = psutil.cpu_percent(interval=1)
-        
-        # 内存使用情况
-        memory = psutil.virtual_memory()
-        
-        # 磁盘使用情况
-        disk = psutil.disk_usage('/')
-        
-        # 网络连接数
-        connections = len(psutil.net_connections())
+        # 读取后台采样器的最新样本
+        sample = await system_metrics_sampler.current()
         
         response_time = time.time() - start_time
         
         # 判断系统是否健康
         healthy = (
-            cpu_percent < 80 and
-            memory.percent < 85 and
-            disk.percent < 90
+            sample["cpu_percent"] < 80 and
+            sample["memory_percent"] < 85 and
+            sample["disk_percent"] < 90
         )
         
         return {
             "healthy": healthy,
             "response_time": response_time,
             "details": {
-                "cpu_percent": cpu_percent,
-                "memory_percent": memory.percent,
-                "memory_available_gb": round(memory.available / (1024**3), 2),
-                "disk_percent": disk.percent,
-                "disk_free_gb": round(disk.free / (1024**3), 2),
-                "network_connections": connections
+                "cpu_percent": sample["cpu_percent"],
+                "memory_percent": sample["memory_percent"],
+                "memory_available_gb": round(sample["memory_available_mb"] / 1024, 2),
+                "disk_percent": sample["disk_percent"],
+                "disk_free_gb": round(sample["disk_free_gb"], 2),
+                "load_1m": round(sample["load_1m"], 2),
+                "process_open_fds": int(sample["process_open_fds"])
             }
         }
     except Exception as e:
@@ -421,43 +421,46 @@ async def batch_track_activities(
         if len(activities) > 50:
             raise HTTPException(status_code=400, detail="单次最多跟踪50个活动")
         
-        results = []
-        total_points = 0
-        
+        batch = []
         for activity in activities:
-            try:
-                # 添加用户信息到上下文
-                context = activity.context.copy()
-                context.update({
-                    'user_id': str(current_user.id),
-                    'username': current_user.username,
-                    'quality_score': activity.quality_score or 0,
-                    'session_duration': activity.session_duration or 0,
-                    'timestamp': datetime.now().isoformat(),
-                    'batch_tracking': True
-                })
-                
-                # 跟踪活动
-                result = await activity_tracker.track_lawyer_activity(
-                    current_user.id, activity.activity_type, context, db
-                )
-                
-                results.append({
+            # 添加用户信息到上下文
+            context = activity.context.copy()
+            context.update({
+                'user_id': str(current_user.id),
+                'username': current_user.username,
+                'quality_score': activity.quality_score or 0,
+                'session_duration': activity.session_duration or 0,
+                'timestamp': datetime.now().isoformat(),
+                'batch_tracking': True
+            })
+            batch.append((activity.activity_type, context))
+        
+        # 整批活动在一个事务中处理，数据库往返次数与活动数量无关
+        try:
+            tracked = await activity_tracker.track_lawyer_activities(current_user.id, batch, db)
+            results = [
+                {
                     "activity_type": activity.activity_type,
                     "success": True,
                     "result": result
-                })
-                
-                # 累计积分
-                if result.get('points_reward', {}).get('points_earned'):
-                    total_points += result['points_reward']['points_earned']
-                    
-            except Exception as e:
-                results.append({
+                }
+                for activity, result in zip(activities, tracked)
+            ]
+        except Exception as e:
+            results = [
+                {
                     "activity_type": activity.activity_type,
                     "success": False,
                     "error": str(e)
-                })
+                }
+                for activity in activities
+            ]
+        
+        # 累计积分
+        total_points = sum(
+            r['result'].get('points_reward', {}).get('points_earned', 0)
+            for r in results if r['success']
+        )
         
         successful_count = sum(1 for r in results if r['success'])
         
@@ -8,12 +8,13 @@ import json
 from typing import Optional, List, Dict, Any
 from uuid import UUID, uuid4
 from datetime import datetime, timedelta, date
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_, update, func
 from pydantic import BaseModel, Field
 
 from app.core.database import get_db
+from app.core.pagination import InvalidCursorError, paginate_select
 from app.models.lawyer_review import DocumentReviewTask, ReviewStatus
 from app.models.statistics import TaskPublishRecord, LawyerDailyLimit, UserDailyPublishLimit
 from app.models.user import User
@@ -456,24 +457,26 @@ async def convert_anonymous_task(
 
 @router.get("/", response_model=List[dict])
 async def get_tasks(
+    response: Response,
     user_type: Optional[str] = Query(None, description="用户类型过滤: sales, lawyer, institution"),
     limit: int = Query(20, ge=1, le=100, description="返回任务数量"),
     offset: int = Query(0, ge=0, description="偏移量"),
     status_filter: Optional[str] = Query(None, description="状态过滤"),
+    cursor: Optional[str] = Query(None, description="分页游标（上一页响应头 X-Next-Cursor），提供时忽略偏移量"),
     db: AsyncSession = Depends(get_db)
 ) -> List[dict]:
     """
     获取任务列表
-    支持按用户类型过滤
+    支持按用户类型过滤；还有下一页时通过响应头 X-Next-Cursor 返回游标
     """
     try:
         # 构建查询条件
-        query = select(DocumentReviewTask)
+        conditions = []
         
         # 根据用户类型过滤
         if user_type == "sales":
             # 销售相关任务 - 获取匿名任务或销售创建的任务
-            query = query.where(
+            conditions.append(
                 or_(
                     DocumentReviewTask.creator_id.is_(None),  # 匿名任务
                     DocumentReviewTask.ai_metadata.has_key("sales_related")  # 销售相关任务
@@ -481,27 +484,35 @@ async def get_tasks(
             )
         elif user_type == "lawyer":
             # 律师相关任务 - 分配给律师的任务
-            query = query.where(DocumentReviewTask.lawyer_id.is_not(None))
+            conditions.append(DocumentReviewTask.lawyer_id.is_not(None))
         elif user_type == "institution":
             # 机构相关任务
-            query = query.where(DocumentReviewTask.ai_metadata.has_key("institution_related"))
+            conditions.append(DocumentReviewTask.ai_metadata.has_key("institution_related"))
         
         # 状态过滤
         if status_filter:
             if status_filter == "pending":
-                query = query.where(DocumentReviewTask.status == ReviewStatus.PENDING)
+                conditions.append(DocumentReviewTask.status == ReviewStatus.PENDING)
             elif status_filter == "in_progress":
-                query = query.where(DocumentReviewTask.status == ReviewStatus.IN_PROGRESS)
+                conditions.append(DocumentReviewTask.status == ReviewStatus.IN_PROGRESS)
             elif status_filter == "completed":
-                query = query.where(DocumentReviewTask.status == ReviewStatus.COMPLETED)
-        
-        # 添加排序和限制
-        query = query.order_by(DocumentReviewTask.created_at.desc())
-        query = query.limit(limit).offset(offset)
-        
-        # 执行查询
-        result = await db.execute(query)
-        tasks = result.scalars().all()
+                conditions.append(DocumentReviewTask.status == ReviewStatus.COMPLETED)
+        
+        # 按 (created_at, id) 键集分页，列表接口不返回总数
+        page = await paginate_select(
+            db,
+            select(DocumentReviewTask),
+            conditions,
+            DocumentReviewTask.created_at,
+            DocumentReviewTask.id,
+            cursor=cursor,
+            limit=limit,
+            offset=offset,
+            count="none"
+        )
+        tasks = page.items
+        if page.next_cursor:
+            response.headers["X-Next-Cursor"] = page.next_cursor
         
         # 转换为响应格式
         task_list = []
@@ -523,6 +534,8 @@ async def get_tasks(
         
         return task_list
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"获取任务列表失败: {str(e)}")
         raise HTTPException(
@@ -14,6 +14,7 @@ from jose import jwt, JWTError
 
 from app.core.config import settings
 from app.services.websocket_manager import websocket_manager
+from app.services.realtime_data_aggregator import realtime_data_aggregator
 from app.services.auth_service import AuthService
 from app.core.deps import get_auth_service
 
@@ -79,6 +80,9 @@ async def admin_realtime_websocket(
         
         logger.info(f"管理员WebSocket连接建立: {user['username']} ({connection_id})")
         
+        # 发送看板全量数据，之后按 seq 推送增量
+        await realtime_data_aggregator.send_snapshot(connection_id)
+        
         # 保持连接并处理消息
         while True:
             try:
@@ -142,6 +146,10 @@ async def handle_client_message(connection_id: str, message: dict):
             data_types = message.get("data_types", [])
             await handle_unsubscription(connection_id, data_types)
             
+        elif message_type == "resync":
+            # 客户端增量 seq 不连续，重新下发全量数据
+            await realtime_data_aggregator.send_snapshot(connection_id)
+            
         elif message_type == "request_data":
             # 请求特定数据
             data_type = message.get("data_type")
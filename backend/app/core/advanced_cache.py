@@ -5,15 +5,21 @@
 
 import json
 import time
+import inspect
 import logging
 import asyncio
-from typing import Any, Dict, List, Optional, Callable, Union
+from typing import Any, Dict, List, Optional, Callable, Union, Iterable, Set
 from datetime import datetime, timedelta
 from functools import wraps
 import hashlib
 import pickle
 import aioredis
 from contextlib import asynccontextmanager
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import Request
+
+from app.core.cache_invalidation import CacheInvalidationBus
 
 logger = logging.getLogger(__name__)
 
@@ -212,6 +218,30 @@ class RedisCache:
             logger.error(f"Redis clear pattern error: {e}")
             return 0
     
+    async def add_tags(self, key: str, tags: Iterable[str], ttl: int = 300) -> None:
+        """登记缓存键所属的标签"""
+        try:
+            for tag in tags:
+                tag_key = self._make_key(f"tag:{tag}")
+                await self.redis.sadd(tag_key, key)
+                # 标签集合至少与其中的键存活同样长
+                current_ttl = await self.redis.ttl(tag_key)
+                if current_ttl is None or current_ttl < ttl:
+                    await self.redis.expire(tag_key, ttl)
+        except Exception as e:
+            logger.error(f"Redis add tags error: {e}")
+    
+    async def pop_tag_keys(self, tag: str) -> Set[str]:
+        """取出并删除标签下登记的所有缓存键"""
+        try:
+            tag_key = self._make_key(f"tag:{tag}")
+            members = await self.redis.smembers(tag_key)
+            await self.redis.delete(tag_key)
+            return {m.decode() if isinstance(m, bytes) else m for m in members}
+        except Exception as e:
+            logger.error(f"Redis pop tag keys error: {e}")
+            return set()
+    
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计"""
         total_requests = self.stats['hits'] + self.stats['misses']
@@ -231,6 +261,12 @@ class MultiLevelCache:
     def __init__(self, memory_cache: MemoryCache, redis_cache: RedisCache):
         self.memory_cache = memory_cache
         self.redis_cache = redis_cache
+        # 本进程内存缓存的标签索引：标签 -> 缓存键
+        self.tag_index: Dict[str, Set[str]] = {}
+        # 跨进程失效总线（未启用时只失效本进程L1）
+        self.invalidation_bus: Optional[CacheInvalidationBus] = None
+        # 失效版本号：L2读取期间发生过失效则不回填L1，避免旧值写回
+        self._invalidation_version = 0
         self.stats = {
             'l1_hits': 0,  # 内存缓存命中
             'l2_hits': 0,  # Redis缓存命中
@@ -246,36 +282,96 @@ class MultiLevelCache:
             return data
         
         # L2: Redis缓存
+        version = self._invalidation_version
         data = await self.redis_cache.get(key)
         if data is not None:
             self.stats['l2_hits'] += 1
             # 回填到内存缓存
-            self.memory_cache.set(key, data)
+            if version == self._invalidation_version:
+                self.memory_cache.set(key, data)
             return data
         
         self.stats['misses'] += 1
         return None
     
-    async def set(self, key: str, value: Any, ttl: int = 300) -> None:
+    async def set(self, key: str, value: Any, ttl: int = 300, tags: Optional[Iterable[str]] = None) -> None:
         """多级设置缓存数据"""
         # 同时设置两级缓存
         self.memory_cache.set(key, value)
         await self.redis_cache.set(key, value, ttl)
+        
+        if tags:
+            tags = list(tags)
+            for tag in tags:
+                self.tag_index.setdefault(tag, set()).add(key)
+            await self.redis_cache.add_tags(key, tags, ttl)
+        
+        # 其他进程的L1可能持有旧值
+        self._broadcast(keys=[key])
     
     async def delete(self, key: str) -> None:
         """多级删除缓存数据"""
-        self.memory_cache.delete(key)
+        self.invalidate_local(keys=[key])
         await self.redis_cache.delete(key)
+        self._broadcast(keys=[key])
     
     async def clear_pattern(self, pattern: str) -> None:
         """清除匹配模式的缓存"""
         # 清除内存缓存中匹配的键
-        keys_to_remove = [k for k in self.memory_cache.cache.keys() if pattern in k]
-        for key in keys_to_remove:
-            self.memory_cache.delete(key)
+        self.invalidate_local(patterns=[pattern])
         
         # 清除Redis缓存
         await self.redis_cache.clear_pattern(pattern)
+        self._broadcast(patterns=[pattern])
+    
+    async def invalidate_tags(self, tags: Iterable[str]) -> int:
+        """按标签失效缓存，返回失效的键数量"""
+        tags = list(tags)
+        invalidated: Set[str] = set()
+        
+        for tag in tags:
+            keys = self.tag_index.pop(tag, set())
+            keys |= await self.redis_cache.pop_tag_keys(tag)
+            invalidated |= keys
+        
+        self.invalidate_local(keys=invalidated)
+        for key in invalidated:
+            await self.redis_cache.delete(key)
+        self._broadcast(keys=invalidated, tags=tags)
+        
+        return len(invalidated)
+    
+    def invalidate_local(
+        self,
+        keys: Iterable[str] = (),
+        patterns: Iterable[str] = (),
+        tags: Iterable[str] = (),
+    ) -> None:
+        """只失效本进程L1（也作为失效总线的接收回调）"""
+        self._invalidation_version += 1
+        
+        for key in keys:
+            self.memory_cache.delete(key)
+        
+        for pattern in patterns:
+            keys_to_remove = [k for k in self.memory_cache.cache.keys() if pattern in k]
+            for key in keys_to_remove:
+                self.memory_cache.delete(key)
+        
+        for tag in tags:
+            for key in self.tag_index.pop(tag, set()):
+                self.memory_cache.delete(key)
+    
+    def reset_local(self) -> None:
+        """清空本进程L1（失效消息可能丢失时调用）"""
+        self._invalidation_version += 1
+        self.memory_cache.clear()
+        self.tag_index.clear()
+    
+    def _broadcast(self, keys: Iterable[str] = (), patterns: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        """通过失效总线通知其他进程"""
+        if self.invalidation_bus is not None:
+            self.invalidation_bus.publish(keys=keys, patterns=patterns, tags=tags)
     
     def get_stats(self) -> Dict[str, Any]:
         """获取多级缓存统计"""
@@ -290,16 +386,23 @@ class MultiLevelCache:
             'l2_hit_rate': (self.stats['l2_hits'] / total_requests * 100) if total_requests > 0 else 0,
             'overall_hit_rate': ((self.stats['l1_hits'] + self.stats['l2_hits']) / total_requests * 100) if total_requests > 0 else 0,
             'memory_stats': self.memory_cache.get_stats(),
-            'redis_stats': self.redis_cache.get_stats()
+            'redis_stats': self.redis_cache.get_stats(),
+            'invalidation_stats': self.invalidation_bus.get_stats() if self.invalidation_bus else None
         }
 
+# L1默认TTL；启用失效总线后其他进程的写入会主动失效L1，可以放宽TTL
+L1_TTL_LOCAL_ONLY = 300
+L1_TTL_WITH_INVALIDATION_BUS = 1800
+
 class CacheManager:
     """缓存管理器"""
     
     def __init__(self, redis_client: aioredis.Redis):
-        self.memory_cache = MemoryCache(max_size=1000, ttl=300)
+        self.redis_client = redis_client
+        self.memory_cache = MemoryCache(max_size=1000, ttl=L1_TTL_LOCAL_ONLY)
         self.redis_cache = RedisCache(redis_client)
         self.multi_cache = MultiLevelCache(self.memory_cache, self.redis_cache)
+        self.invalidation_bus: Optional[CacheInvalidationBus] = None
         self.cache_warming_tasks = {}
         self.cache_patterns = {
             'user': 'user:{}',
@@ -352,6 +455,30 @@ class CacheManager:
         
         logger.info("Cache warm-up completed")
     
+    async def start_invalidation_bus(self) -> None:
+        """启动跨进程失效总线并放宽L1 TTL"""
+        if self.invalidation_bus is not None:
+            return
+        
+        bus = CacheInvalidationBus(self.redis_client)
+        await bus.start(
+            handler=lambda keys, patterns, tags: self.multi_cache.invalidate_local(keys, patterns, tags),
+            resync_handler=self.multi_cache.reset_local
+        )
+        self.invalidation_bus = bus
+        self.multi_cache.invalidation_bus = bus
+        self.memory_cache.ttl = L1_TTL_WITH_INVALIDATION_BUS
+    
+    async def stop_invalidation_bus(self) -> None:
+        """停止失效总线并恢复L1 TTL"""
+        if self.invalidation_bus is None:
+            return
+        
+        await self.invalidation_bus.stop()
+        self.multi_cache.invalidation_bus = None
+        self.invalidation_bus = None
+        self.memory_cache.ttl = L1_TTL_LOCAL_ONLY
+    
     async def start_cache_maintenance(self) -> None:
         """启动缓存维护任务"""
         asyncio.create_task(self._cache_maintenance_loop())
@@ -386,42 +513,177 @@ class CacheManager:
         for key in expired_keys:
             self.memory_cache.delete(key)
         
+        # 清理标签索引中已不在内存缓存的键
+        tag_index = self.multi_cache.tag_index
+        for tag in list(tag_index.keys()):
+            tag_index[tag] &= self.memory_cache.cache.keys()
+            if not tag_index[tag]:
+                del tag_index[tag]
+        
         if expired_keys:
             logger.info(f"Cleaned up {len(expired_keys)} expired cache entries")
 
-def cached(ttl: int = 300, key_pattern: str = None):
-    """缓存装饰器"""
+# 不参与缓存键生成的参数（请求级对象）
+IGNORED_KEY_PARAM_NAMES = frozenset({'self', 'cls', 'db', 'session', 'request', 'background_tasks'})
+IGNORED_KEY_PARAM_TYPES = (Session, AsyncSession, Request)
+
+# 缓存键最大长度，超出部分使用摘要
+MAX_CACHE_KEY_LENGTH = 200
+
+# 单飞锁：同一缓存键并发未命中时只计算一次
+_inflight_calls: Dict[str, asyncio.Future] = {}
+
+
+def _is_key_argument(name: str, value: Any) -> bool:
+    """判断参数是否参与缓存键"""
+    if name in IGNORED_KEY_PARAM_NAMES:
+        return False
+    if isinstance(value, IGNORED_KEY_PARAM_TYPES):
+        return False
+    if callable(value):
+        return False
+    return True
+
+
+def build_cache_key(func: Callable, bound_arguments: Dict[str, Any]) -> str:
+    """默认缓存键：模块.函数名 + 参与键生成的参数"""
+    parts = [
+        f"{name}={value}"
+        for name, value in bound_arguments.items()
+        if _is_key_argument(name, value)
+    ]
+    key = f"fn:{func.__module__}.{func.__qualname__}:{':'.join(parts)}"
+    
+    if len(key) > MAX_CACHE_KEY_LENGTH:
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        key = f"fn:{func.__module__}.{func.__qualname__}:{digest}"
+    return key
+
+
+async def _single_flight(key: str, compute: Callable) -> Any:
+    """同一键的并发调用只执行一次compute，其余等待结果"""
+    future = _inflight_calls.get(key)
+    if future is not None:
+        return await asyncio.shield(future)
+    
+    future = asyncio.get_running_loop().create_future()
+    _inflight_calls[key] = future
+    try:
+        result = await compute()
+        future.set_result(result)
+        return result
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except Exception as e:
+        future.set_exception(e)
+        # 避免无人等待时出现"exception was never retrieved"警告
+        future.exception()
+        raise
+    finally:
+        _inflight_calls.pop(key, None)
+
+
+def cached(
+    ttl: int = 300,
+    key_pattern: str = None,
+    key_builder: Optional[Callable[..., str]] = None,
+    tags: Optional[List[str]] = None,
+    stale_ttl: int = 0,
+):
+    """
+    函数结果缓存装饰器（基于多级缓存）
+    
+    Args:
+        ttl: 结果保持新鲜的秒数
+        key_pattern: 键模板，可按参数名引用，如"points:summary:{lawyer_id}"
+        key_builder: 自定义键生成函数，接收被装饰函数的全部参数
+        tags: 标签模板列表，如["lawyer:{lawyer_id}"]，用于 invalidate_tags 批量失效
+        stale_ttl: 过期后仍可返回旧值的秒数，期间后台刷新（stale-while-revalidate）；
+            后台刷新会复用原始参数，请勿用于依赖请求级数据库会话的函数
+    
+    缓存系统未初始化时直接调用原函数；db/session/request 等请求级参数不参与键生成；
+    并发未命中同一键时只计算一次。
+    """
     def decorator(func):
+        signature = inspect.signature(func)
+        
         @wraps(func)
         async def wrapper(*args, **kwargs):
-            # 生成缓存键
-            if key_pattern:
-                cache_key = key_pattern.format(*args, **kwargs)
-            else:
-                # 基于函数名和参数生成键
-                func_name = func.__name__
-                args_str = ':'.join(map(str, args))
-                kwargs_str = ':'.join(f"{k}={v}" for k, v in sorted(kwargs.items()))
-                cache_key = f"{func_name}:{args_str}:{kwargs_str}"
+            manager = cache_manager
+            if manager is None:
+                return await func(*args, **kwargs)
+            
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = bound.arguments
             
-            # 尝试从缓存获取
-            if hasattr(wrapper, '_cache_manager'):
-                data = await wrapper._cache_manager.multi_cache.get(cache_key)
-                if data is not None:
-                    return data
+            try:
+                if key_builder:
+                    cache_key = key_builder(*args, **kwargs)
+                elif key_pattern:
+                    cache_key = key_pattern.format(**arguments)
+                else:
+                    cache_key = build_cache_key(func, arguments)
+                entry_tags = [tag.format(**arguments) for tag in (tags or [])]
+            except (KeyError, IndexError, AttributeError) as e:
+                logger.error(f"Cache key build error for {func.__qualname__}: {e}")
+                return await func(*args, **kwargs)
             
-            # 执行函数
-            result = await func(*args, **kwargs)
+            async def compute_and_store():
+                result = await func(*args, **kwargs)
+                if result is not None:
+                    now = time.time()
+                    envelope = {
+                        '__cached__': True,
+                        'value': result,
+                        'fresh_until': now + ttl,
+                    }
+                    await manager.multi_cache.set(
+                        cache_key, envelope, ttl + stale_ttl, tags=entry_tags
+                    )
+                return result
             
-            # 存入缓存
-            if hasattr(wrapper, '_cache_manager') and result is not None:
-                await wrapper._cache_manager.multi_cache.set(cache_key, result, ttl)
+            envelope = await manager.multi_cache.get(cache_key)
+            if isinstance(envelope, dict) and envelope.get('__cached__'):
+                if time.time() < envelope['fresh_until']:
+                    return envelope['value']
+                
+                if stale_ttl > 0:
+                    # 返回旧值，后台单飞刷新
+                    if cache_key not in _inflight_calls:
+                        asyncio.create_task(_refresh_in_background(cache_key, compute_and_store))
+                    return envelope['value']
             
-            return result
+            return await _single_flight(cache_key, compute_and_store)
         
+        wrapper.cache_key_pattern = key_pattern
+        wrapper.cache_tags = tags or []
         return wrapper
     return decorator
 
+
+async def _refresh_in_background(cache_key: str, compute: Callable) -> None:
+    """后台刷新过期缓存"""
+    try:
+        await _single_flight(cache_key, compute)
+    except Exception as e:
+        logger.error(f"Background cache refresh failed for {cache_key}: {e}")
+
+
+async def invalidate_tags(*tags: str) -> int:
+    """按标签失效函数结果缓存（缓存系统未初始化时为空操作）"""
+    if cache_manager is None or not tags:
+        return 0
+    
+    try:
+        count = await cache_manager.multi_cache.invalidate_tags(tags)
+        logger.debug(f"Invalidated {count} cache entries for tags: {tags}")
+        return count
+    except Exception as e:
+        logger.error(f"Cache tag invalidation error: {e}")
+        return 0
+
 # 全局缓存管理器实例
 cache_manager: Optional[CacheManager] = None
 
@@ -432,10 +694,10 @@ async def initialize_cache_system(redis_client: aioredis.Redis) -> CacheManager:
     cache_manager = CacheManager(redis_client)
     await cache_manager.start_cache_maintenance()
     
-    # 设置装饰器的缓存管理器
-    for func in [cached]:
-        if hasattr(func, '_cache_manager'):
-            func._cache_manager = cache_manager
+    try:
+        await cache_manager.start_invalidation_bus()
+    except Exception as e:
+        logger.error(f"Cache invalidation bus start failed, using local-only L1: {e}")
     
     logger.info("Cache system initialized successfully")
     return cache_manager
@@ -0,0 +1,271 @@
+"""
+缓存失效广播总线
+通过Redis发布/订阅把键、模式和标签失效广播到所有工作进程，
+保证多级缓存中各进程内存缓存（L1）的一致性
+"""
+
+import json
+import time
+import uuid
+import asyncio
+import logging
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import aioredis
+from prometheus_client import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+INVALIDATION_CHANNEL = "lawsker:cache:invalidate"
+
+CACHE_INVALIDATION_LAG = Histogram(
+    'cache_invalidation_lag_seconds',
+    'Delay between publishing a cache invalidation and applying it on another worker',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+CACHE_INVALIDATION_MESSAGES = Counter(
+    'cache_invalidation_messages_total',
+    'Cache invalidation bus messages',
+    ['direction']
+)
+
+
+class InvalidationBatch:
+    """待发送的失效批次"""
+
+    def __init__(self):
+        self.keys: Set[str] = set()
+        self.patterns: Set[str] = set()
+        self.tags: Set[str] = set()
+
+    def add(self, keys: Iterable[str] = (), patterns: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        self.keys.update(keys)
+        self.patterns.update(patterns)
+        self.tags.update(tags)
+
+    def size(self) -> int:
+        return len(self.keys) + len(self.patterns) + len(self.tags)
+
+    def is_empty(self) -> bool:
+        return self.size() == 0
+
+
+# 接收端回调：(keys, patterns, tags) -> None
+InvalidationHandler = Callable[[List[str], List[str], List[str]], None]
+# 丢失消息时的回调：清空本地缓存
+ResyncHandler = Callable[[], None]
+
+
+class CacheInvalidationBus:
+    """
+    缓存失效总线
+
+    - 发送端按批合并失效项，在 flush_interval 内或达到 max_batch_size 时发布一次
+    - 每个进程带唯一 source_id 和单调递增的序号（版本戳），
+      接收端据此忽略自身消息、丢弃重复消息，并在发现序号断档（消息丢失）时清空本地L1
+    - 记录从发布到应用的失效延迟
+    """
+
+    def __init__(
+        self,
+        redis_client: aioredis.Redis,
+        channel: str = INVALIDATION_CHANNEL,
+        flush_interval: float = 0.01,
+        max_batch_size: int = 500,
+    ):
+        self.redis = redis_client
+        self.channel = channel
+        self.flush_interval = flush_interval
+        self.max_batch_size = max_batch_size
+        self.source_id = uuid.uuid4().hex
+
+        self._handler: Optional[InvalidationHandler] = None
+        self._resync_handler: Optional[ResyncHandler] = None
+        self._listeners: List[InvalidationHandler] = []
+        self._resync_listeners: List[ResyncHandler] = []
+        self._sequence = 0
+        self._last_seen: Dict[str, int] = {}
+        self._pending = InvalidationBatch()
+        self._flush_task: Optional[asyncio.Task] = None
+        self._listener_task: Optional[asyncio.Task] = None
+        self.is_running = False
+
+        self.stats = {
+            'published_messages': 0,
+            'published_items': 0,
+            'received_messages': 0,
+            'applied_items': 0,
+            'duplicate_messages': 0,
+            'resyncs': 0,
+            'publish_errors': 0,
+            'lag_total_seconds': 0.0,
+            'lag_max_seconds': 0.0,
+        }
+
+    async def start(self, handler: InvalidationHandler, resync_handler: Optional[ResyncHandler] = None) -> None:
+        """订阅失效频道"""
+        if self.is_running:
+            return
+
+        self._handler = handler
+        self._resync_handler = resync_handler
+        self.is_running = True
+        self._listener_task = asyncio.create_task(self._listen_loop())
+        logger.info(f"Cache invalidation bus started: {self.source_id}")
+
+    def add_listener(self, handler: InvalidationHandler, resync_handler: Optional[ResyncHandler] = None) -> None:
+        """注册额外的进程内缓存（如配置缓存），接收同样的失效消息"""
+        self._listeners.append(handler)
+        if resync_handler:
+            self._resync_listeners.append(resync_handler)
+
+    async def stop(self) -> None:
+        """停止总线，先发送剩余的失效项"""
+        if not self.is_running:
+            return
+
+        self.is_running = False
+        await self.flush()
+
+        for task in (self._flush_task, self._listener_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+
+        logger.info("Cache invalidation bus stopped")
+
+    def publish(self, keys: Iterable[str] = (), patterns: Iterable[str] = (), tags: Iterable[str] = ()) -> None:
+        """登记需要广播的失效项（非阻塞，按批发送）"""
+        if not self.is_running:
+            return
+
+        self._pending.add(keys, patterns, tags)
+
+        if self._pending.size() >= self.max_batch_size:
+            asyncio.create_task(self.flush())
+        elif self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """立即发布当前批次"""
+        if self._pending.is_empty():
+            return
+
+        batch, self._pending = self._pending, InvalidationBatch()
+        self._sequence += 1
+        message = {
+            'src': self.source_id,
+            'seq': self._sequence,
+            'ts': time.time(),
+            'keys': sorted(batch.keys),
+            'patterns': sorted(batch.patterns),
+            'tags': sorted(batch.tags),
+        }
+
+        try:
+            await self.redis.publish(self.channel, json.dumps(message))
+            self.stats['published_messages'] += 1
+            self.stats['published_items'] += batch.size()
+            CACHE_INVALIDATION_MESSAGES.labels(direction='published').inc()
+        except Exception as e:
+            self.stats['publish_errors'] += 1
+            logger.error(f"Cache invalidation publish error: {e}")
+
+    async def _listen_loop(self) -> None:
+        """订阅循环，断线后重新订阅并要求本地重新同步"""
+        while self.is_running:
+            pubsub = self.redis.pubsub()
+            try:
+                await pubsub.subscribe(self.channel)
+                # 订阅建立前可能错过消息，保守地清空本地缓存
+                self._resync("subscribed")
+
+                while self.is_running:
+                    message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                    if message is None:
+                        continue
+                    self._handle_message(message.get('data'))
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Cache invalidation listener error: {e}")
+                await asyncio.sleep(1)
+            finally:
+                try:
+                    await pubsub.close()
+                except Exception:
+                    pass
+
+    def _handle_message(self, data: Any) -> None:
+        """应用一条失效消息"""
+        try:
+            if isinstance(data, bytes):
+                data = data.decode('utf-8')
+            message = json.loads(data)
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Invalid cache invalidation message: {e}")
+            return
+
+        source = message.get('src')
+        if source == self.source_id:
+            return
+
+        self.stats['received_messages'] += 1
+        CACHE_INVALIDATION_MESSAGES.labels(direction='received').inc()
+
+        sequence = message.get('seq', 0)
+        last_seen = self._last_seen.get(source)
+        if last_seen is not None:
+            if sequence <= last_seen:
+                self.stats['duplicate_messages'] += 1
+                return
+            if sequence > last_seen + 1:
+                # 序号断档说明有消息丢失，无法确定哪些键已失效
+                self._resync(f"gap from {source}: {last_seen} -> {sequence}")
+        self._last_seen[source] = sequence
+
+        keys = message.get('keys', [])
+        patterns = message.get('patterns', [])
+        tags = message.get('tags', [])
+
+        for handler in ([self._handler] if self._handler else []) + self._listeners:
+            try:
+                handler(keys, patterns, tags)
+            except Exception as e:
+                logger.error(f"Cache invalidation handler error: {e}")
+
+        self.stats['applied_items'] += len(keys) + len(patterns) + len(tags)
+
+        lag = max(0.0, time.time() - message.get('ts', time.time()))
+        self.stats['lag_total_seconds'] += lag
+        self.stats['lag_max_seconds'] = max(self.stats['lag_max_seconds'], lag)
+        CACHE_INVALIDATION_LAG.observe(lag)
+
+    def _resync(self, reason: str) -> None:
+        """清空本地缓存"""
+        self.stats['resyncs'] += 1
+        logger.info(f"Cache invalidation resync ({reason})")
+        for handler in ([self._resync_handler] if self._resync_handler else []) + self._resync_listeners:
+            try:
+                handler()
+            except Exception as e:
+                logger.error(f"Cache resync handler error: {e}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取总线统计"""
+        received = self.stats['received_messages'] - self.stats['duplicate_messages']
+        return {
+            **self.stats,
+            'source_id': self.source_id,
+            'is_running': self.is_running,
+            'pending_items': self._pending.size(),
+            'lag_avg_seconds': (self.stats['lag_total_seconds'] / received) if received > 0 else 0.0,
+        }
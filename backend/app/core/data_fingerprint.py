@@ -0,0 +1,357 @@
+"""
+数据指纹
+按主键范围把每张表切成若干块，对每块按主键顺序计算行哈希的聚合（md5(string_agg(md5(row) ORDER BY pk))），
+多个连接并行计算；并行时各连接共享协调连接导出的快照（pg_export_snapshot），结果是同一时刻的一致视图。
+迁移前的指纹快照保存为 JSON，迁移后沿用迁移前的分块边界和列清单重新计算，两者比对即可精确到
+哪些主键范围的数据发生了变化、哪些范围丢了行。只依赖 asyncpg，迁移脚本可以直接使用
+"""
+
+import asyncio
+import json
+import logging
+import math
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+DEFAULT_CHUNK_ROWS = 100000
+INTEGER_KEY_TYPES = {"smallint", "integer", "bigint"}
+
+_TABLES_SQL = """
+    SELECT
+        n.nspname AS schema_name,
+        c.relname AS table_name,
+        GREATEST(c.reltuples, 0)::bigint AS estimated_rows,
+        ARRAY(
+            SELECT a.attname FROM pg_attribute a
+            WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+            ORDER BY a.attnum
+        ) AS columns,
+        ARRAY(
+            SELECT a.attname
+            FROM pg_index i
+            CROSS JOIN LATERAL unnest(i.indkey) WITH ORDINALITY AS k(attnum, ord)
+            JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = k.attnum
+            WHERE i.indrelid = c.oid AND i.indisprimary
+            ORDER BY k.ord
+        ) AS key_columns,
+        (
+            SELECT format_type(a.atttypid, a.atttypmod)
+            FROM pg_index i
+            JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum = i.indkey[0]
+            WHERE i.indrelid = c.oid AND i.indisprimary
+        ) AS key_type
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE c.relkind IN ('r', 'p')
+      AND NOT c.relispartition
+      AND n.nspname = ANY($1::text[])
+    ORDER BY n.nspname, c.relname
+"""
+
+
+def quote_ident(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def asyncpg_dsn(database_url: str) -> str:
+    """SQLAlchemy 风格的连接串（postgresql+asyncpg://）转成 asyncpg 可用的形式"""
+    scheme, sep, rest = database_url.partition("://")
+    return f"{scheme.split('+')[0]}{sep}{rest}"
+
+
+def integer_bounds(low: int, high: int, chunks: int) -> List[str]:
+    """把 [low, high] 均分为 chunks 段，返回中间的分割点"""
+    if chunks <= 1 or high <= low:
+        return []
+    step = math.ceil((high - low + 1) / chunks)
+    return [str(low + step * i) for i in range(1, chunks) if low + step * i <= high]
+
+
+def sample_bounds(histogram: Sequence[str], chunks: int) -> List[str]:
+    """从 pg_stats 直方图边界（等频）中取 chunks - 1 个等距的分割点"""
+    if chunks <= 1 or len(histogram) < 3:
+        return []
+    last = len(histogram) - 1
+    picked = [histogram[round(i * last / chunks)] for i in range(1, chunks)]
+    return [value for value in dict.fromkeys(picked) if value not in (histogram[0], histogram[last])]
+
+
+def chunk_ranges(bounds: Sequence[str]) -> List[Tuple[Optional[str], Optional[str]]]:
+    """分割点 -> [(None, b0), (b0, b1), ..., (bn, None)]，两端不设界，新增到范围外的行也能被计入"""
+    edges: List[Optional[str]] = [None, *bounds, None]
+    return [(edges[i], edges[i + 1]) for i in range(len(edges) - 1)]
+
+
+@dataclass
+class ChunkFingerprint:
+    lo: Optional[str]
+    hi: Optional[str]
+    rows: int = 0
+    digest: str = ""
+
+
+@dataclass
+class TableFingerprint:
+    table: str
+    columns: List[str]
+    key_columns: List[str]
+    key_type: Optional[str]
+    chunks: List[ChunkFingerprint] = field(default_factory=list)
+    error: Optional[str] = None
+
+    @property
+    def rows(self) -> int:
+        return sum(chunk.rows for chunk in self.chunks)
+
+
+@dataclass
+class FingerprintSnapshot:
+    database: str
+    created_at: str
+    tables: Dict[str, TableFingerprint]
+    chunk_rows: int = DEFAULT_CHUNK_ROWS
+    duration_seconds: float = 0.0
+
+    def row_counts(self) -> Dict[str, int]:
+        return {name: table.rows for name, table in self.tables.items()}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"version": SNAPSHOT_VERSION, **asdict(self)}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "FingerprintSnapshot":
+        tables = {}
+        for name, table in data["tables"].items():
+            chunks = [ChunkFingerprint(**chunk) for chunk in table.pop("chunks")]
+            tables[name] = TableFingerprint(**table, chunks=chunks)
+        return cls(
+            database=data["database"], created_at=data["created_at"], tables=tables,
+            chunk_rows=data.get("chunk_rows", DEFAULT_CHUNK_ROWS),
+            duration_seconds=data.get("duration_seconds", 0.0)
+        )
+
+    def save(self, path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2))
+        return path
+
+    @classmethod
+    def load(cls, path) -> "FingerprintSnapshot":
+        return cls.from_dict(json.loads(Path(path).read_text()))
+
+
+def chunk_query(table: TableFingerprint, chunk: ChunkFingerprint) -> Tuple[str, List[str]]:
+    """
+    单块的指纹查询
+
+    有主键时按主键范围过滤、按主键排序聚合；没有主键的表只有一块，用与顺序无关的哈希求和
+    """
+    row_expr = f"md5(ROW({', '.join(quote_ident(c) for c in table.columns)})::text)"
+    if not table.key_columns:
+        return (
+            f"SELECT COUNT(*), COALESCE(SUM(('x' || substr({row_expr}, 1, 15))::bit(60)::bigint::numeric), 0)::text "
+            f"FROM {table.table}",
+            []
+        )
+
+    key = quote_ident(table.key_columns[0])
+    order_by = ", ".join(quote_ident(c) for c in table.key_columns)
+    conditions, args = [], []
+    if chunk.lo is not None:
+        args.append(chunk.lo)
+        conditions.append(f"{key} >= (${len(args)}::text)::{table.key_type}")
+    if chunk.hi is not None:
+        args.append(chunk.hi)
+        conditions.append(f"{key} < (${len(args)}::text)::{table.key_type}")
+    where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+    return (
+        f"SELECT COUNT(*), md5(COALESCE(string_agg({row_expr}, '' ORDER BY {order_by}), '')) "
+        f"FROM {table.table}{where}",
+        args
+    )
+
+
+def diff_snapshots(before: FingerprintSnapshot, after: FingerprintSnapshot) -> Dict[str, Any]:
+    """
+    比对两个快照
+
+    返回 {'ok', 'missing_tables', 'new_tables', 'schema_changes', 'changed', 'lost_rows', 'tables'}：
+    changed 为 {表: [{'lo', 'hi', 'rows_before', 'rows_after'}]}，只列出指纹不同的范围；
+    lost_rows 为行数减少的表。ok 表示没有丢表、丢列或丢行（内容变化需要调用方判断是否符合预期）
+    """
+    missing_tables = sorted(set(before.tables) - set(after.tables))
+    new_tables = sorted(set(after.tables) - set(before.tables))
+    schema_changes: Dict[str, str] = {}
+    changed: Dict[str, List[Dict[str, Any]]] = {}
+    lost_rows: Dict[str, Dict[str, int]] = {}
+    tables: Dict[str, Dict[str, int]] = {}
+
+    for name in sorted(set(before.tables) & set(after.tables)):
+        old, new = before.tables[name], after.tables[name]
+        if new.error:
+            schema_changes[name] = new.error
+            continue
+        tables[name] = {"rows_before": old.rows, "rows_after": new.rows, "chunks": len(old.chunks)}
+        ranges = []
+        for old_chunk, new_chunk in zip(old.chunks, new.chunks):
+            if (old_chunk.rows, old_chunk.digest) != (new_chunk.rows, new_chunk.digest):
+                ranges.append({
+                    "lo": old_chunk.lo, "hi": old_chunk.hi,
+                    "rows_before": old_chunk.rows, "rows_after": new_chunk.rows,
+                })
+        if ranges:
+            changed[name] = ranges
+        if new.rows < old.rows:
+            lost_rows[name] = {"before": old.rows, "after": new.rows}
+
+    return {
+        "ok": not (missing_tables or schema_changes or lost_rows),
+        "missing_tables": missing_tables,
+        "new_tables": new_tables,
+        "schema_changes": schema_changes,
+        "changed": changed,
+        "lost_rows": lost_rows,
+        "tables": tables,
+    }
+
+
+class DataFingerprinter:
+    """
+    计算数据库的指纹快照
+
+    snapshot() 默认用连接池并行；传入 conn 时在该连接（及其当前事务）上顺序计算，
+    用于在迁移事务提交前校验事务内的结果。给定 baseline 时沿用其分块边界和列清单
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        workers: int = 8,
+        chunk_rows: int = DEFAULT_CHUNK_ROWS,
+        schemas: Sequence[str] = ("public",),
+        exclude: Sequence[str] = ()
+    ):
+        self.dsn = asyncpg_dsn(database_url)
+        self.workers = max(1, workers)
+        self.chunk_rows = chunk_rows
+        self.schemas = list(schemas)
+        self.exclude = set(exclude)
+
+    async def _plan_table(self, conn, row, baseline: Optional[FingerprintSnapshot]) -> TableFingerprint:
+        name = f"{quote_ident(row['schema_name'])}.{quote_ident(row['table_name'])}"
+        columns, key_columns = list(row["columns"]), list(row["key_columns"])
+        old = baseline.tables.get(name) if baseline else None
+        if old is not None:
+            # 只比较迁移前就有的列，新增列不影响指纹
+            dropped = [c for c in old.columns if c not in columns]
+            table = TableFingerprint(name, old.columns, old.key_columns, old.key_type)
+            if dropped:
+                table.error = f"列已删除: {', '.join(dropped)}"
+            elif old.key_columns and old.key_columns != key_columns:
+                table.error = f"主键已变更: {', '.join(old.key_columns)} -> {', '.join(key_columns) or '无'}"
+            else:
+                table.chunks = [ChunkFingerprint(c.lo, c.hi) for c in old.chunks]
+            return table
+
+        table = TableFingerprint(name, columns, key_columns, row["key_type"] if key_columns else None)
+        bounds: List[str] = []
+        chunks = max(1, math.ceil(row["estimated_rows"] / self.chunk_rows))
+        if key_columns and chunks > 1:
+            key = quote_ident(key_columns[0])
+            if table.key_type in INTEGER_KEY_TYPES:
+                low, high = await conn.fetchrow(f"SELECT MIN({key}), MAX({key}) FROM {name}")
+                if low is not None:
+                    bounds = integer_bounds(low, high, chunks)
+            else:
+                histogram = await conn.fetchval("""
+                    SELECT histogram_bounds::text::text[] FROM pg_stats
+                    WHERE schemaname = $1 AND tablename = $2 AND attname = $3
+                """, row["schema_name"], row["table_name"], key_columns[0])
+                bounds = sample_bounds(histogram or [], chunks)
+        table.chunks = [ChunkFingerprint(lo, hi) for lo, hi in chunk_ranges(bounds)]
+        return table
+
+    async def _plan(self, conn, baseline: Optional[FingerprintSnapshot]) -> Dict[str, TableFingerprint]:
+        tables = {}
+        for row in await conn.fetch(_TABLES_SQL, self.schemas):
+            if row["table_name"] in self.exclude:
+                continue
+            table = await self._plan_table(conn, row, baseline)
+            tables[table.table] = table
+        return tables
+
+    @staticmethod
+    async def _fingerprint_chunk(conn, table: TableFingerprint, chunk: ChunkFingerprint) -> None:
+        sql, args = chunk_query(table, chunk)
+        rows, digest = await conn.fetchrow(sql, *args)
+        chunk.rows, chunk.digest = rows, digest
+
+    async def snapshot(
+        self,
+        baseline: Optional[FingerprintSnapshot] = None,
+        conn: Optional[asyncpg.Connection] = None,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> FingerprintSnapshot:
+        started = datetime.now()
+        if conn is not None:
+            database = await conn.fetchval("SELECT current_database()")
+            tables = await self._plan(conn, baseline)
+            jobs = [(t, c) for t in tables.values() for c in t.chunks]
+            for done, (table, chunk) in enumerate(jobs, 1):
+                await self._fingerprint_chunk(conn, table, chunk)
+                if progress:
+                    progress(done, len(jobs))
+        else:
+            database, tables = await self._snapshot_parallel(baseline, progress)
+
+        return FingerprintSnapshot(
+            database=database,
+            created_at=started.isoformat(),
+            tables=tables,
+            chunk_rows=self.chunk_rows,
+            duration_seconds=round((datetime.now() - started).total_seconds(), 3)
+        )
+
+    async def _snapshot_parallel(self, baseline, progress):
+        pool = await asyncpg.create_pool(self.dsn, min_size=1, max_size=self.workers + 1)
+        try:
+            async with pool.acquire() as coordinator:
+                transaction = coordinator.transaction(isolation="repeatable_read", readonly=True)
+                await transaction.start()
+                try:
+                    snapshot_id = await coordinator.fetchval("SELECT pg_export_snapshot()")
+                    database = await coordinator.fetchval("SELECT current_database()")
+                    tables = await self._plan(coordinator, baseline)
+                    jobs: asyncio.Queue = asyncio.Queue()
+                    for table in tables.values():
+                        for chunk in table.chunks:
+                            jobs.put_nowait((table, chunk))
+                    total = jobs.qsize()
+                    done = 0
+
+                    async def worker():
+                        nonlocal done
+                        async with pool.acquire() as conn:
+                            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                                await conn.execute(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'")
+                                while not jobs.empty():
+                                    table, chunk = jobs.get_nowait()
+                                    await self._fingerprint_chunk(conn, table, chunk)
+                                    done += 1
+                                    if progress:
+                                        progress(done, total)
+
+                    await asyncio.gather(*(worker() for _ in range(min(self.workers, total) or 1)))
+                finally:
+                    await transaction.rollback()
+        finally:
+            await pool.close()
+        return database, tables
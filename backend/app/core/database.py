@@ -9,6 +9,7 @@ from sqlalchemy import event
 import structlog
 
 from app.core.config import settings
+from app.core.query_profiler import attach_query_profiler
 
 logger = structlog.get_logger()
 
@@ -20,6 +21,9 @@ engine = create_async_engine(
     pool_recycle=300,
 )
 
+# 注册请求级SQL查询分析钩子
+attach_query_profiler(engine.sync_engine)
+
 # 创建异步会话工厂
 AsyncSessionLocal = async_sessionmaker(
     engine,
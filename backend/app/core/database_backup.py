@@ -0,0 +1,522 @@
+"""
+数据库备份
+用 pg_dump 目录格式（-Fd）并行导出，pg_dump 作为异步子进程运行，从 --verbose 输出解析进度；
+PostgreSQL 16 及以上的客户端用 zstd 压缩，低版本回退到 gzip。导出完成后为每个文件计算 SHA-256
+写入 manifest.json，恢复前先按清单校验并核对 pg_restore 目录中的每个数据项都有文件，
+再用 pg_restore -j 并行恢复。/operations/backup 创建的 backup_records 由 DatabaseBackupEngine 执行
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+# 同一时间只允许一个备份，跨worker用会话级咨询锁
+BACKUP_LOCK_KEY = 7301005
+HASH_CHUNK_SIZE = 4 * 1024 * 1024
+STDERR_TAIL_LINES = 50
+PROGRESS_UPDATE_SECONDS = 1.0
+
+# pg_dump / pg_restore --verbose 中开始处理一张表数据的行
+_TABLE_DATA_LINE = re.compile(r'(?:dumping contents of table|processing data for table) "?([^"\s]+)"?')
+_VERSION = re.compile(r'\(PostgreSQL\)\s*(\d+)')
+# pg_restore --list 中的表数据项，如 "3290; 0 16390 TABLE DATA public users postgres"
+_TOC_TABLE_DATA = re.compile(r'^(\d+);\s+\d+\s+\d+\s+TABLE DATA\s')
+_DATA_FILE_SUFFIXES = (".dat", ".dat.gz", ".dat.zst", ".dat.lz4")
+
+ProgressCallback = Callable[[int, str], Awaitable[None]]
+
+
+class BackupError(RuntimeError):
+    """备份或恢复失败"""
+
+
+def pg_env(database_url: str) -> Dict[str, str]:
+    """把 SQLAlchemy 连接串转成 libpq 环境变量，密码不出现在命令行里"""
+    url = make_url(database_url)
+    env = os.environ.copy()
+    env.update({
+        "PGHOST": url.host or "localhost",
+        "PGPORT": str(url.port or 5432),
+        "PGUSER": url.username or "postgres",
+        "PGDATABASE": url.database or "postgres",
+    })
+    if url.password:
+        env["PGPASSWORD"] = str(url.password)
+    return env
+
+
+def pg_tool(name: str) -> str:
+    bin_dir = settings.BACKUP_PG_BIN_DIR
+    return str(Path(bin_dir) / name) if bin_dir else name
+
+
+def parse_pg_version(output: str) -> int:
+    """'pg_dump (PostgreSQL) 16.2' -> 16"""
+    match = _VERSION.search(output)
+    if not match:
+        raise BackupError(f"无法识别的版本: {output.strip()}")
+    return int(match.group(1))
+
+
+def compression_args(compression: str, pg_major: int) -> Tuple[List[str], str]:
+    """
+    按客户端版本生成压缩参数，返回 (参数, 实际使用的压缩方式)
+
+    zstd 需要 pg_dump 16 及以上，低版本回退到 gzip；none 表示不压缩
+    """
+    method, _, level = compression.partition(":")
+    method = method.strip().lower() or "zstd"
+    if method == "none":
+        return (["--compress=none"] if pg_major >= 16 else ["--compress=0"]), "none"
+    if method == "zstd" and pg_major >= 16:
+        level = level or "3"
+        return [f"--compress=zstd:{level}"], f"zstd:{level}"
+    level = level if method == "gzip" and level else "6"
+    return ([f"--compress=gzip:{level}"] if pg_major >= 16 else [f"--compress={level}"]), f"gzip:{level}"
+
+
+def toc_data_ids(listing: str) -> Set[str]:
+    """pg_restore --list 输出中所有表数据项的 dump id"""
+    ids = set()
+    for line in listing.splitlines():
+        match = _TOC_TABLE_DATA.match(line.strip())
+        if match:
+            ids.add(match.group(1))
+    return ids
+
+
+def data_file_ids(names) -> Set[str]:
+    ids = set()
+    for name in names:
+        for suffix in _DATA_FILE_SUFFIXES:
+            if name.endswith(suffix) and name[:-len(suffix)].isdigit():
+                ids.add(name[:-len(suffix)])
+    return ids
+
+
+def _sha256(path: Path) -> Tuple[int, str]:
+    digest = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            size += len(chunk)
+            digest.update(chunk)
+    return size, digest.hexdigest()
+
+
+async def checksum_files(backup_dir: Path, jobs: int = 4) -> Dict[str, Dict[str, Any]]:
+    """并行计算目录下每个文件（清单除外）的大小和 SHA-256"""
+    semaphore = asyncio.Semaphore(max(1, jobs))
+    names = sorted(
+        entry.name for entry in backup_dir.iterdir() if entry.is_file() and entry.name != MANIFEST_NAME
+    )
+
+    async def one(name: str):
+        async with semaphore:
+            size, digest = await asyncio.to_thread(_sha256, backup_dir / name)
+            return name, {"size": size, "sha256": digest}
+
+    return dict(await asyncio.gather(*(one(name) for name in names)))
+
+
+async def write_manifest(backup_dir: Path, metadata: Dict[str, Any], jobs: int = 4) -> Dict[str, Any]:
+    """写入 manifest.json，返回清单内容（含清单文件自身的 sha256）"""
+    files = await checksum_files(backup_dir, jobs)
+    manifest = {
+        "version": MANIFEST_VERSION,
+        "format": "directory",
+        **metadata,
+        "files": files,
+        "total_size": sum(item["size"] for item in files.values()),
+    }
+    manifest_path = backup_dir / MANIFEST_NAME
+    manifest_path.write_text(json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True))
+    manifest["manifest_sha256"] = (await asyncio.to_thread(_sha256, manifest_path))[1]
+    return manifest
+
+
+def read_manifest(backup_dir: Path) -> Dict[str, Any]:
+    path = Path(backup_dir) / MANIFEST_NAME
+    if not path.exists():
+        raise BackupError(f"{backup_dir} 缺少 {MANIFEST_NAME}")
+    return json.loads(path.read_text())
+
+
+async def run_pg_tool(
+    cmd: List[str],
+    env: Dict[str, str],
+    on_line: Optional[Callable[[str], Awaitable[None]]] = None
+) -> str:
+    """
+    以异步子进程运行 pg_dump / pg_restore，逐行处理 stderr，返回 stdout
+
+    失败时抛出 BackupError 并附带 stderr 末尾若干行；任务被取消时终止子进程
+    """
+    process = await asyncio.create_subprocess_exec(
+        *cmd, env=env, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    tail: deque = deque(maxlen=STDERR_TAIL_LINES)
+
+    async def read_stderr():
+        async for raw_line in process.stderr:
+            line = raw_line.decode(errors="replace").rstrip()
+            tail.append(line)
+            if on_line:
+                await on_line(line)
+
+    try:
+        stdout, _ = await asyncio.gather(process.stdout.read(), read_stderr())
+        await process.wait()
+    except asyncio.CancelledError:
+        if process.returncode is None:
+            process.terminate()
+            try:
+                await asyncio.wait_for(process.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                process.kill()
+                await process.wait()
+        raise
+
+    if process.returncode != 0:
+        raise BackupError(f"{Path(cmd[0]).name} 退出码 {process.returncode}: " + "\n".join(tail))
+    return stdout.decode(errors="replace")
+
+
+async def pg_client_version(tool: str = "pg_dump") -> int:
+    output = await run_pg_tool([pg_tool(tool), "--version"], os.environ.copy())
+    return parse_pg_version(output)
+
+
+async def dump_database(
+    database_url: str,
+    target_dir: Path,
+    jobs: int = 4,
+    compression: str = "zstd:3",
+    progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """
+    并行导出数据库到 target_dir（目录格式），写入清单并返回清单内容
+
+    progress(已开始导出的表数, 表名) 在每张表开始导出时调用
+    """
+    target_dir = Path(target_dir)
+    if target_dir.exists():
+        raise BackupError(f"备份目录已存在: {target_dir}")
+    target_dir.parent.mkdir(parents=True, exist_ok=True)
+
+    pg_major = await pg_client_version("pg_dump")
+    compress, used_compression = compression_args(compression, pg_major)
+    env = pg_env(database_url)
+    cmd = [
+        pg_tool("pg_dump"), "--format=directory", f"--jobs={max(1, jobs)}", *compress,
+        "--verbose", "--no-password", f"--file={target_dir}",
+    ]
+
+    started = datetime.now()
+    tables: Set[str] = set()
+
+    async def on_line(line: str):
+        match = _TABLE_DATA_LINE.search(line)
+        if match and match.group(1) not in tables:
+            tables.add(match.group(1))
+            if progress:
+                await progress(len(tables), match.group(1))
+
+    await run_pg_tool(cmd, env, on_line)
+    return await write_manifest(target_dir, {
+        "database": env["PGDATABASE"],
+        "created_at": started.isoformat(),
+        "duration_seconds": round((datetime.now() - started).total_seconds(), 3),
+        "pg_dump_version": pg_major,
+        "compression": used_compression,
+        "jobs": jobs,
+        "tables": len(tables),
+    }, jobs)
+
+
+async def verify_backup(backup_dir: Path, jobs: int = 4, check_toc: bool = True) -> Dict[str, Any]:
+    """
+    校验备份目录：按清单比对每个文件的大小和 SHA-256，并确认 pg_restore 能读出目录、
+    每个表数据项都有对应的数据文件。返回 {'ok', 'missing', 'mismatched', 'unexpected', 'missing_data', 'files'}
+    """
+    backup_dir = Path(backup_dir)
+    manifest = read_manifest(backup_dir)
+    actual = await checksum_files(backup_dir, jobs)
+    expected = manifest["files"]
+
+    missing = sorted(set(expected) - set(actual))
+    unexpected = sorted(set(actual) - set(expected))
+    mismatched = sorted(
+        name for name in set(expected) & set(actual)
+        if expected[name]["sha256"] != actual[name]["sha256"] or expected[name]["size"] != actual[name]["size"]
+    )
+
+    missing_data: List[str] = []
+    if check_toc and not missing and not mismatched:
+        listing = await run_pg_tool(
+            [pg_tool("pg_restore"), "--list", str(backup_dir)], os.environ.copy()
+        )
+        missing_data = sorted(toc_data_ids(listing) - data_file_ids(actual))
+
+    return {
+        "ok": not (missing or mismatched or missing_data),
+        "missing": missing,
+        "mismatched": mismatched,
+        "unexpected": unexpected,
+        "missing_data": missing_data,
+        "files": len(expected),
+    }
+
+
+async def restore_database(
+    backup_dir: Path,
+    database_url: str,
+    jobs: int = 4,
+    clean: bool = False,
+    verify: bool = True,
+    progress: Optional[ProgressCallback] = None
+) -> Dict[str, Any]:
+    """
+    用 pg_restore 并行恢复到 database_url 指向的库
+
+    verify=True 时先校验清单，任何文件缺失或不一致都不恢复；clean=True 先删除库中已有的同名对象
+    """
+    backup_dir = Path(backup_dir)
+    result: Dict[str, Any] = {}
+    if verify:
+        result["verification"] = await verify_backup(backup_dir, jobs)
+        if not result["verification"]["ok"]:
+            raise BackupError(f"备份校验失败，未恢复: {result['verification']}")
+
+    env = pg_env(database_url)
+    cmd = [
+        pg_tool("pg_restore"), "--format=directory", f"--jobs={max(1, jobs)}",
+        "--no-owner", "--exit-on-error", "--verbose", "--no-password", f"--dbname={env['PGDATABASE']}",
+    ]
+    if clean:
+        cmd += ["--clean", "--if-exists"]
+    cmd.append(str(backup_dir))
+
+    tables: Set[str] = set()
+
+    async def on_line(line: str):
+        match = _TABLE_DATA_LINE.search(line)
+        if match and match.group(1) not in tables:
+            tables.add(match.group(1))
+            if progress:
+                await progress(len(tables), match.group(1))
+
+    started = datetime.now()
+    await run_pg_tool(cmd, env, on_line)
+    result.update({
+        "tables": len(tables),
+        "duration_seconds": round((datetime.now() - started).total_seconds(), 3),
+    })
+    return result
+
+
+class DatabaseBackupEngine:
+    """
+    执行 backup_records 中的备份任务
+
+    备份期间在一个 AUTOCOMMIT 连接上持有会话级咨询锁，多个worker只有一个在导出；
+    拿到锁时其余仍为 running 的记录必然是进程退出前没做完的，标记为失败。
+    进度按表数写回 backup_records，最多每秒一次
+    """
+
+    def __init__(
+        self,
+        backup_dir: Optional[str] = None,
+        jobs: Optional[int] = None,
+        compression: Optional[str] = None,
+        database_url: Optional[str] = None
+    ):
+        self.backup_dir = Path(backup_dir or settings.BACKUP_DIR)
+        self.jobs = jobs or settings.BACKUP_JOBS
+        self.compression = compression or settings.BACKUP_COMPRESSION
+        self.database_url = database_url or settings.DATABASE_URL
+        self._tasks: Set[asyncio.Task] = set()
+        self.stats = {
+            'backups_completed': 0,
+            'backups_failed': 0,
+            'backups_skipped': 0,
+            'last_backup_seconds': 0.0,
+            'last_backup_bytes': 0,
+        }
+
+    @staticmethod
+    def _session_factory(session_factory):
+        if session_factory is None:
+            from app.core.database import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+        return session_factory
+
+    def backup_path(self, file_name: str) -> Path:
+        return self.backup_dir / file_name
+
+    def submit(self, record_id: int) -> asyncio.Task:
+        """在后台执行一条备份记录"""
+        task = asyncio.create_task(self.run_backup(record_id))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _update_record(self, session_factory, record_id: int, **values) -> None:
+        assignments = ", ".join(f"{column} = :{column}" for column in values)
+        async with session_factory() as db:
+            await db.execute(
+                text(f"UPDATE backup_records SET {assignments} WHERE id = :record_id"),
+                {**values, 'record_id': record_id}
+            )
+            await db.commit()
+
+    async def _count_tables(self, db) -> int:
+        result = await db.execute(text("""
+            SELECT COUNT(*) FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE c.relkind = 'r'
+              AND n.nspname NOT IN ('pg_catalog', 'information_schema')
+              AND n.nspname NOT LIKE 'pg_toast%'
+        """))
+        return result.scalar() or 0
+
+    async def run_backup(self, record_id: int, session_factory=None) -> Dict[str, Any]:
+        session_factory = self._session_factory(session_factory)
+        async with session_factory() as lock_db:
+            lock_conn = await lock_db.connection(execution_options={"isolation_level": "AUTOCOMMIT"})
+            locked = (await lock_conn.execute(
+                text("SELECT pg_try_advisory_lock(:lock_key)"), {'lock_key': BACKUP_LOCK_KEY}
+            )).scalar()
+            if not locked:
+                self.stats['backups_skipped'] += 1
+                await self._update_record(
+                    session_factory, record_id, backup_status='failed',
+                    error_message='已有备份正在进行', completed_at=datetime.now()
+                )
+                return {'status': 'skipped'}
+            try:
+                return await self._run_locked(record_id, session_factory, lock_conn)
+            finally:
+                await lock_conn.execute(
+                    text("SELECT pg_advisory_unlock(:lock_key)"), {'lock_key': BACKUP_LOCK_KEY}
+                )
+
+    async def _run_locked(self, record_id: int, session_factory, lock_conn) -> Dict[str, Any]:
+        await lock_conn.execute(text("""
+            UPDATE backup_records
+            SET backup_status = 'failed', error_message = '备份进程中断', completed_at = CURRENT_TIMESTAMP
+            WHERE backup_status = 'running' AND id <> :record_id
+        """), {'record_id': record_id})
+        record = (await lock_conn.execute(
+            text("SELECT file_name FROM backup_records WHERE id = :record_id"), {'record_id': record_id}
+        )).first()
+        if record is None:
+            raise BackupError(f"备份记录不存在: {record_id}")
+        target_dir = self.backup_path(record[0])
+        tables_total = await self._count_tables(lock_conn)
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        last_update = 0.0
+        await self._update_record(
+            session_factory, record_id, backup_status='running', file_path=str(target_dir),
+            backup_format='directory', parallel_jobs=self.jobs, tables_total=tables_total,
+            tables_done=0, progress_percent=0
+        )
+
+        async def on_progress(done: int, table: str):
+            nonlocal last_update
+            now = loop.time()
+            if now - last_update < PROGRESS_UPDATE_SECONDS:
+                return
+            last_update = now
+            percent = min(99, done * 100 // tables_total) if tables_total else 0
+            await self._update_record(
+                session_factory, record_id, tables_done=done, progress_percent=percent
+            )
+
+        try:
+            manifest = await dump_database(
+                self.database_url, target_dir, self.jobs, self.compression, on_progress
+            )
+        except BaseException as e:
+            self.stats['backups_failed'] += 1
+            error = '备份已取消' if isinstance(e, asyncio.CancelledError) else str(e)
+            logger.error(f"数据库备份失败: {error}")
+            if target_dir.exists():
+                await asyncio.to_thread(shutil.rmtree, target_dir, True)
+            await asyncio.shield(self._update_record(
+                session_factory, record_id, backup_status='failed', error_message=error[:2000],
+                backup_duration=int(loop.time() - started), completed_at=datetime.now()
+            ))
+            raise
+
+        duration = int(loop.time() - started)
+        await self._update_record(
+            session_factory, record_id, backup_status='completed', file_size=manifest['total_size'],
+            backup_duration=duration, compression=manifest['compression'],
+            manifest_checksum=manifest['manifest_sha256'], tables_done=manifest['tables'],
+            progress_percent=100, completed_at=datetime.now()
+        )
+        self.stats['backups_completed'] += 1
+        self.stats['last_backup_seconds'] = duration
+        self.stats['last_backup_bytes'] = manifest['total_size']
+        logger.info(f"数据库备份完成: {target_dir}（{manifest['total_size']} 字节，{duration}s）")
+        return {'status': 'completed', 'path': str(target_dir), 'manifest': manifest}
+
+    async def verify_record(self, record_id: int, session_factory=None) -> Dict[str, Any]:
+        """校验一条已完成的备份并记录结果"""
+        session_factory = self._session_factory(session_factory)
+        async with session_factory() as db:
+            row = (await db.execute(text("""
+                SELECT file_path, backup_status FROM backup_records WHERE id = :record_id
+            """), {'record_id': record_id})).first()
+        if row is None or row[1] != 'completed' or not row[0]:
+            raise BackupError("只能校验已完成的备份")
+        result = await verify_backup(Path(row[0]), self.jobs)
+        await self._update_record(
+            session_factory, record_id, verify_status='passed' if result['ok'] else 'failed',
+            verified_at=datetime.now()
+        )
+        return result
+
+    async def stop(self) -> None:
+        """取消进行中的备份，子进程随之终止"""
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except BaseException:
+                pass
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'running': self.running, 'jobs': self.jobs, 'compression': self.compression}
+
+
+database_backup_engine = DatabaseBackupEngine()
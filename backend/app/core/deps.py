@@ -4,7 +4,7 @@
 """
 
 from typing import AsyncGenerator, Dict, Any, Optional
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.ext.asyncio import AsyncSession
 from uuid import UUID
@@ -79,6 +79,7 @@ def require_roles(*required_roles: str):
 
 
 async def get_current_user(
+    request: Request,
     credentials: HTTPAuthorizationCredentials = Depends(security)
 ) -> Dict[str, Any]:
     """
@@ -87,7 +88,7 @@ async def get_current_user(
     """
     try:
         # 解析JWT令牌
-        payload = security_manager.verify_token(credentials.credentials, "access")
+        payload = security_manager.verify_request_token(request, credentials.credentials, "access")
         if not payload:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
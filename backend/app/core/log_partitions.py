@@ -0,0 +1,596 @@
+"""
+日志表时间分区
+access_logs、user_activity_logs、lawyer_activity_logs、system_logs 按天或按月做原生范围分区：
+按时间范围过滤的查询只扫描相关分区，过期数据整分区分离、导出为压缩文件后删除，不再逐行DELETE。
+
+LogPartitionManager 负责预建未来分区和按保留期归档；PartitionConverter 把已有的普通表在线转换为分区表
+（见 migrations/023_log_partitioning.sql 与 app/scripts/partition_logs.py）
+"""
+
+import os
+import re
+import gzip
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 预建分区与归档时各worker竞争的咨询锁
+MAINTENANCE_LOCK_KEY = 7301003
+CONVERTING_SUFFIX = "_partitioned"   # 转换期间的新分区表
+LEGACY_SUFFIX = "_unpartitioned"     # 切换后保留的原表，确认无误后删除
+INDEX_SUFFIX = "_part"               # 新表上重建的索引，删除原表后改回原名
+
+_INDEX_DEF = re.compile(r"^CREATE (UNIQUE )?INDEX (\S+) ON (?:ONLY )?(\S+) (.+)$")
+
+
+class PartitionConversionError(RuntimeError):
+    """表无法转换为分区表"""
+
+
+@dataclass(frozen=True)
+class PartitionSpec:
+    """一张日志表的分区方式"""
+    table: str
+    column: str          # 分区键
+    interval: str        # day / month
+    retention_days: int  # 保留天数，0为永久保留
+    premake: int         # 预建的未来分区数
+    id_column: str = "id"
+
+    @property
+    def default_partition(self) -> str:
+        return f"{self.table}_default"
+
+
+def log_partition_specs() -> Dict[str, PartitionSpec]:
+    specs = [
+        PartitionSpec("access_logs", "created_at", "day", settings.ACCESS_LOG_RETENTION_DAYS, 7),
+        PartitionSpec("user_activity_logs", "created_at", "month", settings.ACTIVITY_LOG_RETENTION_DAYS, 2),
+        # 律师活动按 activity_date 查询和汇总，用它做分区键才能裁剪
+        PartitionSpec("lawyer_activity_logs", "activity_date", "month", settings.ACTIVITY_LOG_RETENTION_DAYS, 2),
+        PartitionSpec("system_logs", "created_at", "month", settings.SYSTEM_LOG_RETENTION_DAYS, 2),
+    ]
+    return {spec.table: spec for spec in specs}
+
+
+# ---------- 分区区间 ----------
+
+def period_start(value: date, interval: str) -> date:
+    if isinstance(value, datetime):
+        value = value.date()
+    return value if interval == "day" else value.replace(day=1)
+
+
+def next_period(start: date, interval: str) -> date:
+    if interval == "day":
+        return start + timedelta(days=1)
+    return (start.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def periods_between(first: date, last: date, interval: str) -> List[date]:
+    """覆盖 first 到 last（含）的各分区起点"""
+    starts = []
+    cursor = period_start(first, interval)
+    while cursor <= last:
+        starts.append(cursor)
+        cursor = next_period(cursor, interval)
+    return starts
+
+
+def partition_name(table: str, start: date, interval: str) -> str:
+    return f"{table}_p{start:%Y%m%d}" if interval == "day" else f"{table}_p{start:%Y%m}"
+
+
+def parse_partition_start(table: str, name: str, interval: str) -> Optional[date]:
+    """从分区名取出区间起点；不是按本规则命名的分区（如默认分区）返回None"""
+    prefix = f"{table}_p"
+    if not name.startswith(prefix):
+        return None
+    try:
+        return datetime.strptime(name[len(prefix):], "%Y%m%d" if interval == "day" else "%Y%m").date()
+    except ValueError:
+        return None
+
+
+def is_expired(start: date, interval: str, today: date, retention_days: int) -> bool:
+    """分区的全部数据都早于保留期时过期"""
+    return retention_days > 0 and next_period(start, interval) <= today - timedelta(days=retention_days)
+
+
+def partitioned_index_sql(indexdef: str, table: str) -> Optional[str]:
+    """
+    把原表的索引定义改写为新分区表上的索引
+
+    唯一索引不含分区键时无法在分区表上建立，返回None（主键另行按 (id, 分区键) 建立）
+    """
+    match = _INDEX_DEF.match(indexdef)
+    if not match or match.group(1):
+        return None
+    return f"CREATE INDEX IF NOT EXISTS {match.group(2)}{INDEX_SUFFIX} ON {table} {match.group(4)}"
+
+
+class LogPartitionManager:
+    """
+    日志分区维护
+
+    定期为已转换的表预建未来分区，把超出保留期的分区分离并导出为 gzip 压缩的CSV后删除。
+    分离与导出分两步提交：分离只短暂持有父表锁，导出在分离后进行；
+    导出中断时分区仍记录为 detached，下次维护继续
+    """
+
+    def __init__(
+        self,
+        specs: Optional[Dict[str, PartitionSpec]] = None,
+        archive_dir: Optional[str] = None,
+        interval: Optional[float] = None
+    ):
+        self.specs = specs or log_partition_specs()
+        self.archive_dir = archive_dir or settings.LOG_ARCHIVE_DIR
+        self.interval = interval if interval is not None else settings.LOG_PARTITION_MAINTENANCE_INTERVAL
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'runs': 0,
+            'skipped_runs': 0,
+            'run_errors': 0,
+            'partitions_created': 0,
+            'partitions_detached': 0,
+            'partitions_archived': 0,
+        }
+
+    @staticmethod
+    def _session_factory(session_factory):
+        if session_factory is None:
+            from app.core.database import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+        return session_factory
+
+    # ---------- 分区 ----------
+
+    async def is_partitioned(self, db, table: str) -> bool:
+        result = await db.execute(text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:table)"), {'table': table})
+        return result.scalar() == 'p'
+
+    async def list_partitions(self, db, parent: str) -> List[str]:
+        result = await db.execute(text("""
+            SELECT c.relname FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(:parent)
+            ORDER BY c.relname
+        """), {'parent': parent})
+        return [row[0] for row in result.fetchall()]
+
+    async def ensure_partitions(
+        self,
+        db,
+        spec: PartitionSpec,
+        today: date,
+        parent: Optional[str] = None,
+        since: Optional[date] = None
+    ) -> List[str]:
+        """
+        建好从 since（默认今天）所在区间到之后 premake 个区间的分区，以及默认分区；由调用方提交
+
+        分区名按最终表名生成，转换期间建在新表上的分区切换后无需改名
+        """
+        parent = parent or spec.table
+        existing = set(await self.list_partitions(db, parent))
+        last = period_start(today, spec.interval)
+        for _ in range(spec.premake):
+            last = next_period(last, spec.interval)
+
+        created = []
+        for start in periods_between(since or today, last, spec.interval):
+            name = partition_name(spec.table, start, spec.interval)
+            if name in existing:
+                continue
+            end = next_period(start, spec.interval)
+            await db.execute(text(
+                f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {parent} "
+                f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+            ))
+            created.append(name)
+        # 维护任务停摆时写入落到默认分区，不会因为没有分区而失败
+        if spec.default_partition not in existing:
+            await db.execute(text(f"CREATE TABLE IF NOT EXISTS {spec.default_partition} PARTITION OF {parent} DEFAULT"))
+
+        self.stats['partitions_created'] += len(created)
+        return created
+
+    async def expired_partitions(self, db, spec: PartitionSpec, today: date) -> List[Tuple[str, date]]:
+        if not spec.retention_days:
+            return []
+        expired = []
+        for name in await self.list_partitions(db, spec.table):
+            start = parse_partition_start(spec.table, name, spec.interval)
+            if start and is_expired(start, spec.interval, today, spec.retention_days):
+                expired.append((name, start))
+        return expired
+
+    async def detach_partition(self, db, spec: PartitionSpec, name: str, start: date) -> None:
+        """分离分区并记录待归档；由调用方提交"""
+        await db.execute(text(f"ALTER TABLE {spec.table} DETACH PARTITION {name}"))
+        await db.execute(text("""
+            INSERT INTO log_partition_archives (partition_name, parent_table, range_start, range_end)
+            VALUES (:name, :parent, :range_start, :range_end)
+            ON CONFLICT (partition_name) DO UPDATE SET status = 'detached', detached_at = CURRENT_TIMESTAMP
+        """), {
+            'name': name,
+            'parent': spec.table,
+            'range_start': start,
+            'range_end': next_period(start, spec.interval),
+        })
+        self.stats['partitions_detached'] += 1
+
+    # ---------- 归档 ----------
+
+    async def _export(self, db, table_name: str, path: str) -> int:
+        """用 COPY 把表导出为 gzip 压缩的CSV，返回行数"""
+        connection = await db.connection()
+        raw = await connection.get_raw_connection()
+        loop = asyncio.get_running_loop()
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wb") as archive:
+            async def write(chunk: bytes) -> None:
+                await loop.run_in_executor(None, archive.write, chunk)
+
+            status = await raw.driver_connection.copy_from_table(
+                table_name, output=write, format="csv", header=True
+            )
+        os.replace(tmp_path, path)
+        return int(status.split()[-1])
+
+    async def archive_next(self, db) -> Optional[Dict[str, Any]]:
+        """
+        导出并删除一个已分离的分区，没有待归档分区时返回None
+
+        记录行用 SKIP LOCKED 锁定，多个worker不会重复导出同一分区
+        """
+        row = (await db.execute(text("""
+            SELECT partition_name, parent_table FROM log_partition_archives
+            WHERE status = 'detached'
+            ORDER BY range_start
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        """))).first()
+        if row is None:
+            await db.rollback()
+            return None
+
+        name, parent = row
+        directory = os.path.join(self.archive_dir, parent)
+        await asyncio.get_running_loop().run_in_executor(None, lambda: os.makedirs(directory, exist_ok=True))
+        path = os.path.join(directory, f"{name}.csv.gz")
+        row_count = await self._export(db, name, path)
+        await db.execute(text(f"DROP TABLE IF EXISTS {name}"))
+        await db.execute(text("""
+            UPDATE log_partition_archives
+            SET status = 'archived', row_count = :row_count, archive_path = :path, archived_at = CURRENT_TIMESTAMP
+            WHERE partition_name = :name
+        """), {'name': name, 'row_count': row_count, 'path': path})
+        await db.commit()
+
+        self.stats['partitions_archived'] += 1
+        logger.info(f"日志分区已归档: {name} -> {path}（{row_count} 行）")
+        return {'partition': name, 'rows': row_count, 'path': path}
+
+    # ---------- 维护 ----------
+
+    async def maintain(self, session_factory=None, today: Optional[date] = None) -> Dict[str, Any]:
+        """预建分区、分离过期分区并归档；未转换为分区表的日志表跳过"""
+        session_factory = self._session_factory(session_factory)
+        today = today or date.today()
+        summary: Dict[str, Any] = {'created': [], 'detached': [], 'archived': [], 'skipped_tables': []}
+
+        async with session_factory() as db:
+            for spec in self.specs.values():
+                try:
+                    locked = (await db.execute(
+                        text("SELECT pg_try_advisory_xact_lock(:lock_key)"), {'lock_key': MAINTENANCE_LOCK_KEY}
+                    )).scalar()
+                    if not locked:
+                        await db.rollback()
+                        self.stats['skipped_runs'] += 1
+                        return summary
+                    if not await self.is_partitioned(db, spec.table):
+                        summary['skipped_tables'].append(spec.table)
+                        await db.rollback()
+                        continue
+                    summary['created'] += await self.ensure_partitions(db, spec, today)
+                    for name, start in await self.expired_partitions(db, spec, today):
+                        await self.detach_partition(db, spec, name, start)
+                        summary['detached'].append(name)
+                    await db.commit()
+                except Exception as e:
+                    await db.rollback()
+                    self.stats['run_errors'] += 1
+                    logger.error(f"日志分区维护失败 {spec.table}: {e}")
+
+            while True:
+                archived = await self.archive_next(db)
+                if archived is None:
+                    break
+                summary['archived'].append(archived)
+
+        self.stats['runs'] += 1
+        return summary
+
+    def start(self) -> None:
+        if not self.interval:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"日志分区维护已启动（间隔 {self.interval}s）")
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.maintain()
+            except Exception as e:
+                self.stats['run_errors'] += 1
+                logger.error(f"日志分区维护失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'running': self.running, 'interval': self.interval}
+
+
+class PartitionConverter:
+    """
+    把普通日志表在线转换为分区表
+
+    1. prepare：按原表结构建分区表（主键改为 (id, 分区键)，重建非唯一索引），
+       建好覆盖全部历史的分区，并在原表上安装触发器把之后的写入同步到新表
+    2. copy：按 (分区键, id) 顺序分批复制历史数据，每批单独提交，进度记录在 log_partition_conversions
+    3. cutover：短暂加排他锁补齐尾部、移除触发器并交换表名，原表保留为 *_unpartitioned
+    4. drop_legacy：确认无误后删除原表，索引改回原名
+
+    复制与触发器同步都用 ON CONFLICT DO NOTHING，重复执行或中断后重跑不会产生重复行
+    """
+
+    def __init__(
+        self,
+        spec: PartitionSpec,
+        manager: Optional[LogPartitionManager] = None,
+        batch_size: int = 10000,
+        pause_seconds: float = 0.05
+    ):
+        self.spec = spec
+        self.manager = manager or LogPartitionManager()
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.new_table = f"{spec.table}{CONVERTING_SUFFIX}"
+        self.legacy_table = f"{spec.table}{LEGACY_SUFFIX}"
+        self.sync_function = f"{spec.table}_partition_sync"
+
+    async def progress(self, db) -> Optional[Dict[str, Any]]:
+        result = await db.execute(
+            text("SELECT * FROM log_partition_conversions WHERE table_name = :table"), {'table': self.spec.table}
+        )
+        row = result.mappings().first()
+        return dict(row) if row else None
+
+    async def _key_types(self, db, table: str) -> Tuple[str, str]:
+        result = await db.execute(text("""
+            SELECT attname, format_type(atttypid, atttypmod) FROM pg_attribute
+            WHERE attrelid = to_regclass(:table) AND attname IN (:column, :id_column) AND NOT attisdropped
+        """), {'table': table, 'column': self.spec.column, 'id_column': self.spec.id_column})
+        types = dict(result.fetchall())
+        return types[self.spec.column], types[self.spec.id_column]
+
+    async def prepare(self, db, today: Optional[date] = None) -> List[str]:
+        """建分区表和同步触发器并提交，返回新建的分区"""
+        spec = self.spec
+        if await self.manager.is_partitioned(db, spec.table):
+            raise PartitionConversionError(f"{spec.table} 已经是分区表")
+        has_null_key = (await db.execute(text(
+            f"SELECT EXISTS (SELECT 1 FROM {spec.table} WHERE {spec.column} IS NULL)"
+        ))).scalar()
+        if has_null_key:
+            raise PartitionConversionError(f"{spec.table}.{spec.column} 存在空值，需先补齐后再转换")
+
+        await db.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {self.new_table} (
+                LIKE {spec.table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS INCLUDING STORAGE INCLUDING COMMENTS
+            ) PARTITION BY RANGE ({spec.column})
+        """))
+        has_pk = (await db.execute(text(
+            "SELECT EXISTS (SELECT 1 FROM pg_constraint WHERE conrelid = to_regclass(:table) AND contype = 'p')"
+        ), {'table': self.new_table})).scalar()
+        if not has_pk:
+            await db.execute(text(f"ALTER TABLE {self.new_table} ADD PRIMARY KEY ({spec.id_column}, {spec.column})"))
+
+        indexes = (await db.execute(text("""
+            SELECT indexname, indexdef FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = :table
+        """), {'table': spec.table})).fetchall()
+        for index_name, indexdef in indexes:
+            sql = partitioned_index_sql(indexdef, self.new_table)
+            if sql is None:
+                logger.info(f"跳过唯一索引 {index_name}（分区表的唯一约束须包含分区键）")
+                continue
+            await db.execute(text(sql))
+
+        first = (await db.execute(text(f"SELECT CAST(MIN({spec.column}) AS DATE) FROM {spec.table}"))).scalar()
+        today = today or date.today()
+        created = await self.manager.ensure_partitions(
+            db, spec, today, parent=self.new_table, since=min(first or today, today)
+        )
+
+        await db.execute(text(f"""
+            CREATE OR REPLACE FUNCTION {self.sync_function}() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                    DELETE FROM {self.new_table}
+                    WHERE {spec.id_column} = OLD.{spec.id_column} AND {spec.column} = OLD.{spec.column};
+                END IF;
+                IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                    INSERT INTO {self.new_table} SELECT NEW.* ON CONFLICT DO NOTHING;
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """))
+        await db.execute(text(f"DROP TRIGGER IF EXISTS {self.sync_function} ON {spec.table}"))
+        await db.execute(text(f"""
+            CREATE TRIGGER {self.sync_function}
+            AFTER INSERT OR UPDATE OR DELETE ON {spec.table}
+            FOR EACH ROW EXECUTE FUNCTION {self.sync_function}()
+        """))
+        await db.execute(text("""
+            INSERT INTO log_partition_conversions (table_name) VALUES (:table)
+            ON CONFLICT (table_name) DO NOTHING
+        """), {'table': spec.table})
+        await db.commit()
+        logger.info(f"{spec.table} 分区表已就绪，新建 {len(created)} 个分区")
+        return created
+
+    async def copy_batch(self, db) -> int:
+        """从上次进度复制一批并记录进度，返回复制的行数；由调用方提交"""
+        spec = self.spec
+        progress = await self.progress(db)
+        if progress is None:
+            raise PartitionConversionError(f"{spec.table} 尚未执行 prepare")
+        key_type, id_type = await self._key_types(db, spec.table)
+
+        params: Dict[str, Any] = {'limit': self.batch_size}
+        where = ""
+        if progress['last_key'] is not None:
+            where = (f"WHERE ({spec.column}, {spec.id_column}) > "
+                     f"(CAST(:last_key AS {key_type}), CAST(:last_id AS {id_type}))")
+            params.update(last_key=progress['last_key'], last_id=progress['last_id'])
+
+        row = (await db.execute(text(f"""
+            WITH batch AS (
+                SELECT * FROM {spec.table} {where}
+                ORDER BY {spec.column}, {spec.id_column}
+                LIMIT :limit
+            ), copied AS (
+                INSERT INTO {self.new_table} SELECT * FROM batch ON CONFLICT DO NOTHING
+            )
+            SELECT (SELECT COUNT(*) FROM batch) AS rows,
+                   CAST({spec.column} AS TEXT) AS last_key,
+                   CAST({spec.id_column} AS TEXT) AS last_id
+            FROM batch
+            ORDER BY {spec.column} DESC, {spec.id_column} DESC
+            LIMIT 1
+        """), params)).first()
+        if row is None:
+            return 0
+
+        await db.execute(text("""
+            UPDATE log_partition_conversions
+            SET last_key = :last_key, last_id = :last_id, copied_rows = copied_rows + :rows,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE table_name = :table
+        """), {'table': spec.table, 'last_key': row.last_key, 'last_id': row.last_id, 'rows': row.rows})
+        return row.rows
+
+    async def copy(
+        self,
+        session_factory,
+        max_batches: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, int]:
+        """分批复制直到追上原表"""
+        batches = 0
+        total = 0
+        async with session_factory() as db:
+            while max_batches is None or batches < max_batches:
+                copied = await self.copy_batch(db)
+                await db.commit()
+                if not copied:
+                    break
+                batches += 1
+                total += copied
+                if progress:
+                    progress(batches, total)
+                await asyncio.sleep(self.pause_seconds)
+        logger.info(f"{self.spec.table} 复制完成: {batches} 批, {total} 行")
+        return {'batches': batches, 'copied': total}
+
+    async def verify(self, db) -> Dict[str, int]:
+        """比较复制进度之前两张表的行数"""
+        spec = self.spec
+        progress = await self.progress(db)
+        if not progress or progress['last_key'] is None:
+            return {'source': 0, 'target': 0}
+        key_type, id_type = await self._key_types(db, spec.table)
+        condition = (f"({spec.column}, {spec.id_column}) <= "
+                     f"(CAST(:last_key AS {key_type}), CAST(:last_id AS {id_type}))")
+        params = {'last_key': progress['last_key'], 'last_id': progress['last_id']}
+        source = (await db.execute(text(f"SELECT COUNT(*) FROM {spec.table} WHERE {condition}"), params)).scalar()
+        target = (await db.execute(text(f"SELECT COUNT(*) FROM {self.new_table} WHERE {condition}"), params)).scalar()
+        return {'source': source, 'target': target}
+
+    async def cutover(self, db) -> int:
+        """加锁补齐尾部并交换表名，返回补齐的行数"""
+        spec = self.spec
+        await db.execute(text(f"LOCK TABLE {spec.table} IN ACCESS EXCLUSIVE MODE"))
+        # 复制追上之后的写入已由触发器同步，这里只补齐最后一批复制之后、触发器之外的遗漏
+        caught_up = 0
+        while True:
+            copied = await self.copy_batch(db)
+            if not copied:
+                break
+            caught_up += copied
+
+        sequence = (await db.execute(
+            text("SELECT pg_get_serial_sequence(:table, :id_column)"),
+            {'table': spec.table, 'id_column': spec.id_column}
+        )).scalar()
+        await db.execute(text(f"DROP TRIGGER IF EXISTS {self.sync_function} ON {spec.table}"))
+        await db.execute(text(f"DROP FUNCTION IF EXISTS {self.sync_function}()"))
+        await db.execute(text(f"ALTER TABLE {spec.table} RENAME TO {self.legacy_table}"))
+        await db.execute(text(f"ALTER TABLE {self.new_table} RENAME TO {spec.table}"))
+        if sequence:
+            # 删除原表时不连带删除仍被新表默认值使用的序列
+            await db.execute(text(f"ALTER SEQUENCE {sequence} OWNED BY {spec.table}.{spec.id_column}"))
+        await db.execute(text("""
+            UPDATE log_partition_conversions SET status = 'cut_over', updated_at = CURRENT_TIMESTAMP
+            WHERE table_name = :table
+        """), {'table': spec.table})
+        await db.commit()
+        logger.info(f"{spec.table} 已切换为分区表，原表保留为 {self.legacy_table}")
+        return caught_up
+
+    async def drop_legacy(self, db) -> None:
+        """删除切换后保留的原表，并把新表索引改回原名"""
+        spec = self.spec
+        await db.execute(text(f"DROP TABLE IF EXISTS {self.legacy_table}"))
+        indexes = (await db.execute(text("""
+            SELECT indexname FROM pg_indexes
+            WHERE schemaname = current_schema() AND tablename = :table
+        """), {'table': spec.table})).fetchall()
+        for (index_name,) in indexes:
+            if not index_name.endswith(INDEX_SUFFIX):
+                continue
+            await db.execute(text(f"ALTER INDEX {index_name} RENAME TO {index_name[:-len(INDEX_SUFFIX)]}"))
+        await db.execute(text("""
+            UPDATE log_partition_conversions SET status = 'done', updated_at = CURRENT_TIMESTAMP
+            WHERE table_name = :table
+        """), {'table': spec.table})
+        await db.commit()
+
+
+log_partition_manager = LogPartitionManager()
@@ -0,0 +1,325 @@
+"""
+事件循环延迟监控
+后台任务按固定间隔休眠并测量实际唤醒的延迟，延迟即事件循环被同步代码占用的时长；
+超过阈值时记录阻塞事件，并列出阻塞期间正在处理的请求（阻塞者必在其中）。
+可选开启慢回调检测：阻塞发生时采集事件循环线程的调用栈，按代码位置聚合
+"""
+
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, List, Optional
+
+from prometheus_client import Counter as PrometheusCounter, Histogram
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+RECENT_BLOCKS_SIZE = 50
+# 看门狗线程复制处理中请求时，遇到事件循环线程并发修改的重试次数
+INFLIGHT_SNAPSHOT_RETRIES = 5
+STACK_DEPTH = 30
+MAX_SLOW_CALLBACK_LOCATIONS = 200
+APP_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+EVENT_LOOP_LAG = Histogram(
+    'event_loop_lag_seconds',
+    'Delay between the scheduled and actual wake-up of the event loop sampler',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+EVENT_LOOP_BLOCKED = PrometheusCounter(
+    'event_loop_blocked_total',
+    'Event loop stalls longer than the lag threshold'
+)
+EVENT_LOOP_SLOW_CALLBACKS = PrometheusCounter(
+    'event_loop_slow_callbacks_total',
+    'Slow callbacks captured by the slow-callback detector'
+)
+
+
+class SlowCallbackDetector:
+    """
+    慢回调检测器
+
+    事件循环内的心跳回调定期刷新时间戳；看门狗线程发现心跳停滞超过阈值时，
+    采集事件循环线程此刻的调用栈（正在运行的就是阻塞循环的回调），
+    心跳恢复后补记本次阻塞的时长，按应用代码中最内层的调用位置聚合
+    """
+
+    def __init__(self, threshold_ms: float = settings.EVENT_LOOP_SLOW_CALLBACK_MS, stack_depth: int = STACK_DEPTH):
+        self.threshold_ms = threshold_ms
+        self.stack_depth = stack_depth
+        self._check_interval = max(threshold_ms / 2000, 0.005)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._heartbeat_handle: Optional[asyncio.TimerHandle] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._lock = threading.Lock()
+        self._last_beat = 0.0
+        # 当前这次阻塞已采集的调用栈，心跳恢复时结算
+        self._pending: Optional[Dict[str, Any]] = None
+        self._inflight_provider: Callable[[], List[str]] = list
+        self.locations: Dict[str, Dict[str, Any]] = {}
+        self.stats = {
+            'slow_callbacks': 0,
+            'dropped_locations': 0,
+        }
+
+    @property
+    def running(self) -> bool:
+        return self._watchdog is not None and self._watchdog.is_alive()
+
+    def start(self, inflight_provider: Optional[Callable[[], List[str]]] = None) -> None:
+        """在事件循环线程中调用"""
+        if self.running:
+            return
+        if inflight_provider is not None:
+            self._inflight_provider = inflight_provider
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._last_beat = time.monotonic()
+        self._stopping.clear()
+        self._heartbeat_handle = self._loop.call_later(self._check_interval, self._heartbeat)
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+        logger.info(f"慢回调检测已开启（阈值 {self.threshold_ms}ms）")
+
+    def stop(self) -> None:
+        self._stopping.set()
+        if self._heartbeat_handle is not None:
+            self._heartbeat_handle.cancel()
+            self._heartbeat_handle = None
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+            self._watchdog = None
+        self._pending = None
+        self._loop = None
+
+    def _heartbeat(self) -> None:
+        now = time.monotonic()
+        with self._lock:
+            pending, self._pending = self._pending, None
+            stall_ms = (now - self._last_beat - self._check_interval) * 1000
+            self._last_beat = now
+        if pending is not None:
+            self._record(pending, stall_ms)
+        if not self._stopping.is_set():
+            self._heartbeat_handle = self._loop.call_later(self._check_interval, self._heartbeat)
+
+    def _watch(self) -> None:
+        threshold = self.threshold_ms / 1000
+        while not self._stopping.wait(self._check_interval):
+            with self._lock:
+                if self._pending is not None:
+                    continue
+                if time.monotonic() - self._last_beat - self._check_interval < threshold:
+                    continue
+                frame = sys._current_frames().get(self._loop_thread_id)
+                if frame is None:
+                    continue
+                # 采样期间事件循环可能已恢复并修改处理中的请求，由provider负责安全复制
+                self._pending = {
+                    'stack': traceback.extract_stack(frame, limit=self.stack_depth),
+                    'handlers': self._inflight_provider(),
+                }
+
+    @staticmethod
+    def _location(stack: traceback.StackSummary) -> str:
+        """最内层的应用代码位置，找不到时取最内层帧"""
+        for frame in reversed(stack):
+            if frame.filename.startswith(APP_ROOT) and frame.filename != __file__:
+                return f"{os.path.relpath(frame.filename, os.path.dirname(APP_ROOT))}:{frame.lineno} in {frame.name}"
+        frame = stack[-1]
+        return f"{frame.filename}:{frame.lineno} in {frame.name}"
+
+    def _record(self, pending: Dict[str, Any], stall_ms: float) -> None:
+        stack = pending['stack']
+        if not stack:
+            return
+        location = self._location(stack)
+        self.stats['slow_callbacks'] += 1
+        EVENT_LOOP_SLOW_CALLBACKS.inc()
+
+        entry = self.locations.get(location)
+        if entry is None:
+            if len(self.locations) >= MAX_SLOW_CALLBACK_LOCATIONS:
+                self.stats['dropped_locations'] += 1
+                return
+            entry = self.locations[location] = {
+                'location': location,
+                'count': 0,
+                'total_ms': 0.0,
+                'max_ms': 0.0,
+                'handlers': Counter(),
+                'stack': [],
+            }
+        entry['count'] += 1
+        entry['total_ms'] += stall_ms
+        entry['max_ms'] = max(entry['max_ms'], stall_ms)
+        entry['handlers'].update(pending['handlers'])
+        entry['stack'] = [f"{frame.filename}:{frame.lineno} in {frame.name}" for frame in stack]
+        logger.warning(f"慢回调 {stall_ms:.0f}ms: {location}")
+
+    def reset(self) -> None:
+        self.locations.clear()
+        self.stats['slow_callbacks'] = 0
+        self.stats['dropped_locations'] = 0
+
+    def get_top_blockers(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """按累计阻塞时长排序的代码位置"""
+        entries = sorted(self.locations.values(), key=lambda entry: entry['total_ms'], reverse=True)[:limit]
+        return [
+            {
+                'location': entry['location'],
+                'count': entry['count'],
+                'total_ms': round(entry['total_ms'], 1),
+                'avg_ms': round(entry['total_ms'] / entry['count'], 1),
+                'max_ms': round(entry['max_ms'], 1),
+                'handlers': entry['handlers'].most_common(5),
+                'stack': entry['stack'],
+            }
+            for entry in entries
+        ]
+
+    def get_stats(self, limit: int = 10) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'enabled': self.running,
+            'threshold_ms': self.threshold_ms,
+            'locations': len(self.locations),
+            'top_blockers': self.get_top_blockers(limit),
+        }
+
+
+class EventLoopLagMonitor:
+    """事件循环延迟监控器"""
+
+    def __init__(
+        self,
+        interval: float = settings.EVENT_LOOP_LAG_INTERVAL,
+        threshold_ms: float = settings.EVENT_LOOP_LAG_THRESHOLD_MS,
+    ):
+        self.interval = interval
+        self.threshold_ms = threshold_ms
+        self._task: Optional[asyncio.Task] = None
+        # 正在处理的请求（处理器 -> 并发数）
+        self._inflight: Counter = Counter()
+        # 自上次采样以来开始处理过的请求，覆盖在两次采样之间开始并结束的请求
+        self._seen_since_sample: set = set()
+        self.recent_blocks: Deque[Dict[str, Any]] = deque(maxlen=RECENT_BLOCKS_SIZE)
+        self.blocking_handlers: Counter = Counter()
+        self.slow_callbacks = SlowCallbackDetector()
+        self.stats = {
+            'samples': 0,
+            'blocked_events': 0,
+            'last_lag_ms': 0.0,
+            'max_lag_ms': 0.0,
+            'total_lag_ms': 0.0,
+        }
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"事件循环延迟监控已启动（间隔 {self.interval}s，阈值 {self.threshold_ms}ms）")
+        if settings.EVENT_LOOP_SLOW_CALLBACK_ENABLED:
+            self.enable_slow_callback_detection()
+
+    def enable_slow_callback_detection(self) -> None:
+        """开启慢回调检测（需在事件循环中调用）"""
+        self.slow_callbacks.start(inflight_provider=self._inflight_snapshot)
+
+    def disable_slow_callback_detection(self) -> None:
+        self.slow_callbacks.stop()
+
+    async def stop(self) -> None:
+        self.slow_callbacks.stop()
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    def _inflight_snapshot(self) -> List[str]:
+        """
+        从看门狗线程复制处理中的请求。
+        事件循环线程可能同时增删条目导致迭代失败，失败时重试；track()不加锁以免拖慢每个请求
+        """
+        for _ in range(INFLIGHT_SNAPSHOT_RETRIES):
+            try:
+                return sorted(handler for handler, _ in list(self._inflight.items()))
+            except RuntimeError:
+                continue
+        return []
+
+    @contextmanager
+    def track(self, handler: str) -> Iterator[None]:
+        """标记一个正在处理的请求"""
+        self._inflight[handler] += 1
+        self._seen_since_sample.add(handler)
+        try:
+            yield
+        finally:
+            self._inflight[handler] -= 1
+            if self._inflight[handler] <= 0:
+                del self._inflight[handler]
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (loop.time() - started - self.interval) * 1000)
+            self.record(lag_ms)
+
+    def record(self, lag_ms: float) -> None:
+        """记录一次采样"""
+        self.stats['samples'] += 1
+        self.stats['last_lag_ms'] = lag_ms
+        self.stats['total_lag_ms'] += lag_ms
+        self.stats['max_lag_ms'] = max(self.stats['max_lag_ms'], lag_ms)
+        EVENT_LOOP_LAG.observe(lag_ms / 1000)
+
+        suspects = sorted(self._seen_since_sample | set(self._inflight))
+        self._seen_since_sample = set(self._inflight)
+
+        if lag_ms < self.threshold_ms:
+            return
+
+        self.stats['blocked_events'] += 1
+        EVENT_LOOP_BLOCKED.inc()
+        self.blocking_handlers.update(suspects)
+        self.recent_blocks.append({
+            'lag_ms': round(lag_ms, 1),
+            'timestamp': time.time(),
+            'handlers': suspects,
+        })
+        logger.warning(
+            f"事件循环阻塞 {lag_ms:.0f}ms（阈值 {self.threshold_ms:.0f}ms），"
+            f"期间处理中的请求: {', '.join(suspects) or '无（后台任务）'}"
+        )
+
+    def get_stats(self) -> Dict[str, Any]:
+        samples = self.stats['samples']
+        return {
+            **self.stats,
+            'avg_lag_ms': self.stats['total_lag_ms'] / samples if samples else 0.0,
+            'threshold_ms': self.threshold_ms,
+            'running': self._task is not None and not self._task.done(),
+            'top_blocking_handlers': self.blocking_handlers.most_common(10),
+            'recent_blocks': list(self.recent_blocks)[-10:],
+            'slow_callbacks': self.slow_callbacks.get_stats(),
+        }
+
+
+# 全局事件循环延迟监控器
+loop_lag_monitor = EventLoopLagMonitor()
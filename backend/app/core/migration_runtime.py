@@ -0,0 +1,350 @@
+"""
+迁移运行时
+把迁移文件拆成普通语句段和回填段按顺序执行：普通语句段在一个事务内执行；回填段用
+`-- @backfill` / `-- @end` 标出，按主键分批执行，每批一个短事务，带 lock_timeout / statement_timeout，
+批间限速，不会长时间锁住整张表或产生巨大的单个事务。每个语句段和每批回填的进度都在同一事务内
+写入 migration_backfill_log，中断或失败后重新运行从断点继续，已完成的语句段不会重复执行。
+
+回填段写法（{batch} 会替换为当前批次的主键范围条件）：
+
+    -- @backfill name=users_workspace_id table=users key=id batch_size=5000
+    UPDATE users SET workspace_id = 'ws-' || substr(md5(random()::text), 1, 12)
+    WHERE workspace_id IS NULL AND {batch};
+    -- @end
+
+回填只处理执行时已存在的主键；回填期间新写入的行应由应用或列默认值保证正确。只依赖 asyncpg
+"""
+
+import asyncio
+import logging
+import re
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Union
+
+import asyncpg
+
+from app.core.data_fingerprint import asyncpg_dsn, quote_ident
+
+logger = logging.getLogger(__name__)
+
+BATCH_PLACEHOLDER = "{batch}"
+_DIRECTIVE = re.compile(r"^\s*--\s*@backfill\b(.*)$")
+_END = re.compile(r"^\s*--\s*@end\b")
+_ROWCOUNT = re.compile(r"(\d+)\s*$")
+
+_LOG_TABLE_SQL = """
+    CREATE TABLE IF NOT EXISTS migration_backfill_log (
+        migration_name VARCHAR(255) NOT NULL,
+        step_name VARCHAR(255) NOT NULL,
+        status VARCHAR(20) NOT NULL DEFAULT 'running',   -- running, done, failed
+        last_key TEXT,
+        rows_affected BIGINT NOT NULL DEFAULT 0,
+        keys_scanned BIGINT NOT NULL DEFAULT 0,
+        batches INTEGER NOT NULL DEFAULT 0,
+        error_message TEXT,
+        started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (migration_name, step_name)
+    )
+"""
+
+
+class MigrationRuntimeError(RuntimeError):
+    """迁移语句段或回填执行失败（进度已保存，可重新运行继续）"""
+
+
+@dataclass
+class StatementSegment:
+    sql: str
+    name: str = ""
+
+
+@dataclass
+class BackfillSegment:
+    name: str
+    table: str
+    key: str
+    sql: str
+    batch_size: int = 5000
+    options: Dict[str, str] = field(default_factory=dict)
+
+
+Segment = Union[StatementSegment, BackfillSegment]
+
+
+def parse_directive(text: str) -> Dict[str, str]:
+    """'name=x table=users key=id' -> {'name': 'x', ...}"""
+    options = {}
+    for token in text.split():
+        key, sep, value = token.partition("=")
+        if not sep or not value:
+            raise ValueError(f"无法解析的回填参数: {token}")
+        options[key] = value
+    return options
+
+
+def parse_migration(sql: str) -> List[Segment]:
+    """按回填标记把迁移拆成语句段和回填段，保持原有顺序"""
+    segments: List[Segment] = []
+    buffer: List[str] = []
+    backfill: Optional[Dict[str, str]] = None
+
+    def flush_statements():
+        text = "\n".join(buffer).strip()
+        if any(line.strip() and not line.strip().startswith("--") for line in buffer):
+            segments.append(StatementSegment(text, f"statements:{len(segments) + 1}"))
+        buffer.clear()
+
+    for line_no, line in enumerate(sql.splitlines(), 1):
+        directive = _DIRECTIVE.match(line)
+        if directive:
+            if backfill is not None:
+                raise ValueError(f"第 {line_no} 行: 回填段未以 -- @end 结束")
+            flush_statements()
+            backfill = parse_directive(directive.group(1))
+            missing = {"name", "table", "key"} - set(backfill)
+            if missing:
+                raise ValueError(f"第 {line_no} 行: 回填缺少参数 {', '.join(sorted(missing))}")
+            continue
+        if _END.match(line):
+            if backfill is None:
+                raise ValueError(f"第 {line_no} 行: 多余的 -- @end")
+            body = "\n".join(buffer).strip().rstrip(";").strip()
+            if BATCH_PLACEHOLDER not in body:
+                raise ValueError(f"回填 {backfill['name']} 的语句缺少 {BATCH_PLACEHOLDER}")
+            segments.append(BackfillSegment(
+                name=backfill.pop("name"),
+                table=backfill.pop("table"),
+                key=backfill.pop("key"),
+                sql=body,
+                batch_size=int(backfill.pop("batch_size", 5000)),
+                options=backfill,
+            ))
+            buffer.clear()
+            backfill = None
+            continue
+        buffer.append(line)
+
+    if backfill is not None:
+        raise ValueError(f"回填 {backfill['name']} 未以 -- @end 结束")
+    flush_statements()
+    return segments
+
+
+def has_backfills(sql: str) -> bool:
+    return any(_DIRECTIVE.match(line) for line in sql.splitlines())
+
+
+def render_batch_sql(sql: str, key: str, key_type: str, has_lower: bool) -> str:
+    """把 {batch} 替换为主键范围条件：首批 key <= $1，之后 key > $1 AND key <= $2"""
+    column = quote_ident(key)
+    if has_lower:
+        condition = f"({column} > ($1::text)::{key_type} AND {column} <= ($2::text)::{key_type})"
+    else:
+        condition = f"({column} <= ($1::text)::{key_type})"
+    return sql.replace(BATCH_PLACEHOLDER, condition)
+
+
+def estimate_eta(done: int, total: int, elapsed: float) -> Optional[float]:
+    """按已扫描的主键数估算剩余秒数；总数来自 reltuples，只是估计"""
+    if done <= 0 or elapsed <= 0:
+        return None
+    return max(0.0, (total - done) * elapsed / done)
+
+
+def affected_rows(status: str) -> int:
+    """'UPDATE 5000' / 'INSERT 0 5000' -> 5000"""
+    match = _ROWCOUNT.search(status or "")
+    return int(match.group(1)) if match else 0
+
+
+class MigrationRuntime:
+    """
+    执行带回填段的迁移
+
+    lock_timeout 内拿不到锁的批次退避重试；statement_timeout 超时的批次减半后重试，
+    连续失败超过 max_retries 次则记录失败并抛出 MigrationRuntimeError，进度保留在日志表中
+    """
+
+    def __init__(
+        self,
+        database_url: str,
+        lock_timeout: str = "2s",
+        statement_timeout: str = "30s",
+        throttle_seconds: float = 0.05,
+        max_retries: int = 10,
+        progress: Optional[Callable[[Dict[str, Any]], None]] = None
+    ):
+        self.dsn = asyncpg_dsn(database_url)
+        self.lock_timeout = lock_timeout
+        self.statement_timeout = statement_timeout
+        self.throttle_seconds = throttle_seconds
+        self.max_retries = max_retries
+        self.progress = progress
+
+    async def ensure_log_table(self, conn) -> None:
+        await conn.execute(_LOG_TABLE_SQL)
+
+    async def get_log(self, conn, migration_name: str) -> Dict[str, Dict[str, Any]]:
+        rows = await conn.fetch(
+            "SELECT * FROM migration_backfill_log WHERE migration_name = $1", migration_name
+        )
+        return {row["step_name"]: dict(row) for row in rows}
+
+    async def _set_step(self, conn, migration_name: str, step: str, status: str, error: Optional[str] = None):
+        await conn.execute("""
+            INSERT INTO migration_backfill_log (migration_name, step_name, status, error_message)
+            VALUES ($1, $2, $3, $4)
+            ON CONFLICT (migration_name, step_name) DO UPDATE SET
+                status = EXCLUDED.status, error_message = EXCLUDED.error_message, updated_at = CURRENT_TIMESTAMP
+        """, migration_name, step, status, error)
+
+    async def run(
+        self,
+        sql: str,
+        migration_name: str,
+        max_batches: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        执行迁移，返回各步骤的结果；已完成的步骤跳过
+
+        max_batches 限制本次每个回填最多执行的批数（分多次运行或测试断点续跑），未做完时返回 complete=False
+        """
+        segments = parse_migration(sql)
+        conn = await asyncpg.connect(self.dsn)
+        summary: Dict[str, Any] = {"migration": migration_name, "steps": {}, "complete": True}
+        try:
+            await self.ensure_log_table(conn)
+            log = await self.get_log(conn, migration_name)
+            for segment in segments:
+                if log.get(segment.name, {}).get("status") == "done":
+                    summary["steps"][segment.name] = {"skipped": True}
+                    continue
+                if isinstance(segment, StatementSegment):
+                    await self._run_statements(conn, migration_name, segment)
+                    summary["steps"][segment.name] = {"executed": True}
+                else:
+                    result = await self._run_backfill(conn, migration_name, segment, max_batches)
+                    summary["steps"][segment.name] = result
+                    if not result["done"]:
+                        summary["complete"] = False
+                        break
+        finally:
+            await conn.close()
+        return summary
+
+    async def _run_statements(self, conn, migration_name: str, segment: StatementSegment) -> None:
+        try:
+            async with conn.transaction():
+                await conn.execute(segment.sql)
+                await self._set_step(conn, migration_name, segment.name, "done")
+        except Exception as e:
+            await self._set_step(conn, migration_name, segment.name, "failed", str(e)[:2000])
+            raise MigrationRuntimeError(f"{segment.name} 执行失败: {e}") from e
+
+    async def _key_info(self, conn, segment: BackfillSegment):
+        row = await conn.fetchrow("""
+            SELECT format_type(a.atttypid, a.atttypmod) AS key_type, GREATEST(c.reltuples, 0)::bigint AS estimated
+            FROM pg_class c
+            JOIN pg_attribute a ON a.attrelid = c.oid AND a.attname = $2
+            WHERE c.oid = to_regclass($1)
+        """, segment.table, segment.key)
+        if row is None:
+            raise MigrationRuntimeError(f"回填 {segment.name}: 表 {segment.table} 或列 {segment.key} 不存在")
+        return row["key_type"], row["estimated"]
+
+    async def _next_batch(self, conn, segment: BackfillSegment, key_type: str, last_key, batch_size: int):
+        """从 last_key 之后取 batch_size 个主键，返回 (本批上界, 主键数)；走主键索引，不扫描整表"""
+        key = quote_ident(segment.key)
+        where = f"WHERE {key} > ($1::text)::{key_type}" if last_key is not None else ""
+        args = [last_key] if last_key is not None else []
+        # 不用 MAX()：uuid 等类型没有 max 聚合
+        row = await conn.fetchrow(f"""
+            WITH batch AS (SELECT {key} AS k FROM {segment.table} {where} ORDER BY {key} LIMIT {int(batch_size)})
+            SELECT (SELECT k::text FROM batch ORDER BY k DESC LIMIT 1) AS bound, (SELECT COUNT(*) FROM batch) AS keys
+        """, *args)
+        return row["bound"], row["keys"]
+
+    async def _run_backfill(
+        self, conn, migration_name: str, segment: BackfillSegment, max_batches: Optional[int]
+    ) -> Dict[str, Any]:
+        key_type, estimated = await self._key_info(conn, segment)
+        state = await conn.fetchrow("""
+            INSERT INTO migration_backfill_log (migration_name, step_name, status)
+            VALUES ($1, $2, 'running')
+            ON CONFLICT (migration_name, step_name) DO UPDATE SET status = 'running', error_message = NULL
+            RETURNING last_key, rows_affected, keys_scanned, batches
+        """, migration_name, segment.name)
+        last_key, rows, scanned, batches = state["last_key"], state["rows_affected"], state["keys_scanned"], state["batches"]
+        if last_key is not None:
+            logger.info(f"回填 {segment.name} 从 {last_key} 继续（已处理 {scanned} 个主键）")
+
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        scanned_at_start = scanned
+        batch_size = segment.batch_size
+        retries = 0
+        run_batches = 0
+
+        while max_batches is None or run_batches < max_batches:
+            try:
+                async with conn.transaction():
+                    await conn.execute(f"SET LOCAL lock_timeout = '{self.lock_timeout}'")
+                    await conn.execute(f"SET LOCAL statement_timeout = '{self.statement_timeout}'")
+                    bound, batch_keys = await self._next_batch(conn, segment, key_type, last_key, batch_size)
+                    if bound is None:
+                        await conn.execute("""
+                            UPDATE migration_backfill_log SET status = 'done', updated_at = CURRENT_TIMESTAMP
+                            WHERE migration_name = $1 AND step_name = $2
+                        """, migration_name, segment.name)
+                        break
+                    args = [last_key, bound] if last_key is not None else [bound]
+                    status = await conn.execute(
+                        render_batch_sql(segment.sql, segment.key, key_type, last_key is not None), *args
+                    )
+                    batch_rows = affected_rows(status)
+                    await conn.execute("""
+                        UPDATE migration_backfill_log
+                        SET last_key = $3, rows_affected = rows_affected + $4, keys_scanned = keys_scanned + $5,
+                            batches = batches + 1, updated_at = CURRENT_TIMESTAMP
+                        WHERE migration_name = $1 AND step_name = $2
+                    """, migration_name, segment.name, bound, batch_rows, batch_keys)
+            except (asyncpg.exceptions.LockNotAvailableError, asyncpg.exceptions.QueryCanceledError) as e:
+                retries += 1
+                if retries > self.max_retries:
+                    await self._set_step(conn, migration_name, segment.name, "failed", str(e)[:2000])
+                    raise MigrationRuntimeError(f"回填 {segment.name} 连续 {retries - 1} 次超时: {e}") from e
+                if isinstance(e, asyncpg.exceptions.QueryCanceledError):
+                    batch_size = max(1, batch_size // 2)
+                    logger.warning(f"回填 {segment.name} 批次超时，批大小降为 {batch_size}")
+                await asyncio.sleep(min(30.0, self.throttle_seconds * 2 ** retries + 0.1 * retries))
+                continue
+            except Exception as e:
+                await self._set_step(conn, migration_name, segment.name, "failed", str(e)[:2000])
+                raise MigrationRuntimeError(f"回填 {segment.name} 失败: {e}") from e
+
+            retries = 0
+            last_key = bound
+            rows += batch_rows
+            scanned += batch_keys
+            batches += 1
+            run_batches += 1
+            if self.progress:
+                elapsed = loop.time() - started
+                total = max(estimated, scanned)
+                self.progress({
+                    "step": segment.name,
+                    "batches": batches,
+                    "rows_affected": rows,
+                    "keys_scanned": scanned,
+                    "estimated_keys": total,
+                    "percent": round(scanned * 100 / total, 1) if total else None,
+                    "eta_seconds": estimate_eta(scanned - scanned_at_start, total - scanned_at_start, elapsed),
+                    "batch_size": batch_size,
+                })
+            if self.throttle_seconds:
+                await asyncio.sleep(self.throttle_seconds)
+        else:
+            return {"done": False, "batches": batches, "rows_affected": rows, "last_key": last_key}
+
+        return {"done": True, "batches": batches, "rows_affected": rows, "last_key": last_key}
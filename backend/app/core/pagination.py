@@ -0,0 +1,242 @@
+"""
+键集（游标）分页工具
+列表按 (created_at, id) 倒序排列：游标记录上一页最后一行的键，下一页从该键之后继续，
+任意深度的翻页都只读取一页数据；总数可改用查询计划的估算行数，避免每页一次全量COUNT。
+数据查询与计数查询共用同一组过滤条件
+"""
+
+import json
+import base64
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import func, select, text, tuple_
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import CompileError
+from sqlalchemy.sql import Select
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+COUNT_MODES = ("auto", "exact", "estimate", "none")
+
+
+class InvalidCursorError(ValueError):
+    """游标无法解析（被篡改或来自其他列表）"""
+
+
+def encode_cursor(created_at: datetime, row_id: Any) -> str:
+    payload = json.dumps({"t": created_at.isoformat(), "i": str(row_id)}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        return datetime.fromisoformat(payload["t"]), str(payload["i"])
+    except (ValueError, KeyError, TypeError) as e:
+        raise InvalidCursorError(f"无效的分页游标: {cursor}") from e
+
+
+@dataclass
+class KeysetPage:
+    """一页数据及翻页信息"""
+    items: List[Any]
+    next_cursor: Optional[str]
+    has_more: bool
+    total: Optional[int] = None
+    total_is_estimate: bool = False
+
+    def total_pages(self, page_size: int) -> int:
+        if not self.total:
+            return 1
+        return max(1, (self.total + page_size - 1) // page_size)
+
+
+class SqlFilter:
+    """
+    文本SQL的过滤条件构造器
+
+    同一个实例同时生成数据查询和计数查询的 WHERE 子句与参数，两者的条件不会再分叉
+    """
+
+    def __init__(self):
+        self.conditions: List[str] = []
+        self.params: Dict[str, Any] = {}
+
+    def add(self, condition: str, **params: Any) -> "SqlFilter":
+        self.conditions.append(condition)
+        self.params.update(params)
+        return self
+
+    def where_clause(self, extra: Sequence[str] = ()) -> str:
+        conditions = [*self.conditions, *extra]
+        return f"WHERE {' AND '.join(conditions)}" if conditions else ""
+
+
+def _plan_rows(explain_output: Any) -> int:
+    """从 EXPLAIN (FORMAT JSON) 的输出中取出顶层节点的估算行数"""
+    if isinstance(explain_output, str):
+        explain_output = json.loads(explain_output)
+    return int(explain_output[0]["Plan"]["Plan Rows"])
+
+
+async def estimate_count_sql(db, from_sql: str, sql_filter: SqlFilter) -> int:
+    """用查询计划估算文本SQL的行数"""
+    result = await db.execute(
+        text(f"EXPLAIN (FORMAT JSON) SELECT 1 {from_sql} {sql_filter.where_clause()}"),
+        sql_filter.params
+    )
+    return _plan_rows(result.scalar())
+
+
+async def estimate_count(db, stmt: Select) -> Optional[int]:
+    """用查询计划估算 select 的行数；条件中含无法内联的参数类型时返回None"""
+    try:
+        compiled = stmt.compile(
+            dialect=postgresql.dialect(),
+            compile_kwargs={"literal_binds": True, "render_postcompile": True}
+        )
+    except (CompileError, NotImplementedError) as e:
+        logger.debug(f"无法生成估算计数语句，改用精确计数: {e}")
+        return None
+    # 内联后的字面量中可能含冒号，转义后 text() 不会把它当作绑定参数
+    sql = str(compiled).replace(":", r"\:")
+    result = await db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))
+    return _plan_rows(result.scalar())
+
+
+async def _resolve_total(count: str, estimate, exact) -> Tuple[Optional[int], bool]:
+    """按计数模式得到总数与是否为估算值"""
+    if count == "none":
+        return None, False
+    if count in ("auto", "estimate"):
+        estimated = await estimate()
+        if estimated is not None and (count == "estimate" or estimated >= settings.PAGINATION_EXACT_COUNT_THRESHOLD):
+            return estimated, True
+    return await exact(), False
+
+
+def _row_key(item: Any, created_key: str, id_key: str) -> Tuple[datetime, Any]:
+    if isinstance(item, dict) or hasattr(item, "keys"):
+        return item[created_key], item[id_key]
+    return getattr(item, created_key), getattr(item, id_key)
+
+
+async def paginate_select(
+    db,
+    stmt: Select,
+    conditions: Sequence[Any],
+    created_column,
+    id_column,
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+    count: str = "auto",
+) -> KeysetPage:
+    """
+    对 select 语句分页
+
+    Args:
+        stmt: 未加过滤、排序的数据查询，如 select(Case)
+        conditions: 过滤条件，同时用于数据查询和计数查询
+        created_column / id_column: 排序键列
+        cursor: 上一页返回的 next_cursor；提供时忽略 offset
+        offset: 兼容旧的页码分页，仅在没有游标时使用
+        count: auto（估算值较大时使用估算，否则精确计数）/ exact / estimate / none
+    """
+    data_stmt = stmt.where(*conditions)
+    if cursor:
+        cursor_created_at, cursor_id = decode_cursor(cursor)
+        try:
+            cursor_id = id_column.type.python_type(cursor_id)
+        except ValueError as e:
+            raise InvalidCursorError(f"无效的分页游标: {cursor}") from e
+        data_stmt = data_stmt.where(tuple_(created_column, id_column) < tuple_(cursor_created_at, cursor_id))
+        offset = 0
+    data_stmt = data_stmt.order_by(created_column.desc(), id_column.desc()).offset(offset).limit(limit + 1)
+
+    items = list((await db.execute(data_stmt)).scalars().all())
+    has_more = len(items) > limit
+    items = items[:limit]
+    next_cursor = encode_cursor(*_row_key(items[-1], created_column.key, id_column.key)) if has_more else None
+
+    if not cursor and not has_more and (items or offset == 0):
+        # 最后一页：总数已知，不需要再计数
+        total, is_estimate = (offset + len(items), False) if count != "none" else (None, False)
+    else:
+        async def exact():
+            return (await db.execute(select(func.count(id_column)).where(*conditions))).scalar() or 0
+
+        total, is_estimate = await _resolve_total(
+            count,
+            lambda: estimate_count(db, select(id_column).where(*conditions)),
+            exact
+        )
+
+    return KeysetPage(items=items, next_cursor=next_cursor, has_more=has_more, total=total, total_is_estimate=is_estimate)
+
+
+async def paginate_sql(
+    db,
+    columns: str,
+    from_sql: str,
+    sql_filter: SqlFilter,
+    created_column: str = "created_at",
+    id_column: str = "id",
+    id_cast: str = "UUID",
+    cursor: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+    count: str = "auto",
+) -> KeysetPage:
+    """
+    对文本SQL分页
+
+    Args:
+        columns: SELECT 列表，须包含排序键列（按列名取值）
+        from_sql: FROM/JOIN 子句，计数查询复用
+        sql_filter: 过滤条件，同时用于数据查询和计数查询
+        created_column / id_column: 排序键表达式，如 w.created_at、w.id
+        id_cast: id 列的数据库类型，游标中的 id 按该类型比较
+    """
+    params = {**sql_filter.params, "_limit": limit + 1, "_offset": 0 if cursor else offset}
+    keyset: List[str] = []
+    if cursor:
+        params["_cursor_created_at"], cursor_id = decode_cursor(cursor)
+        try:
+            params["_cursor_id"] = int(cursor_id) if id_cast in ("BIGINT", "INTEGER") else cursor_id
+        except ValueError as e:
+            raise InvalidCursorError(f"无效的分页游标: {cursor}") from e
+        keyset.append(f"({created_column}, {id_column}) < (:_cursor_created_at, CAST(:_cursor_id AS {id_cast}))")
+
+    rows = (await db.execute(text(f"""
+        SELECT {columns}
+        {from_sql}
+        {sql_filter.where_clause(keyset)}
+        ORDER BY {created_column} DESC, {id_column} DESC
+        LIMIT :_limit OFFSET :_offset
+    """), params)).mappings().all()
+
+    has_more = len(rows) > limit
+    items = [dict(row) for row in rows[:limit]]
+    created_key, id_key = created_column.split(".")[-1], id_column.split(".")[-1]
+    next_cursor = encode_cursor(*_row_key(items[-1], created_key, id_key)) if has_more else None
+
+    if not cursor and not has_more and (items or offset == 0):
+        total, is_estimate = (offset + len(items), False) if count != "none" else (None, False)
+    else:
+        async def exact():
+            return (await db.execute(
+                text(f"SELECT COUNT(*) {from_sql} {sql_filter.where_clause()}"), sql_filter.params
+            )).scalar() or 0
+
+        total, is_estimate = await _resolve_total(
+            count, lambda: estimate_count_sql(db, from_sql, sql_filter), exact
+        )
+
+    return KeysetPage(items=items, next_cursor=next_cursor, has_more=has_more, total=total, total_is_estimate=is_estimate)
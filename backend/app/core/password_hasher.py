@@ -0,0 +1,166 @@
+"""
+异步密码哈希服务
+bcrypt计算在专用的有界线程池中执行，不阻塞事件循环；
+排队超过上限时立即拒绝，成本参数变化后在验证成功时自动重新哈希
+"""
+
+import time
+import asyncio
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from passlib.context import CryptContext
+from prometheus_client import Counter, Gauge, Histogram
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 密码加密上下文：rounds变化后 needs_update 返回True，登录时自动升级旧哈希
+pwd_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__rounds=settings.PASSWORD_BCRYPT_ROUNDS
+)
+
+PASSWORD_HASH_QUEUE_DEPTH = Gauge(
+    'password_hash_queue_depth',
+    'Password hashing jobs waiting for a worker thread'
+)
+PASSWORD_HASH_INFLIGHT = Gauge(
+    'password_hash_inflight',
+    'Password hashing jobs queued or running'
+)
+PASSWORD_HASH_REJECTED = Counter(
+    'password_hash_rejected_total',
+    'Password hashing jobs rejected because the pool was overloaded',
+    ['reason']
+)
+PASSWORD_HASH_WAIT = Histogram(
+    'password_hash_wait_seconds',
+    'Time password hashing jobs spent waiting for a worker thread',
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+PASSWORD_HASH_DURATION = Histogram(
+    'password_hash_duration_seconds',
+    'CPU time of password hashing operations',
+    ['operation'],
+    buckets=(0.01, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.0)
+)
+
+
+class PasswordHasherOverloaded(Exception):
+    """哈希线程池过载，调用方应返回503并提示稍后重试"""
+
+
+class AsyncPasswordHasher:
+    """有界线程池中的bcrypt哈希与验证"""
+
+    def __init__(
+        self,
+        context: CryptContext = pwd_context,
+        max_workers: int = settings.PASSWORD_HASH_WORKERS,
+        max_queue: int = settings.PASSWORD_HASH_MAX_QUEUE,
+        queue_timeout: float = settings.PASSWORD_HASH_QUEUE_TIMEOUT,
+    ):
+        self.context = context
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="password-hash")
+        # 已提交但未完成的任务数（排队+执行中），只在事件循环线程中修改
+        self._pending = 0
+        self.stats = {
+            'completed': 0,
+            'rejected_queue_full': 0,
+            'rejected_queue_timeout': 0,
+            'rehashed': 0,
+        }
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self._pending - self.max_workers)
+
+    def _update_gauges(self) -> None:
+        PASSWORD_HASH_INFLIGHT.set(self._pending)
+        PASSWORD_HASH_QUEUE_DEPTH.set(self.queue_depth)
+
+    async def _run(self, operation: str, func: Callable[..., Any], *args: Any) -> Any:
+        """在线程池中执行哈希操作"""
+        if self._pending >= self.max_workers + self.max_queue:
+            self.stats['rejected_queue_full'] += 1
+            PASSWORD_HASH_REJECTED.labels(reason='queue_full').inc()
+            raise PasswordHasherOverloaded("Password hashing queue is full")
+
+        enqueued_at = time.monotonic()
+
+        def job():
+            waited = time.monotonic() - enqueued_at
+            PASSWORD_HASH_WAIT.observe(waited)
+            if waited > self.queue_timeout:
+                # 调用方大概率已超时，不再消耗CPU
+                self.stats['rejected_queue_timeout'] += 1
+                PASSWORD_HASH_REJECTED.labels(reason='queue_timeout').inc()
+                raise PasswordHasherOverloaded("Password hashing queue timeout")
+
+            started_at = time.perf_counter()
+            try:
+                return func(*args)
+            finally:
+                PASSWORD_HASH_DURATION.labels(operation=operation).observe(time.perf_counter() - started_at)
+
+        self._pending += 1
+        self._update_gauges()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(self._executor, job)
+            self.stats['completed'] += 1
+            return result
+        finally:
+            self._pending -= 1
+            self._update_gauges()
+
+    async def hash(self, password: str) -> str:
+        """生成密码哈希"""
+        return await self._run('hash', self.context.hash, password)
+
+    async def verify(self, password: str, hashed_password: Optional[str]) -> bool:
+        """验证密码"""
+        verified, _ = await self.verify_and_update(password, hashed_password)
+        return verified
+
+    async def verify_and_update(self, password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+        """
+        验证密码，若哈希使用的成本参数已过时则同时返回新哈希
+
+        Returns:
+            (是否验证通过, 需要写回的新哈希或None)
+        """
+        if not hashed_password:
+            return False, None
+
+        try:
+            verified, new_hash = await self._run('verify', self.context.verify_and_update, password, hashed_password)
+        except (ValueError, TypeError) as e:
+            logger.warning(f"Unrecognized password hash: {e}")
+            return False, None
+
+        if new_hash:
+            self.stats['rehashed'] += 1
+        return verified, new_hash
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'pending': self._pending,
+            'queue_depth': self.queue_depth,
+            'max_workers': self.max_workers,
+            'max_queue': self.max_queue,
+        }
+
+
+# 全局密码哈希服务
+password_hasher = AsyncPasswordHasher()
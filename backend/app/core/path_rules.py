@@ -0,0 +1,190 @@
+"""
+路径规则分类引擎
+把各中间件的路径规则（限流档位、访问日志、CSRF豁免、认证豁免、工作台、压缩）
+一次性编译为合并正则，并按路由模板缓存分类结果，中间件每个请求只需一次查表
+"""
+
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 规则匹配方式
+MATCH_PREFIX = "prefix"      # path.startswith(pattern)
+MATCH_CONTAINS = "contains"  # pattern in path
+
+# (匹配方式, 模式, 命中时的值)
+PathRule = Tuple[str, str, Any]
+
+# 路由模板化：把ID类路径段替换为占位符，避免缓存被动态路径撑爆
+_ID_SEGMENT = re.compile(
+    r"/(?:"
+    r"[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}"  # UUID
+    r"|\d+"                                                                        # 数字ID
+    r"|[0-9a-fA-F]{16,}"                                                           # 长十六进制
+    r")(?=/|$)"
+)
+
+# 默认路径规则（各中间件未传入自定义规则时使用）
+DEFAULT_PATH_RULES: Dict[str, List[str]] = {
+    # 不记录访问日志：静态资源和健康检查
+    "log_excluded_prefixes": [
+        "/static/", "/css/", "/js/", "/images/", "/favicon.ico",
+        "/health", "/docs", "/redoc", "/openapi.json",
+    ],
+    # CSRF豁免路径
+    "csrf_exempt_prefixes": [
+        "/docs",
+        "/redoc",
+        "/openapi.json",
+        "/health",
+        "/api/v1/auth/login",
+        "/api/v1/auth/register",
+        "/api/v1/auth/forgot-password",
+        "/api/v1/auth/reset-password",
+        "/api/v1/auth/send-sms-code",
+        "/api/v1/auth/verify-sms-code",
+    ],
+    # 认证中间件跳过的路径
+    "auth_excluded_prefixes": [
+        "/docs",
+        "/redoc",
+        "/openapi.json",
+        "/health",
+        "/api/v1/auth/login",
+        "/api/v1/auth/register",
+        "/api/v1/auth/forgot-password",
+        "/api/v1/auth/reset-password",
+    ],
+    # 工作台路由前缀（工作台类型取前缀名）
+    "workspace_prefixes": ["/user/", "/lawyer/", "/admin/"],
+    # 不压缩响应的路径
+    "compression_excluded_prefixes": [],
+    # 限流规则模式（按声明顺序，第一个包含于路径中的模式生效）
+    "rate_limit_patterns": [],
+}
+
+
+def normalize_route_template(path: str) -> str:
+    """把路径中的ID段替换为{id}，得到近似的路由模板"""
+    return _ID_SEGMENT.sub("/{id}", path)
+
+
+class PathRuleMatcher:
+    """
+    有序路径规则匹配器
+
+    所有规则编译为一个正则：每条规则是一个带命名分组的零宽前瞻分支，
+    在位置0按声明顺序尝试，因此语义与逐条扫描取第一个命中完全一致
+    """
+
+    def __init__(self, rules: Iterable[PathRule], default: Any = None):
+        self.rules: List[PathRule] = list(rules)
+        self.default = default
+        self._values: Dict[str, Any] = {}
+
+        branches = []
+        for index, (match_type, pattern, value) in enumerate(self.rules):
+            group = f"r{index}"
+            escaped = re.escape(pattern)
+            if match_type == MATCH_PREFIX:
+                branches.append(f"(?P<{group}>(?={escaped}))")
+            elif match_type == MATCH_CONTAINS:
+                branches.append(f"(?P<{group}>(?=.*?{escaped}))")
+            else:
+                raise ValueError(f"Unknown path rule match type: {match_type}")
+            self._values[group] = value
+
+        self._regex = re.compile("|".join(branches), re.DOTALL) if branches else None
+
+    def match(self, path: str) -> Any:
+        """返回第一个命中规则的值，未命中返回默认值"""
+        if self._regex is None:
+            return self.default
+        matched = self._regex.match(path)
+        if matched is None:
+            return self.default
+        return self._values[matched.lastgroup]
+
+    @classmethod
+    def prefixes(cls, prefixes: Sequence[str], value: Any = True, default: Any = False) -> "PathRuleMatcher":
+        """由前缀列表构建布尔匹配器"""
+        return cls(((MATCH_PREFIX, prefix, value) for prefix in prefixes), default=default)
+
+
+@dataclass(frozen=True)
+class PathClassification:
+    """单个路由模板的分类结果"""
+    route_template: str
+    rate_limit_rule: Optional[str]   # 命中的限流规则模式，None表示默认限流
+    log_request: bool                # 是否记录访问日志
+    csrf_exempt: bool                # 路径是否豁免CSRF（请求方法另行判断）
+    auth_excluded: bool              # 是否跳过认证中间件
+    workspace_type: Optional[str]    # 工作台类型 user/lawyer/admin，非工作台为None
+    compressible: bool               # 是否允许压缩响应
+
+
+class PathClassifier:
+    """路径分类器：编译全部规则并按路由模板缓存分类结果"""
+
+    def __init__(self, rules: Optional[Dict[str, List[str]]] = None, cache_size: int = 4096):
+        self.rules: Dict[str, List[str]] = {**DEFAULT_PATH_RULES, **(rules or {})}
+        self.cache_size = cache_size
+
+        self._rate_limit = PathRuleMatcher(
+            ((MATCH_CONTAINS, pattern, pattern) for pattern in self.rules["rate_limit_patterns"]),
+            default=None,
+        )
+        self._log_excluded = PathRuleMatcher.prefixes(self.rules["log_excluded_prefixes"])
+        self._csrf_exempt = PathRuleMatcher.prefixes(self.rules["csrf_exempt_prefixes"])
+        self._auth_excluded = PathRuleMatcher.prefixes(self.rules["auth_excluded_prefixes"])
+        self._compression_excluded = PathRuleMatcher.prefixes(self.rules["compression_excluded_prefixes"])
+        self._workspace = PathRuleMatcher(
+            ((MATCH_PREFIX, prefix, prefix.strip("/")) for prefix in self.rules["workspace_prefixes"]),
+            default=None,
+        )
+
+        self._classify_template = lru_cache(maxsize=cache_size)(self._compute)
+
+    def with_overrides(self, **rules: Optional[Sequence[str]]) -> "PathClassifier":
+        """基于当前规则生成新的分类器，值为None的覆盖项被忽略"""
+        overrides = {name: list(value) for name, value in rules.items() if value is not None}
+        unknown = set(overrides) - set(DEFAULT_PATH_RULES)
+        if unknown:
+            raise ValueError(f"Unknown path rule sets: {sorted(unknown)}")
+        if not overrides:
+            return self
+        return PathClassifier({**self.rules, **overrides}, self.cache_size)
+
+    def classify(self, path: str) -> PathClassification:
+        """获取路径分类（按路由模板缓存）"""
+        return self._classify_template(normalize_route_template(path))
+
+    def _compute(self, template: str) -> PathClassification:
+        return PathClassification(
+            route_template=template,
+            rate_limit_rule=self._rate_limit.match(template),
+            log_request=not self._log_excluded.match(template),
+            csrf_exempt=self._csrf_exempt.match(template),
+            auth_excluded=self._auth_excluded.match(template),
+            workspace_type=self._workspace.match(template),
+            compressible=not self._compression_excluded.match(template),
+        )
+
+    def cache_info(self) -> Dict[str, int]:
+        info = self._classify_template.cache_info()
+        return {
+            "hits": info.hits,
+            "misses": info.misses,
+            "size": info.currsize,
+            "max_size": info.maxsize,
+        }
+
+
+# 全局默认分类器
+path_classifier = PathClassifier()
+
+
+def get_path_classifier() -> PathClassifier:
+    """获取全局路径分类器"""
+    return path_classifier
@@ -16,6 +16,7 @@ import redis
 import aioredis
 from sqlalchemy.pool import QueuePool
 from app.core.logging import get_logger
+from app.core.path_rules import get_path_classifier
 
 logger = get_logger(__name__)
 
@@ -33,6 +34,9 @@ class ResponseCompressionMiddleware(BaseHTTPMiddleware):
         self.minimum_size = minimum_size
         self.compression_level = compression_level
         self.exclude_paths = exclude_paths or []
+        self.path_classifier = get_path_classifier().with_overrides(
+            compression_excluded_prefixes=exclude_paths or None
+        )
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         # 检查是否需要压缩
@@ -82,11 +86,7 @@ class ResponseCompressionMiddleware(BaseHTTPMiddleware):
             return False
         
         # 检查排除路径
-        path = request.url.path
-        if any(path.startswith(exclude_path) for exclude_path in self.exclude_paths):
-            return False
-        
-        return True
+        return self.path_classifier.classify(request.url.path).compressible
     
     def _can_compress_response(self, response: Response) -> bool:
         """检查响应是否可以压缩"""
@@ -10,7 +10,6 @@ from typing import Dict, List, Optional, Any
 from datetime import datetime, timedelta
 from functools import wraps
 import redis
-import psutil
 from sqlalchemy import text
 from sqlalchemy.ext.asyncio import AsyncSession
 from prometheus_client import Counter, Histogram, Gauge, start_http_server
@@ -120,22 +119,25 @@ class PerformanceMonitor:
             logger.error(f"Failed to send performance alert: {e}")
     
     async def collect_system_metrics(self):
-        """收集系统指标"""
+        """收集系统指标（读取后台采样器的最新样本）"""
         try:
+            from app.core.system_metrics import system_metrics_sampler
+            sample = await system_metrics_sampler.current()
+            
             # CPU使用率
-            cpu_percent = psutil.cpu_percent(interval=1)
+            cpu_percent = sample['cpu_percent']
             SYSTEM_CPU_USAGE.set(cpu_percent)
             
             # 内存使用率
-            memory = psutil.virtual_memory()
-            SYSTEM_MEMORY_USAGE.set(memory.percent)
+            memory_percent = sample['memory_percent']
+            SYSTEM_MEMORY_USAGE.set(memory_percent)
             
             # 检查系统资源阈值
             if cpu_percent > self.alert_thresholds['cpu_usage']:
                 await self._send_system_alert('cpu_usage', cpu_percent)
             
-            if memory.percent > self.alert_thresholds['memory_usage']:
-                await self._send_system_alert('memory_usage', memory.percent)
+            if memory_percent > self.alert_thresholds['memory_usage']:
+                await self._send_system_alert('memory_usage', memory_percent)
                 
         except Exception as e:
             logger.error(f"Failed to collect system metrics: {e}")
@@ -0,0 +1,201 @@
+"""
+请求级SQL查询分析器
+通过SQLAlchemy引擎事件统计每个请求执行的语句数与数据库耗时，
+按归一化SQL生成指纹，同一请求内同一指纹重复执行达到阈值即判定为N+1
+"""
+
+import re
+import time
+import hashlib
+import logging
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+from prometheus_client import Counter as PrometheusCounter, Histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+DB_QUERIES_PER_REQUEST = Histogram(
+    'http_request_db_queries',
+    'SQL statements executed per HTTP request',
+    ['route'],
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+DB_TIME_PER_REQUEST = Histogram(
+    'http_request_db_seconds',
+    'Total database time per HTTP request',
+    ['route'],
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+DB_N_PLUS_ONE = PrometheusCounter(
+    'db_n_plus_one_total',
+    'Requests in which one statement fingerprint repeated past the N+1 threshold',
+    ['route']
+)
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_BIND_PARAM = re.compile(r"%\(\w+\)s|%s|\$\d+|(?<!:):\w+|\?")
+_IN_LIST = re.compile(r"\bin\s*\(\s*\?(?:\s*,\s*\?)*\s*\)", re.IGNORECASE)
+_VALUES_ROWS = re.compile(r"(\(\s*\?(?:\s*,\s*\?)*\s*\))(?:\s*,\s*\(\s*\?(?:\s*,\s*\?)*\s*\))+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_sql(statement: str) -> str:
+    """去掉字面量、绑定参数和IN/VALUES列表长度差异，只保留语句结构"""
+    sql = _STRING_LITERAL.sub("?", statement)
+    sql = _BIND_PARAM.sub("?", sql)
+    sql = _NUMBER_LITERAL.sub("?", sql)
+    sql = _IN_LIST.sub("IN (?)", sql)
+    sql = _VALUES_ROWS.sub(r"\1", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def fingerprint_sql(statement: str) -> str:
+    return hashlib.sha1(normalize_sql(statement).encode()).hexdigest()[:12]
+
+
+@dataclass
+class QueryProfile:
+    """一个请求（或一段被分析代码）内的查询统计"""
+    route: str
+    query_count: int = 0
+    db_time: float = 0.0
+    fingerprints: Counter = field(default_factory=Counter)
+    samples: Dict[str, str] = field(default_factory=dict)
+
+    def record(self, statement: str, duration: float) -> None:
+        key = fingerprint_sql(statement)
+        self.query_count += 1
+        self.db_time += duration
+        self.fingerprints[key] += 1
+        if key not in self.samples:
+            self.samples[key] = normalize_sql(statement)
+
+    def n_plus_one(self, threshold: int = settings.QUERY_PROFILER_N_PLUS_ONE_THRESHOLD) -> List[Dict[str, Any]]:
+        """重复次数达到阈值的指纹"""
+        return [
+            {'fingerprint': key, 'count': count, 'sql': self.samples[key]}
+            for key, count in self.fingerprints.most_common()
+            if count >= threshold
+        ]
+
+
+_current_profile: ContextVar[Optional[QueryProfile]] = ContextVar("query_profile", default=None)
+
+
+def current_profile() -> Optional[QueryProfile]:
+    return _current_profile.get()
+
+
+@contextmanager
+def profile_queries(route: str) -> Iterator[QueryProfile]:
+    """在当前上下文中统计SQL；异步引擎的greenlet与线程池会话均继承该上下文"""
+    profile = QueryProfile(route=route)
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current_profile.get() is not None:
+        conn.info.setdefault('query_profiler_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current_profile.get()
+    if profile is None:
+        return
+    starts = conn.info.get('query_profiler_start')
+    if not starts:
+        return
+    profile.record(statement, time.perf_counter() - starts.pop())
+
+
+def attach_query_profiler(engine: Engine) -> None:
+    """在同步引擎上注册分析钩子（异步引擎传入 engine.sync_engine）"""
+    if not settings.QUERY_PROFILER_ENABLED:
+        return
+    if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+class QueryProfilerStats:
+    """按路由累计的数据库统计，供管理接口查看"""
+
+    def __init__(self, threshold: int = settings.QUERY_PROFILER_N_PLUS_ONE_THRESHOLD):
+        self.threshold = threshold
+        self.routes: Dict[str, Dict[str, Any]] = {}
+        # 测试中收集请求级统计的列表
+        self.listeners: List[List[QueryProfile]] = []
+
+    def observe(self, profile: QueryProfile) -> List[Dict[str, Any]]:
+        """记录一个请求的统计，返回检测到的N+1指纹"""
+        if not settings.QUERY_PROFILER_ENABLED:
+            return []
+        for listener in self.listeners:
+            listener.append(profile)
+        suspects = profile.n_plus_one(self.threshold)
+
+        DB_QUERIES_PER_REQUEST.labels(route=profile.route).observe(profile.query_count)
+        DB_TIME_PER_REQUEST.labels(route=profile.route).observe(profile.db_time)
+
+        route = self.routes.setdefault(profile.route, {
+            'requests': 0,
+            'queries': 0,
+            'db_time_ms': 0.0,
+            'max_queries': 0,
+            'n_plus_one_requests': 0,
+        })
+        route['requests'] += 1
+        route['queries'] += profile.query_count
+        route['db_time_ms'] += profile.db_time * 1000
+        route['max_queries'] = max(route['max_queries'], profile.query_count)
+
+        if suspects:
+            route['n_plus_one_requests'] += 1
+            route['last_n_plus_one'] = suspects[0]
+            DB_N_PLUS_ONE.labels(route=profile.route).inc()
+            logger.warning(
+                f"疑似N+1查询 {profile.route}: 同一语句执行 {suspects[0]['count']} 次 - {suspects[0]['sql'][:200]}"
+            )
+        return suspects
+
+    def get_stats(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """按累计数据库耗时排序的路由"""
+        routes = sorted(self.routes.items(), key=lambda item: item[1]['db_time_ms'], reverse=True)[:limit]
+        return [
+            {
+                'route': name,
+                **stats,
+                'db_time_ms': round(stats['db_time_ms'], 1),
+                'avg_queries': round(stats['queries'] / stats['requests'], 1),
+                'avg_db_time_ms': round(stats['db_time_ms'] / stats['requests'], 1),
+            }
+            for name, stats in routes
+        ]
+
+
+# 全局查询分析统计
+query_profiler_stats = QueryProfilerStats()
+
+
+@contextmanager
+def capture_request_profiles() -> Iterator[List[QueryProfile]]:
+    """收集代码块执行期间所有请求的查询统计（TestClient在其他线程运行应用时使用）"""
+    profiles: List[QueryProfile] = []
+    query_profiler_stats.listeners.append(profiles)
+    try:
+        yield profiles
+    finally:
+        query_profiler_stats.listeners.remove(profiles)
@@ -1,21 +1,18 @@
 """
 安全认证模块 - HttpOnly Cookie 实现
 """
-import os
 import jwt
 from datetime import datetime, timedelta
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, Tuple
 from fastapi import HTTPException, status, Request, Response
 from fastapi.security import HTTPBearer
-from passlib.context import CryptContext
-from cryptography.hazmat.primitives import serialization
-from cryptography.hazmat.primitives.asymmetric import rsa
 
-# 密码加密上下文
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from app.core.token_service import TokenService
+from app.core.password_hasher import pwd_context, password_hasher
+# 供认证相关模块从 app.core.security 统一导入
+from app.core.password_hasher import PasswordHasherOverloaded  # noqa: F401
 
 # JWT配置
-JWT_ALGORITHM = "RS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 60  # 1小时
 REFRESH_TOKEN_EXPIRE_DAYS = 30    # 30天
 
@@ -31,38 +28,17 @@ COOKIE_SETTINGS = {
 class SecurityManager:
     """安全管理器"""
     
-    def __init__(self):
-        self.private_key = self._load_or_generate_private_key()
-        self.public_key = self.private_key.public_key()
-        
-    def _load_or_generate_private_key(self):
-        """加载或生成RSA私钥"""
-        key_path = "jwt_private_key.pem"
-        
-        if os.path.exists(key_path):
-            with open(key_path, "rb") as key_file:
-                private_key = serialization.load_pem_private_key(
-                    key_file.read(),
-                    password=None
-                )
-        else:
-            # 生成新的RSA密钥对
-            private_key = rsa.generate_private_key(
-                public_exponent=65537,
-                key_size=2048
-            )
-            
-            # 保存私钥
-            pem = private_key.private_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PrivateFormat.PKCS8,
-                encryption_algorithm=serialization.NoEncryption()
-            )
-            
-            with open(key_path, "wb") as key_file:
-                key_file.write(pem)
-                
-        return private_key
+    def __init__(self, token_service: Optional[TokenService] = None):
+        # 密钥对象只加载一次，签发和验证都直接使用密钥对象
+        self.token_service = token_service or TokenService()
+    
+    @property
+    def private_key(self):
+        return self.token_service.private_key
+    
+    @property
+    def public_key(self):
+        return self.token_service.private_key.public_key()
     
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
         """验证密码"""
@@ -78,14 +54,7 @@ class SecurityManager:
         expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         to_encode.update({"exp": expire, "type": "access"})
         
-        private_key_pem = self.private_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        )
-        
-        encoded_jwt = jwt.encode(to_encode, private_key_pem, algorithm=JWT_ALGORITHM)
-        return encoded_jwt
+        return self.token_service.encode(to_encode)
     
     def create_refresh_token(self, data: Dict[str, Any]) -> str:
         """创建刷新令牌"""
@@ -93,24 +62,12 @@ class SecurityManager:
         expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
         to_encode.update({"exp": expire, "type": "refresh"})
         
-        private_key_pem = self.private_key.private_bytes(
-            encoding=serialization.Encoding.PEM,
-            format=serialization.PrivateFormat.PKCS8,
-            encryption_algorithm=serialization.NoEncryption()
-        )
-        
-        encoded_jwt = jwt.encode(to_encode, private_key_pem, algorithm=JWT_ALGORITHM)
-        return encoded_jwt
+        return self.token_service.encode(to_encode)
     
     def verify_token(self, token: str, token_type: str = "access") -> Optional[Dict[str, Any]]:
         """验证令牌"""
         try:
-            public_key_pem = self.public_key.public_bytes(
-                encoding=serialization.Encoding.PEM,
-                format=serialization.PublicFormat.SubjectPublicKeyInfo
-            )
-            
-            payload = jwt.decode(token, public_key_pem, algorithms=[JWT_ALGORITHM])
+            payload = self.token_service.decode(token)
             
             # 验证令牌类型
             if payload.get("type") != token_type:
@@ -122,6 +79,22 @@ class SecurityManager:
         except jwt.PyJWTError:
             return None
     
+    def verify_request_token(self, request: Request, token: str, token_type: str = "access") -> Optional[Dict[str, Any]]:
+        """验证令牌并把结果保存在request.state上，同一请求内中间件和依赖只验证一次"""
+        verified = getattr(request.state, "verified_tokens", None)
+        if verified is None:
+            verified = {}
+            request.state.verified_tokens = verified
+        
+        cache_key = (token_type, token)
+        if cache_key not in verified:
+            verified[cache_key] = self.verify_token(token, token_type)
+        
+        payload = verified[cache_key]
+        if payload is not None and token_type == "access":
+            request.state.token_claims = payload
+        return payload
+    
     def set_auth_cookies(self, response: Response, access_token: str, refresh_token: str):
         """设置认证Cookie"""
         # 设置访问令牌Cookie
@@ -222,7 +195,7 @@ async def get_current_user(request: Request) -> Dict[str, Any]:
             detail="Not authenticated"
         )
     
-    payload = security_manager.verify_token(token)
+    payload = security_manager.verify_request_token(request, token)
     if not payload:
         # 尝试刷新令牌
         refresh_token = security_manager.get_token_from_cookie(request, "refresh")
@@ -300,6 +273,26 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
     """验证密码"""
     return security_manager.verify_password(plain_password, hashed_password)
 
+async def hash_password(password: str) -> str:
+    """获取密码哈希（在哈希线程池中执行，不阻塞事件循环）"""
+    return await password_hasher.hash(password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    """验证密码（在哈希线程池中执行，不阻塞事件循环）"""
+    return await password_hasher.verify(plain_password, hashed_password)
+
+async def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """验证密码，成本参数变化时返回需要写回的新哈希"""
+    return await password_hasher.verify_and_update(plain_password, hashed_password)
+
+def password_overloaded_exception() -> HTTPException:
+    """密码哈希线程池过载时返回给客户端的异常"""
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail="登录请求过多，请稍后重试",
+        headers={"Retry-After": "1"}
+    )
+
 def create_access_token(data: Dict[str, Any]) -> str:
     """创建访问令牌"""
     return security_manager.create_access_token(data)
@@ -0,0 +1,192 @@
+"""
+系统日志批量写入
+SystemLogHandler 挂在根 logger 上，只把日志记录转换为字典放进内存队列，不做任何 I/O，
+请求路径和其他线程里的 logger 调用不会因写库而阻塞；SystemLogWriter 后台任务按间隔把队列中的记录
+分批写入 system_logs，积压时连续写到队列清空。队列有上限，写库持续失败或日志暴增时丢弃最旧的记录并计数
+"""
+
+import json
+import asyncio
+import logging
+import socket
+import threading
+import traceback
+from collections import deque
+from datetime import datetime
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 这些 logger 的记录不写库：写库本身会产生它们，写入它们会形成循环
+IGNORED_LOGGERS = ("sqlalchemy", "asyncpg", "uvicorn.access", __name__)
+HOST_NAME = socket.gethostname()
+
+_INSERT_SQL = text("""
+    INSERT INTO system_logs (
+        log_level, log_source, log_category, log_message, log_details, stack_trace, created_at
+    ) VALUES (
+        :log_level, :log_source, :log_category, :log_message, CAST(:log_details AS JSON), :stack_trace, :created_at
+    )
+""")
+
+
+def record_to_row(record: logging.LogRecord, source: str = "backend") -> Dict[str, Any]:
+    """日志记录转为 system_logs 的一行"""
+    try:
+        message = record.getMessage()
+    except Exception:
+        message = str(record.msg)
+    stack_trace = None
+    if record.exc_info:
+        stack_trace = "".join(traceback.format_exception(*record.exc_info))
+    elif record.stack_info:
+        stack_trace = record.stack_info
+    return {
+        "log_level": record.levelname[:20],
+        "log_source": source,
+        "log_category": record.name[:50],
+        "log_message": message[:10000],
+        "log_details": json.dumps({
+            "module": record.module,
+            "function": record.funcName,
+            "line": record.lineno,
+            "host": HOST_NAME,
+            "process": record.process,
+            "thread": record.threadName,
+        }, ensure_ascii=False),
+        "stack_trace": stack_trace,
+        "created_at": datetime.fromtimestamp(record.created),
+    }
+
+
+class SystemLogHandler(logging.Handler):
+    """把日志记录放入有界队列；emit 不做 I/O，可在任意线程调用"""
+
+    def __init__(self, level: int = logging.WARNING, capacity: int = 10000):
+        super().__init__(level)
+        self.queue: Deque[Dict[str, Any]] = deque(maxlen=capacity)
+        self.dropped = 0
+        self._local = threading.local()
+
+    def emit(self, record: logging.LogRecord) -> None:
+        if record.name.startswith(IGNORED_LOGGERS) or getattr(self._local, "busy", False):
+            return
+        self._local.busy = True
+        try:
+            if len(self.queue) == self.queue.maxlen:
+                self.dropped += 1
+            self.queue.append(record_to_row(record))
+        except Exception:
+            self.handleError(record)
+        finally:
+            self._local.busy = False
+
+    def drain(self, limit: int) -> List[Dict[str, Any]]:
+        rows = []
+        while self.queue and len(rows) < limit:
+            rows.append(self.queue.popleft())
+        return rows
+
+
+class SystemLogWriter:
+    """后台批量写入 system_logs"""
+
+    def __init__(
+        self,
+        level: Optional[str] = None,
+        flush_interval: Optional[float] = None,
+        batch_size: Optional[int] = None,
+        capacity: Optional[int] = None
+    ):
+        self.flush_interval = flush_interval if flush_interval is not None else settings.SYSTEM_LOG_FLUSH_INTERVAL
+        self.batch_size = batch_size or settings.SYSTEM_LOG_BATCH_SIZE
+        self.handler = SystemLogHandler(
+            logging.getLevelName((level or settings.SYSTEM_LOG_STORE_LEVEL).upper()),
+            capacity or settings.SYSTEM_LOG_QUEUE_SIZE
+        )
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"written": 0, "batches": 0, "write_errors": 0, "run_errors": 0}
+
+    def start(self) -> None:
+        """挂载日志处理器并启动后台写入；间隔为0时不启动"""
+        if not self.flush_interval:
+            return
+        root = logging.getLogger()
+        if self.handler not in root.handlers:
+            root.addHandler(self.handler)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"系统日志写入已启动（级别 {logging.getLevelName(self.handler.level)}，间隔 {self.flush_interval}s）")
+
+    async def stop(self) -> None:
+        """卸载处理器，写入剩余记录"""
+        logging.getLogger().removeHandler(self.handler)
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+        try:
+            while await self.flush():
+                pass
+        except Exception as e:
+            logger.error(f"关闭时写入系统日志失败: {e}")
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                # 积压超过一批时连续写入，直到队列清空
+                while await self.flush() == self.batch_size:
+                    pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.stats["run_errors"] += 1
+                logger.error(f"写入系统日志失败: {e}")
+
+    async def flush(self, session_factory=None) -> int:
+        """写入一批记录，返回写入条数；失败时记录放回队列头部，下次重试"""
+        rows = self.handler.drain(self.batch_size)
+        if not rows:
+            return 0
+        if session_factory is None:
+            from app.core.database import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+        try:
+            async with session_factory() as db:
+                await db.execute(_INSERT_SQL, rows)
+                await db.commit()
+        except Exception:
+            self.stats["write_errors"] += 1
+            # 放回时队列可能已满：新记录优先，超出容量的旧记录丢弃
+            room = self.handler.queue.maxlen - len(self.handler.queue)
+            self.handler.dropped += max(0, len(rows) - room)
+            self.handler.queue.extendleft(reversed(rows[len(rows) - room:] if room < len(rows) else rows))
+            raise
+        self.stats["written"] += len(rows)
+        self.stats["batches"] += 1
+        return len(rows)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "running": self.running,
+            "queued": len(self.handler.queue),
+            "dropped": self.handler.dropped,
+            "level": logging.getLevelName(self.handler.level),
+        }
+
+
+# 全局系统日志写入器
+system_log_writer = SystemLogWriter()
@@ -0,0 +1,398 @@
+"""
+系统指标采样器
+后台任务按固定间隔在线程池中采集CPU、内存、磁盘、网络和本进程指标，写入定长环形缓冲区；
+接口直接读取最新值和历史，不再在请求中调用 psutil（cpu_percent(interval=1) 会阻塞事件循环一秒）。
+主机级指标按分钟聚合后写入 system_metrics 表，多个worker通过咨询锁保证每分钟只写一份
+"""
+
+import os
+import time
+import socket
+import asyncio
+import logging
+from array import array
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import psutil
+from sqlalchemy import text
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 写入 system_metrics 的主机级指标：字段 -> (metric_type, metric_name, metric_unit)
+PERSISTED_METRICS = {
+    'cpu_percent': ('cpu', 'cpu_usage', '%'),
+    'memory_percent': ('memory', 'memory_usage', '%'),
+    'disk_percent': ('disk', 'disk_usage', '%'),
+    'load_1m': ('cpu', 'load_1m', 'load'),
+    'net_sent_kbps': ('network', 'net_sent_kbps', 'KB/s'),
+    'net_recv_kbps': ('network', 'net_recv_kbps', 'KB/s'),
+}
+# 按分钟持久化时各worker竞争的咨询锁
+PERSIST_LOCK_KEY = 7301001
+
+
+class MetricRingBuffer:
+    """
+    定长环形缓冲区
+
+    每个字段一个 array('d')，写入和读取最新值都是 O(1)；
+    5秒采样保留6小时共4320行，十几个字段只占几百KB
+    """
+
+    def __init__(self, fields: Sequence[str], capacity: int):
+        self.fields = tuple(fields)
+        self.capacity = capacity
+        self._timestamps = array('d', bytes(8 * capacity))
+        self._columns = {name: array('d', bytes(8 * capacity)) for name in self.fields}
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: float, values: Dict[str, float]) -> None:
+        index = self._next
+        self._timestamps[index] = timestamp
+        for name, column in self._columns.items():
+            column[index] = values.get(name, 0.0)
+        self._next = (index + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def _index(self, offset: int) -> int:
+        """第 offset 行（0为最旧）在数组中的位置"""
+        return (self._next - self._size + offset) % self.capacity
+
+    def latest(self) -> Optional[Dict[str, float]]:
+        if not self._size:
+            return None
+        index = (self._next - 1) % self.capacity
+        row = {name: column[index] for name, column in self._columns.items()}
+        row['timestamp'] = self._timestamps[index]
+        return row
+
+    def _first_offset_since(self, since: float) -> int:
+        """时间戳不小于 since 的第一行（时间戳单调递增，二分查找）"""
+        low, high = 0, self._size
+        while low < high:
+            middle = (low + high) // 2
+            if self._timestamps[self._index(middle)] < since:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def series(
+        self,
+        fields: Optional[Sequence[str]] = None,
+        since: Optional[float] = None,
+        max_points: Optional[int] = None
+    ) -> Dict[str, List[float]]:
+        """
+        取历史数据（按时间正序）
+
+        Args:
+            since: 只取该时间戳之后的行
+            max_points: 行数超过时按等间隔抽样
+        """
+        fields = tuple(fields or self.fields)
+        start = self._first_offset_since(since) if since is not None else 0
+        count = self._size - start
+        step = max(1, -(-count // max_points)) if max_points else 1
+        offsets = range(start, self._size, step)
+
+        result = {'timestamp': [self._timestamps[self._index(offset)] for offset in offsets]}
+        for name in fields:
+            column = self._columns[name]
+            result[name] = [column[self._index(offset)] for offset in offsets]
+        return result
+
+    def average(self, fields: Sequence[str], since: float) -> Dict[str, float]:
+        """since 之后各字段的平均值"""
+        start = self._first_offset_since(since)
+        count = self._size - start
+        if count <= 0:
+            return {}
+        return {
+            name: sum(self._columns[name][self._index(offset)] for offset in range(start, self._size)) / count
+            for name in fields
+        }
+
+
+class SystemMetricsSampler:
+    """系统指标采样器"""
+
+    FIELDS = (
+        'cpu_percent',
+        'memory_percent',
+        'memory_available_mb',
+        'memory_total_mb',
+        'disk_percent',
+        'disk_free_gb',
+        'disk_total_gb',
+        'net_sent_kbps',
+        'net_recv_kbps',
+        'load_1m',
+        'process_rss_mb',
+        'process_cpu_percent',
+        'process_threads',
+        'process_open_fds',
+    )
+
+    def __init__(
+        self,
+        interval: float = settings.SYSTEM_METRICS_INTERVAL,
+        retention_seconds: int = settings.SYSTEM_METRICS_RETENTION_SECONDS,
+        persist_interval: int = settings.SYSTEM_METRICS_PERSIST_INTERVAL,
+        disk_path: str = settings.SYSTEM_METRICS_DISK_PATH,
+    ):
+        self.interval = interval
+        self.persist_interval = persist_interval
+        self.disk_path = disk_path
+        self.buffer = MetricRingBuffer(self.FIELDS, max(1, int(retention_seconds / interval)))
+        self.host_name = socket.gethostname()
+        self._process = psutil.Process(os.getpid())
+        self._last_net: Optional[Tuple[float, int, int]] = None
+        self._primed = False
+        self._task: Optional[asyncio.Task] = None
+        self._last_persist = time.time()
+        self.stats = {
+            'samples': 0,
+            'sample_errors': 0,
+            'persisted_minutes': 0,
+            'persist_errors': 0,
+            'last_sample_ms': 0.0,
+        }
+
+    # ---------- 采集（在线程池中执行） ----------
+
+    def _prime(self) -> None:
+        """cpu_percent(interval=None) 返回与上次调用之间的占用率，首次调用只建立基准"""
+        psutil.cpu_percent(interval=None)
+        self._process.cpu_percent(interval=None)
+        counters = psutil.net_io_counters()
+        self._last_net = (time.monotonic(), counters.bytes_sent, counters.bytes_recv)
+        self._primed = True
+
+    def sample(self) -> Dict[str, float]:
+        """采集一次，全部为非阻塞调用"""
+        if not self._primed:
+            self._prime()
+
+        memory = psutil.virtual_memory()
+        disk = psutil.disk_usage(self.disk_path)
+
+        now = time.monotonic()
+        counters = psutil.net_io_counters()
+        last_time, last_sent, last_recv = self._last_net
+        elapsed = max(now - last_time, 1e-6)
+        self._last_net = (now, counters.bytes_sent, counters.bytes_recv)
+
+        with self._process.oneshot():
+            process_memory = self._process.memory_info()
+            process_cpu = self._process.cpu_percent(interval=None)
+            process_threads = self._process.num_threads()
+            try:
+                process_fds = self._process.num_fds()
+            except (AttributeError, psutil.Error):
+                process_fds = 0
+
+        return {
+            'cpu_percent': psutil.cpu_percent(interval=None),
+            'memory_percent': memory.percent,
+            'memory_available_mb': memory.available / (1024 ** 2),
+            'memory_total_mb': memory.total / (1024 ** 2),
+            'disk_percent': disk.percent,
+            'disk_free_gb': disk.free / (1024 ** 3),
+            'disk_total_gb': disk.total / (1024 ** 3),
+            'net_sent_kbps': (counters.bytes_sent - last_sent) / elapsed / 1024,
+            'net_recv_kbps': (counters.bytes_recv - last_recv) / elapsed / 1024,
+            'load_1m': os.getloadavg()[0] if hasattr(os, 'getloadavg') else 0.0,
+            'process_rss_mb': process_memory.rss / (1024 ** 2),
+            'process_cpu_percent': process_cpu,
+            'process_threads': float(process_threads),
+            'process_open_fds': float(process_fds),
+        }
+
+    async def sample_now(self) -> Dict[str, float]:
+        """在线程池中采集一次并写入缓冲区"""
+        loop = asyncio.get_running_loop()
+        started = time.perf_counter()
+        values = await loop.run_in_executor(None, self.sample)
+        self.stats['last_sample_ms'] = (time.perf_counter() - started) * 1000
+        self.stats['samples'] += 1
+        self.buffer.append(time.time(), values)
+        return values
+
+    # ---------- 后台任务 ----------
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"系统指标采样已启动（间隔 {self.interval}s，保留 {self.buffer.capacity} 个样本）")
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while True:
+            try:
+                await self.sample_now()
+            except Exception as e:
+                self.stats['sample_errors'] += 1
+                logger.error(f"系统指标采样失败: {e}")
+
+            if self.persist_interval and time.time() - self._last_persist >= self.persist_interval:
+                self._last_persist = time.time()
+                await self.persist()
+
+            # 按固定节拍采样，不因采样耗时漂移
+            next_tick += self.interval
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+
+    # ---------- 读取 ----------
+
+    def latest(self, max_age: Optional[float] = None) -> Optional[Dict[str, float]]:
+        """最新样本；超过 max_age 秒视为过期"""
+        row = self.buffer.latest()
+        if row is None:
+            return None
+        if max_age is not None and time.time() - row['timestamp'] > max_age:
+            return None
+        return row
+
+    async def current(self) -> Dict[str, float]:
+        """最新样本，采样器未运行或样本过期时在线程池中现采一次"""
+        row = self.latest(max_age=self.interval * 3)
+        if row is not None:
+            return row
+        await self.sample_now()
+        return self.buffer.latest()
+
+    def history(
+        self,
+        seconds: float,
+        fields: Optional[Sequence[str]] = None,
+        max_points: Optional[int] = 360
+    ) -> Dict[str, List[float]]:
+        return self.buffer.series(fields, since=time.time() - seconds, max_points=max_points)
+
+    # ---------- 持久化 ----------
+
+    async def persist(self, session_factory=None) -> bool:
+        """把最近一个持久化周期的主机级平均值写入 system_metrics，返回是否写入"""
+        averages = self.buffer.average(list(PERSISTED_METRICS), since=time.time() - self.persist_interval)
+        if not averages:
+            return False
+
+        if session_factory is None:
+            from app.core.database import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+
+        bucket = datetime.now().replace(second=0, microsecond=0)
+        params: Dict[str, Any] = {'host_name': self.host_name, 'bucket': bucket}
+        values = []
+        for i, (name, value) in enumerate(averages.items()):
+            metric_type, metric_name, unit = PERSISTED_METRICS[name]
+            values.append(f"(:type_{i}, :name_{i}, CAST(:value_{i} AS NUMERIC), :unit_{i})")
+            params.update({
+                f'type_{i}': metric_type,
+                f'name_{i}': metric_name,
+                f'value_{i}': round(value, 4),
+                f'unit_{i}': unit,
+            })
+
+        try:
+            async with session_factory() as db:
+                locked = (await db.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:lock_key)"), {'lock_key': PERSIST_LOCK_KEY}
+                )).scalar()
+                if not locked:
+                    return False
+                # 同一分钟已有其他worker写入时跳过
+                result = await db.execute(text(f"""
+                    INSERT INTO system_metrics
+                        (metric_type, metric_name, metric_value, metric_unit, host_name, service_name, created_at)
+                    SELECT v.metric_type, v.metric_name, v.metric_value, v.metric_unit,
+                           :host_name, 'system', CAST(:bucket AS TIMESTAMP)
+                    FROM (VALUES {', '.join(values)}) AS v(metric_type, metric_name, metric_value, metric_unit)
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM system_metrics
+                        WHERE metric_name = 'cpu_usage' AND host_name = :host_name AND created_at = :bucket
+                    )
+                """), params)
+                await db.commit()
+                written = result.rowcount > 0
+                if written:
+                    self.stats['persisted_minutes'] += 1
+                return written
+        except Exception as e:
+            self.stats['persist_errors'] += 1
+            logger.error(f"系统指标持久化失败: {e}")
+            return False
+
+    @staticmethod
+    async def load_history(
+        db,
+        hours: float,
+        metric_names: Optional[Sequence[str]] = None,
+        host_name: Optional[str] = None,
+        max_points: int = 360
+    ) -> Dict[str, List[Tuple[str, float]]]:
+        """从 system_metrics 读取历史，按时间桶取平均，每个指标最多 max_points 个点"""
+        metric_names = list(metric_names or [spec[1] for spec in PERSISTED_METRICS.values()])
+        step = max(60, int(hours * 3600 / max_points))
+        params: Dict[str, Any] = {
+            'since': datetime.now() - timedelta(hours=hours),
+            'step': step,
+            'metric_names': metric_names,
+        }
+        host_filter = ""
+        if host_name:
+            host_filter = "AND host_name = :host_name"
+            params['host_name'] = host_name
+
+        result = await db.execute(text(f"""
+            SELECT metric_name,
+                   to_timestamp(floor(extract(epoch FROM created_at) / :step) * :step) AT TIME ZONE 'UTC' AS bucket,
+                   AVG(metric_value) AS value
+            FROM system_metrics
+            WHERE created_at >= :since
+              AND metric_name = ANY(:metric_names)
+              {host_filter}
+            GROUP BY metric_name, bucket
+            ORDER BY metric_name, bucket
+        """), params)
+
+        history: Dict[str, List[Tuple[str, float]]] = {name: [] for name in metric_names}
+        for row in result.mappings():
+            history[row['metric_name']].append((row['bucket'].isoformat(), round(float(row['value']), 2)))
+        return history
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'running': self.running,
+            'interval': self.interval,
+            'buffered_samples': len(self.buffer),
+            'capacity': self.buffer.capacity,
+            'latest': self.latest(),
+        }
+
+
+# 全局系统指标采样器
+system_metrics_sampler = SystemMetricsSampler()
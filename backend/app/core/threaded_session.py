@@ -0,0 +1,173 @@
+"""
+同步会话线程池适配器
+服务层统一使用 await db.execute(...) / await db.commit() 访问数据库：
+请求链路中传入的是 AsyncSession；脚本、定时任务等持有同步引擎的调用方
+使用 ThreadedSession，把同步 Session 的每次调用放到专用线程池执行，不阻塞事件循环
+"""
+
+import asyncio
+import contextvars
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from typing import Any, AsyncGenerator, Callable, Dict, Optional
+
+from sqlalchemy import create_engine
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session, sessionmaker
+
+from app.core.config import settings
+from app.core.query_profiler import attach_query_profiler
+
+logger = logging.getLogger(__name__)
+
+
+def sync_database_url(url: str) -> str:
+    """把异步驱动的连接串转换为同步驱动"""
+    return url.replace("postgresql+asyncpg://", "postgresql+psycopg2://", 1)
+
+
+class SyncSessionPool:
+    """
+    同步引擎、会话工厂与线程池
+
+    线程数等于连接池容量，线程拿到任务时总有可用连接，
+    排队只发生在线程池队列中，不会在持有线程的同时等待连接
+    """
+
+    def __init__(
+        self,
+        database_url: str = settings.DATABASE_URL,
+        pool_size: int = settings.SYNC_DB_POOL_SIZE,
+        max_overflow: int = settings.SYNC_DB_MAX_OVERFLOW,
+    ):
+        self.database_url = sync_database_url(database_url)
+        self.pool_size = pool_size
+        self.max_overflow = max_overflow
+        self._engine: Optional[Engine] = None
+        self._session_factory: Optional[sessionmaker] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self.stats = {
+            'sessions_opened': 0,
+            'calls': 0,
+        }
+
+    @property
+    def engine(self) -> Engine:
+        if self._engine is None:
+            self._engine = create_engine(
+                self.database_url,
+                pool_size=self.pool_size,
+                max_overflow=self.max_overflow,
+                pool_pre_ping=True,
+                pool_recycle=300,
+            )
+            attach_query_profiler(self._engine)
+        return self._engine
+
+    @property
+    def session_factory(self) -> sessionmaker:
+        if self._session_factory is None:
+            self._session_factory = sessionmaker(
+                bind=self.engine, autocommit=False, autoflush=False, expire_on_commit=False
+            )
+        return self._session_factory
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.pool_size + self.max_overflow,
+                thread_name_prefix="sync-db",
+            )
+        return self._executor
+
+    def new_session(self) -> "ThreadedSession":
+        self.stats['sessions_opened'] += 1
+        return ThreadedSession(self.session_factory(), self)
+
+    async def run(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """在线程池中执行同步调用（携带调用方的上下文变量，如请求级查询统计）"""
+        self.stats['calls'] += 1
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        return await loop.run_in_executor(self.executor, partial(context.run, func, *args, **kwargs))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._engine is not None:
+            self._engine.dispose()
+            self._engine = None
+            self._session_factory = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        pool = self._engine.pool if self._engine is not None else None
+        return {
+            **self.stats,
+            'pool_size': self.pool_size,
+            'max_overflow': self.max_overflow,
+            'checked_out': pool.checkedout() if pool is not None else 0,
+        }
+
+
+class ThreadedSession:
+    """
+    AsyncSession 接口子集的同步会话包装
+
+    每次调用都在线程池中执行，同一会话的调用由调用方顺序 await，不会并发
+    """
+
+    def __init__(self, session: Session, pool: SyncSessionPool):
+        self.sync_session = session
+        self._pool = pool
+
+    async def execute(self, statement, params=None, **kwargs):
+        return await self._pool.run(self.sync_session.execute, statement, params, **kwargs)
+
+    async def scalar(self, statement, params=None, **kwargs):
+        return await self._pool.run(self.sync_session.scalar, statement, params, **kwargs)
+
+    async def commit(self) -> None:
+        await self._pool.run(self.sync_session.commit)
+
+    async def rollback(self) -> None:
+        await self._pool.run(self.sync_session.rollback)
+
+    async def flush(self) -> None:
+        await self._pool.run(self.sync_session.flush)
+
+    async def close(self) -> None:
+        await self._pool.run(self.sync_session.close)
+
+    async def __aenter__(self) -> "ThreadedSession":
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            await self.rollback()
+        await self.close()
+
+
+# 全局同步会话池（首次使用时才创建引擎与线程）
+sync_session_pool = SyncSessionPool()
+
+
+def wrap_sync_session(session: Session) -> ThreadedSession:
+    """包装调用方已有的同步会话（如测试脚本、同步引擎创建的会话）"""
+    return ThreadedSession(session, sync_session_pool)
+
+
+@asynccontextmanager
+async def threaded_session() -> AsyncGenerator[ThreadedSession, None]:
+    """创建一个在线程池中执行的同步会话"""
+    async with sync_session_pool.new_session() as session:
+        yield session
+
+
+async def get_threaded_db() -> AsyncGenerator[ThreadedSession, None]:
+    """FastAPI依赖：同步引擎会话（经线程池访问）"""
+    async with threaded_session() as session:
+        yield session
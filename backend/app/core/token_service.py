@@ -0,0 +1,285 @@
+"""
+JWT令牌服务
+密钥只在启动时解析一次为密钥对象，按kid支持密钥轮换；
+验证通过的令牌按哈希缓存到其exp为止，避免同一令牌重复做RS256验签
+"""
+
+import os
+import copy
+import json
+import base64
+import glob
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+
+logger = logging.getLogger(__name__)
+
+JWT_ALGORITHM = "RS256"
+
+# 当前签名私钥
+ACTIVE_PRIVATE_KEY_PATH = "jwt_private_key.pem"
+# 轮换下来的旧密钥（私钥或公钥PEM），仅用于验证轮换前签发的令牌
+RETIRED_KEYS_DIR = "jwt_keys"
+
+# 已验证令牌缓存容量
+VERIFIED_TOKEN_CACHE_SIZE = 10000
+# 遇到未知kid时重新加载密钥的最小间隔（滚动发布期间其他进程可能已切换新密钥）
+KEY_RELOAD_INTERVAL_SECONDS = 30
+
+
+def key_id(public_key: rsa.RSAPublicKey) -> str:
+    """由公钥指纹生成kid"""
+    der = public_key.public_bytes(
+        encoding=serialization.Encoding.DER,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return hashlib.sha256(der).hexdigest()[:16]
+
+
+def _load_public_key_file(path: str) -> Optional[rsa.RSAPublicKey]:
+    """从PEM文件加载公钥（文件可以是私钥或公钥）"""
+    with open(path, "rb") as key_file:
+        data = key_file.read()
+    try:
+        return serialization.load_pem_private_key(data, password=None).public_key()
+    except (ValueError, TypeError):
+        pass
+    try:
+        return serialization.load_pem_public_key(data)
+    except ValueError as e:
+        logger.error(f"Invalid JWT key file {path}: {e}")
+        return None
+
+
+def unverified_kid(token: str) -> Optional[str]:
+    """读取令牌头部的kid（不验签，仅用于选择公钥）"""
+    try:
+        header_segment = token.split(".", 1)[0]
+        header_segment += "=" * (-len(header_segment) % 4)
+        header = json.loads(base64.urlsafe_b64decode(header_segment))
+    except (ValueError, TypeError) as e:
+        raise jwt.DecodeError(f"Invalid token header: {e}")
+    if not isinstance(header, dict):
+        raise jwt.DecodeError("Invalid token header")
+    return header.get("kid")
+
+
+class TokenService:
+    """JWT签发与验证"""
+
+    def __init__(
+        self,
+        private_key_path: str = ACTIVE_PRIVATE_KEY_PATH,
+        retired_keys_dir: str = RETIRED_KEYS_DIR,
+        cache_size: int = VERIFIED_TOKEN_CACHE_SIZE,
+    ):
+        self.private_key_path = private_key_path
+        self.retired_keys_dir = retired_keys_dir
+        self.cache_size = cache_size
+
+        self._lock = threading.Lock()
+        # token哈希 -> (claims, exp, kid)
+        self._verified: "OrderedDict[bytes, Tuple[Dict[str, Any], float, str]]" = OrderedDict()
+        self._last_reload = 0.0
+
+        self.private_key: rsa.RSAPrivateKey = None
+        self.signing_kid: str = ""
+        self._public_keys: Dict[str, rsa.RSAPublicKey] = {}
+        self.stats = {
+            'cache_hits': 0,
+            'cache_misses': 0,
+            'verify_failures': 0,
+            'key_reloads': 0,
+        }
+
+        self.load_keys()
+
+    # ---- 密钥管理 ----
+
+    def load_keys(self) -> None:
+        """从磁盘加载签名私钥和所有验证公钥"""
+        private_key = self._load_or_generate_private_key()
+        public_keys: Dict[str, rsa.RSAPublicKey] = {}
+
+        for path in sorted(glob.glob(os.path.join(self.retired_keys_dir, "*.pem"))):
+            public_key = _load_public_key_file(path)
+            if public_key is not None:
+                public_keys[key_id(public_key)] = public_key
+
+        signing_kid = key_id(private_key.public_key())
+        public_keys[signing_kid] = private_key.public_key()
+
+        with self._lock:
+            removed = set(self._public_keys) - set(public_keys)
+            self.private_key = private_key
+            self.signing_kid = signing_kid
+            self._public_keys = public_keys
+            if removed:
+                self._purge_kids(removed)
+
+        self._last_reload = time.monotonic()
+        logger.info(f"JWT keys loaded: signing kid={signing_kid}, verification kids={sorted(public_keys)}")
+
+    def _load_or_generate_private_key(self) -> rsa.RSAPrivateKey:
+        """加载或生成RSA私钥"""
+        if os.path.exists(self.private_key_path):
+            with open(self.private_key_path, "rb") as key_file:
+                return serialization.load_pem_private_key(key_file.read(), password=None)
+
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        self._write_private_key(self.private_key_path, private_key)
+        return private_key
+
+    @staticmethod
+    def _write_private_key(path: str, private_key: rsa.RSAPrivateKey) -> None:
+        pem = private_key.private_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PrivateFormat.PKCS8,
+            encryption_algorithm=serialization.NoEncryption()
+        )
+        with open(path, "wb") as key_file:
+            key_file.write(pem)
+
+    def rotate_signing_key(self, new_private_key: Optional[rsa.RSAPrivateKey] = None) -> str:
+        """
+        轮换签名密钥：当前公钥移入旧密钥目录继续用于验证，新密钥开始签发。
+        其他进程遇到新kid时会自动重新加载密钥，无需停机
+        """
+        new_private_key = new_private_key or rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+        os.makedirs(self.retired_keys_dir, exist_ok=True)
+        retired_pem = self.private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        with open(os.path.join(self.retired_keys_dir, f"{self.signing_kid}.pem"), "wb") as key_file:
+            key_file.write(retired_pem)
+
+        self._write_private_key(self.private_key_path, new_private_key)
+        self.load_keys()
+        return self.signing_kid
+
+    def retire_key(self, kid: str) -> bool:
+        """停止接受某个旧密钥签发的令牌（其所有令牌过期后调用）"""
+        if kid == self.signing_kid:
+            raise ValueError("Cannot retire the active signing key")
+
+        path = os.path.join(self.retired_keys_dir, f"{kid}.pem")
+        if os.path.exists(path):
+            os.remove(path)
+
+        with self._lock:
+            if self._public_keys.pop(kid, None) is None:
+                return False
+            self._purge_kids({kid})
+        return True
+
+    def _purge_kids(self, kids) -> None:
+        """删除由指定密钥签发的已验证缓存（调用方持有锁）"""
+        for token_hash in [h for h, (_, _, kid) in self._verified.items() if kid in kids]:
+            del self._verified[token_hash]
+
+    def _verification_keys(self, token: str) -> List[Tuple[str, rsa.RSAPublicKey]]:
+        """按令牌头部的kid选择验证公钥"""
+        kid = unverified_kid(token)
+        if kid is None:
+            # 引入kid之前签发的令牌：先试当前签名密钥，再试旧密钥
+            keys = dict(self._public_keys)
+            active = keys.pop(self.signing_kid)
+            return [(self.signing_kid, active)] + list(keys.items())
+
+        public_key = self._public_keys.get(kid)
+        if public_key is None and time.monotonic() - self._last_reload > KEY_RELOAD_INTERVAL_SECONDS:
+            self.stats['key_reloads'] += 1
+            self.load_keys()
+            public_key = self._public_keys.get(kid)
+
+        if public_key is None:
+            raise jwt.InvalidKeyError(f"Unknown key id: {kid}")
+        return [(kid, public_key)]
+
+    # ---- 签发与验证 ----
+
+    def encode(self, claims: Dict[str, Any]) -> str:
+        """签发令牌"""
+        return jwt.encode(
+            claims,
+            self.private_key,
+            algorithm=JWT_ALGORITHM,
+            headers={"kid": self.signing_kid}
+        )
+
+    def decode(self, token: str) -> Dict[str, Any]:
+        """
+        验证令牌并返回claims副本，失败时抛出 jwt.PyJWTError。
+        验证通过的令牌缓存到exp为止
+        """
+        token_hash = hashlib.sha256(token.encode("utf-8")).digest()
+        now = time.time()
+
+        with self._lock:
+            cached = self._verified.get(token_hash)
+            if cached is not None:
+                claims, expires_at, _ = cached
+                if expires_at > now:
+                    self._verified.move_to_end(token_hash)
+                    self.stats['cache_hits'] += 1
+                    return copy.deepcopy(claims)
+                del self._verified[token_hash]
+            self.stats['cache_misses'] += 1
+
+        try:
+            candidates = self._verification_keys(token)
+            for index, (kid, public_key) in enumerate(candidates):
+                try:
+                    claims = jwt.decode(token, public_key, algorithms=[JWT_ALGORITHM])
+                    break
+                except jwt.InvalidSignatureError:
+                    if index == len(candidates) - 1:
+                        raise
+        except jwt.PyJWTError:
+            self.stats['verify_failures'] += 1
+            raise
+
+        expires_at = claims.get("exp")
+        if isinstance(expires_at, (int, float)):
+            with self._lock:
+                self._verified[token_hash] = (copy.deepcopy(claims), float(expires_at), kid)
+                self._verified.move_to_end(token_hash)
+                while len(self._verified) > self.cache_size:
+                    self._verified.popitem(last=False)
+
+        return claims
+
+    def public_keys(self) -> List[Dict[str, Any]]:
+        """当前所有验证公钥（kid与PEM）"""
+        return [
+            {
+                "kid": kid,
+                "active": kid == self.signing_kid,
+                "pem": public_key.public_bytes(
+                    encoding=serialization.Encoding.PEM,
+                    format=serialization.PublicFormat.SubjectPublicKeyInfo
+                ).decode("ascii"),
+            }
+            for kid, public_key in self._public_keys.items()
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            cached_tokens = len(self._verified)
+        return {
+            **self.stats,
+            'cached_tokens': cached_tokens,
+            'cache_size': self.cache_size,
+            'signing_kid': self.signing_kid,
+            'verification_kids': sorted(self._public_keys),
+        }
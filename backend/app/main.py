@@ -70,11 +70,52 @@ async def lifespan(app: FastAPI):
     # 初始化缓存系统
     try:
         redis_client = await get_redis_client()
-        await initialize_cache_system(redis_client)
+        cache_manager = await initialize_cache_system(redis_client)
+        
+        # 配置缓存和工作台授权缓存接收跨进程失效消息
+        if cache_manager.invalidation_bus is not None:
+            from app.services.config_cache import config_cache
+            cache_manager.invalidation_bus.add_listener(
+                config_cache.handle_invalidation,
+                config_cache.invalidate_all
+            )
+            from app.services.workspace_auth_cache import workspace_auth_cache
+            cache_manager.invalidation_bus.add_listener(
+                workspace_auth_cache.handle_invalidation,
+                workspace_auth_cache.invalidate_all
+            )
+        
+        # Credits余额缓存（仅用于展示）与数据库定期对账
+        from app.services.credits_ledger import start_credits_balance_cache
+        start_credits_balance_cache(redis_client)
         logger.info("✅ 缓存系统初始化完成")
     except Exception as e:
         logger.error(f"❌ 缓存系统初始化失败: {e}")
     
+    # 启动系统日志批量写入
+    from app.core.system_log_writer import system_log_writer
+    system_log_writer.start()
+    
+    # 启动事件循环延迟监控
+    from app.core.loop_monitor import loop_lag_monitor
+    loop_lag_monitor.start()
+    
+    # 启动系统指标采样
+    from app.core.system_metrics import system_metrics_sampler
+    system_metrics_sampler.start()
+    
+    # 启动指标汇总
+    from app.services.metric_rollups import metric_rollup_engine
+    metric_rollup_engine.start()
+    
+    # 启动日志分区维护
+    from app.core.log_partitions import log_partition_manager
+    log_partition_manager.start()
+    
+    # 启动律师业绩统计维护
+    from app.services.lawyer_stats import lawyer_stats_refresher
+    lawyer_stats_refresher.start()
+    
     # 启动访问日志处理器
     from app.services.access_log_processor import start_access_log_processor
     await start_access_log_processor()
@@ -116,6 +157,39 @@ async def lifespan(app: FastAPI):
     await stop_websocket_manager()
     await stop_realtime_data_aggregator()
     logger.info("✅ 所有处理器已停止")
+    
+    # 停止Credits余额缓存对账，写入待写的余额
+    from app.services.credits_ledger import stop_credits_balance_cache
+    await stop_credits_balance_cache()
+    
+    # 关闭缓存失效总线
+    from app.core import advanced_cache
+    if advanced_cache.cache_manager is not None:
+        await advanced_cache.cache_manager.stop_invalidation_bus()
+    
+    # 关闭密码哈希线程池
+    from app.core.password_hasher import password_hasher
+    password_hasher.shutdown()
+    
+    # 关闭同步会话线程池、事件循环监控、系统指标采样、指标汇总、日志分区维护、律师统计维护与进行中的备份
+    from app.core.threaded_session import sync_session_pool
+    from app.core.loop_monitor import loop_lag_monitor
+    from app.core.system_metrics import system_metrics_sampler
+    from app.services.metric_rollups import metric_rollup_engine
+    from app.core.log_partitions import log_partition_manager
+    from app.services.lawyer_stats import lawyer_stats_refresher
+    from app.core.database_backup import database_backup_engine
+    sync_session_pool.shutdown()
+    await loop_lag_monitor.stop()
+    await system_metrics_sampler.stop()
+    await metric_rollup_engine.stop()
+    await log_partition_manager.stop()
+    await lawyer_stats_refresher.stop()
+    await database_backup_engine.stop()
+    
+    # 最后停止系统日志写入，写入关闭过程中的日志
+    from app.core.system_log_writer import system_log_writer
+    await system_log_writer.stop()
 
 
 # 创建FastAPI应用
@@ -210,11 +284,12 @@ async def performance_metrics():
         cache_manager = await get_cache_manager()
         cache_stats = cache_manager.multi_cache.get_stats()
         
-        import psutil
+        from app.core.system_metrics import system_metrics_sampler
+        sample = await system_metrics_sampler.current()
         system_stats = {
-            "cpu_percent": psutil.cpu_percent(),
-            "memory_percent": psutil.virtual_memory().percent,
-            "disk_percent": psutil.disk_usage('/').percent if psutil.disk_usage('/') else 0
+            "cpu_percent": sample["cpu_percent"],
+            "memory_percent": sample["memory_percent"],
+            "disk_percent": sample["disk_percent"]
         }
         
         return {
@@ -20,6 +20,8 @@ import redis.asyncio as redis
 
 from app.core.database import AsyncSessionLocal
 from app.core.config import settings
+from app.core.path_rules import get_path_classifier
+from app.services.realtime_data_aggregator import realtime_data_aggregator
 
 logger = logging.getLogger(__name__)
 
@@ -217,6 +219,7 @@ class AccessLoggerMiddleware:
             # 批量执行插入
             await db.execute(insert_query, logs)
             await db.commit()
+            realtime_data_aggregator.record_access_logs(logs)
             
         except Exception as e:
             logger.error(f"批量插入访问日志失败: {str(e)}")
@@ -325,6 +328,7 @@ class AccessLoggerMiddleware:
             
             await db.execute(insert_query, log_data)
             await db.commit()
+            realtime_data_aggregator.record_access_logs([log_data])
             
         except Exception as e:
             logger.error(f"插入访问日志失败: {str(e)}")
@@ -332,16 +336,5 @@ class AccessLoggerMiddleware:
             
     def _should_log_request(self, request: Request) -> bool:
         """判断是否应该记录此请求"""
-        path = request.url.path
-        
-        # 排除静态资源和健康检查
-        excluded_paths = [
-            "/static/", "/css/", "/js/", "/images/", "/favicon.ico",
-            "/health", "/docs", "/redoc", "/openapi.json"
-        ]
-        
-        for excluded in excluded_paths:
-            if path.startswith(excluded):
-                return False
-        
-        return True 
\ No newline at end of file
+        # 排除静态资源和健康检查（规则见 path_rules.DEFAULT_PATH_RULES）
+        return get_path_classifier().classify(request.url.path).log_request 
\ No newline at end of file
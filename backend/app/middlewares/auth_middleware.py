@@ -8,6 +8,7 @@ from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from app.core.security import security_manager
 from app.core.logging import get_logger
+from app.core.path_rules import DEFAULT_PATH_RULES, get_path_classifier
 
 logger = get_logger(__name__)
 
@@ -16,22 +17,16 @@ class AuthMiddleware(BaseHTTPMiddleware):
     
     def __init__(self, app, excluded_paths: list = None):
         super().__init__(app)
-        self.excluded_paths = excluded_paths or [
-            "/docs",
-            "/redoc", 
-            "/openapi.json",
-            "/health",
-            "/api/v1/auth/login",
-            "/api/v1/auth/register",
-            "/api/v1/auth/forgot-password",
-            "/api/v1/auth/reset-password"
-        ]
+        self.excluded_paths = excluded_paths or list(DEFAULT_PATH_RULES["auth_excluded_prefixes"])
+        self.path_classifier = get_path_classifier().with_overrides(
+            auth_excluded_prefixes=excluded_paths or None
+        )
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
         start_time = time.time()
         
         # 跳过不需要认证的路径
-        if any(request.url.path.startswith(path) for path in self.excluded_paths):
+        if self.path_classifier.classify(request.url.path).auth_excluded:
             response = await call_next(request)
             return response
         
@@ -43,7 +38,7 @@ class AuthMiddleware(BaseHTTPMiddleware):
         
         if access_token:
             # 验证访问令牌
-            payload = security_manager.verify_token(access_token, "access")
+            payload = security_manager.verify_request_token(request, access_token, "access")
             if not payload and refresh_token:
                 # 访问令牌过期，尝试刷新
                 new_access_token = security_manager.refresh_access_token(refresh_token)
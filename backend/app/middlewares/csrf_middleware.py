@@ -12,6 +12,7 @@ from fastapi import Request, Response, HTTPException, status
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from app.core.logging import get_logger
+from app.core.path_rules import DEFAULT_PATH_RULES, get_path_classifier
 
 logger = get_logger(__name__)
 
@@ -38,18 +39,11 @@ class CSRFMiddleware(BaseHTTPMiddleware):
         self.header_name = header_name
         self.cookie_name = cookie_name
         self.exempt_methods = exempt_methods or ["GET", "HEAD", "OPTIONS", "TRACE"]
-        self.exempt_paths = exempt_paths or [
-            "/docs",
-            "/redoc",
-            "/openapi.json",
-            "/health",
-            "/api/v1/auth/login",
-            "/api/v1/auth/register",
-            "/api/v1/auth/forgot-password",
-            "/api/v1/auth/reset-password",
-            "/api/v1/auth/send-sms-code",
-            "/api/v1/auth/verify-sms-code"
-        ]
+        self.exempt_methods = set(self.exempt_methods)
+        self.exempt_paths = exempt_paths or list(DEFAULT_PATH_RULES["csrf_exempt_prefixes"])
+        self.path_classifier = get_path_classifier().with_overrides(
+            csrf_exempt_prefixes=exempt_paths or None
+        )
         self.token_lifetime = token_lifetime
     
     async def dispatch(self, request: Request, call_next: Callable) -> Response:
@@ -89,7 +83,7 @@ class CSRFMiddleware(BaseHTTPMiddleware):
             return True
         
         # 豁免的路径
-        if any(request.url.path.startswith(path) for path in self.exempt_paths):
+        if self.path_classifier.classify(request.url.path).csrf_exempt:
             return True
         
         return False
@@ -18,6 +18,10 @@ from app.core.performance_monitor import (
     CONCURRENT_USERS,
     performance_optimizer
 )
+from app.core.config import settings
+from app.core.loop_monitor import loop_lag_monitor
+from app.core.query_profiler import profile_queries, query_profiler_stats
+from app.core.path_rules import normalize_route_template
 
 logger = logging.getLogger(__name__)
 
@@ -45,8 +49,11 @@ class PerformanceMiddleware(BaseHTTPMiddleware):
             CONCURRENT_USERS.set(self.concurrent_requests)
         
         try:
-            # 处理请求
-            response = await call_next(request)
+            # 处理请求（登记到事件循环监控，阻塞时可定位到处理器；同时统计本请求的SQL）
+            handler = f"{request.method} {normalize_route_template(request.url.path)}"
+            with loop_lag_monitor.track(handler), profile_queries(handler) as query_profile:
+                response = await call_next(request)
+            n_plus_one = query_profiler_stats.observe(query_profile)
             
             # 计算响应时间
             duration = time.time() - start_time
@@ -65,6 +72,10 @@ class PerformanceMiddleware(BaseHTTPMiddleware):
             # 添加性能头信息
             response.headers["X-Response-Time"] = f"{duration:.3f}s"
             response.headers["X-Concurrent-Requests"] = str(self.concurrent_requests)
+            if settings.DEBUG:
+                response.headers["X-DB-Query-Count"] = str(query_profile.query_count)
+                response.headers["X-DB-Time"] = f"{query_profile.db_time:.3f}s"
+                response.headers["X-DB-N-Plus-One"] = str(len(n_plus_one))
             
             # 记录慢请求
             if duration > 2.0:  # 超过2秒的请求
@@ -10,6 +10,7 @@ from fastapi import Request, Response, HTTPException, status
 from fastapi.responses import JSONResponse
 from starlette.middleware.base import BaseHTTPMiddleware
 from app.core.logging import get_logger
+from app.core.path_rules import get_path_classifier
 
 logger = get_logger(__name__)
 
@@ -45,6 +46,11 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
             for pattern, limit in rate_limit_rules.items():
                 self.rate_limit_rules[pattern] = self._parse_rate_limit(limit)
         
+        # 限流规则编译为路径分类器，按路由模板缓存命中结果
+        self.path_classifier = get_path_classifier().with_overrides(
+            rate_limit_patterns=list(self.rate_limit_rules)
+        )
+        
         # IP白名单和黑名单
         self.ip_whitelist = set(ip_whitelist or [])
         self.ip_blacklist = set(ip_blacklist or [])
@@ -157,13 +163,11 @@ class RateLimitMiddleware(BaseHTTPMiddleware):
     
     def _get_rate_limit_for_path(self, path: str) -> Dict[str, int]:
         """获取路径对应的限流配置"""
-        # 检查特定路径规则
-        for pattern, limit in self.rate_limit_rules.items():
-            if pattern in path:
-                return limit
-        
-        # 返回默认限流配置
-        return self.default_rate_limit
+        # 按声明顺序第一个包含于路径中的规则生效，未命中使用默认限流配置
+        pattern = self.path_classifier.classify(path).rate_limit_rule
+        if pattern is None:
+            return self.default_rate_limit
+        return self.rate_limit_rules[pattern]
     
     async def _check_rate_limit(self, request: Request, client_ip: str) -> Dict:
         """检查限流"""
@@ -6,12 +6,14 @@
 from typing import Dict, Any, Optional
 from fastapi import Request, HTTPException, status
 from fastapi.responses import RedirectResponse
-from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 import structlog
 
-from app.core.database import get_db
+from app.core.database import AsyncSessionLocal
+from app.core.path_rules import get_path_classifier
+from app.core.security import security_manager
 from app.models.user import User
+from app.services.workspace_auth_cache import WorkspaceAuthorization, workspace_auth_cache
 
 logger = structlog.get_logger()
 
@@ -43,13 +45,7 @@ class WorkspaceMiddleware:
     
     def is_workspace_route(self, path: str) -> bool:
         """检查是否是工作台路由"""
-        workspace_patterns = [
-            '/user/',
-            '/lawyer/',
-            '/admin/'
-        ]
-        
-        return any(path.startswith(pattern) for pattern in workspace_patterns)
+        return get_path_classifier().classify(path).workspace_type is not None
     
     async def validate_workspace_access(self, request: Request):
         """验证工作台访问权限"""
@@ -76,6 +72,13 @@ class WorkspaceMiddleware:
                 detail="需要登录"
             )
         
+        # 令牌有效期内账户可能已被停用或封禁
+        if not await self.check_user_active(current_user['id']):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="用户账户已停用"
+            )
+        
         # 验证用户是否有权限访问该工作台
         if not await self.check_workspace_permission(current_user['id'], workspace_id):
             raise HTTPException(
@@ -103,61 +106,74 @@ class WorkspaceMiddleware:
     
     def get_workspace_type_from_path(self, path: str) -> str:
         """从路径获取工作台类型"""
-        if path.startswith('/user/'):
-            return 'user'
-        elif path.startswith('/lawyer/'):
-            return 'lawyer'
-        elif path.startswith('/admin/'):
-            return 'admin'
-        else:
-            return 'unknown'
+        return get_path_classifier().classify(path).workspace_type or 'unknown'
     
     async def get_current_user_from_request(self, request: Request) -> Optional[Dict[str, Any]]:
-        """从请求中获取当前用户信息"""
+        """从请求令牌的已验证claims中获取当前用户（不查询数据库）"""
         try:
             # 从Authorization头或Cookie中获取token
+            token = None
             authorization = request.headers.get("Authorization")
-            if not authorization:
-                # 尝试从Cookie获取
+            if authorization and authorization.lower().startswith("bearer "):
+                token = authorization[7:]
+            if not token:
                 token = request.cookies.get("access_token")
-                if token:
-                    authorization = f"Bearer {token}"
             
-            if not authorization:
+            if not token:
                 return None
             
-            # 这里应该调用认证服务验证token
-            # 简化实现，实际应该集成现有的认证逻辑
-            from app.services.auth_service import AuthService
-            
-            # 获取数据库连接
-            db = next(get_db())
-            auth_service = AuthService(db)
+            claims = security_manager.verify_request_token(request, token, "access")
+            if not claims:
+                return None
             
-            token = authorization.replace("Bearer ", "")
-            user_info = await auth_service.get_current_user_from_token(token)
+            user_id = claims.get("user_id") or claims.get("sub")
+            if not user_id:
+                return None
             
-            return user_info
+            return {
+                "id": str(user_id),
+                "email": claims.get("email") or claims.get("sub"),
+                "role": claims.get("role"),
+            }
             
         except Exception as e:
             logger.error("获取当前用户失败", error=str(e))
             return None
     
+    async def get_workspace_authorization(self, user_id: str) -> Optional[WorkspaceAuthorization]:
+        """获取用户的工作台授权信息（短TTL缓存，身份或账户状态变更时失效）"""
+        async def load_authorization():
+            async with AsyncSessionLocal() as db:
+                result = await db.execute(
+                    select(User.workspace_id, User.account_type, User.status)
+                    .where(User.id == user_id)
+                )
+                row = result.first()
+                if row is None:
+                    return None
+                return {
+                    "workspace_id": row.workspace_id,
+                    "account_type": row.account_type,
+                    "status": getattr(row.status, "value", row.status),
+                }
+        
+        return await workspace_auth_cache.get(user_id, load_authorization)
+    
+    async def check_user_active(self, user_id: str) -> bool:
+        """检查用户账户是否处于活跃状态"""
+        try:
+            authorization = await self.get_workspace_authorization(user_id)
+            return authorization is not None and authorization.is_active()
+            
+        except Exception as e:
+            logger.error("检查用户状态失败", error=str(e), user_id=user_id)
+            return False
+    
     async def check_workspace_permission(self, user_id: str, workspace_id: str) -> bool:
         """检查用户是否有权限访问指定工作台"""
         try:
-            # 获取数据库连接
-            db = next(get_db())
-            
-            # 查询用户的workspace_id
-            result = await db.execute(
-                select(User.workspace_id)
-                .where(User.id == user_id)
-            )
-            
-            user_workspace_id = result.scalar_one_or_none()
-            
-            return user_workspace_id == workspace_id
+            authorization = await self.get_workspace_authorization(user_id)
+            return authorization is not None and authorization.owns_workspace(workspace_id)
             
         except Exception as e:
             logger.error("检查工作台权限失败", error=str(e), user_id=user_id, workspace_id=workspace_id)
@@ -166,26 +182,8 @@ class WorkspaceMiddleware:
     async def check_user_type_match(self, user_id: str, workspace_type: str) -> bool:
         """检查用户类型是否与工作台类型匹配"""
         try:
-            # 获取数据库连接
-            db = next(get_db())
-            
-            # 查询用户的account_type
-            result = await db.execute(
-                select(User.account_type)
-                .where(User.id == user_id)
-            )
-            
-            user_account_type = result.scalar_one_or_none()
-            
-            # 匹配规则
-            type_mapping = {
-                'user': ['user'],
-                'lawyer': ['lawyer', 'lawyer_pending'],
-                'admin': ['admin']
-            }
-            
-            allowed_types = type_mapping.get(workspace_type, [])
-            return user_account_type in allowed_types
+            authorization = await self.get_workspace_authorization(user_id)
+            return authorization is not None and authorization.matches_workspace_type(workspace_type)
             
         except Exception as e:
             logger.error("检查用户类型匹配失败", error=str(e), user_id=user_id, workspace_type=workspace_type)
@@ -4,8 +4,8 @@
 """
 
 from sqlalchemy import Column, String, DateTime, Boolean, ForeignKey, Text, Integer, Enum as SQLEnum, Numeric
-from sqlalchemy.dialects.postgresql import UUID
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import UUID, TSVECTOR
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 import uuid
 import enum
@@ -55,6 +55,10 @@ class Case(Base):
     debtor_email = Column(String(255), nullable=True)
     debtor_address = Column(Text, nullable=True)
     debtor_info = Column(Text, nullable=False)  # 债务人信息JSON (字符串)
+    debtor_id_number = Column(String(30), nullable=True)  # 证件号（由触发器从 debtor_info 提取）
+    
+    # 关键词检索向量（由触发器维护，列表查询不加载）
+    search_vector = deferred(Column(TSVECTOR, nullable=True))
     
     # 债务信息
     debt_amount = Column(Numeric(15, 2), nullable=False)
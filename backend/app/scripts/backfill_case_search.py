@@ -0,0 +1,39 @@
+#!/usr/bin/env python3
+"""
+回填案件搜索向量
+执行 migrations/020_case_search.sql 后运行，分批为已有案件生成 search_vector 和债务人提取字段，
+可随时中断，重新运行会从未回填的行继续
+"""
+
+import argparse
+import asyncio
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.database import AsyncSessionLocal
+from app.services.case_search import CaseSearchBackfill
+
+
+async def main(args):
+    backfill = CaseSearchBackfill(batch_size=args.batch_size, pause_seconds=args.pause)
+
+    async with AsyncSessionLocal() as db:
+        print(f"待回填案件: {await backfill.pending_count(db)}")
+
+    def report(batch: int, total: int):
+        if batch % 10 == 0:
+            print(f"已完成 {batch} 批, {total} 行")
+
+    result = await backfill.run(AsyncSessionLocal, max_batches=args.max_batches, progress=report)
+    print(f"回填完成: {result['batches']} 批, {result['updated']} 行, 剩余 {result['remaining']} 行")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="分批回填案件搜索向量")
+    parser.add_argument("--batch-size", type=int, default=1000, help="每批行数")
+    parser.add_argument("--pause", type=float, default=0.05, help="批次间停顿秒数")
+    parser.add_argument("--max-batches", type=int, default=None, help="本次最多执行的批数")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+日志表分区转换与维护
+执行 migrations/023_log_partitioning.sql 后运行：
+
+    python app/scripts/partition_logs.py status
+    python app/scripts/partition_logs.py convert --table access_logs      # 建分区表、同步触发器并分批复制
+    python app/scripts/partition_logs.py convert --table access_logs --cutover
+    python app/scripts/partition_logs.py drop-legacy --table access_logs  # 确认无误后删除原表
+    python app/scripts/partition_logs.py maintain                         # 预建分区并归档过期分区
+
+convert 可随时中断，重新运行从记录的进度继续；--cutover 在复制追上后短暂加锁交换表名
+"""
+
+import argparse
+import asyncio
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.database import AsyncSessionLocal
+from app.core.log_partitions import LogPartitionManager, PartitionConverter
+
+
+async def status(manager: LogPartitionManager, args):
+    async with AsyncSessionLocal() as db:
+        for spec in manager.specs.values():
+            converter = PartitionConverter(spec, manager)
+            partitioned = await manager.is_partitioned(db, spec.table)
+            progress = await converter.progress(db)
+            partitions = await manager.list_partitions(db, spec.table) if partitioned else []
+            state = progress['status'] if progress else ('partitioned' if partitioned else 'not converted')
+            copied = f", 已复制 {progress['copied_rows']} 行" if progress else ""
+            print(f"{spec.table:<22} {state:<14} 分区 {len(partitions)} 个{copied}")
+
+
+async def convert(manager: LogPartitionManager, args):
+    converter = PartitionConverter(
+        manager.specs[args.table], manager, batch_size=args.batch_size, pause_seconds=args.pause
+    )
+    async with AsyncSessionLocal() as db:
+        progress = await converter.progress(db)
+        if progress is None:
+            created = await converter.prepare(db)
+            print(f"分区表已创建: {len(created)} 个分区，已安装同步触发器")
+        elif progress['status'] != 'copying':
+            print(f"{args.table} 已切换（{progress['status']}）")
+            return
+
+    def report(batch: int, total: int):
+        if batch % 10 == 0:
+            print(f"已完成 {batch} 批, {total} 行")
+
+    result = await converter.copy(AsyncSessionLocal, max_batches=args.max_batches, progress=report)
+    print(f"复制完成: {result['batches']} 批, {result['copied']} 行")
+
+    async with AsyncSessionLocal() as db:
+        counts = await converter.verify(db)
+        print(f"校验: 原表 {counts['source']} 行, 分区表 {counts['target']} 行")
+        if args.cutover:
+            if args.max_batches is not None and result['batches'] >= args.max_batches:
+                print("复制尚未追上原表，未切换")
+                return
+            if counts['source'] != counts['target']:
+                print("行数不一致，未切换")
+                return
+            caught_up = await converter.cutover(db)
+            print(f"已切换为分区表（补齐 {caught_up} 行），原表保留为 {converter.legacy_table}")
+
+
+async def drop_legacy(manager: LogPartitionManager, args):
+    converter = PartitionConverter(manager.specs[args.table], manager)
+    async with AsyncSessionLocal() as db:
+        progress = await converter.progress(db)
+        if not progress or progress['status'] != 'cut_over':
+            print(f"{args.table} 尚未切换，不能删除原表")
+            return
+        await converter.drop_legacy(db)
+        print(f"已删除 {converter.legacy_table}")
+
+
+async def maintain(manager: LogPartitionManager, args):
+    summary = await manager.maintain(AsyncSessionLocal)
+    print(f"新建分区: {len(summary['created'])}, 分离: {len(summary['detached'])}, 归档: {len(summary['archived'])}")
+    for archived in summary['archived']:
+        print(f"  {archived['partition']}: {archived['rows']} 行 -> {archived['path']}")
+    if summary['skipped_tables']:
+        print(f"未转换的表: {', '.join(summary['skipped_tables'])}")
+
+
+COMMANDS = {
+    'status': status,
+    'convert': convert,
+    'drop-legacy': drop_legacy,
+    'maintain': maintain,
+}
+
+
+if __name__ == "__main__":
+    manager = LogPartitionManager()
+    parser = argparse.ArgumentParser(description="日志表分区转换与维护")
+    parser.add_argument("command", choices=list(COMMANDS))
+    parser.add_argument("--table", choices=list(manager.specs), help="convert / drop-legacy 的目标表")
+    parser.add_argument("--batch-size", type=int, default=10000, help="每批复制的行数")
+    parser.add_argument("--pause", type=float, default=0.05, help="批次间停顿秒数")
+    parser.add_argument("--max-batches", type=int, default=None, help="本次最多复制的批数")
+    parser.add_argument("--cutover", action="store_true", help="复制完成且校验一致后切换表名")
+    args = parser.parse_args()
+    if args.command in ('convert', 'drop-legacy') and not args.table:
+        parser.error(f"{args.command} 需要 --table")
+    asyncio.run(COMMANDS[args.command](manager, args))
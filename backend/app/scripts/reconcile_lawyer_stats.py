@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+"""
+律师业绩统计全量重算
+执行 migrations/024_lawyer_stats.sql 后运行一次建立 lawyer_stats；之后由后台任务增量维护，
+也可在批量导入案件或修数据后手动运行。等待正在进行的校准结束后再执行，重复运行结果不变
+"""
+
+import argparse
+import asyncio
+import sys
+import os
+
+# 添加项目根目录到 Python 路径
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.core.database import AsyncSessionLocal
+from app.services.lawyer_stats import LawyerStatsRefresher
+
+
+async def main(args):
+    refresher = LawyerStatsRefresher(batch_size=args.batch_size)
+    result = await refresher.reconcile(AsyncSessionLocal, wait=True)
+    print(f"全量重算完成: {result['lawyers']} 位律师, 用时 {refresher.stats['last_reconcile_seconds']}s")
+
+    refreshed = await refresher.refresh_dirty(AsyncSessionLocal)
+    print(f"处理待更新队列: {refreshed} 位律师")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="全量重算律师业绩统计")
+    parser.add_argument("--batch-size", type=int, default=500, help="每个事务重算的律师数")
+    asyncio.run(main(parser.parse_args()))
@@ -6,13 +6,14 @@ import uuid
 from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, or_
+from sqlalchemy import select, and_, or_
 from fastapi import HTTPException
 
 from app.models.user import User
 from app.models.case import Case
 from app.models.statistics import TaskPublishRecord
 from app.core.config import settings
+from app.services.lawyer_stats import load_lawyer_stats
 
 
 class AIAssignmentService:
@@ -104,36 +105,13 @@ class AIAssignmentService:
         result = await self.db.execute(query)
         lawyers = result.scalars().all()
         
-        # 获取律师工作负载和统计信息
+        # 获取律师工作负载和统计信息：一次读取 lawyer_stats，不再逐个律师查询案件
+        lawyer_stats = await load_lawyer_stats(self.db, [lawyer.id for lawyer in lawyers])
         lawyer_data = []
         for lawyer in lawyers:
-            # 获取当前案件数
-            current_cases_query = select(func.count(Case.id)).where(
-                and_(
-                    Case.lawyer_id == lawyer.id,
-                    Case.status.in_(["pending", "in_progress", "review"])
-                )
-            )
-            current_cases_result = await self.db.execute(current_cases_query)
-            current_cases = current_cases_result.scalar() or 0
-            
-            # 获取成功率（最近30天）
-            thirty_days_ago = datetime.now() - timedelta(days=30)
-            success_rate_query = select(
-                func.count(Case.id).filter(Case.status == "completed").label("completed"),
-                func.count(Case.id).label("total")
-            ).where(
-                and_(
-                    Case.lawyer_id == lawyer.id,
-                    Case.created_at >= thirty_days_ago
-                )
-            )
-            success_result = await self.db.execute(success_rate_query)
-            success_data = success_result.first()
-            
-            success_rate = 0.0
-            if success_data and success_data.total > 0:
-                success_rate = success_data.completed / success_data.total
+            stats = lawyer_stats[str(lawyer.id)]
+            current_cases = stats["active_cases"]
+            success_rate = float(stats["success_rate_30d"])
             
             lawyer_data.append({
                 "id": lawyer.id,
@@ -3,15 +3,15 @@
 自动响应和处理各种监控告警
 """
 import asyncio
+import copy
 import json
 import time
-from typing import Dict, List, Any, Optional, Callable
+from typing import Dict, List, Any, Optional, Callable, Set
 from datetime import datetime, timedelta
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, asdict, field
 from enum import Enum
-import re
 from app.core.logging import get_logger
-from app.services.alert_manager import AlertManager
+from app.services.alert_rule_index import AlertRuleIndex, CompiledRule
 from app.services.notification_channels import NotificationManager
 from app.services.health_monitor import health_monitor
 
@@ -49,82 +49,17 @@ class AutomationRule:
     cooldown_minutes: int = 30  # 冷却时间（分钟）
     max_executions_per_hour: int = 5  # 每小时最大执行次数
     priority: int = 1  # 优先级（1-10，数字越大优先级越高）
+    max_concurrent_actions: int = 1  # 单条规则内同时执行的动作数（1表示按顺序执行）
+    # 编译后的条件及编译时的条件快照（条件变化后重新编译）
+    _compiled: Optional[CompiledRule] = field(default=None, init=False, repr=False, compare=False)
+    _compiled_conditions: Optional[Dict[str, Any]] = field(default=None, init=False, repr=False, compare=False)
     
     def matches_alert(self, alert_data: Dict[str, Any]) -> bool:
         """检查告警是否匹配规则条件"""
-        try:
-            for condition_key, condition_value in self.conditions.items():
-                if condition_key not in alert_data:
-                    return False
-                
-                alert_value = alert_data[condition_key]
-                
-                # 支持不同类型的条件匹配
-                if isinstance(condition_value, dict):
-                    # 复杂条件匹配
-                    if not self._match_complex_condition(alert_value, condition_value):
-                        return False
-                elif isinstance(condition_value, str):
-                    # 字符串匹配（支持正则表达式）
-                    if not self._match_string_condition(str(alert_value), condition_value):
-                        return False
-                else:
-                    # 直接匹配
-                    if alert_value != condition_value:
-                        return False
-            
-            return True
-            
-        except Exception as e:
-            logger.error(f"Error matching rule {self.id}: {str(e)}")
-            return False
-    
-    def _match_complex_condition(self, alert_value: Any, condition: Dict[str, Any]) -> bool:
-        """匹配复杂条件"""
-        operator = condition.get("operator", "eq")
-        value = condition.get("value")
-        
-        try:
-            if operator == "eq":
-                return alert_value == value
-            elif operator == "ne":
-                return alert_value != value
-            elif operator == "gt":
-                return float(alert_value) > float(value)
-            elif operator == "gte":
-                return float(alert_value) >= float(value)
-            elif operator == "lt":
-                return float(alert_value) < float(value)
-            elif operator == "lte":
-                return float(alert_value) <= float(value)
-            elif operator == "contains":
-                return str(value) in str(alert_value)
-            elif operator == "regex":
-                return bool(re.search(str(value), str(alert_value)))
-            elif operator == "in":
-                return alert_value in value
-            else:
-                logger.warning(f"Unknown operator: {operator}")
-                return False
-                
-        except (ValueError, TypeError) as e:
-            logger.error(f"Error in complex condition matching: {str(e)}")
-            return False
-    
-    def _match_string_condition(self, alert_value: str, condition: str) -> bool:
-        """匹配字符串条件"""
-        # 如果条件以regex:开头，使用正则表达式匹配
-        if condition.startswith("regex:"):
-            pattern = condition[6:]  # 移除"regex:"前缀
-            return bool(re.search(pattern, alert_value))
-        
-        # 如果条件包含通配符，转换为正则表达式
-        if "*" in condition or "?" in condition:
-            pattern = condition.replace("*", ".*").replace("?", ".")
-            return bool(re.match(pattern, alert_value))
-        
-        # 直接字符串匹配
-        return alert_value == condition
+        if self._compiled is None or self.conditions != self._compiled_conditions:
+            self._compiled = CompiledRule(self)
+            self._compiled_conditions = copy.deepcopy(self.conditions)
+        return self._compiled.matches(alert_data)
 
 @dataclass
 class ActionExecution:
@@ -161,6 +96,23 @@ class AlertAutomationEngine:
         self.is_running = False
         self.processing_task = None
         
+        # 规则索引（规则变更后延迟重建）
+        self._rule_index = AlertRuleIndex()
+        self._index_dirty = True
+        
+        # 推送式告警队列与批处理参数
+        self.queue_max_size = 10000
+        self.batch_size = 200
+        self.batch_wait_seconds = 0.05
+        self._alert_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_max_size)
+        self.dropped_alerts = 0
+        
+        # 动作并发控制
+        self.max_concurrent_rules = 20
+        self._global_semaphore = asyncio.Semaphore(self.max_concurrent_rules)
+        self._rule_semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._inflight_tasks: Set[asyncio.Task] = set()
+        
         # 初始化默认规则
         self._initialize_default_rules()
     
@@ -358,55 +310,124 @@ class AlertAutomationEngine:
             except asyncio.CancelledError:
                 pass
         
+        # 等待正在执行的动作结束
+        if self._inflight_tasks:
+            await asyncio.gather(*self._inflight_tasks, return_exceptions=True)
+        
         logger.info("Alert automation engine stopped")
     
-    async def _processing_loop(self):
-        """处理循环"""
-        alert_manager = AlertManager()
+    def submit_alert(self, alert_data: Dict[str, Any]) -> bool:
+        """
+        推送告警到处理队列（非阻塞）
+        
+        Returns:
+            是否成功入队；引擎未运行或队列已满时返回False
+        """
+        if not self.is_running:
+            return False
+        
+        try:
+            self._alert_queue.put_nowait(alert_data)
+            return True
+        except asyncio.QueueFull:
+            self.dropped_alerts += 1
+            logger.warning(f"Alert queue full, dropped alert: {alert_data.get('id', 'unknown')}")
+            return False
+    
+    async def _next_batch(self) -> List[Dict[str, Any]]:
+        """等待第一条告警，然后在批处理窗口内尽量多取"""
+        batch = [await self._alert_queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.batch_wait_seconds
+        
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._alert_queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._alert_queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
         
+        return batch
+    
+    async def _processing_loop(self):
+        """处理循环：消费推送的告警，按批分发"""
         while self.is_running:
             try:
-                # 获取未处理的告警
-                alerts = await alert_manager.get_unprocessed_alerts()
-                
-                for alert in alerts:
-                    await self._process_alert(alert)
-                
-                # 等待下次处理
-                await asyncio.sleep(10)  # 10秒检查一次
+                batch = await self._next_batch()
+                await self._process_batch(batch)
                 
             except asyncio.CancelledError:
                 break
             except Exception as e:
                 logger.error(f"Alert processing loop error: {str(e)}")
-                await asyncio.sleep(30)  # 出错时等待更长时间
+                await asyncio.sleep(1)
+    
+    def _get_rule_index(self) -> AlertRuleIndex:
+        """获取规则索引，规则变更后重建"""
+        if self._index_dirty:
+            self._rule_index.rebuild(list(self.rules.values()))
+            self._index_dirty = False
+        return self._rule_index
+    
+    def match_rules(self, alert_data: Dict[str, Any]) -> List[AutomationRule]:
+        """查找匹配告警的已启用规则（按优先级从高到低）"""
+        return self._get_rule_index().match(alert_data)
+    
+    async def _process_batch(self, alerts: List[Dict[str, Any]]):
+        """处理一批告警：匹配规则并并发分发执行"""
+        for alert_data in alerts:
+            try:
+                matching_rules = self.match_rules(alert_data)
+                
+                if not matching_rules:
+                    logger.debug(f"No matching rules for alert: {alert_data.get('id', 'unknown')}")
+                    continue
+                
+                for rule in matching_rules:
+                    if await self._can_execute_rule(rule):
+                        self._dispatch_rule(rule, alert_data)
+                    else:
+                        logger.info(f"Rule {rule.id} skipped due to cooldown or rate limit")
+            
+            except Exception as e:
+                logger.error(f"Error processing alert: {str(e)}")
+    
+    def _dispatch_rule(self, rule: AutomationRule, alert_data: Dict[str, Any]) -> asyncio.Task:
+        """登记执行并在后台任务中运行规则动作"""
+        # 在分发时立即登记，保证冷却和频率限制对并发告警生效
+        self._record_rule_execution(rule)
+        
+        task = asyncio.create_task(self._run_rule_actions(rule, alert_data))
+        self._inflight_tasks.add(task)
+        task.add_done_callback(self._inflight_tasks.discard)
+        return task
     
     async def _process_alert(self, alert_data: Dict[str, Any]):
         """处理单个告警"""
         try:
-            # 查找匹配的规则
-            matching_rules = []
-            
-            for rule in self.rules.values():
-                if not rule.enabled:
-                    continue
-                
-                if rule.matches_alert(alert_data):
-                    matching_rules.append(rule)
+            matching_rules = self.match_rules(alert_data)
             
             if not matching_rules:
                 logger.debug(f"No matching rules for alert: {alert_data.get('id', 'unknown')}")
                 return
             
-            # 按优先级排序
-            matching_rules.sort(key=lambda r: r.priority, reverse=True)
-            
-            # 执行匹配的规则
+            tasks = []
             for rule in matching_rules:
                 if await self._can_execute_rule(rule):
-                    await self._execute_rule(rule, alert_data)
+                    tasks.append(self._dispatch_rule(rule, alert_data))
                 else:
                     logger.info(f"Rule {rule.id} skipped due to cooldown or rate limit")
+            
+            if tasks:
+                await asyncio.gather(*tasks, return_exceptions=True)
         
         except Exception as e:
             logger.error(f"Error processing alert: {str(e)}")
@@ -430,27 +451,51 @@ class AlertAutomationEngine:
                 exec_time for exec_time in self.rule_execution_count[rule.id]
                 if exec_time > hour_ago
             ]
+            self.rule_execution_count[rule.id] = recent_executions
             
             if len(recent_executions) >= rule.max_executions_per_hour:
                 return False
         
         return True
     
-    async def _execute_rule(self, rule: AutomationRule, alert_data: Dict[str, Any]):
-        """执行规则"""
-        logger.info(f"Executing rule: {rule.name}")
-        
-        # 记录执行时间
+    def _record_rule_execution(self, rule: AutomationRule):
+        """记录规则执行时间"""
         now = datetime.now()
         self.last_execution_time[rule.id] = now
         
         if rule.id not in self.rule_execution_count:
             self.rule_execution_count[rule.id] = []
         self.rule_execution_count[rule.id].append(now)
-        
-        # 执行所有动作
-        for action_config in rule.actions:
-            await self._execute_action(rule.id, action_config, alert_data)
+    
+    async def _execute_rule(self, rule: AutomationRule, alert_data: Dict[str, Any]):
+        """执行规则"""
+        self._record_rule_execution(rule)
+        await self._run_rule_actions(rule, alert_data)
+    
+    async def _run_rule_actions(self, rule: AutomationRule, alert_data: Dict[str, Any]):
+        """在全局和规则级并发限制下执行规则的所有动作"""
+        async with self._global_semaphore:
+            logger.info(f"Executing rule: {rule.name}")
+            
+            if rule.max_concurrent_actions <= 1:
+                # 按配置顺序执行（如先重启再通知）
+                for action_config in rule.actions:
+                    await self._execute_action(rule.id, action_config, alert_data)
+                return
+            
+            semaphore = self._rule_semaphores.get(rule.id)
+            if semaphore is None:
+                semaphore = asyncio.Semaphore(rule.max_concurrent_actions)
+                self._rule_semaphores[rule.id] = semaphore
+            
+            async def run_limited(action_config: Dict[str, Any]):
+                async with semaphore:
+                    await self._execute_action(rule.id, action_config, alert_data)
+            
+            await asyncio.gather(
+                *(run_limited(action_config) for action_config in rule.actions),
+                return_exceptions=True
+            )
     
     async def _execute_action(self, rule_id: str, action_config: Dict[str, Any], alert_data: Dict[str, Any]):
         """执行单个动作"""
@@ -517,8 +562,11 @@ class AlertAutomationEngine:
         elif service == "application":
             # 重启应用程序（这里只是示例，实际需要根据部署方式实现）
             import subprocess
-            result = subprocess.run(["systemctl", "restart", "lawsker-backend"], 
-                                  capture_output=True, text=True)
+            # 在线程中执行，避免阻塞事件循环影响其他并发动作
+            result = await asyncio.to_thread(
+                subprocess.run, ["systemctl", "restart", "lawsker-backend"],
+                capture_output=True, text=True
+            )
             
             if result.returncode == 0:
                 return {"message": "Application service restarted"}
@@ -637,7 +685,8 @@ class AlertAutomationEngine:
         
         import subprocess
         
-        result = subprocess.run(
+        result = await asyncio.to_thread(
+            subprocess.run,
             script,
             shell=True,
             capture_output=True,
@@ -657,12 +706,16 @@ class AlertAutomationEngine:
     def add_rule(self, rule: AutomationRule):
         """添加自动化规则"""
         self.rules[rule.id] = rule
+        self._rule_semaphores.pop(rule.id, None)
+        self._index_dirty = True
         logger.info(f"Added automation rule: {rule.name}")
     
     def remove_rule(self, rule_id: str):
         """移除自动化规则"""
         if rule_id in self.rules:
             del self.rules[rule_id]
+            self._rule_semaphores.pop(rule_id, None)
+            self._index_dirty = True
             logger.info(f"Removed automation rule: {rule_id}")
     
     def get_rule(self, rule_id: str) -> Optional[AutomationRule]:
@@ -723,7 +776,11 @@ class AlertAutomationEngine:
             "success_rate": (successful_executions / total_executions * 100) if total_executions > 0 else 0,
             "rule_statistics": rule_stats,
             "action_statistics": action_stats,
-            "is_running": self.is_running
+            "is_running": self.is_running,
+            "queue_size": self._alert_queue.qsize(),
+            "dropped_alerts": self.dropped_alerts,
+            "inflight_rule_executions": len(self._inflight_tasks),
+            "rule_index": self._get_rule_index().get_statistics()
         }
 
 # 全局告警自动化引擎实例
@@ -153,6 +153,10 @@ class AlertManager:
             # 记录告警历史
             await self._record_alert_history(alert)
             
+            # 推送给告警自动化引擎（延迟导入避免循环依赖）
+            from app.services.alert_automation import alert_automation
+            alert_automation.submit_alert(alert.to_dict())
+            
             logger.info(f"处理告警完成: {alert.name} ({alert.severity})")
             return True
             
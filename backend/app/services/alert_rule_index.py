@@ -0,0 +1,270 @@
+"""
+告警规则索引
+将自动化规则的触发条件预编译，并按告警名称、严重级别和标签值建立倒排索引，
+告警到达时只需评估候选规则，避免对所有规则逐条做正则/复杂条件匹配
+"""
+import re
+from enum import Enum
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+# 缺失值哨兵
+_MISSING = object()
+
+# 可作为索引维度的条件键及其优先级（数字越小越优先，选择性越高）
+_NAME_KEYS = ("alertname", "alert_name", "name")
+_INDEX_KEY_PRIORITY = {
+    **{key: 0 for key in _NAME_KEYS},
+    "component": 2,
+    "service": 2,
+    "severity": 3,
+    "status": 4,
+}
+_LABEL_KEY_PRIORITY = 1
+
+Predicate = Callable[[Any], bool]
+
+
+def resolve_alert_value(alert_data: Dict[str, Any], key: str) -> Any:
+    """
+    读取告警字段值
+
+    优先按原始键读取；键不存在且包含"."时按路径逐级读取嵌套字典，
+    例如"metrics.memory_percent"、"labels.instance"
+    """
+    if key in alert_data:
+        return alert_data[key]
+
+    if "." not in key:
+        return _MISSING
+
+    value: Any = alert_data
+    for part in key.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _scalar(value: Any) -> Any:
+    """
+    告警值规整为普通值：告警按 asdict 序列化时保留 AlertSeverity/AlertStatus 等枚举成员，
+    str(成员) 得到的是 "AlertSeverity.WARNING" 而不是 "warning"
+    """
+    return value.value if isinstance(value, Enum) else value
+
+
+def _compile_complex_condition(condition: Dict[str, Any]) -> Predicate:
+    """预编译复杂条件（operator/value）"""
+    operator = condition.get("operator", "eq")
+    value = condition.get("value")
+
+    def _numeric(compare: Callable[[float, float], bool]) -> Predicate:
+        def predicate(alert_value: Any) -> bool:
+            try:
+                return compare(float(alert_value), float(value))
+            except (ValueError, TypeError):
+                return False
+        return predicate
+
+    if operator == "eq":
+        return lambda alert_value: alert_value == value
+    if operator == "ne":
+        return lambda alert_value: alert_value != value
+    if operator == "gt":
+        return _numeric(lambda a, b: a > b)
+    if operator == "gte":
+        return _numeric(lambda a, b: a >= b)
+    if operator == "lt":
+        return _numeric(lambda a, b: a < b)
+    if operator == "lte":
+        return _numeric(lambda a, b: a <= b)
+    if operator == "contains":
+        needle = str(value)
+        return lambda alert_value: needle in str(alert_value)
+    if operator == "regex":
+        try:
+            pattern = re.compile(str(value))
+        except re.error as e:
+            logger.error(f"Invalid regex in condition: {value} ({str(e)})")
+            return lambda alert_value: False
+        return lambda alert_value: bool(pattern.search(str(alert_value)))
+    if operator == "in":
+        def predicate(alert_value: Any) -> bool:
+            try:
+                return alert_value in value
+            except TypeError:
+                return False
+        return predicate
+
+    logger.warning(f"Unknown operator: {operator}")
+    return lambda alert_value: False
+
+
+def _compile_string_condition(condition: str) -> Predicate:
+    """预编译字符串条件（支持regex:前缀和*/?通配符）"""
+    try:
+        if condition.startswith("regex:"):
+            pattern = re.compile(condition[6:])
+            return lambda alert_value: bool(pattern.search(str(_scalar(alert_value))))
+
+        if "*" in condition or "?" in condition:
+            pattern = re.compile(condition.replace("*", ".*").replace("?", "."))
+            return lambda alert_value: bool(pattern.match(str(_scalar(alert_value))))
+    except re.error as e:
+        logger.error(f"Invalid pattern in condition: {condition} ({str(e)})")
+        return lambda alert_value: False
+
+    return lambda alert_value: str(_scalar(alert_value)) == condition
+
+
+def _exact_index_values(condition: Any) -> Optional[Tuple[str, ...]]:
+    """
+    返回可用于索引的精确匹配值
+
+    只有能确定"匹配 => str(规整后的告警值) 属于这些值"的条件才参与索引，
+    其余条件（正则、通配符、数值比较等）只在候选规则上评估
+    """
+    if isinstance(condition, str):
+        if condition.startswith("regex:") or "*" in condition or "?" in condition:
+            return None
+        return (condition,)
+
+    if isinstance(condition, dict):
+        operator = condition.get("operator", "eq")
+        value = condition.get("value")
+        if operator == "eq" and isinstance(value, str):
+            return (value,)
+        if (
+            operator == "in"
+            and isinstance(value, (list, tuple, set))
+            and value
+            and all(isinstance(item, str) for item in value)
+        ):
+            return tuple(value)
+
+    return None
+
+
+def _index_key_priority(key: str) -> Optional[int]:
+    """条件键的索引优先级，不可索引时返回None"""
+    if key in _INDEX_KEY_PRIORITY:
+        return _INDEX_KEY_PRIORITY[key]
+    if key.startswith("labels."):
+        return _LABEL_KEY_PRIORITY
+    return None
+
+
+class CompiledRule:
+    """预编译后的规则条件"""
+
+    __slots__ = ("rule", "sequence", "predicates", "index_key", "index_values")
+
+    def __init__(self, rule: Any, sequence: int = 0):
+        self.rule = rule
+        self.sequence = sequence
+        self.predicates: List[Tuple[str, Predicate]] = []
+        self.index_key: Optional[str] = None
+        self.index_values: Tuple[str, ...] = ()
+
+        best_priority: Optional[int] = None
+        for key, condition in rule.conditions.items():
+            if isinstance(condition, dict):
+                predicate = _compile_complex_condition(condition)
+            elif isinstance(condition, str):
+                predicate = _compile_string_condition(condition)
+            else:
+                predicate = (lambda expected: lambda alert_value: alert_value == expected)(condition)
+            self.predicates.append((key, predicate))
+
+            priority = _index_key_priority(key)
+            if priority is None:
+                continue
+            values = _exact_index_values(condition)
+            if values is None:
+                continue
+            if best_priority is None or priority < best_priority:
+                best_priority = priority
+                self.index_key = key
+                self.index_values = values
+
+    def matches(self, alert_data: Dict[str, Any]) -> bool:
+        """评估所有条件"""
+        try:
+            for key, predicate in self.predicates:
+                value = resolve_alert_value(alert_data, key)
+                if value is _MISSING or not predicate(value):
+                    return False
+            return True
+        except Exception as e:
+            logger.error(f"Error matching rule {getattr(self.rule, 'id', '?')}: {str(e)}")
+            return False
+
+
+class AlertRuleIndex:
+    """告警规则倒排索引"""
+
+    def __init__(self, rules: Sequence[Any] = ()):
+        # 索引维度 -> 精确值 -> 候选规则
+        self._buckets: Dict[str, Dict[str, List[CompiledRule]]] = {}
+        # 无法建立索引的规则，每条告警都需要评估
+        self._unindexed: List[CompiledRule] = []
+        self._size = 0
+        self.rebuild(rules)
+
+    def rebuild(self, rules: Sequence[Any]):
+        """根据规则列表重建索引"""
+        buckets: Dict[str, Dict[str, List[CompiledRule]]] = {}
+        unindexed: List[CompiledRule] = []
+
+        for sequence, rule in enumerate(rules):
+            compiled = CompiledRule(rule, sequence)
+            if compiled.index_key is None:
+                unindexed.append(compiled)
+                continue
+            value_map = buckets.setdefault(compiled.index_key, {})
+            for value in compiled.index_values:
+                value_map.setdefault(value, []).append(compiled)
+
+        self._buckets = buckets
+        self._unindexed = unindexed
+        self._size = len(rules)
+
+    def candidates(self, alert_data: Dict[str, Any]) -> List[CompiledRule]:
+        """返回可能匹配该告警的候选规则"""
+        candidates: Dict[int, CompiledRule] = {}
+
+        for key, value_map in self._buckets.items():
+            value = resolve_alert_value(alert_data, key)
+            if value is _MISSING:
+                continue
+            for compiled in value_map.get(str(_scalar(value)), ()):
+                candidates[compiled.sequence] = compiled
+
+        for compiled in self._unindexed:
+            candidates[compiled.sequence] = compiled
+
+        return list(candidates.values())
+
+    def match(self, alert_data: Dict[str, Any]) -> List[Any]:
+        """返回匹配的已启用规则，按优先级从高到低排序"""
+        matched = [
+            compiled for compiled in self.candidates(alert_data)
+            if compiled.rule.enabled and compiled.matches(alert_data)
+        ]
+        matched.sort(key=lambda c: (-c.rule.priority, c.sequence))
+        return [compiled.rule for compiled in matched]
+
+    def get_statistics(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        return {
+            "total_rules": self._size,
+            "indexed_rules": self._size - len(self._unindexed),
+            "unindexed_rules": len(self._unindexed),
+            "index_keys": {
+                key: len(value_map) for key, value_map in self._buckets.items()
+            },
+        }
@@ -1,6 +1,7 @@
 """
 访问分析数据聚合服务
-定期统计access_logs数据并更新daily_statistics表
+访问数据由指标汇总表（metric_rollups_daily）提供，概览直接读取汇总结果；
+aggregate_daily_stats 重算指定日期的汇总并同步到daily_statistics表
 """
 
 import logging
@@ -11,49 +12,40 @@ from sqlalchemy import text, func
 import asyncio
 
 from app.core.database import AsyncSessionLocal
+from app.services.metric_rollups import load_daily_rollup, metric_rollup_engine
 
 logger = logging.getLogger(__name__)
 
 
 async def aggregate_daily_stats(target_date: Optional[date] = None) -> Dict[str, Any]:
-    """聚合指定日期的访问统计数据"""
+    """重算指定日期的指标汇总，并同步到daily_statistics表"""
     if target_date is None:
         target_date = date.today()
     
     async with AsyncSessionLocal() as db:
         try:
-            # 统计当日访问数据
-            stats_query = text("""
-                SELECT 
-                    COUNT(*) as total_pv,
-                    COUNT(DISTINCT session_id) as total_uv,
-                    COUNT(DISTINCT ip_address) as unique_ips,
-                    COUNT(CASE WHEN device_type = 'mobile' THEN 1 END) as mobile_visits,
-                    COUNT(CASE WHEN device_type = 'desktop' THEN 1 END) as desktop_visits,
-                    AVG(response_time) as avg_response_time
-                FROM access_logs 
-                WHERE DATE(created_at) = :target_date
-            """)
-            
-            result = await db.execute(stats_query, {"target_date": target_date})
-            row = result.fetchone()
+            # 按 created_at 范围重算当天汇总（可走索引），再从天汇总取值
+            day_start = datetime.combine(target_date, datetime.min.time())
+            await metric_rollup_engine.aggregate_range(db, day_start, day_start + timedelta(days=1))
+            rollup = await load_daily_rollup(db, target_date)
             
-            if not row:
-                logger.warning(f"没有找到 {target_date} 的访问数据")
+            if not rollup:
+                logger.warning(f"没有找到 {target_date} 的汇总数据")
                 return {}
             
+            latency_count = rollup["latency_count"] or 0
             stats_data = {
                 "stat_date": target_date,
-                "total_pv": row[0] or 0,
-                "total_uv": row[1] or 0,
-                "unique_ips": row[2] or 0,
-                "mobile_visits": row[3] or 0,
-                "desktop_visits": row[4] or 0,
-                "avg_response_time": int(row[5]) if row[5] else 0,
+                "total_pv": rollup["pv"],
+                "total_uv": rollup["uv"],
+                "unique_ips": rollup["unique_ips"],
+                "mobile_visits": rollup["mobile_visits"],
+                "desktop_visits": rollup["desktop_visits"],
+                "avg_response_time": int(rollup["latency_sum_ms"] / latency_count) if latency_count else 0,
                 "bounce_rate": 0.0,
-                "new_users": 0,
+                "new_users": rollup["signups"],
                 "new_lawyers": 0,
-                "total_revenue": 0.0
+                "total_revenue": float(rollup["revenue"] or 0)
             }
             
             # 更新或插入daily_statistics表
@@ -98,29 +90,9 @@ async def get_analytics_overview(target_date: Optional[date] = None) -> Dict[str
     
     async with AsyncSessionLocal() as db:
         try:
-            # 先尝试聚合今日数据
-            await aggregate_daily_stats(target_date)
-            
-            # 获取今日统计
-            today_query = text("""
-                SELECT total_pv, total_uv, unique_ips, mobile_visits, desktop_visits
-                FROM daily_statistics 
-                WHERE stat_date = :target_date
-            """)
-            
-            result = await db.execute(today_query, {"target_date": target_date})
-            today_row = result.fetchone()
-            
-            # 获取昨日统计用于计算增长
-            yesterday = target_date - timedelta(days=1)
-            yesterday_query = text("""
-                SELECT total_pv, total_uv, unique_ips 
-                FROM daily_statistics 
-                WHERE stat_date = :yesterday
-            """)
-            
-            yesterday_result = await db.execute(yesterday_query, {"yesterday": yesterday})
-            yesterday_row = yesterday_result.fetchone()
+            # 读取后台维护的天汇总，不在请求中扫描访问日志
+            today_row = await load_daily_rollup(db, target_date)
+            yesterday_row = await load_daily_rollup(db, target_date - timedelta(days=1))
             
             if not today_row:
                 logger.warning(f"没有找到 {target_date} 的统计数据")
@@ -138,11 +110,11 @@ async def get_analytics_overview(target_date: Optional[date] = None) -> Dict[str
                     }
                 }
             
-            total_pv = today_row[0] or 0
-            total_uv = today_row[1] or 0
-            unique_ips = today_row[2] or 0
-            mobile_visits = today_row[3] or 0
-            desktop_visits = today_row[4] or 0
+            total_pv = today_row["pv"] or 0
+            total_uv = today_row["uv"] or 0
+            unique_ips = today_row["unique_ips"] or 0
+            mobile_visits = today_row["mobile_visits"] or 0
+            desktop_visits = today_row["desktop_visits"] or 0
             
             # 计算移动端占比
             total_visits = mobile_visits + desktop_visits
@@ -154,9 +126,9 @@ async def get_analytics_overview(target_date: Optional[date] = None) -> Dict[str
                     return 100.0 if current > 0 else 0.0
                 return round(((current - previous) / previous) * 100, 1)
             
-            prev_pv = yesterday_row[0] if yesterday_row else 0
-            prev_uv = yesterday_row[1] if yesterday_row else 0
-            prev_ips = yesterday_row[2] if yesterday_row else 0
+            prev_pv = yesterday_row["pv"] if yesterday_row else 0
+            prev_uv = yesterday_row["uv"] if yesterday_row else 0
+            prev_ips = yesterday_row["unique_ips"] if yesterday_row else 0
             
             return {
                 "todayPV": total_pv,
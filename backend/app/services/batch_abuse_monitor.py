@@ -1,8 +1,12 @@
 """
 批量任务滥用监控服务
 实现滥用检测、统计分析、90%减少目标跟踪
+检测和指标读取由 batch_upload_tasks 上的触发器增量维护的计数（migrations/027_batch_upload_abuse_counters.sql）：
+每用户小时计数桶按窗口相加，重复上传按文件内容哈希判定，滥用指标读取天汇总
 """
 
+import asyncio
+import hashlib
 import logging
 from datetime import datetime, date, timedelta
 from typing import Dict, Any, List, Optional, Tuple
@@ -12,12 +16,65 @@ import json
 from dataclasses import dataclass
 from enum import Enum
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text, and_, or_, func
 from fastapi import HTTPException
 
 logger = logging.getLogger(__name__)
 
+# 检测窗口（小时）和 batch_upload_user_hourly 中参与检测的计数列
+COUNTER_WINDOWS = {"1h": 1, "24h": 24, "7d": 24 * 7, "30d": 24 * 30}
+COUNTER_COLUMNS = ("uploads", "small_uploads", "failed_uploads", "suspicious_uploads", "files", "duplicate_files")
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def _window_weight(hours: int) -> str:
+    """小时桶落在最近 hours 小时内的比例：整桶在窗口内计1，跨窗口起点的桶按时间比例折算（滑动窗口计数）"""
+    return (
+        "LEAST(1.0, GREATEST(0.0, EXTRACT(EPOCH FROM bucket_start + INTERVAL '1 hour' "
+        f"- (CURRENT_TIMESTAMP - INTERVAL '{hours} hours')) / 3600.0))"
+    )
+
+
+def build_counters_query() -> str:
+    """一次查询取回用户所有窗口的计数，只读最长窗口内的小时桶（主键范围扫描）"""
+    weights = ", ".join(f"{_window_weight(hours)} AS w_{window}" for window, hours in COUNTER_WINDOWS.items())
+    sums = ",\n            ".join(
+        f"COALESCE(SUM({column} * w_{window}), 0) AS {column}_{window}"
+        for window in COUNTER_WINDOWS for column in COUNTER_COLUMNS
+    )
+    return f"""
+        SELECT {sums}
+        FROM (
+            SELECT *, {weights}
+            FROM batch_upload_user_hourly
+            WHERE user_id = :user_id
+            AND bucket_start > CURRENT_TIMESTAMP - INTERVAL '{max(COUNTER_WINDOWS.values()) + 1} hours'
+        ) buckets
+    """
+
+
+_COUNTERS_SQL = text(build_counters_query())
+
+
+async def hash_upload_files(files: List[Any]) -> List[str]:
+    """
+    计算上传文件内容的 SHA-256（十六进制），写入 batch_upload_tasks.content_hashes 用于重复检测
+    
+    分块读取，哈希计算放到线程中执行；读完后回到文件开头，后续处理可以再次读取
+    """
+    hashes = []
+    for file in files:
+        digest = hashlib.sha256()
+        while True:
+            chunk = await file.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            await asyncio.to_thread(digest.update, chunk)
+        await file.seek(0)
+        hashes.append(digest.hexdigest())
+    return hashes
+
 
 class AbuseLevel(Enum):
     """滥用等级"""
@@ -69,7 +126,7 @@ class BatchAbuseMonitor:
         self.BASELINE_ABUSE_RATE = 0.25  # 假设实施前25%的批量上传是滥用
         self.TARGET_REDUCTION = 0.90     # 目标减少90%
     
-    async def detect_abuse_patterns(self, user_id: UUID, db: Session) -> List[AbusePattern]:
+    async def detect_abuse_patterns(self, user_id: UUID, db: AsyncSession) -> List[AbusePattern]:
         """
         检测用户的滥用模式
         
@@ -81,25 +138,26 @@ class BatchAbuseMonitor:
             检测到的滥用模式列表
         """
         try:
+            counters = await self.get_user_counters(user_id, db)
             patterns = []
             
             # 1. 检测频率滥用
-            frequency_pattern = await self._detect_frequency_abuse(user_id, db)
+            frequency_pattern = self._detect_frequency_abuse(counters)
             if frequency_pattern:
                 patterns.append(frequency_pattern)
             
             # 2. 检测内容质量滥用
-            quality_pattern = await self._detect_quality_abuse(user_id, db)
+            quality_pattern = self._detect_quality_abuse(counters)
             if quality_pattern:
                 patterns.append(quality_pattern)
             
             # 3. 检测重复内容滥用
-            duplicate_pattern = await self._detect_duplicate_abuse(user_id, db)
+            duplicate_pattern = self._detect_duplicate_abuse(counters)
             if duplicate_pattern:
                 patterns.append(duplicate_pattern)
             
             # 4. 检测可疑文件名模式
-            filename_pattern = await self._detect_filename_abuse(user_id, db)
+            filename_pattern = await self._detect_filename_abuse(user_id, counters, db)
             if filename_pattern:
                 patterns.append(filename_pattern)
             
@@ -109,169 +167,115 @@ class BatchAbuseMonitor:
             logger.error(f"检测滥用模式失败: {str(e)}")
             return []
     
-    async def _detect_frequency_abuse(self, user_id: UUID, db: Session) -> Optional[AbusePattern]:
+    async def get_user_counters(self, user_id: UUID, db: AsyncSession) -> Dict[str, Dict[str, float]]:
+        """
+        读取用户各检测窗口的滚动计数
+        
+        Returns:
+            {窗口: {计数列: 值}}，窗口见 COUNTER_WINDOWS；跨窗口起点的小时桶按比例折算，值可能带小数
+        """
+        row = (await db.execute(_COUNTERS_SQL, {"user_id": str(user_id)})).mappings().one()
+        return {
+            window: {column: float(row[f"{column}_{window}"]) for column in COUNTER_COLUMNS}
+            for window in COUNTER_WINDOWS
+        }
+    
+    def _detect_frequency_abuse(self, counters: Dict[str, Dict[str, float]]) -> Optional[AbusePattern]:
         """检测频率滥用"""
-        try:
-            # 检查过去24小时的上传次数
-            query = text("""
-                SELECT COUNT(*) as daily_count,
-                       COUNT(CASE WHEN created_at > NOW() - INTERVAL '1 hour' THEN 1 END) as hourly_count
-                FROM batch_upload_tasks 
-                WHERE user_id = :user_id 
-                AND created_at > NOW() - INTERVAL '24 hours'
-            """)
-            
-            result = db.execute(query, {"user_id": str(user_id)}).fetchone()
-            
-            if not result:
-                return None
-            
-            daily_count, hourly_count = result
-            
-            # 判断是否超过阈值
-            if daily_count > self.ABUSE_THRESHOLDS['daily_upload_limit']:
-                return AbusePattern(
-                    pattern_type="frequency_abuse_daily",
-                    severity=AbuseLevel.HIGH,
-                    description=f"用户24小时内上传{daily_count}次，超过限制{self.ABUSE_THRESHOLDS['daily_upload_limit']}次",
-                    indicators={"daily_count": daily_count, "limit": self.ABUSE_THRESHOLDS['daily_upload_limit']},
-                    confidence_score=0.9
-                )
-            
-            if hourly_count > self.ABUSE_THRESHOLDS['hourly_upload_limit']:
-                return AbusePattern(
-                    pattern_type="frequency_abuse_hourly",
-                    severity=AbuseLevel.MEDIUM,
-                    description=f"用户1小时内上传{hourly_count}次，超过限制{self.ABUSE_THRESHOLDS['hourly_upload_limit']}次",
-                    indicators={"hourly_count": hourly_count, "limit": self.ABUSE_THRESHOLDS['hourly_upload_limit']},
-                    confidence_score=0.8
-                )
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"检测频率滥用失败: {str(e)}")
-            return None
+        daily_count = round(counters["24h"]["uploads"])
+        hourly_count = round(counters["1h"]["uploads"])
+        
+        # 判断是否超过阈值
+        if daily_count > self.ABUSE_THRESHOLDS['daily_upload_limit']:
+            return AbusePattern(
+                pattern_type="frequency_abuse_daily",
+                severity=AbuseLevel.HIGH,
+                description=f"用户24小时内上传{daily_count}次，超过限制{self.ABUSE_THRESHOLDS['daily_upload_limit']}次",
+                indicators={"daily_count": daily_count, "limit": self.ABUSE_THRESHOLDS['daily_upload_limit']},
+                confidence_score=0.9
+            )
+        
+        if hourly_count > self.ABUSE_THRESHOLDS['hourly_upload_limit']:
+            return AbusePattern(
+                pattern_type="frequency_abuse_hourly",
+                severity=AbuseLevel.MEDIUM,
+                description=f"用户1小时内上传{hourly_count}次，超过限制{self.ABUSE_THRESHOLDS['hourly_upload_limit']}次",
+                indicators={"hourly_count": hourly_count, "limit": self.ABUSE_THRESHOLDS['hourly_upload_limit']},
+                confidence_score=0.8
+            )
+        
+        return None
     
-    async def _detect_quality_abuse(self, user_id: UUID, db: Session) -> Optional[AbusePattern]:
-        """检测内容质量滥用"""
-        try:
-            # 检查最近上传的文件质量指标
-            query = text("""
-                SELECT 
-                    COUNT(*) as total_uploads,
-                    COUNT(CASE WHEN file_size < 1024 THEN 1 END) as small_files,
-                    COUNT(CASE WHEN error_records > success_records THEN 1 END) as failed_uploads
-                FROM batch_upload_tasks 
-                WHERE user_id = :user_id 
-                AND created_at > NOW() - INTERVAL '7 days'
-            """)
-            
-            result = db.execute(query, {"user_id": str(user_id)}).fetchone()
-            
-            if not result or result[0] == 0:
-                return None
-            
-            total_uploads, small_files, failed_uploads = result
-            
-            # 计算质量指标
-            small_file_ratio = small_files / total_uploads
-            failed_ratio = failed_uploads / total_uploads
-            
-            if small_file_ratio > self.ABUSE_THRESHOLDS['empty_file_ratio']:
-                return AbusePattern(
-                    pattern_type="quality_abuse_small_files",
-                    severity=AbuseLevel.MEDIUM,
-                    description=f"用户上传的小文件比例过高: {small_file_ratio:.2%}",
-                    indicators={
-                        "small_file_ratio": small_file_ratio,
-                        "threshold": self.ABUSE_THRESHOLDS['empty_file_ratio'],
-                        "total_uploads": total_uploads,
-                        "small_files": small_files
-                    },
-                    confidence_score=0.7
-                )
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"检测质量滥用失败: {str(e)}")
+    def _detect_quality_abuse(self, counters: Dict[str, Dict[str, float]]) -> Optional[AbusePattern]:
+        """检测内容质量滥用（最近7天）"""
+        weekly = counters["7d"]
+        total_uploads = weekly["uploads"]
+        if total_uploads <= 0:
             return None
+        
+        # 计算质量指标
+        small_file_ratio = weekly["small_uploads"] / total_uploads
+        
+        if small_file_ratio > self.ABUSE_THRESHOLDS['empty_file_ratio']:
+            return AbusePattern(
+                pattern_type="quality_abuse_small_files",
+                severity=AbuseLevel.MEDIUM,
+                description=f"用户上传的小文件比例过高: {small_file_ratio:.2%}",
+                indicators={
+                    "small_file_ratio": small_file_ratio,
+                    "threshold": self.ABUSE_THRESHOLDS['empty_file_ratio'],
+                    "total_uploads": round(total_uploads),
+                    "small_files": round(weekly["small_uploads"]),
+                    "failed_uploads": round(weekly["failed_uploads"])
+                },
+                confidence_score=0.7
+            )
+        
+        return None
     
-    async def _detect_duplicate_abuse(self, user_id: UUID, db: Session) -> Optional[AbusePattern]:
-        """检测重复内容滥用"""
-        try:
-            # 检查文件名和大小的重复情况
-            query = text("""
-                SELECT 
-                    file_name,
-                    file_size,
-                    COUNT(*) as duplicate_count
-                FROM batch_upload_tasks 
-                WHERE user_id = :user_id 
-                AND created_at > NOW() - INTERVAL '30 days'
-                GROUP BY file_name, file_size
-                HAVING COUNT(*) > 1
-                ORDER BY duplicate_count DESC
-            """)
-            
-            results = db.execute(query, {"user_id": str(user_id)}).fetchall()
-            
-            if not results:
-                return None
-            
-            total_duplicates = sum(row[2] - 1 for row in results)  # 减去原始文件
-            
-            # 获取总上传数
-            total_query = text("""
-                SELECT COUNT(*) FROM batch_upload_tasks 
-                WHERE user_id = :user_id 
-                AND created_at > NOW() - INTERVAL '30 days'
-            """)
-            
-            total_uploads = db.execute(total_query, {"user_id": str(user_id)}).scalar()
-            
-            if total_uploads > 0:
-                duplicate_ratio = total_duplicates / total_uploads
-                
-                if duplicate_ratio > self.ABUSE_THRESHOLDS['duplicate_content_ratio']:
-                    return AbusePattern(
-                        pattern_type="duplicate_content_abuse",
-                        severity=AbuseLevel.HIGH,
-                        description=f"用户重复上传内容比例过高: {duplicate_ratio:.2%}",
-                        indicators={
-                            "duplicate_ratio": duplicate_ratio,
-                            "threshold": self.ABUSE_THRESHOLDS['duplicate_content_ratio'],
-                            "total_duplicates": total_duplicates,
-                            "total_uploads": total_uploads
-                        },
-                        confidence_score=0.85
-                    )
-            
-            return None
-            
-        except Exception as e:
-            logger.error(f"检测重复内容滥用失败: {str(e)}")
+    def _detect_duplicate_abuse(self, counters: Dict[str, Dict[str, float]]) -> Optional[AbusePattern]:
+        """检测重复内容滥用（最近30天，按文件内容哈希）"""
+        monthly = counters["30d"]
+        total_files = monthly["files"]
+        if total_files <= 0:
             return None
+        
+        duplicate_ratio = monthly["duplicate_files"] / total_files
+        
+        if duplicate_ratio > self.ABUSE_THRESHOLDS['duplicate_content_ratio']:
+            return AbusePattern(
+                pattern_type="duplicate_content_abuse",
+                severity=AbuseLevel.HIGH,
+                description=f"用户重复上传内容比例过高: {duplicate_ratio:.2%}",
+                indicators={
+                    "duplicate_ratio": duplicate_ratio,
+                    "threshold": self.ABUSE_THRESHOLDS['duplicate_content_ratio'],
+                    "total_duplicates": round(monthly["duplicate_files"]),
+                    "total_files": round(total_files)
+                },
+                confidence_score=0.85
+            )
+        
+        return None
     
-    async def _detect_filename_abuse(self, user_id: UUID, db: Session) -> Optional[AbusePattern]:
-        """检测可疑文件名模式"""
+    async def _detect_filename_abuse(
+        self, user_id: UUID, counters: Dict[str, Dict[str, float]], db: AsyncSession
+    ) -> Optional[AbusePattern]:
+        """检测可疑文件名模式（最近7天）；计数命中时才查询文件名明细"""
+        if round(counters["7d"]["suspicious_uploads"]) == 0:
+            return None
+        
         try:
-            # 检查文件名中的可疑关键词
-            suspicious_patterns = self.ABUSE_THRESHOLDS['suspicious_file_patterns']
-            
             query = text("""
                 SELECT file_name, COUNT(*) as count
                 FROM batch_upload_tasks 
                 WHERE user_id = :user_id 
                 AND created_at > NOW() - INTERVAL '7 days'
-                AND (
-                    """ + " OR ".join([f"LOWER(file_name) LIKE '%{pattern}%'" for pattern in suspicious_patterns]) + """
-                )
+                AND batch_upload_suspicious_name(file_name)
                 GROUP BY file_name
             """)
             
-            results = db.execute(query, {"user_id": str(user_id)}).fetchall()
+            results = (await db.execute(query, {"user_id": str(user_id)})).fetchall()
             
             if results:
                 suspicious_files = [{"filename": row[0], "count": row[1]} for row in results]
@@ -284,7 +288,7 @@ class BatchAbuseMonitor:
                     indicators={
                         "suspicious_files": suspicious_files,
                         "total_suspicious": total_suspicious,
-                        "patterns_detected": suspicious_patterns
+                        "patterns_detected": self.ABUSE_THRESHOLDS['suspicious_file_patterns']
                     },
                     confidence_score=0.6
                 )
@@ -295,7 +299,31 @@ class BatchAbuseMonitor:
             logger.error(f"检测文件名滥用失败: {str(e)}")
             return None
     
-    async def calculate_abuse_metrics(self, start_date: date, end_date: date, db: Session) -> AbuseMetrics:
+    def _build_metrics(
+        self, start_date: date, end_date: date, total_uploads: int, abusive_uploads: int, credits_prevented: int
+    ) -> AbuseMetrics:
+        """由上传数、滥用上传数和Credits不足的用户数计算滥用指标"""
+        # 估算被Credits系统阻止的滥用（基于历史数据和阈值）
+        estimated_prevented_abuse = int(credits_prevented * self.BASELINE_ABUSE_RATE)
+        
+        # 计算滥用率
+        abuse_rate = abusive_uploads / max(1, total_uploads)
+        
+        # 估算成本节省（每个被阻止的滥用上传节省的服务器资源成本）
+        cost_per_abuse = Decimal('5.00')  # 假设每个滥用上传成本5元
+        estimated_cost_savings = estimated_prevented_abuse * cost_per_abuse
+        
+        return AbuseMetrics(
+            period_start=start_date,
+            period_end=end_date,
+            total_batch_uploads=total_uploads,
+            abusive_uploads=abusive_uploads,
+            abuse_rate=abuse_rate,
+            credits_prevented_abuse=estimated_prevented_abuse,
+            estimated_cost_savings=estimated_cost_savings
+        )
+    
+    async def calculate_abuse_metrics(self, start_date: date, end_date: date, db: AsyncSession) -> AbuseMetrics:
         """
         计算指定时期的滥用指标
         
@@ -308,40 +336,19 @@ class BatchAbuseMonitor:
             滥用指标
         """
         try:
-            # 获取总批量上传数
-            total_query = text("""
-                SELECT COUNT(*) FROM batch_upload_tasks 
-                WHERE created_at::date BETWEEN :start_date AND :end_date
+            # 上传数和滥用上传数读取天汇总（由 batch_upload_tasks 上的触发器维护）；
+            # 与原先直接查询 batch_upload_tasks 一致，总数和滥用数都只统计 debt_collection，滥用率口径不变
+            rollup_query = text("""
+                SELECT COALESCE(SUM(total_uploads), 0), COALESCE(SUM(abusive_uploads), 0)
+                FROM batch_upload_daily_rollups
+                WHERE bucket_date BETWEEN :start_date AND :end_date
                 AND task_type = 'debt_collection'
             """)
             
-            total_uploads = db.execute(total_query, {
-                "start_date": start_date,
-                "end_date": end_date
-            }).scalar() or 0
-            
-            # 计算滥用上传数（基于多个指标）
-            abuse_query = text("""
-                SELECT COUNT(DISTINCT t.id) as abusive_uploads
-                FROM batch_upload_tasks t
-                WHERE t.created_at::date BETWEEN :start_date AND :end_date
-                AND t.task_type = 'debt_collection'
-                AND (
-                    -- 小文件滥用
-                    t.file_size < 1024
-                    -- 失败率高的上传
-                    OR (t.total_records > 0 AND t.error_records::float / t.total_records > 0.8)
-                    -- 可疑文件名
-                    OR (
-                        """ + " OR ".join([f"LOWER(t.file_name) LIKE '%{pattern}%'" for pattern in self.ABUSE_THRESHOLDS['suspicious_file_patterns']]) + """
-                    )
-                )
-            """)
-            
-            abusive_uploads = db.execute(abuse_query, {
+            total_uploads, abusive_uploads = (await db.execute(rollup_query, {
                 "start_date": start_date,
                 "end_date": end_date
-            }).scalar() or 0
+            })).one()
             
             # 计算Credits阻止的滥用（估算）
             credits_prevented_query = text("""
@@ -352,44 +359,65 @@ class BatchAbuseMonitor:
                 -- 假设Credits不足的用户中有一定比例会进行滥用上传
             """)
             
-            credits_prevented = db.execute(credits_prevented_query, {
+            credits_prevented = (await db.execute(credits_prevented_query, {
                 "start_date": start_date,
                 "end_date": end_date
-            }).scalar() or 0
+            })).scalar() or 0
             
-            # 估算被Credits系统阻止的滥用（基于历史数据和阈值）
-            estimated_prevented_abuse = int(credits_prevented * self.BASELINE_ABUSE_RATE)
+            return self._build_metrics(start_date, end_date, total_uploads, abusive_uploads, credits_prevented)
             
-            # 计算滥用率
-            abuse_rate = abusive_uploads / max(1, total_uploads)
+        except Exception as e:
+            logger.error(f"计算滥用指标失败: {str(e)}")
+            return self._build_metrics(start_date, end_date, 0, 0, 0)
+    
+    async def calculate_daily_abuse_metrics(
+        self, start_date: date, end_date: date, db: AsyncSession
+    ) -> List[AbuseMetrics]:
+        """
+        按天计算滥用指标，两次查询取回整个时间段（没有上传的日期为零值）
+        
+        Args:
+            start_date: 开始日期
+            end_date: 结束日期
+            db: 数据库会话
             
-            # 估算成本节省（每个被阻止的滥用上传节省的服务器资源成本）
-            cost_per_abuse = Decimal('5.00')  # 假设每个滥用上传成本5元
-            estimated_cost_savings = estimated_prevented_abuse * cost_per_abuse
+        Returns:
+            按日期升序的每日滥用指标
+        """
+        try:
+            rollup_query = text("""
+                SELECT day::date, COALESCE(r.total_uploads, 0), COALESCE(r.abusive_uploads, 0)
+                FROM generate_series(CAST(:start_date AS DATE), CAST(:end_date AS DATE), INTERVAL '1 day') AS day
+                LEFT JOIN batch_upload_daily_rollups r
+                    ON r.bucket_date = day::date AND r.task_type = 'debt_collection'
+                ORDER BY 1
+            """)
+            credits_prevented_query = text("""
+                SELECT uc.created_at::date, COUNT(*) FROM user_credits uc
+                JOIN users u ON uc.user_id = u.id
+                WHERE uc.created_at::date BETWEEN :start_date AND :end_date
+                AND uc.credits_remaining = 0
+                GROUP BY uc.created_at::date
+            """)
+            params = {"start_date": start_date, "end_date": end_date}
             
-            return AbuseMetrics(
-                period_start=start_date,
-                period_end=end_date,
-                total_batch_uploads=total_uploads,
-                abusive_uploads=abusive_uploads,
-                abuse_rate=abuse_rate,
-                credits_prevented_abuse=estimated_prevented_abuse,
-                estimated_cost_savings=estimated_cost_savings
-            )
+            rows = (await db.execute(rollup_query, params)).fetchall()
+            credits_by_day = dict((await db.execute(credits_prevented_query, params)).fetchall())
+            
+            return [
+                self._build_metrics(day, day, total, abusive, credits_by_day.get(day, 0))
+                for day, total, abusive in rows
+            ]
             
         except Exception as e:
-            logger.error(f"计算滥用指标失败: {str(e)}")
-            return AbuseMetrics(
-                period_start=start_date,
-                period_end=end_date,
-                total_batch_uploads=0,
-                abusive_uploads=0,
-                abuse_rate=0.0,
-                credits_prevented_abuse=0,
-                estimated_cost_savings=Decimal('0.00')
-            )
+            logger.error(f"计算每日滥用指标失败: {str(e)}")
+            days = (end_date - start_date).days + 1
+            return [
+                self._build_metrics(start_date + timedelta(days=i), start_date + timedelta(days=i), 0, 0, 0)
+                for i in range(max(0, days))
+            ]
     
-    async def get_abuse_reduction_progress(self, db: Session) -> Dict[str, Any]:
+    async def get_abuse_reduction_progress(self, db: AsyncSession) -> Dict[str, Any]:
         """
         获取滥用减少进度（90%目标跟踪）
         
@@ -493,7 +521,7 @@ class BatchAbuseMonitor:
         
         return recommendations
     
-    async def record_abuse_incident(self, user_id: UUID, patterns: List[AbusePattern], db: Session):
+    async def record_abuse_incident(self, user_id: UUID, patterns: List[AbusePattern], db: AsyncSession):
         """
         记录滥用事件
         
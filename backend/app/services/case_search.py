@@ -0,0 +1,162 @@
+"""
+案件关键词搜索
+cases.search_vector 由数据库触发器维护（见 migrations/020_case_search.sql）：
+文本小写后按字母数字片段切分，每个片段取相邻二元组和末字作为检索词。
+查询时关键词按同样规则切分，全部检索词命中的行再用原有的子串匹配复核，
+结果与原先的 ILIKE 过滤一致，但候选行由 GIN 索引给出
+"""
+
+import re
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import Text, and_, case, cast, func, literal, or_, text
+from sqlalchemy.dialects.postgresql import TSQUERY
+
+from app.models.case import Case
+
+logger = logging.getLogger(__name__)
+
+_SEGMENT = re.compile(r"[^\W_]+")
+_PHONE_NOISE = re.compile(r"[^0-9+]")
+
+
+def _segments(source: str) -> List[str]:
+    return _SEGMENT.findall(source.lower())
+
+
+def index_tokens(source: Optional[str]) -> List[str]:
+    """写入 search_vector 的检索词（与 case_search_tokens 函数一致）"""
+    tokens: List[str] = []
+    for segment in _segments(source or ""):
+        tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+        tokens.append(segment[-1])
+    return tokens
+
+
+def build_tsquery(keyword: str) -> Optional[str]:
+    """
+    关键词转为 tsquery 文本；关键词中没有字母数字时返回None
+
+    多字片段取全部二元组；单字片段用前缀匹配，可命中以该字开头的二元组或片段末字
+    """
+    terms: List[str] = []
+    for segment in _segments(keyword):
+        if len(segment) == 1:
+            candidates = [f"'{segment}':*"]
+        else:
+            candidates = [f"'{segment[i:i + 2]}'" for i in range(len(segment) - 1)]
+        for term in candidates:
+            if term not in terms:
+                terms.append(term)
+    return " & ".join(terms) if terms else None
+
+
+def _tsquery(keyword: str):
+    query = build_tsquery(keyword)
+    return None if query is None else cast(literal(query, Text), TSQUERY)
+
+
+def keyword_condition(keyword: str):
+    """案件关键词过滤条件"""
+    pattern = f"%{keyword}%"
+    substring = or_(
+        Case.case_number.ilike(pattern),
+        Case.description.ilike(pattern),
+        Case.debtor_phone.ilike(pattern),
+        Case.debtor_id_number.ilike(pattern),
+        cast(Case.debtor_info, Text).ilike(pattern)
+    )
+    tsquery = _tsquery(keyword)
+    if tsquery is None:
+        return substring
+    # 尚未回填的行 search_vector 为空，仍按子串匹配
+    return and_(
+        or_(Case.search_vector.op("@@")(tsquery), Case.search_vector.is_(None)),
+        substring
+    )
+
+
+def relevance_order(keyword: str) -> List[Any]:
+    """按相关度排序：编号/姓名/电话/证件号精确命中优先，其次按检索词权重"""
+    exact_conditions = [
+        Case.case_number == keyword,
+        Case.debtor_name == keyword,
+        Case.debtor_id_number == keyword.strip().upper()
+    ]
+    phone = _PHONE_NOISE.sub("", keyword)
+    # 不含数字的关键词清洗后为空串或只剩"+"，不参与电话比较
+    if any(ch.isdigit() for ch in phone):
+        exact_conditions.append(Case.debtor_phone == phone)
+    exact = or_(*exact_conditions)
+    order = [case((exact, 1), else_=0).desc()]
+    tsquery = _tsquery(keyword)
+    if tsquery is not None:
+        order.append(func.ts_rank(Case.search_vector, tsquery).desc().nullslast())
+    order.extend([Case.created_at.desc(), Case.id.desc()])
+    return order
+
+
+class CaseSearchBackfill:
+    """
+    分批回填已有案件的 search_vector
+
+    每批把一部分未回填行的 search_vector 置空，由触发器重新计算；
+    每批单独提交并短暂停顿，SKIP LOCKED 跳过正被业务更新的行，不阻塞线上写入
+    """
+
+    def __init__(self, batch_size: int = 1000, pause_seconds: float = 0.05):
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+
+    async def pending_count(self, db) -> int:
+        result = await db.execute(text("SELECT COUNT(*) FROM cases WHERE search_vector IS NULL"))
+        return result.scalar() or 0
+
+    async def run_batch(self, db) -> int:
+        """回填一批，返回处理的行数"""
+        result = await db.execute(text("""
+            UPDATE cases SET search_vector = NULL
+            WHERE id IN (
+                SELECT id FROM cases
+                WHERE search_vector IS NULL
+                LIMIT :batch_size
+                FOR UPDATE SKIP LOCKED
+            )
+            RETURNING id
+        """), {"batch_size": self.batch_size})
+        updated = len(result.fetchall())
+        await db.commit()
+        return updated
+
+    async def run(
+        self,
+        session_factory,
+        max_batches: Optional[int] = None,
+        progress: Optional[Callable[[int, int], None]] = None
+    ) -> Dict[str, int]:
+        """
+        回填直到没有待处理行
+
+        Args:
+            session_factory: 异步会话工厂，如 AsyncSessionLocal
+            max_batches: 本次最多执行的批数
+            progress: 每批完成后回调 (批次序号, 累计行数)
+        """
+        batches = 0
+        total = 0
+        async with session_factory() as db:
+            while max_batches is None or batches < max_batches:
+                updated = await self.run_batch(db)
+                if not updated:
+                    break
+                batches += 1
+                total += updated
+                if progress:
+                    progress(batches, total)
+                await asyncio.sleep(self.pause_seconds)
+            remaining = await self.pending_count(db)
+
+        logger.info(f"案件搜索回填完成: {batches} 批, {total} 行, 剩余 {remaining} 行")
+        return {"batches": batches, "updated": total, "remaining": remaining}
@@ -6,10 +6,13 @@
 from typing import List, Optional, Dict, Any
 from uuid import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update, delete, func, and_, or_
+from sqlalchemy import select, update, delete, func, and_
 from sqlalchemy.orm import joinedload
 from datetime import datetime, timedelta
 
+from app.core.pagination import InvalidCursorError, paginate_select
+from app.services.case_search import keyword_condition, relevance_order
+from app.services.lawyer_stats import load_lawyer_workload, recompute_lawyer_stats
 from app.models.case import Case, CaseStatus, Client
 from app.models.user import User, LawyerQualification
 
@@ -68,14 +71,48 @@ class CaseService:
         result = await self.db.execute(query)
         return result.scalar_one_or_none()
     
+    def _build_case_conditions(self, tenant_id: UUID, filters: Optional[Dict[str, Any]]) -> List[Any]:
+        """案件列表过滤条件（数据查询与计数查询共用）"""
+        conditions = [Case.tenant_id == tenant_id]
+        if not filters:
+            return conditions
+        
+        if filters.get("status"):
+            conditions.append(Case.status == filters["status"])
+        
+        if filters.get("assigned_to"):
+            conditions.append(Case.assigned_to_user_id == filters["assigned_to"])
+        
+        if filters.get("client_id"):
+            conditions.append(Case.client_id == filters["client_id"])
+        
+        if filters.get("amount_min") is not None and filters["amount_min"] >= 0:
+            conditions.append(Case.case_amount >= filters["amount_min"])
+        
+        if filters.get("amount_max") is not None and filters["amount_max"] >= 0:
+            conditions.append(Case.case_amount <= filters["amount_max"])
+        
+        if filters.get("keyword"):
+            conditions.append(keyword_condition(filters["keyword"]))
+        return conditions
+    
     async def get_cases_list(
         self,
         tenant_id: UUID,
         page: int = 1,
         page_size: int = 20,
-        filters: Optional[Dict[str, Any]] = None
+        filters: Optional[Dict[str, Any]] = None,
+        cursor: Optional[str] = None,
+        count: str = "auto",
+        sort: str = "created"
     ) -> Dict[str, Any]:
-        """获取案件列表（分页）"""
+        """
+        获取案件列表（分页）
+        
+        提供 cursor 时按 (created_at, id) 键集翻页，任意深度的页都只读取一页数据；
+        否则按页码分页（兼容旧客户端）。
+        sort=relevance 且带关键词时按相关度排序，只支持页码分页
+        """
         
         try:
             # 检查参数有效性
@@ -83,82 +120,35 @@ class CaseService:
                 page = 1
             if page_size < 1 or page_size > 100:
                 page_size = 20
-                
-            query = select(Case).where(Case.tenant_id == tenant_id)
-            
-            # 应用过滤条件
-            if filters:
-                if filters.get("status"):
-                    query = query.where(Case.status == filters["status"])
-                
-                if filters.get("assigned_to"):
-                    query = query.where(Case.assigned_to_user_id == filters["assigned_to"])
-                
-                if filters.get("client_id"):
-                    query = query.where(Case.client_id == filters["client_id"])
-                
-                if filters.get("amount_min") is not None and filters["amount_min"] >= 0:
-                    query = query.where(Case.case_amount >= filters["amount_min"])
-                
-                if filters.get("amount_max") is not None and filters["amount_max"] >= 0:
-                    query = query.where(Case.case_amount <= filters["amount_max"])
-                
-                if filters.get("keyword"):
-                    keyword = f"%{filters['keyword']}%"
-                    query = query.where(
-                        or_(
-                            Case.case_number.ilike(keyword),
-                            Case.description.ilike(keyword),
-                            func.cast(Case.debtor_info, func.text("TEXT")).ilike(keyword)
-                        )
-                    )
-            
-            # 总数查询 - 使用更简单的方式
-            count_query = select(func.count(Case.id)).where(Case.tenant_id == tenant_id)
-            if filters:
-                # 重新应用过滤条件用于计数
-                if filters.get("status"):
-                    count_query = count_query.where(Case.status == filters["status"])
-                if filters.get("assigned_to"):
-                    count_query = count_query.where(Case.assigned_to_user_id == filters["assigned_to"])
-                if filters.get("client_id"):
-                    count_query = count_query.where(Case.client_id == filters["client_id"])
-                if filters.get("amount_min") is not None and filters["amount_min"] >= 0:
-                    count_query = count_query.where(Case.case_amount >= filters["amount_min"])
-                if filters.get("amount_max") is not None and filters["amount_max"] >= 0:
-                    count_query = count_query.where(Case.case_amount <= filters["amount_max"])
-                if filters.get("keyword"):
-                    keyword = f"%{filters['keyword']}%"
-                    count_query = count_query.where(
-                        or_(
-                            Case.case_number.ilike(keyword),
-                            Case.description.ilike(keyword),
-                            func.cast(Case.debtor_info, func.text("TEXT")).ilike(keyword)
-                        )
-                    )
             
-            total_result = await self.db.execute(count_query)
-            total = total_result.scalar() or 0
+            if sort == "relevance" and filters and filters.get("keyword"):
+                return await self._get_ranked_cases(tenant_id, page, page_size, filters)
             
-            # 分页查询
-            offset = (page - 1) * page_size
-            query = query.order_by(Case.created_at.desc()).offset(offset).limit(page_size)
-            
-            # 执行查询，但不加载关联数据避免复杂性
-            result = await self.db.execute(query)
-            cases = result.scalars().all()
-            
-            # 安全计算总页数
-            total_pages = max(1, (total + page_size - 1) // page_size) if total > 0 else 1
+            result = await paginate_select(
+                self.db,
+                select(Case),
+                self._build_case_conditions(tenant_id, filters),
+                created_column=Case.created_at,
+                id_column=Case.id,
+                cursor=cursor,
+                limit=page_size,
+                offset=(page - 1) * page_size,
+                count=count
+            )
             
             return {
-                "items": cases,
-                "total": total,
+                "items": result.items,
+                "total": result.total or 0,
                 "page": page,
                 "page_size": page_size,
-                "total_pages": total_pages
+                "total_pages": result.total_pages(page_size),
+                "next_cursor": result.next_cursor,
+                "has_more": result.has_more,
+                "total_is_estimate": result.total_is_estimate
             }
             
+        except InvalidCursorError:
+            raise
         except Exception as e:
             # 记录错误但返回空列表而不是抛出异常
             print(f"获取案件列表失败: {str(e)}")
@@ -169,7 +159,43 @@ class CaseService:
                 "total": 0,
                 "page": max(1, page),
                 "page_size": max(1, page_size),
-                "total_pages": 1
+                "total_pages": 1,
+                "next_cursor": None,
+                "has_more": False,
+                "total_is_estimate": False
+        }
+    
+    async def _get_ranked_cases(
+        self,
+        tenant_id: UUID,
+        page: int,
+        page_size: int,
+        filters: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """按关键词相关度排序的案件列表"""
+        conditions = self._build_case_conditions(tenant_id, filters)
+        query = select(Case).where(*conditions).order_by(
+            *relevance_order(filters["keyword"])
+        ).offset((page - 1) * page_size).limit(page_size + 1)
+        
+        items = list((await self.db.execute(query)).scalars().all())
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        
+        if has_more or (page > 1 and not items):
+            total = (await self.db.execute(select(func.count(Case.id)).where(*conditions))).scalar() or 0
+        else:
+            total = (page - 1) * page_size + len(items)
+        
+        return {
+            "items": items,
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": max(1, (total + page_size - 1) // page_size),
+            "next_cursor": None,
+            "has_more": has_more,
+            "total_is_estimate": False
         }
     
     async def assign_case(
@@ -219,6 +245,8 @@ class CaseService:
         # 记录日志
 
         
+        # 同一事务内刷新新旧律师的统计，连续分配时打分立即看到新增的工作量
+        await recompute_lawyer_stats(self.db, [lawyer_id, case.assigned_to_user_id])
         await self.db.commit()
         
         # 重新获取更新后的案件
@@ -254,54 +282,25 @@ class CaseService:
         
         # 记录状态更新
         
+        await recompute_lawyer_stats(self.db, [case.assigned_to_user_id])
         await self.db.commit()
         
         # 重新获取更新后的案件
         return await self.get_case_by_id(case_id, tenant_id) or case
     
     async def get_lawyer_workload(self, lawyer_id: UUID, tenant_id: UUID) -> Dict[str, Any]:
-        """获取律师工作负荷"""
-        
-        # 当前进行中的案件
-        active_cases_query = select(func.count()).where(
-            and_(
-                Case.assigned_to_user_id == lawyer_id,
-                Case.tenant_id == tenant_id,
-                Case.status.in_([CaseStatus.ASSIGNED, CaseStatus.IN_PROGRESS])
-            )
-        )
-        active_cases_result = await self.db.execute(active_cases_query)
-        active_cases = active_cases_result.scalar() or 0
-        
-        # 本月完成案件
-        month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-        completed_cases_query = select(func.count()).where(
-            and_(
-                Case.assigned_to_user_id == lawyer_id,
-                Case.tenant_id == tenant_id,
-                Case.status == CaseStatus.COMPLETED,
-                Case.completed_at >= month_start
-            )
-        )
-        completed_cases_result = await self.db.execute(completed_cases_query)
-        completed_cases = completed_cases_result.scalar() or 0
-        
-        # 案件总金额
-        amount_query = select(func.sum(Case.case_amount)).where(
-            and_(
-                Case.assigned_to_user_id == lawyer_id,
-                Case.tenant_id == tenant_id,
-                Case.status.in_([CaseStatus.ASSIGNED, CaseStatus.IN_PROGRESS])
-            )
-        )
-        amount_result = await self.db.execute(amount_query)
-        total_amount = amount_result.scalar() or 0
-        
+        """获取律师在当前租户下的工作负荷（读取 lawyer_tenant_workload）"""
+        workload = (await load_lawyer_workload(self.db, [lawyer_id], tenant_id))[str(lawyer_id)]
+        return self._workload_from_stats(workload)
+    
+    def _workload_from_stats(self, stats: Dict[str, Any]) -> Dict[str, Any]:
+        active_cases = stats["active_cases"]
+        total_amount = float(stats["active_amount"])
         return {
             "active_cases": active_cases,
-            "completed_this_month": completed_cases,
-            "total_amount": float(total_amount),
-            "workload_level": self._calculate_workload_level(active_cases, float(total_amount))
+            "completed_this_month": stats["completed_this_month"],
+            "total_amount": total_amount,
+            "workload_level": self._calculate_workload_level(active_cases, total_amount)
         }
     
     async def get_case_statistics(self, tenant_id: UUID) -> Dict[str, Any]:
@@ -366,12 +365,15 @@ class CaseService:
         if not qualified_lawyers:
             raise ValueError("没有可用的合格律师")
         
-        # 计算最佳分配（基于工作负荷）
+        # 计算最佳分配（基于工作负荷），一次读取所有候选律师的统计
         best_lawyer = None
         min_workload = float('inf')
+        lawyer_workload = await load_lawyer_workload(
+            self.db, [lawyer.id for lawyer in qualified_lawyers], tenant_id
+        )
         
         for lawyer in qualified_lawyers:
-            workload = await self.get_lawyer_workload(lawyer.id, tenant_id)
+            workload = self._workload_from_stats(lawyer_workload[str(lawyer.id)])
             score = workload["active_cases"] * 10 + workload["total_amount"] / 10000
             
             if score < min_workload:
@@ -0,0 +1,191 @@
+"""
+系统配置缓存
+按(租户, 类别)整类加载配置，敏感配置解密后只保存在本进程内存中；
+set_config/delete_config 通过版本号使对应类别失效
+"""
+
+import copy
+import time
+import asyncio
+import logging
+from types import MappingProxyType
+from typing import Any, Awaitable, Callable, Dict, Iterable, Mapping, Optional, Tuple
+from uuid import UUID
+
+logger = logging.getLogger(__name__)
+
+# 兜底TTL：即使未收到跨进程失效消息，配置也会在该时间后重新加载
+CONFIG_CACHE_TTL_SECONDS = 300
+
+# 失效总线上的配置键前缀：config:{tenant}:{category}
+CONFIG_INVALIDATION_PREFIX = "config:"
+
+CacheKey = Tuple[str, str]
+
+
+def _tenant_key(tenant_id: Optional[UUID]) -> str:
+    return str(tenant_id) if tenant_id else "global"
+
+
+def config_invalidation_key(category: str, tenant_id: Optional[UUID] = None) -> str:
+    """生成失效总线上使用的配置键"""
+    return f"{CONFIG_INVALIDATION_PREFIX}{_tenant_key(tenant_id)}:{category}"
+
+
+class ConfigSnapshot:
+    """
+    某一(租户, 类别)在特定版本下的只读配置视图
+
+    values 为 key -> 配置值（敏感配置已解密），raw_values 为数据库中的原始值
+    """
+
+    __slots__ = ("category", "tenant_id", "version", "loaded_at", "_values", "_raw_values")
+
+    def __init__(
+        self,
+        category: str,
+        tenant_id: Optional[UUID],
+        version: int,
+        values: Dict[str, Dict[str, Any]],
+        raw_values: Dict[str, Dict[str, Any]],
+    ):
+        self.category = category
+        self.tenant_id = tenant_id
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self._values = values
+        self._raw_values = raw_values
+
+    @property
+    def values(self) -> Mapping[str, Dict[str, Any]]:
+        return MappingProxyType(self._values)
+
+    def get(self, key: str, decrypted: bool = True) -> Optional[Dict[str, Any]]:
+        """返回配置值副本，调用方修改不会影响缓存"""
+        source = self._values if decrypted else self._raw_values
+        value = source.get(key)
+        return copy.deepcopy(value) if value is not None else None
+
+    def is_expired(self, ttl: float) -> bool:
+        return time.monotonic() - self.loaded_at > ttl
+
+    def __repr__(self) -> str:
+        # 不输出配置内容，避免敏感值进入日志
+        return (
+            f"<ConfigSnapshot category={self.category} tenant={_tenant_key(self.tenant_id)} "
+            f"version={self.version} keys={len(self._values)}>"
+        )
+
+
+# 加载函数：返回 (解密后的值, 原始值)
+SnapshotLoader = Callable[[], Awaitable[Tuple[Dict[str, Dict[str, Any]], Dict[str, Dict[str, Any]]]]]
+
+
+class ConfigCache:
+    """进程内配置缓存"""
+
+    def __init__(self, ttl: float = CONFIG_CACHE_TTL_SECONDS):
+        self.ttl = ttl
+        self._snapshots: Dict[CacheKey, ConfigSnapshot] = {}
+        self._versions: Dict[CacheKey, int] = {}
+        self._loading: Dict[CacheKey, asyncio.Future] = {}
+        self.stats = {
+            'hits': 0,
+            'loads': 0,
+            'invalidations': 0,
+            'discarded_loads': 0,
+        }
+
+    def version(self, category: str, tenant_id: Optional[UUID] = None) -> int:
+        """当前版本号"""
+        return self._versions.get((_tenant_key(tenant_id), category), 0)
+
+    async def get_snapshot(
+        self,
+        category: str,
+        tenant_id: Optional[UUID],
+        loader: SnapshotLoader,
+    ) -> ConfigSnapshot:
+        """获取类别快照，未命中或已失效时整类加载一次（并发请求共享同一次加载）"""
+        cache_key = (_tenant_key(tenant_id), category)
+        version = self._versions.get(cache_key, 0)
+
+        snapshot = self._snapshots.get(cache_key)
+        if snapshot is not None and snapshot.version == version and not snapshot.is_expired(self.ttl):
+            self.stats['hits'] += 1
+            return snapshot
+
+        future = self._loading.get(cache_key)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[cache_key] = future
+        try:
+            values, raw_values = await loader()
+            snapshot = ConfigSnapshot(category, tenant_id, version, values, raw_values)
+            self.stats['loads'] += 1
+
+            # 加载期间发生写入时不缓存，下一次读取重新加载
+            if self._versions.get(cache_key, 0) == version:
+                self._snapshots[cache_key] = snapshot
+            else:
+                self.stats['discarded_loads'] += 1
+
+            future.set_result(snapshot)
+            return snapshot
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._loading.pop(cache_key, None)
+
+    def invalidate(self, category: str, tenant_id: Optional[UUID] = None, broadcast: bool = True) -> None:
+        """配置写入后使对应类别失效"""
+        cache_key = (_tenant_key(tenant_id), category)
+        self._invalidate_key(cache_key)
+
+        if broadcast:
+            self._broadcast([config_invalidation_key(category, tenant_id)])
+
+    def invalidate_all(self) -> None:
+        """清空所有缓存的配置"""
+        for cache_key in list(self._snapshots.keys()):
+            self._invalidate_key(cache_key)
+
+    def handle_invalidation(self, keys: Iterable[str], patterns: Iterable[str], tags: Iterable[str]) -> None:
+        """失效总线回调：处理其他进程广播的配置失效"""
+        for key in keys:
+            if not key.startswith(CONFIG_INVALIDATION_PREFIX):
+                continue
+            tenant, _, category = key[len(CONFIG_INVALIDATION_PREFIX):].partition(":")
+            if category:
+                self._invalidate_key((tenant, category))
+
+    def _invalidate_key(self, cache_key: CacheKey) -> None:
+        self._versions[cache_key] = self._versions.get(cache_key, 0) + 1
+        self._snapshots.pop(cache_key, None)
+        self.stats['invalidations'] += 1
+
+    def _broadcast(self, keys: Iterable[str]) -> None:
+        """通过缓存失效总线通知其他进程（未启用时忽略）"""
+        from app.core import advanced_cache
+
+        manager = advanced_cache.cache_manager
+        if manager is not None and manager.invalidation_bus is not None:
+            manager.invalidation_bus.publish(keys=keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'cached_categories': len(self._snapshots),
+            'ttl_seconds': self.ttl,
+        }
+
+
+# 全局配置缓存实例
+config_cache = ConfigCache()
@@ -17,6 +17,7 @@ import logging
 
 from app.models.tenant import SystemConfig, Tenant
 from app.core.config import settings
+from app.services.config_cache import config_cache, ConfigSnapshot
 
 logger = logging.getLogger(__name__)
 
@@ -57,12 +58,23 @@ class ConfigEncryption:
             raise
 
 
+_shared_encryption: Optional[ConfigEncryption] = None
+
+
+def get_config_encryption() -> ConfigEncryption:
+    """获取进程内共享的配置加密实例"""
+    global _shared_encryption
+    if _shared_encryption is None:
+        _shared_encryption = ConfigEncryption()
+    return _shared_encryption
+
+
 class SystemConfigService:
     """系统配置管理服务"""
     
     def __init__(self, db: AsyncSession):
         self.db = db
-        self.encryption = ConfigEncryption()
+        self.encryption = get_config_encryption()
         
         # 敏感配置类型定义
         self.sensitive_categories = {
@@ -93,48 +105,73 @@ class SystemConfigService:
             配置值字典或None
         """
         try:
-            query = select(SystemConfig).where(
-                and_(
-                    SystemConfig.category == category,
-                    SystemConfig.key == key,
-                    SystemConfig.tenant_id == tenant_id,
-                    SystemConfig.is_active == True
-                )
-            )
-            
-            result = await self.db.execute(query)
-            config = result.scalar_one_or_none()
-            
-            if not config:
-                return None
-            
-            # 正确处理JSONB字段的值
-            value: Dict[str, Any] = config.value if isinstance(config.value, dict) else {}
-            
-            # 如果是敏感配置且需要解密
-            if (decrypt_sensitive and 
-                category in self.sensitive_categories and 
-                isinstance(value, dict) and 
-                value.get("encrypted")):
-                
-                decrypted_data = {}
-                for k, v in value.items():
-                    if k != "encrypted" and isinstance(v, str):
-                        try:
-                            decrypted_data[k] = self.encryption.decrypt_value(v)
-                        except:
-                            decrypted_data[k] = v  # 如果解密失败，返回原值
-                    else:
-                        decrypted_data[k] = v
-                
-                return decrypted_data
-            
-            return value
+            snapshot = await self.get_config_snapshot(category, tenant_id)
+            return snapshot.get(key, decrypted=decrypt_sensitive)
             
         except Exception as e:
             logger.error(f"获取配置失败 - category: {category}, key: {key}, error: {str(e)}")
             return None
     
+    async def get_config_snapshot(
+        self,
+        category: str,
+        tenant_id: Optional[UUID] = None
+    ) -> ConfigSnapshot:
+        """
+        获取某类别配置的一致性快照
+        
+        整个类别通过一次查询加载，敏感配置在加载时解密一次并缓存在进程内存中；
+        同一快照内的多个键来自同一版本。
+        """
+        return await config_cache.get_snapshot(
+            category,
+            tenant_id,
+            lambda: self._load_category(category, tenant_id)
+        )
+    
+    async def _load_category(
+        self,
+        category: str,
+        tenant_id: Optional[UUID] = None
+    ):
+        """加载类别下所有启用的配置，返回(解密后的值, 原始值)"""
+        query = select(SystemConfig.key, SystemConfig.value).where(
+            and_(
+                SystemConfig.category == category,
+                SystemConfig.tenant_id == tenant_id,
+                SystemConfig.is_active == True
+            )
+        )
+        
+        result = await self.db.execute(query)
+        
+        values: Dict[str, Dict[str, Any]] = {}
+        raw_values: Dict[str, Dict[str, Any]] = {}
+        for config_key, config_value in result.all():
+            # 正确处理JSONB字段的值
+            value: Dict[str, Any] = config_value if isinstance(config_value, dict) else {}
+            raw_values[config_key] = value
+            values[config_key] = self._decrypt_config_value(category, value)
+        
+        return values, raw_values
+    
+    def _decrypt_config_value(self, category: str, value: Dict[str, Any]) -> Dict[str, Any]:
+        """解密敏感配置（解密失败的字段返回原值）"""
+        if not (category in self.sensitive_categories and value.get("encrypted")):
+            return value
+        
+        decrypted_data = {}
+        for k, v in value.items():
+            if k != "encrypted" and isinstance(v, str):
+                try:
+                    decrypted_data[k] = self.encryption.decrypt_value(v)
+                except:
+                    decrypted_data[k] = v  # 如果解密失败，返回原值
+            else:
+                decrypted_data[k] = v
+        
+        return decrypted_data
+    
     async def set_config(
         self,
         category: str,
@@ -209,6 +246,7 @@ class SystemConfigService:
                 self.db.add(config)
             
             await self.db.commit()
+            config_cache.invalidate(category, tenant_id)
             
             # 重新获取配置对象
             result = await self.db.execute(query)
@@ -569,6 +607,7 @@ class SystemConfigService:
             if config:
                 await self.db.delete(config)
                 await self.db.commit()
+                config_cache.invalidate(category, tenant_id)
                 logger.info(f"配置删除成功 - category: {category}, key: {key}")
                 return True
             
@@ -0,0 +1,427 @@
+"""
+Credits账本引擎
+每次变动只执行一条语句：条件扣减（余额不足时不更新）、每周重置判断、
+使用记录和审计记录的追加都在同一条CTE语句中完成，并发消耗不会出现负余额；
+可选的Redis余额缓存只用于展示，由后台对账任务与数据库保持一致
+"""
+
+import json
+import asyncio
+import logging
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+logger = logging.getLogger(__name__)
+
+BALANCE_CACHE_PREFIX = "credits:balance:"
+BALANCE_CACHE_TTL_SECONDS = 3600
+
+
+def week_start(current_date: date) -> date:
+    """当前日期所在周的周一"""
+    return current_date - timedelta(days=current_date.weekday())
+
+
+# 条件扣减：先锁定余额行，按需叠加每周重置，再在余额足够时扣减，并追加使用与审计记录
+CONSUME_SQL = text("""
+    WITH current_credits AS (
+        SELECT user_id, credits_remaining,
+               COALESCE(last_reset_date < :this_monday, TRUE) AS needs_reset
+        FROM user_credits
+        WHERE user_id = :user_id
+        FOR UPDATE
+    ),
+    updated AS (
+        UPDATE user_credits uc
+        SET
+            credits_remaining = uc.credits_remaining
+                + CASE WHEN c.needs_reset THEN :weekly_credits ELSE 0 END
+                - :cost,
+            total_credits_used = uc.total_credits_used + :cost,
+            last_reset_date = CASE WHEN c.needs_reset THEN :today ELSE uc.last_reset_date END,
+            updated_at = NOW()
+        FROM current_credits c
+        WHERE uc.user_id = c.user_id
+          AND uc.credits_remaining + CASE WHEN c.needs_reset THEN :weekly_credits ELSE 0 END >= :cost
+        RETURNING uc.user_id, uc.credits_remaining, c.needs_reset
+    ),
+    usage_record AS (
+        INSERT INTO credit_usage_records (user_id, credits_used, usage_type, balance_after, weekly_reset_applied)
+        SELECT user_id, :cost, :usage_type, credits_remaining, needs_reset FROM updated
+        RETURNING id
+    ),
+    audit_record AS (
+        INSERT INTO credit_audit_logs (user_id, action, credits_change, balance_after, context)
+        SELECT user_id, 'credits_consumed', -:cost, credits_remaining, CAST(:context AS JSONB) FROM updated
+        RETURNING id
+    )
+    SELECT
+        c.credits_remaining + CASE WHEN c.needs_reset THEN :weekly_credits ELSE 0 END AS available,
+        c.needs_reset,
+        u.credits_remaining AS balance_after,
+        (SELECT id FROM audit_record) AS audit_id,
+        (SELECT id FROM usage_record) AS usage_id
+    FROM current_credits c
+    LEFT JOIN updated u ON u.user_id = c.user_id
+""")
+
+# 确认购买：只有pending状态的购买记录会被入账（幂等），同时追加审计记录
+CONFIRM_PURCHASE_SQL = text("""
+    WITH purchase AS (
+        UPDATE credit_purchase_records
+        SET status = 'paid'
+        WHERE id = :purchase_id AND status = 'pending'
+        RETURNING id, user_id, credits_count
+    ),
+    updated AS (
+        UPDATE user_credits uc
+        SET
+            credits_remaining = uc.credits_remaining + p.credits_count,
+            credits_purchased = uc.credits_purchased + p.credits_count,
+            updated_at = NOW()
+        FROM purchase p
+        WHERE uc.user_id = p.user_id
+        RETURNING uc.user_id, uc.credits_remaining, p.credits_count, p.id AS purchase_id
+    ),
+    audit_record AS (
+        INSERT INTO credit_audit_logs (user_id, action, credits_change, balance_after, reference_id, context)
+        SELECT user_id, 'credits_purchased', credits_count, credits_remaining, CAST(purchase_id AS VARCHAR),
+               CAST(:context AS JSONB)
+        FROM updated
+        RETURNING id
+    )
+    SELECT u.user_id, u.credits_count, u.credits_remaining AS balance_after,
+           (SELECT id FROM audit_record) AS audit_id
+    FROM updated u
+""")
+
+# 每周重置：单个用户或全部用户，一条语句完成并追加审计记录
+RESET_SQL_TEMPLATE = """
+    WITH updated AS (
+        UPDATE user_credits
+        SET
+            credits_remaining = credits_remaining + :weekly_credits,
+            last_reset_date = :today,
+            updated_at = NOW()
+        WHERE (last_reset_date IS NULL OR last_reset_date < :this_monday) {user_filter}
+        RETURNING user_id, credits_remaining
+    ),
+    audit_record AS (
+        INSERT INTO credit_audit_logs (user_id, action, credits_change, balance_after, context)
+        SELECT user_id, 'credits_reset', :weekly_credits, credits_remaining, CAST(:context AS JSONB)
+        FROM updated
+        RETURNING id
+    )
+    SELECT user_id, credits_remaining FROM updated
+"""
+RESET_USER_SQL = text(RESET_SQL_TEMPLATE.format(user_filter="AND user_id = :user_id"))
+RESET_ALL_SQL = text(RESET_SQL_TEMPLATE.format(user_filter=""))
+
+
+@dataclass
+class ConsumeResult:
+    """一次扣减的结果"""
+    success: bool
+    available_before: int
+    balance_after: int
+    weekly_reset_applied: bool
+    audit_id: Optional[int] = None
+
+
+class CreditsLedger:
+    """Credits账本：所有余额变动的唯一入口"""
+
+    def __init__(self, weekly_credits: int = 1, balance_cache: Optional["CreditsBalanceCache"] = None):
+        self.weekly_credits = weekly_credits
+        self.balance_cache = balance_cache
+
+    async def consume(
+        self,
+        db: AsyncSession,
+        user_id: str,
+        cost: int,
+        usage_type: str,
+        context: Optional[Dict[str, Any]] = None,
+        today: Optional[date] = None,
+    ) -> Optional[ConsumeResult]:
+        """
+        条件扣减Credits（调用方负责提交事务）
+
+        Returns:
+            扣减结果；用户没有Credits记录时返回None
+        """
+        today = today or date.today()
+        row = (await db.execute(CONSUME_SQL, {
+            "user_id": str(user_id),
+            "cost": cost,
+            "usage_type": usage_type,
+            "weekly_credits": self.weekly_credits,
+            "today": today,
+            "this_monday": week_start(today),
+            "context": json.dumps({"usage_type": usage_type, **(context or {})}, default=str),
+        })).fetchone()
+
+        if row is None:
+            return None
+
+        available, needs_reset, balance_after, audit_id, _ = row
+        if balance_after is None:
+            return ConsumeResult(
+                success=False,
+                available_before=available,
+                balance_after=available,
+                weekly_reset_applied=False,
+            )
+
+        return ConsumeResult(
+            success=True,
+            available_before=available,
+            balance_after=balance_after,
+            weekly_reset_applied=bool(needs_reset),
+            audit_id=audit_id,
+        )
+
+    async def confirm_purchase(
+        self,
+        db: AsyncSession,
+        purchase_id: str,
+        context: Optional[Dict[str, Any]] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """购买入账（调用方负责提交事务），记录不是pending状态时返回None"""
+        row = (await db.execute(CONFIRM_PURCHASE_SQL, {
+            "purchase_id": purchase_id,
+            "context": json.dumps(context or {}, default=str),
+        })).fetchone()
+
+        if row is None:
+            return None
+
+        return {
+            "user_id": str(row[0]),
+            "credits_added": row[1],
+            "balance_after": row[2],
+            "audit_id": row[3],
+        }
+
+    async def apply_weekly_reset(self, db: AsyncSession, user_id: Optional[str] = None, today: Optional[date] = None) -> List[Dict[str, Any]]:
+        """
+        执行每周重置（单个用户或全部用户，调用方负责提交事务）
+
+        Returns:
+            被重置用户的新余额
+        """
+        today = today or date.today()
+        params = {
+            "weekly_credits": self.weekly_credits,
+            "today": today,
+            "this_monday": week_start(today),
+            "context": json.dumps({"reset_date": today.isoformat()}),
+        }
+        if user_id is not None:
+            params["user_id"] = str(user_id)
+            rows = (await db.execute(RESET_USER_SQL, params)).fetchall()
+        else:
+            rows = (await db.execute(RESET_ALL_SQL, params)).fetchall()
+
+        return [{"user_id": str(row[0]), "balance_after": row[1]} for row in rows]
+
+    def publish_balance(self, user_id: str, balance: int, version: Optional[int] = None) -> None:
+        """事务提交后把最新余额交给Redis缓存（异步写入）"""
+        if self.balance_cache is not None:
+            self.balance_cache.record(str(user_id), balance, version)
+
+
+class CreditsBalanceCache:
+    """
+    Redis余额缓存
+
+    - 账本提交后登记最新余额，后台按批写入Redis（同一用户只写最新版本）
+    - Redis仅用于展示，扣减始终以数据库条件更新为准
+    - reconcile 定期用数据库余额校正缓存，修正写入乱序或丢失造成的偏差
+    """
+
+    def __init__(
+        self,
+        redis_client,
+        ttl: int = BALANCE_CACHE_TTL_SECONDS,
+        flush_interval: float = 0.05,
+    ):
+        self.redis = redis_client
+        self.ttl = ttl
+        self.flush_interval = flush_interval
+        # user_id -> (balance, version)
+        self._pending: Dict[str, tuple] = {}
+        self._flush_task: Optional[asyncio.Task] = None
+        self._reconcile_task: Optional[asyncio.Task] = None
+        self.stats = {
+            'writes': 0,
+            'write_errors': 0,
+            'reconciled_keys': 0,
+            'drift_corrected': 0,
+        }
+
+    @staticmethod
+    def key(user_id: str) -> str:
+        return f"{BALANCE_CACHE_PREFIX}{user_id}"
+
+    def record(self, user_id: str, balance: int, version: Optional[int] = None) -> None:
+        """登记余额，版本号（审计记录ID）较旧的写入被忽略"""
+        version = version if version is not None else 0
+        current = self._pending.get(user_id)
+        if current is not None and current[1] > version:
+            return
+        self._pending[user_id] = (balance, version)
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = loop.create_task(self._delayed_flush())
+
+    async def _delayed_flush(self) -> None:
+        await asyncio.sleep(self.flush_interval)
+        await self.flush()
+
+    async def flush(self) -> None:
+        """把登记的余额批量写入Redis"""
+        if not self._pending:
+            return
+
+        pending, self._pending = self._pending, {}
+        try:
+            pipe = self.redis.pipeline()
+            for user_id, (balance, _) in pending.items():
+                pipe.set(self.key(user_id), balance, ex=self.ttl)
+            await pipe.execute()
+            self.stats['writes'] += len(pending)
+        except Exception as e:
+            self.stats['write_errors'] += 1
+            logger.warning(f"Credits余额缓存写入失败: {e}")
+
+    async def get(self, user_id: str) -> Optional[int]:
+        """读取缓存余额，未命中或Redis不可用时返回None"""
+        try:
+            value = await self.redis.get(self.key(str(user_id)))
+            return int(value) if value is not None else None
+        except Exception as e:
+            logger.warning(f"Credits余额缓存读取失败: {e}")
+            return None
+
+    async def reconcile(
+        self,
+        fetch_balances: Callable[[List[str]], Awaitable[Dict[str, int]]],
+        batch_size: int = 500,
+    ) -> int:
+        """用数据库余额校正所有缓存键，返回修正的键数"""
+        corrected = 0
+        batch: List[str] = []
+
+        async def reconcile_batch(user_ids: List[str]) -> int:
+            actual = await fetch_balances(user_ids)
+            cached = await self.redis.mget([self.key(uid) for uid in user_ids])
+            pipe = self.redis.pipeline()
+            fixed = 0
+            for user_id, cached_value in zip(user_ids, cached):
+                balance = actual.get(user_id)
+                if balance is None:
+                    pipe.delete(self.key(user_id))
+                    fixed += 1
+                elif cached_value is None or int(cached_value) != balance:
+                    pipe.set(self.key(user_id), balance, ex=self.ttl)
+                    fixed += 1
+            await pipe.execute()
+            return fixed
+
+        async for key in self.redis.scan_iter(match=f"{BALANCE_CACHE_PREFIX}*", count=batch_size):
+            if isinstance(key, bytes):
+                key = key.decode("utf-8")
+            batch.append(key[len(BALANCE_CACHE_PREFIX):])
+            if len(batch) >= batch_size:
+                corrected += await reconcile_batch(batch)
+                self.stats['reconciled_keys'] += len(batch)
+                batch = []
+        if batch:
+            corrected += await reconcile_batch(batch)
+            self.stats['reconciled_keys'] += len(batch)
+
+        self.stats['drift_corrected'] += corrected
+        if corrected:
+            logger.info(f"Credits余额缓存对账修正 {corrected} 个键")
+        return corrected
+
+    def start_reconciler(
+        self,
+        fetch_balances: Callable[[List[str]], Awaitable[Dict[str, int]]],
+        interval: float = 300,
+    ) -> None:
+        """启动后台对账任务"""
+        async def reconcile_loop():
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self.reconcile(fetch_balances)
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Credits余额缓存对账失败: {e}")
+
+        if self._reconcile_task is None or self._reconcile_task.done():
+            self._reconcile_task = asyncio.create_task(reconcile_loop())
+
+    async def stop(self) -> None:
+        if self._reconcile_task and not self._reconcile_task.done():
+            self._reconcile_task.cancel()
+            try:
+                await self._reconcile_task
+            except asyncio.CancelledError:
+                pass
+        await self.flush()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'pending': len(self._pending)}
+
+
+# 全局余额缓存，应用启动且Redis可用时创建；为None时账本不写缓存
+credits_balance_cache: Optional[CreditsBalanceCache] = None
+
+
+async def fetch_balances(user_ids: List[str], session_factory=None) -> Dict[str, int]:
+    """从数据库读取一批用户的余额，供缓存对账使用"""
+    if session_factory is None:
+        from app.core.database import AsyncSessionLocal
+        session_factory = AsyncSessionLocal
+    async with session_factory() as db:
+        rows = (await db.execute(text("""
+            SELECT user_id, credits_remaining FROM user_credits
+            WHERE user_id = ANY(CAST(:user_ids AS UUID[]))
+        """), {"user_ids": list(user_ids)})).fetchall()
+    return {str(row[0]): row[1] for row in rows}
+
+
+def start_credits_balance_cache(redis_client, reconcile_interval: Optional[float] = None) -> Optional[CreditsBalanceCache]:
+    """创建全局余额缓存并启动对账任务；未启用或没有Redis客户端时不创建"""
+    global credits_balance_cache
+    from app.core.config import settings
+    if redis_client is None or not settings.CREDITS_BALANCE_CACHE_ENABLED:
+        return None
+    if credits_balance_cache is None:
+        credits_balance_cache = CreditsBalanceCache(redis_client)
+        credits_balance_cache.start_reconciler(
+            fetch_balances,
+            interval=reconcile_interval or settings.CREDITS_BALANCE_RECONCILE_INTERVAL
+        )
+        logger.info("Credits余额缓存已启动")
+    return credits_balance_cache
+
+
+async def stop_credits_balance_cache() -> None:
+    """停止对账任务并写入待写的余额"""
+    global credits_balance_cache
+    if credits_balance_cache is not None:
+        await credits_balance_cache.stop()
+        credits_balance_cache = None
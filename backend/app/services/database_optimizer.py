@@ -18,6 +18,7 @@ from dataclasses import dataclass
 from app.core.database import get_db, engine
 from app.core.logging import get_logger
 from app.core.config import settings
+from app.core.system_metrics import system_metrics_sampler
 
 logger = get_logger(__name__)
 
@@ -381,8 +382,9 @@ class DatabaseOptimizer:
                 size_stats = size_result.fetchone()
             
             # 系统资源使用
-            memory_usage = psutil.virtual_memory().used / (1024 * 1024)  # MB
-            cpu_usage = psutil.cpu_percent(interval=1)
+            sample = await system_metrics_sampler.current()
+            memory_usage = sample['memory_total_mb'] - sample['memory_available_mb']  # MB
+            cpu_usage = sample['cpu_percent']
             
             return DatabaseMetrics(
                 connections_active=conn_stats.active_connections or 0,
@@ -14,6 +14,7 @@ from enum import Enum
 from sqlalchemy import text
 from app.core.database import get_db
 from app.core.logging import get_logger
+from app.core.system_metrics import system_metrics_sampler
 from app.services.alert_manager import AlertManager
 from app.services.notification_channels import NotificationManager
 
@@ -247,8 +248,8 @@ class SystemResourceChecker(HealthChecker):
     async def _perform_check(self) -> HealthCheckResult:
         """检查系统资源使用情况"""
         try:
-            # CPU使用率
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # CPU使用率（后台采样器的最新样本，避免阻塞事件循环）
+            cpu_percent = (await system_metrics_sampler.current())['cpu_percent']
             cpu_count = psutil.cpu_count()
             
             # 内存使用情况
@@ -567,6 +568,10 @@ class HealthMonitorService:
             "timestamp": result.timestamp.isoformat()
         }
         
+        # 推送给告警自动化引擎（延迟导入避免循环依赖）
+        from app.services.alert_automation import alert_automation
+        alert_automation.submit_alert(alert_data)
+        
         # 发送到告警管理器
         await self.alert_manager.create_alert(
             title=f"Health Check Alert: {result.component}",
@@ -0,0 +1,681 @@
+"""
+律师活动事件管道
+原始活动事件按批追加（每张表一条多行INSERT），派生状态（每日活跃度、每日任务、
+活跃度等级、里程碑、积分与律师等级）按律师在内存中逐事件折叠，最后每张表一次UPSERT；
+一批活动的数据库往返次数与表数相关，与活动数量无关
+"""
+
+import json
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, date, timedelta
+from decimal import Decimal
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.advanced_cache import invalidate_tags
+
+logger = logging.getLogger(__name__)
+
+# 活动类型 -> 每日任务
+ACTIVITY_TO_TASK = {
+    'daily_login': 'login',
+    'case_response': 'respond_to_case',
+    'case_completion': 'complete_case',
+    'profile_update': 'update_profile',
+    'ai_tool_usage': 'use_ai_tool',
+    'online_duration': 'online_1hour',
+    'client_interaction': 'client_message'
+}
+
+# 活动类型 -> 积分引擎行为
+ACTIVITY_POINTS_ACTION = {
+    'daily_login': 'online_hour',
+    'case_response': 'case_complete_success',
+    'case_completion': 'case_complete_excellent',
+    'client_interaction': 'online_hour',
+    'profile_update': 'online_hour',
+    'ai_tool_usage': 'ai_credit_used',
+    'online_duration': 'online_hour',
+    'quality_feedback': 'review_5star'
+}
+
+MILESTONE_CONFIGS = [
+    {'type': 'consecutive_days', 'threshold': 7, 'reward_points': 500, 'title': '连续活跃一周'},
+    {'type': 'consecutive_days', 'threshold': 30, 'reward_points': 2000, 'title': '连续活跃一月'},
+    {'type': 'total_active_days', 'threshold': 100, 'reward_points': 3000, 'title': '累计活跃100天'},
+    {'type': 'total_score', 'threshold': 10000, 'reward_points': 1500, 'title': '累计活跃度10000分'},
+    {'type': 'best_daily_score', 'threshold': 500, 'reward_points': 800, 'title': '单日活跃度500分'}
+]
+
+# 连续活跃天数和30天等级窗口所需的历史天数
+HISTORY_DAYS = 100
+LEVEL_WINDOW_DAYS = 30
+
+
+@dataclass
+class ActivityEvent:
+    """一条待处理的律师活动"""
+    lawyer_id: str
+    activity_type: str
+    context: Dict[str, Any]
+    occurred_at: datetime = field(default_factory=datetime.now)
+
+
+@dataclass
+class LawyerActivityState:
+    """单个律师在本批次中的派生状态（加载一次，逐事件折叠）"""
+    lawyer_id: str
+    today: date
+    membership: Dict[str, Any]
+    level_details: Dict[str, Any]
+    # 最近HISTORY_DAYS天的每日得分（含今日）
+    daily_scores: Dict[date, int] = field(default_factory=dict)
+    today_count: int = 0
+    today_breakdown: Dict[str, int] = field(default_factory=dict)
+    first_activity_time: Optional[datetime] = None
+    last_activity_time: Optional[datetime] = None
+    # 今日之前的累计统计
+    prior_active_days: int = 0
+    prior_total_score: int = 0
+    prior_best_daily_score: int = 0
+    task_counts: Dict[str, int] = field(default_factory=dict)
+    achieved_milestones: Set[str] = field(default_factory=set)
+    # 待写入的行
+    activity_logs: List[Dict[str, Any]] = field(default_factory=list)
+    task_completions: List[Dict[str, Any]] = field(default_factory=list)
+    milestones: List[Dict[str, Any]] = field(default_factory=list)
+    point_transactions: List[Dict[str, Any]] = field(default_factory=list)
+    level_activity: Optional[Dict[str, Any]] = None
+    level_upgrades: List[Tuple[int, int]] = field(default_factory=list)
+
+    def consecutive_days(self) -> int:
+        """截至今日的连续活跃天数"""
+        days = 0
+        current = self.today
+        while current in self.daily_scores and days < HISTORY_DAYS:
+            days += 1
+            current -= timedelta(days=1)
+        return days
+
+
+@dataclass
+class ActivityBatch:
+    """一批活动的处理结果"""
+    states: List[LawyerActivityState]
+    results: List[Dict[str, Any]]
+
+
+def _values_clause(rows: Sequence[Dict[str, Any]], columns: Sequence[str], prefix: str,
+                   casts: Optional[Dict[str, str]] = None) -> Tuple[str, Dict[str, Any]]:
+    """生成多行VALUES子句及其绑定参数"""
+    casts = casts or {}
+    tuples = []
+    params: Dict[str, Any] = {}
+    for index, row in enumerate(rows):
+        placeholders = []
+        for column in columns:
+            name = f"{prefix}{index}_{column}"
+            params[name] = row.get(column)
+            placeholder = f":{name}"
+            if column in casts:
+                placeholder = f"CAST({placeholder} AS {casts[column]})"
+            placeholders.append(placeholder)
+        tuples.append(f"({', '.join(placeholders)})")
+    return ",\n".join(tuples), params
+
+
+class LawyerActivityPipeline:
+    """律师活动事件管道"""
+
+    def __init__(self, tracker):
+        self.tracker = tracker
+        self.points_engine = tracker.points_engine
+        self.membership_service = tracker.membership_service
+
+    async def process(self, events: Sequence[ActivityEvent], db: AsyncSession) -> ActivityBatch:
+        """
+        处理一批活动（调用方负责提交事务，提交后调用 publish）
+
+        Returns:
+            本批次的状态与结果，results 顺序与输入一致
+        """
+        states = await self._load_states({event.lawyer_id for event in events}, db)
+
+        results = []
+        for event in events:
+            results.append(await self._fold(states[event.lawyer_id], event))
+
+        await self._flush(states.values(), db)
+        return ActivityBatch(states=list(states.values()), results=results)
+
+    async def publish(self, batch: ActivityBatch) -> None:
+        """事务提交后的副作用：失效积分缓存、发送升级通知"""
+        for state in batch.states:
+            if state.point_transactions:
+                await invalidate_tags(f"lawyer:{state.lawyer_id}")
+            for old_level, new_level in state.level_upgrades:
+                await self.points_engine._send_level_upgrade_notification(
+                    state.lawyer_id, old_level, new_level, None
+                )
+
+    async def _load_states(self, lawyer_ids: Set[str], db: AsyncSession) -> Dict[str, LawyerActivityState]:
+        """加载本批次涉及律师的当前状态，每张表一次查询"""
+        today = date.today()
+        ids = sorted(lawyer_ids)
+
+        # 会员信息（可能自动分配免费会员并提交，必须在加锁之前）
+        memberships = {
+            lawyer_id: await self.membership_service.get_lawyer_membership(lawyer_id, db)
+            for lawyer_id in ids
+        }
+
+        level_query = text("""
+            SELECT * FROM lawyer_level_details
+            WHERE lawyer_id = ANY(CAST(:ids AS UUID[]))
+            ORDER BY lawyer_id
+            FOR UPDATE
+        """)
+        level_rows = {str(row['lawyer_id']): dict(row) for row in (await db.execute(level_query, {"ids": ids})).mappings()}
+        missing = [lawyer_id for lawyer_id in ids if lawyer_id not in level_rows]
+        if missing:
+            for lawyer_id in missing:
+                await self.membership_service._initialize_lawyer_level_details(lawyer_id, db)
+            level_rows.update({
+                str(row['lawyer_id']): dict(row)
+                for row in (await db.execute(level_query, {"ids": missing})).mappings()
+            })
+
+        states = {
+            lawyer_id: LawyerActivityState(
+                lawyer_id=lawyer_id,
+                today=today,
+                membership=memberships[lawyer_id],
+                level_details=level_rows.get(lawyer_id, {}),
+            )
+            for lawyer_id in ids
+        }
+
+        # 最近的每日活跃度（连续天数、30天等级窗口、今日明细）
+        daily_rows = (await db.execute(text("""
+            SELECT lawyer_id, activity_date, total_activity_score, activity_count,
+                   activity_breakdown, first_activity_time, last_activity_time
+            FROM lawyer_daily_activity
+            WHERE lawyer_id = ANY(CAST(:ids AS UUID[])) AND activity_date >= :since
+        """), {"ids": ids, "since": today - timedelta(days=HISTORY_DAYS)})).mappings()
+        for row in daily_rows:
+            state = states[str(row['lawyer_id'])]
+            state.daily_scores[row['activity_date']] = row['total_activity_score']
+            if row['activity_date'] == today:
+                state.today_count = row['activity_count']
+                state.today_breakdown = dict(row['activity_breakdown'] or {})
+                state.first_activity_time = row['first_activity_time']
+                state.last_activity_time = row['last_activity_time']
+
+        # 今日之前的累计统计（里程碑）
+        lifetime_rows = (await db.execute(text("""
+            SELECT lawyer_id,
+                   COUNT(DISTINCT activity_date) AS active_days,
+                   COALESCE(SUM(total_activity_score), 0) AS total_score,
+                   COALESCE(MAX(total_activity_score), 0) AS best_daily_score
+            FROM lawyer_daily_activity
+            WHERE lawyer_id = ANY(CAST(:ids AS UUID[])) AND activity_date <> :today
+            GROUP BY lawyer_id
+        """), {"ids": ids, "today": today})).mappings()
+        for row in lifetime_rows:
+            state = states[str(row['lawyer_id'])]
+            state.prior_active_days = row['active_days']
+            state.prior_total_score = int(row['total_score'])
+            state.prior_best_daily_score = row['best_daily_score']
+
+        task_rows = (await db.execute(text("""
+            SELECT lawyer_id, task_type, COUNT(*) AS completed_count
+            FROM lawyer_daily_task_completions
+            WHERE lawyer_id = ANY(CAST(:ids AS UUID[])) AND completion_date = :today
+            GROUP BY lawyer_id, task_type
+        """), {"ids": ids, "today": today})).mappings()
+        for row in task_rows:
+            states[str(row['lawyer_id'])].task_counts[row['task_type']] = row['completed_count']
+
+        milestone_rows = (await db.execute(text("""
+            SELECT lawyer_id, milestone_key FROM lawyer_activity_milestones
+            WHERE lawyer_id = ANY(CAST(:ids AS UUID[]))
+        """), {"ids": ids})).mappings()
+        for row in milestone_rows:
+            states[str(row['lawyer_id'])].achieved_milestones.add(row['milestone_key'])
+
+        return states
+
+    async def _fold(self, state: LawyerActivityState, event: ActivityEvent) -> Dict[str, Any]:
+        """把一条活动折叠进律师状态，返回与逐条处理时相同结构的结果"""
+        tracker = self.tracker
+        context = event.context
+
+        # 1. 活动日志
+        state.activity_logs.append({
+            'lawyer_id': state.lawyer_id,
+            'activity_type': event.activity_type,
+            'activity_date': state.today,
+            'activity_time': event.occurred_at.time(),
+            'context': json.dumps(context, default=str),
+            'ip_address': context.get('ip_address'),
+            'user_agent': context.get('user_agent'),
+            'session_duration': context.get('session_duration', 0),
+            'quality_score': context.get('quality_score', 0)
+        })
+
+        # 2. 活动得分
+        activity_score = self._activity_score(state, event)
+
+        # 3. 每日活跃度
+        state.daily_scores[state.today] = state.daily_scores.get(state.today, 0) + activity_score
+        state.today_count += 1
+        state.today_breakdown[event.activity_type] = state.today_breakdown.get(event.activity_type, 0) + 1
+        state.first_activity_time = state.first_activity_time or event.occurred_at
+        state.last_activity_time = event.occurred_at
+        daily_activity = {
+            'total_score': state.daily_scores[state.today],
+            'activity_count': state.today_count,
+            'activity_breakdown': dict(state.today_breakdown)
+        }
+
+        # 4. 每日任务
+        task_rewards = []
+        task_type = ACTIVITY_TO_TASK.get(event.activity_type)
+        task_config = tracker.DAILY_TASKS.get(task_type) if task_type else None
+        if task_config:
+            completed = state.task_counts.get(task_type, 0)
+            if completed < task_config['max_per_day']:
+                state.task_counts[task_type] = completed + 1
+                state.task_completions.append({
+                    'lawyer_id': state.lawyer_id,
+                    'task_type': task_type,
+                    'completion_date': state.today,
+                    'points_earned': task_config['points'],
+                    'context': json.dumps(context, default=str)
+                })
+                await self._fold_points(
+                    state, f"daily_task_{task_type}", {'task_points': task_config['points'], **context}
+                )
+                task_rewards.append({
+                    'task_type': task_type,
+                    'task_name': task_config['description'],
+                    'points_earned': task_config['points'],
+                    'completion_count': completed + 1,
+                    'max_per_day': task_config['max_per_day']
+                })
+
+        # 5. 活跃度等级
+        activity_level = self._activity_level(state)
+
+        # 6. 活动积分
+        points_action = ACTIVITY_POINTS_ACTION.get(event.activity_type, 'online_hour')
+        points_reward = await self._fold_points(state, points_action, context)
+
+        # 7. 里程碑
+        milestone_rewards = await self._fold_milestones(state)
+
+        return {
+            'activity_recorded': True,
+            'activity_score': activity_score,
+            'daily_activity': daily_activity,
+            'task_rewards': task_rewards,
+            'activity_level': activity_level,
+            'points_reward': points_reward,
+            'milestone_rewards': milestone_rewards,
+            'timestamp': event.occurred_at.isoformat()
+        }
+
+    def _activity_score(self, state: LawyerActivityState, event: ActivityEvent) -> int:
+        """计算活动得分"""
+        base_score = self.tracker.ACTIVITY_WEIGHTS.get(event.activity_type, 5)
+        multiplier = 1.0
+
+        # 质量调整
+        quality_score = event.context.get('quality_score', 0)
+        if quality_score >= 90:
+            multiplier *= 1.5
+        elif quality_score >= 80:
+            multiplier *= 1.2
+        elif quality_score < 60:
+            multiplier *= 0.8
+
+        # 时间调整（工作时间内活动得分更高）
+        hour = event.occurred_at.hour
+        if 9 <= hour <= 18:
+            multiplier *= 1.1
+        elif 22 <= hour or hour <= 6:
+            multiplier *= 0.9
+
+        # 连续活动奖励
+        consecutive_days = state.consecutive_days()
+        if consecutive_days >= 7:
+            multiplier *= 1.3
+        elif consecutive_days >= 3:
+            multiplier *= 1.1
+
+        # 会员倍数
+        multiplier *= state.membership.get('point_multiplier', 1.0)
+
+        return max(1, int(base_score * multiplier))
+
+    def _activity_level(self, state: LawyerActivityState) -> Dict[str, Any]:
+        """按最近30天得分计算活跃度等级"""
+        window_start = state.today - timedelta(days=LEVEL_WINDOW_DAYS)
+        scores = [score for day, score in state.daily_scores.items() if day >= window_start]
+
+        total_score = sum(scores)
+        active_days = len(scores)
+        avg_daily_score = total_score / active_days if active_days else 0.0
+        max_daily_score = max(scores) if scores else 0
+
+        activity_level = 'inactive'
+        for level, config in self.tracker.ACTIVITY_LEVELS.items():
+            if config['min_score'] <= total_score <= config['max_score']:
+                activity_level = level
+                break
+
+        state.level_activity = {
+            'lawyer_id': state.lawyer_id,
+            'activity_level': activity_level,
+            'total_score': total_score,
+            'active_days': active_days,
+            'avg_daily_score': avg_daily_score,
+            'max_daily_score': max_daily_score,
+            'calculation_date': state.today
+        }
+
+        level_config = self.tracker.ACTIVITY_LEVELS[activity_level]
+        return {
+            'activity_level': activity_level,
+            'level_name': level_config['name'],
+            'level_color': level_config['color'],
+            'total_score': total_score,
+            'active_days': active_days,
+            'avg_daily_score': round(avg_daily_score, 1),
+            'max_daily_score': max_daily_score
+        }
+
+    async def _fold_milestones(self, state: LawyerActivityState) -> List[Dict[str, Any]]:
+        """检查活跃度里程碑"""
+        today_score = state.daily_scores.get(state.today, 0)
+        current_values = {
+            'consecutive_days': state.consecutive_days(),
+            'total_active_days': state.prior_active_days + (1 if state.today in state.daily_scores else 0),
+            'total_score': state.prior_total_score + today_score,
+            'best_daily_score': max(state.prior_best_daily_score, today_score)
+        }
+
+        milestones = []
+        for milestone in MILESTONE_CONFIGS:
+            milestone_key = f"{milestone['type']}_{milestone['threshold']}"
+            if milestone_key in state.achieved_milestones:
+                continue
+
+            current_value = current_values.get(milestone['type'], 0)
+            if current_value < milestone['threshold']:
+                continue
+
+            state.achieved_milestones.add(milestone_key)
+            state.milestones.append({
+                'lawyer_id': state.lawyer_id,
+                'milestone_key': milestone_key,
+                'milestone_type': milestone['type'],
+                'threshold_value': milestone['threshold'],
+                'current_value': current_value,
+                'reward_points': milestone['reward_points'],
+                'achieved_date': state.today
+            })
+            await self._fold_points(
+                state, 'platform_promotion',
+                {'milestone': milestone['title'], 'bonus_points': milestone['reward_points']}
+            )
+            milestones.append({
+                'milestone_key': milestone_key,
+                'title': milestone['title'],
+                'threshold': milestone['threshold'],
+                'current_value': current_value,
+                'reward_points': milestone['reward_points'],
+                'achieved_date': state.today.isoformat()
+            })
+
+        return milestones
+
+    async def _fold_points(self, state: LawyerActivityState, action: str, context: Dict[str, Any]) -> Dict[str, Any]:
+        """积分计算（与积分引擎规则一致），变动记入内存中的等级详情"""
+        engine = self.points_engine
+        base_points = engine.BASE_POINTS.get(action, 0)
+        adjusted_points = await engine._adjust_points_by_context(base_points, context)
+        multiplier = state.membership.get('point_multiplier', 1.0)
+        final_points = int(adjusted_points * multiplier)
+
+        details = state.level_details
+        points_before = details.get('level_points', 0) or 0
+        state.point_transactions.append({
+            'lawyer_id': state.lawyer_id,
+            'transaction_type': action,
+            'points_change': final_points,
+            'points_before': points_before,
+            'points_after': points_before + final_points,
+            'related_case_id': context.get('case_id'),
+            'related_review_id': context.get('review_id'),
+            'description': engine._generate_transaction_description(action, final_points, multiplier),
+            'metadata': json.dumps({
+                'multiplier': multiplier,
+                'context': context,
+                'timestamp': datetime.now().isoformat()
+            }, default=str)
+        })
+
+        self._apply_level_details_change(details, final_points, action, context)
+        level_change = self._check_level_upgrade(state)
+
+        result = {
+            'points_earned': final_points,
+            'base_points': base_points,
+            'adjusted_points': adjusted_points,
+            'multiplier_applied': multiplier,
+            'membership_type': state.membership.get('membership_type', 'free'),
+            'action': action,
+            'context': context
+        }
+        if level_change:
+            result['level_change'] = level_change
+        return result
+
+    @staticmethod
+    def _apply_level_details_change(details: Dict[str, Any], points_change: int, action: str,
+                                    context: Dict[str, Any]) -> None:
+        """在内存中累加等级详情的变动"""
+        details['level_points'] = (details.get('level_points') or 0) + points_change
+
+        if action.startswith('case_complete'):
+            details['cases_completed'] = (details.get('cases_completed') or 0) + 1
+            if action == 'case_complete_success':
+                details['cases_won'] = (details.get('cases_won') or 0) + 1
+
+            case_amount = context.get('case_amount', 0)
+            if case_amount > 0:
+                amount = Decimal(str(case_amount))
+                details['total_revenue'] = Decimal(details.get('total_revenue') or 0) + amount
+                details['total_cases_amount'] = Decimal(details.get('total_cases_amount') or 0) + amount
+
+        elif action.startswith('review_'):
+            rating = context.get('rating', 0)
+            if rating > 0:
+                cases_completed = details.get('cases_completed') or 0
+                client_rating = float(details.get('client_rating') or 0)
+                details['client_rating'] = round((client_rating * cases_completed + rating) / (cases_completed + 1), 2)
+
+        elif action == 'online_hour':
+            details['total_online_hours'] = (details.get('total_online_hours') or 0) + 1
+
+        elif action == 'ai_credit_used':
+            details['total_ai_credits_used'] = (details.get('total_ai_credits_used') or 0) + context.get('credits_used', 1)
+
+        elif action.startswith('payment_'):
+            payment_amount = context.get('payment_amount', 0)
+            if payment_amount > 0:
+                details['total_paid_amount'] = Decimal(details.get('total_paid_amount') or 0) + Decimal(str(payment_amount))
+
+        cases_completed = details.get('cases_completed') or 0
+        details['success_rate'] = round((details.get('cases_won') or 0) * 100.0 / cases_completed, 2) if cases_completed else 0
+
+    def _check_level_upgrade(self, state: LawyerActivityState) -> Optional[Dict[str, Any]]:
+        """检查律师等级升级（每次积分变动最多升一级）"""
+        details = state.level_details
+        current_level = details.get('current_level') or 1
+        next_level = current_level + 1
+        if next_level > 10:
+            return None
+
+        requirement = self.points_engine.LEVEL_REQUIREMENTS[next_level]
+        current_points = details.get('level_points') or 0
+        cases_completed = details.get('cases_completed') or 0
+        if current_points < requirement['level_points'] or cases_completed < requirement['cases_completed']:
+            return None
+
+        history = list(details.get('level_change_history') or [])
+        history.append({
+            'from_level': current_level,
+            'to_level': next_level,
+            'upgrade_date': datetime.now().isoformat(),
+            'points_at_upgrade': current_points,
+            'cases_at_upgrade': cases_completed
+        })
+        details.update({
+            'current_level': next_level,
+            'last_upgrade_date': state.today,
+            'level_change_history': history,
+            'upgrade_eligible': False
+        })
+        state.level_upgrades.append((current_level, next_level))
+        logger.info(f"律师 {state.lawyer_id} 成功升级到等级 {next_level}")
+
+        return {
+            'upgraded': True,
+            'old_level': current_level,
+            'new_level': next_level,
+            'level_name': requirement['name'],
+            'points_used': current_points,
+            'cases_completed': cases_completed
+        }
+
+    async def _flush(self, states: Iterable[LawyerActivityState], db: AsyncSession) -> None:
+        """把本批次的事件和派生状态写回数据库，每张表一条语句"""
+        states = list(states)
+
+        await self._insert_rows(db, 'lawyer_activity_logs', [
+            row for state in states for row in state.activity_logs
+        ], ['lawyer_id', 'activity_type', 'activity_date', 'activity_time', 'context',
+            'ip_address', 'user_agent', 'session_duration', 'quality_score'])
+
+        daily_rows = [
+            {
+                'lawyer_id': state.lawyer_id,
+                'activity_date': state.today,
+                'total_activity_score': state.daily_scores[state.today],
+                'activity_count': state.today_count,
+                'activity_breakdown': json.dumps(state.today_breakdown),
+                'first_activity_time': state.first_activity_time,
+                'last_activity_time': state.last_activity_time
+            }
+            for state in states if state.activity_logs
+        ]
+        await self._insert_rows(db, 'lawyer_daily_activity', daily_rows, [
+            'lawyer_id', 'activity_date', 'total_activity_score', 'activity_count',
+            'activity_breakdown', 'first_activity_time', 'last_activity_time'
+        ], on_conflict="""
+            ON CONFLICT (lawyer_id, activity_date) DO UPDATE SET
+                total_activity_score = EXCLUDED.total_activity_score,
+                activity_count = EXCLUDED.activity_count,
+                activity_breakdown = EXCLUDED.activity_breakdown,
+                last_activity_time = EXCLUDED.last_activity_time,
+                updated_at = CURRENT_TIMESTAMP
+        """)
+
+        await self._insert_rows(db, 'lawyer_daily_task_completions', [
+            row for state in states for row in state.task_completions
+        ], ['lawyer_id', 'task_type', 'completion_date', 'points_earned', 'context'])
+
+        await self._insert_rows(db, 'lawyer_activity_levels', [
+            state.level_activity for state in states if state.level_activity
+        ], ['lawyer_id', 'activity_level', 'total_score', 'active_days', 'avg_daily_score',
+            'max_daily_score', 'calculation_date'], on_conflict="""
+            ON CONFLICT (lawyer_id) DO UPDATE SET
+                activity_level = EXCLUDED.activity_level,
+                total_score = EXCLUDED.total_score,
+                active_days = EXCLUDED.active_days,
+                avg_daily_score = EXCLUDED.avg_daily_score,
+                max_daily_score = EXCLUDED.max_daily_score,
+                calculation_date = EXCLUDED.calculation_date,
+                updated_at = CURRENT_TIMESTAMP
+        """)
+
+        await self._insert_rows(db, 'lawyer_activity_milestones', [
+            row for state in states for row in state.milestones
+        ], ['lawyer_id', 'milestone_key', 'milestone_type', 'threshold_value',
+            'current_value', 'reward_points', 'achieved_date'],
+            on_conflict="ON CONFLICT (lawyer_id, milestone_key) DO NOTHING")
+
+        await self._insert_rows(db, 'lawyer_point_transactions', [
+            row for state in states for row in state.point_transactions
+        ], ['lawyer_id', 'transaction_type', 'points_change', 'points_before', 'points_after',
+            'related_case_id', 'related_review_id', 'description', 'metadata'])
+
+        await self._update_level_details(db, [state for state in states if state.point_transactions])
+
+    @staticmethod
+    async def _insert_rows(db: AsyncSession, table: str, rows: List[Dict[str, Any]], columns: List[str],
+                     on_conflict: str = "") -> None:
+        if not rows:
+            return
+        values, params = _values_clause(rows, columns, "r")
+        await db.execute(text(f"""
+            INSERT INTO {table} ({', '.join(columns)})
+            VALUES {values}
+            {on_conflict}
+        """), params)
+
+    @staticmethod
+    async def _update_level_details(db: AsyncSession, states: List[LawyerActivityState]) -> None:
+        """等级详情行在加载时已加锁，直接写回折叠后的值"""
+        if not states:
+            return
+
+        casts = {
+            'lawyer_id': 'UUID',
+            'current_level': 'INTEGER',
+            'level_points': 'BIGINT',
+            'cases_completed': 'INTEGER',
+            'cases_won': 'INTEGER',
+            'success_rate': 'DECIMAL(5,2)',
+            'client_rating': 'DECIMAL(3,2)',
+            'total_revenue': 'DECIMAL(15,2)',
+            'total_cases_amount': 'DECIMAL(18,2)',
+            'total_online_hours': 'INTEGER',
+            'total_ai_credits_used': 'INTEGER',
+            'total_paid_amount': 'DECIMAL(15,2)',
+            'upgrade_eligible': 'BOOLEAN',
+            'last_upgrade_date': 'DATE',
+            'level_change_history': 'JSONB',
+        }
+        columns = list(casts)
+        rows = []
+        for state in states:
+            row = {column: state.level_details.get(column) for column in columns}
+            row['lawyer_id'] = state.lawyer_id
+            row['level_change_history'] = json.dumps(row['level_change_history'] or [], default=str)
+            rows.append(row)
+
+        values, params = _values_clause(rows, columns, "d", casts)
+        assignments = ",\n                ".join(f"{column} = v.{column}" for column in columns if column != 'lawyer_id')
+        await db.execute(text(f"""
+            UPDATE lawyer_level_details AS d
+            SET {assignments},
+                updated_at = NOW()
+            FROM (VALUES {values}) AS v ({', '.join(columns)})
+            WHERE d.lawyer_id = v.lawyer_id
+        """), params)
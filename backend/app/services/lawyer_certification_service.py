@@ -16,6 +16,7 @@ from app.models.unified_auth import LawyerCertificationRequest
 from app.services.file_upload_service import FileUploadService
 from app.services.notification_channels import NotificationService
 from app.services.lawyer_membership_service import LawyerMembershipService
+from app.services.workspace_auth_cache import workspace_auth_cache
 
 logger = structlog.get_logger()
 
@@ -220,6 +221,7 @@ class LawyerCertificationService:
             )
             
             await self.db.commit()
+            workspace_auth_cache.invalidate(user_id)
             
             # 自动分配免费会员
             if self.membership_service:
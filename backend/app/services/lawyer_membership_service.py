@@ -3,17 +3,19 @@
 实现免费引流模式和付费会员升级系统
 """
 
+import json
 import logging
 from datetime import datetime, date, timedelta
 from typing import Dict, Any, Optional, List
 from decimal import Decimal
 from uuid import UUID
 
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import and_, or_, func, text
 from fastapi import HTTPException
 
 from app.core.database import get_db
+from app.core.advanced_cache import cached, invalidate_tags
 from app.models.user import User
 from app.services.payment_service import WeChatPayService
 from app.services.config_service import SystemConfigService
@@ -59,14 +61,14 @@ class LawyerMembershipService:
         self.config_service = config_service
         self.payment_service = payment_service
     
-    async def assign_free_membership(self, lawyer_id: UUID, db: Session) -> Dict[str, Any]:
+    async def assign_free_membership(self, lawyer_id: UUID, db: AsyncSession) -> Dict[str, Any]:
         """律师认证通过后自动分配免费会员"""
         try:
             # 检查律师是否已有会员记录
-            existing_membership = db.execute(
-                "SELECT * FROM lawyer_memberships WHERE lawyer_id = %s",
-                (str(lawyer_id),)
-            ).fetchone()
+            existing_membership = (await db.execute(
+                text("SELECT * FROM lawyer_memberships WHERE lawyer_id = :lawyer_id"),
+                {"lawyer_id": str(lawyer_id)}
+            )).fetchone()
             
             if existing_membership:
                 logger.info(f"律师 {lawyer_id} 已有会员记录，跳过分配")
@@ -78,7 +80,7 @@ class LawyerMembershipService:
                 'membership_type': 'free',
                 'start_date': date.today(),
                 'end_date': date.today() + timedelta(days=365*10),  # 10年有效期
-                'benefits': self.MEMBERSHIP_TIERS['free'],
+                'benefits': json.dumps(self.MEMBERSHIP_TIERS['free']),
                 'daily_case_limit': self.MEMBERSHIP_TIERS['free']['daily_case_limit'],
                 'monthly_amount_limit': 50000,  # 5万元月限额
                 'ai_credits_monthly': self.MEMBERSHIP_TIERS['free']['ai_credits_monthly'],
@@ -89,21 +91,21 @@ class LawyerMembershipService:
             }
             
             # 插入数据库
-            db.execute("""
+            await db.execute(text("""
                 INSERT INTO lawyer_memberships 
                 (lawyer_id, membership_type, start_date, end_date, benefits, 
                  daily_case_limit, monthly_amount_limit, ai_credits_monthly, 
                  ai_credits_remaining, ai_credits_used, auto_renewal, payment_amount)
-                VALUES (%(lawyer_id)s, %(membership_type)s, %(start_date)s, %(end_date)s, 
-                        %(benefits)s, %(daily_case_limit)s, %(monthly_amount_limit)s, 
-                        %(ai_credits_monthly)s, %(ai_credits_remaining)s, %(ai_credits_used)s, 
-                        %(auto_renewal)s, %(payment_amount)s)
-            """, membership_data)
+                VALUES (:lawyer_id, :membership_type, :start_date, :end_date, 
+                        :benefits, :daily_case_limit, :monthly_amount_limit, 
+                        :ai_credits_monthly, :ai_credits_remaining, :ai_credits_used, 
+                        :auto_renewal, :payment_amount)
+            """), membership_data)
             
             # 初始化律师等级数据
             await self._initialize_lawyer_level_details(lawyer_id, db)
             
-            db.commit()
+            await db.commit()
             
             logger.info(f"成功为律师 {lawyer_id} 分配免费会员")
             
@@ -117,18 +119,18 @@ class LawyerMembershipService:
             }
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"分配免费会员失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"分配免费会员失败: {str(e)}")
     
-    async def _initialize_lawyer_level_details(self, lawyer_id: UUID, db: Session):
+    async def _initialize_lawyer_level_details(self, lawyer_id: UUID, db: AsyncSession):
         """初始化律师等级详情"""
         try:
             # 检查是否已有等级记录
-            existing_level = db.execute(
-                "SELECT * FROM lawyer_level_details WHERE lawyer_id = %s",
-                (str(lawyer_id),)
-            ).fetchone()
+            existing_level = (await db.execute(
+                text("SELECT * FROM lawyer_level_details WHERE lawyer_id = :lawyer_id"),
+                {"lawyer_id": str(lawyer_id)}
+            )).fetchone()
             
             if existing_level:
                 return
@@ -154,35 +156,35 @@ class LawyerMembershipService:
                 'quality_score': 0,
                 'upgrade_eligible': False,
                 'downgrade_risk': False,
-                'level_change_history': []
+                'level_change_history': json.dumps([])
             }
             
-            db.execute("""
+            await db.execute(text("""
                 INSERT INTO lawyer_level_details 
                 (lawyer_id, current_level, level_points, experience_points, cases_completed,
                  cases_won, cases_failed, success_rate, client_rating, total_revenue,
                  total_online_hours, total_cases_amount, total_ai_credits_used, 
                  total_paid_amount, response_time_avg, case_completion_speed, 
                  quality_score, upgrade_eligible, downgrade_risk, level_change_history)
-                VALUES (%(lawyer_id)s, %(current_level)s, %(level_points)s, %(experience_points)s,
-                        %(cases_completed)s, %(cases_won)s, %(cases_failed)s, %(success_rate)s,
-                        %(client_rating)s, %(total_revenue)s, %(total_online_hours)s,
-                        %(total_cases_amount)s, %(total_ai_credits_used)s, %(total_paid_amount)s,
-                        %(response_time_avg)s, %(case_completion_speed)s, %(quality_score)s,
-                        %(upgrade_eligible)s, %(downgrade_risk)s, %(level_change_history)s)
-            """, level_data)
+                VALUES (:lawyer_id, :current_level, :level_points, :experience_points,
+                        :cases_completed, :cases_won, :cases_failed, :success_rate,
+                        :client_rating, :total_revenue, :total_online_hours,
+                        :total_cases_amount, :total_ai_credits_used, :total_paid_amount,
+                        :response_time_avg, :case_completion_speed, :quality_score,
+                        :upgrade_eligible, :downgrade_risk, :level_change_history)
+            """), level_data)
             
         except Exception as e:
             logger.error(f"初始化律师等级详情失败: {str(e)}")
             raise
     
-    async def get_lawyer_membership(self, lawyer_id: UUID, db: Session) -> Dict[str, Any]:
+    async def get_lawyer_membership(self, lawyer_id: UUID, db: AsyncSession) -> Dict[str, Any]:
         """获取律师会员信息"""
         try:
-            membership = db.execute(
-                "SELECT * FROM lawyer_memberships WHERE lawyer_id = %s",
-                (str(lawyer_id),)
-            ).fetchone()
+            membership = (await db.execute(
+                text("SELECT * FROM lawyer_memberships WHERE lawyer_id = :lawyer_id"),
+                {"lawyer_id": str(lawyer_id)}
+            )).fetchone()
             
             if not membership:
                 # 如果没有会员记录，自动分配免费会员
@@ -214,7 +216,7 @@ class LawyerMembershipService:
             'point_multiplier': tier_config['point_multiplier']
         }
     
-    async def upgrade_membership(self, lawyer_id: UUID, target_tier: str, db: Session) -> Dict[str, Any]:
+    async def upgrade_membership(self, lawyer_id: UUID, target_tier: str, db: AsyncSession) -> Dict[str, Any]:
         """会员升级"""
         try:
             if target_tier not in self.MEMBERSHIP_TIERS:
@@ -252,7 +254,7 @@ class LawyerMembershipService:
         lawyer_id: UUID, 
         amount: float, 
         membership_type: str, 
-        db: Session
+        db: AsyncSession
     ) -> Dict[str, Any]:
         """创建会员支付订单"""
         try:
@@ -293,7 +295,7 @@ class LawyerMembershipService:
         lawyer_id: UUID, 
         membership_type: str, 
         payment_amount: float,
-        db: Session
+        db: AsyncSession
     ) -> Dict[str, Any]:
         """处理会员支付成功"""
         try:
@@ -304,7 +306,7 @@ class LawyerMembershipService:
                 'membership_type': membership_type,
                 'start_date': date.today(),
                 'end_date': date.today() + timedelta(days=30),  # 月付
-                'benefits': tier_config,
+                'benefits': json.dumps(tier_config),
                 'daily_case_limit': tier_config['daily_case_limit'],
                 'monthly_amount_limit': self._get_monthly_amount_limit(membership_type),
                 'ai_credits_monthly': tier_config['ai_credits_monthly'],
@@ -313,22 +315,25 @@ class LawyerMembershipService:
                 'updated_at': datetime.now()
             }
             
-            db.execute("""
+            await db.execute(text("""
                 UPDATE lawyer_memberships 
-                SET membership_type = %(membership_type)s,
-                    start_date = %(start_date)s,
-                    end_date = %(end_date)s,
-                    benefits = %(benefits)s,
-                    daily_case_limit = %(daily_case_limit)s,
-                    monthly_amount_limit = %(monthly_amount_limit)s,
-                    ai_credits_monthly = %(ai_credits_monthly)s,
-                    ai_credits_remaining = %(ai_credits_remaining)s,
-                    payment_amount = %(payment_amount)s,
-                    updated_at = %(updated_at)s
-                WHERE lawyer_id = %(lawyer_id)s
-            """, {**update_data, 'lawyer_id': str(lawyer_id)})
-            
-            db.commit()
+                SET membership_type = :membership_type,
+                    start_date = :start_date,
+                    end_date = :end_date,
+                    benefits = :benefits,
+                    daily_case_limit = :daily_case_limit,
+                    monthly_amount_limit = :monthly_amount_limit,
+                    ai_credits_monthly = :ai_credits_monthly,
+                    ai_credits_remaining = :ai_credits_remaining,
+                    payment_amount = :payment_amount,
+                    updated_at = :updated_at
+                WHERE lawyer_id = :lawyer_id
+            """), {**update_data, 'lawyer_id': str(lawyer_id)})
+            
+            await db.commit()
+            
+            # 会员类型影响积分汇总中的倍数信息
+            await invalidate_tags(f"lawyer:{lawyer_id}")
             
             logger.info(f"律师 {lawyer_id} 成功升级到 {membership_type} 会员")
             
@@ -341,7 +346,7 @@ class LawyerMembershipService:
             }
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"处理会员支付成功失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"处理支付成功失败: {str(e)}")
     
@@ -354,6 +359,7 @@ class LawyerMembershipService:
         }
         return limits.get(membership_type, 50000)
     
+    @cached(ttl=3600, key_pattern="membership:tiers", tags=["membership:tiers"], stale_ttl=600)
     async def get_membership_tiers(self) -> Dict[str, Any]:
         """获取所有会员套餐信息"""
         return {
@@ -374,15 +380,15 @@ class LawyerMembershipService:
         ]
         return comparison_features
     
-    async def check_membership_expiry(self, db: Session) -> List[Dict[str, Any]]:
+    async def check_membership_expiry(self, db: AsyncSession) -> List[Dict[str, Any]]:
         """检查会员到期情况"""
         try:
             # 查询即将到期的会员（7天内）
-            expiring_soon = db.execute("""
+            expiring_soon = (await db.execute(text("""
                 SELECT lawyer_id, membership_type, end_date, auto_renewal
                 FROM lawyer_memberships 
-                WHERE end_date <= %s AND membership_type != 'free'
-            """, (date.today() + timedelta(days=7),)).fetchall()
+                WHERE end_date <= :expiry_before AND membership_type != 'free'
+            """), {"expiry_before": date.today() + timedelta(days=7)})).mappings().fetchall()
             
             expiring_members = []
             for member in expiring_soon:
@@ -400,14 +406,14 @@ class LawyerMembershipService:
             logger.error(f"检查会员到期失败: {str(e)}")
             return []
     
-    async def downgrade_expired_memberships(self, db: Session) -> int:
+    async def downgrade_expired_memberships(self, db: AsyncSession) -> int:
         """降级过期会员到免费版"""
         try:
             # 查询已过期的付费会员
-            expired_members = db.execute("""
+            expired_members = (await db.execute(text("""
                 SELECT lawyer_id FROM lawyer_memberships 
-                WHERE end_date < %s AND membership_type != 'free'
-            """, (date.today(),)).fetchall()
+                WHERE end_date < :today AND membership_type != 'free'
+            """), {"today": date.today()})).mappings().fetchall()
             
             downgraded_count = 0
             for member in expired_members:
@@ -415,65 +421,67 @@ class LawyerMembershipService:
                 await self._downgrade_to_free(member['lawyer_id'], db)
                 downgraded_count += 1
             
-            db.commit()
+            await db.commit()
+            
+            if expired_members:
+                await invalidate_tags(*(f"lawyer:{member['lawyer_id']}" for member in expired_members))
             logger.info(f"成功降级 {downgraded_count} 个过期会员到免费版")
             
             return downgraded_count
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"降级过期会员失败: {str(e)}")
             return 0
     
-    async def _downgrade_to_free(self, lawyer_id: str, db: Session):
+    async def _downgrade_to_free(self, lawyer_id: str, db: AsyncSession):
         """降级律师到免费版"""
         free_config = self.MEMBERSHIP_TIERS['free']
         
-        db.execute("""
+        await db.execute(text("""
             UPDATE lawyer_memberships 
             SET membership_type = 'free',
-                start_date = %s,
-                end_date = %s,
-                benefits = %s,
-                daily_case_limit = %s,
+                start_date = :today,
+                end_date = :end_date,
+                benefits = :free_config,
+                daily_case_limit = :daily_case_limit,
                 monthly_amount_limit = 50000,
-                ai_credits_monthly = %s,
-                ai_credits_remaining = %s,
+                ai_credits_monthly = :ai_credits_monthly,
+                ai_credits_remaining = :ai_credits_monthly,
                 payment_amount = 0,
-                updated_at = %s
-            WHERE lawyer_id = %s
-        """, (
-            date.today(),
-            date.today() + timedelta(days=365*10),
-            free_config,
-            free_config['daily_case_limit'],
-            free_config['ai_credits_monthly'],
-            free_config['ai_credits_monthly'],
-            datetime.now(),
-            lawyer_id
-        ))
+                updated_at = :now
+            WHERE lawyer_id = :lawyer_id
+        """), {
+            "today": date.today(),
+            "end_date": date.today() + timedelta(days=365*10),
+            "free_config": json.dumps(free_config),
+            "daily_case_limit": free_config['daily_case_limit'],
+            "ai_credits_monthly": free_config['ai_credits_monthly'],
+            "now": datetime.now(),
+            "lawyer_id": lawyer_id
+        })
     
-    async def get_membership_statistics(self, db: Session) -> Dict[str, Any]:
+    async def get_membership_statistics(self, db: AsyncSession) -> Dict[str, Any]:
         """获取会员统计数据"""
         try:
             # 各类型会员数量统计
-            stats = db.execute("""
+            stats = (await db.execute(text("""
                 SELECT membership_type, COUNT(*) as count
                 FROM lawyer_memberships 
                 GROUP BY membership_type
-            """).fetchall()
+            """))).mappings().fetchall()
             
             membership_stats = {stat['membership_type']: stat['count'] for stat in stats}
             
             # 收入统计
-            revenue_stats = db.execute("""
+            revenue_stats = (await db.execute(text("""
                 SELECT 
                     SUM(CASE WHEN membership_type = 'professional' THEN payment_amount ELSE 0 END) as professional_revenue,
                     SUM(CASE WHEN membership_type = 'enterprise' THEN payment_amount ELSE 0 END) as enterprise_revenue,
                     SUM(payment_amount) as total_revenue
                 FROM lawyer_memberships 
                 WHERE membership_type != 'free'
-            """).fetchone()
+            """))).mappings().fetchone()
             
             # 转化率计算
             total_lawyers = sum(membership_stats.values())
@@ -10,9 +10,11 @@ from decimal import Decimal
 from uuid import UUID
 import json
 
-from sqlalchemy.orm import Session
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 
+from app.core.advanced_cache import cached, invalidate_tags
 from app.services.lawyer_membership_service import LawyerMembershipService
 from app.services.notification_channels import EmailNotifier
 
@@ -65,7 +67,7 @@ class LawyerPointsEngine:
         lawyer_id: UUID, 
         action: str, 
         context: Dict[str, Any],
-        db: Session
+        db: AsyncSession
     ) -> Dict[str, Any]:
         """计算积分 - 考虑会员倍数"""
         try:
@@ -92,7 +94,10 @@ class LawyerPointsEngine:
             # 7. 检查等级升级
             level_change = await self._check_level_upgrade(lawyer_id, db)
             
-            db.commit()
+            await db.commit()
+            
+            # 积分变动后失效该律师的缓存数据（积分汇总等）
+            await invalidate_tags(f"lawyer:{lawyer_id}")
             
             result = {
                 'points_earned': final_points,
@@ -110,7 +115,7 @@ class LawyerPointsEngine:
             return result
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"计算积分失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"计算积分失败: {str(e)}")
     
@@ -157,7 +162,7 @@ class LawyerPointsEngine:
         points_change: int, 
         multiplier: float,
         context: Dict[str, Any],
-        db: Session
+        db: AsyncSession
     ):
         """记录积分变动"""
         try:
@@ -176,21 +181,21 @@ class LawyerPointsEngine:
                 'related_case_id': context.get('case_id'),
                 'related_review_id': context.get('review_id'),
                 'description': self._generate_transaction_description(action, points_change, multiplier),
-                'metadata': {
+                'metadata': json.dumps({
                     'multiplier': multiplier,
                     'context': context,
                     'timestamp': datetime.now().isoformat()
-                }
+                }, default=str)
             }
             
-            db.execute("""
+            await db.execute(text("""
                 INSERT INTO lawyer_point_transactions 
                 (lawyer_id, transaction_type, points_change, points_before, points_after,
                  related_case_id, related_review_id, description, metadata)
-                VALUES (%(lawyer_id)s, %(transaction_type)s, %(points_change)s, %(points_before)s,
-                        %(points_after)s, %(related_case_id)s, %(related_review_id)s, 
-                        %(description)s, %(metadata)s)
-            """, transaction_data)
+                VALUES (:lawyer_id, :transaction_type, :points_change, :points_before,
+                        :points_after, :related_case_id, :related_review_id, 
+                        :description, :metadata)
+            """), transaction_data)
             
         except Exception as e:
             logger.error(f"记录积分变动失败: {str(e)}")
@@ -230,12 +235,12 @@ class LawyerPointsEngine:
         points_change: int, 
         action: str,
         context: Dict[str, Any],
-        db: Session
+        db: AsyncSession
     ):
         """更新律师等级详情"""
         try:
             # 构建更新数据
-            update_fields = ['level_points = level_points + %(points_change)s']
+            update_fields = ['level_points = level_points + :points_change']
             update_params = {'lawyer_id': str(lawyer_id), 'points_change': points_change}
             
             # 根据行为类型更新相应字段
@@ -247,8 +252,8 @@ class LawyerPointsEngine:
                 # 更新收入
                 case_amount = context.get('case_amount', 0)
                 if case_amount > 0:
-                    update_fields.append('total_revenue = total_revenue + %(case_amount)s')
-                    update_fields.append('total_cases_amount = total_cases_amount + %(case_amount)s')
+                    update_fields.append('total_revenue = total_revenue + :case_amount')
+                    update_fields.append('total_cases_amount = total_cases_amount + :case_amount')
                     update_params['case_amount'] = case_amount
             
             elif action.startswith('review_'):
@@ -256,7 +261,7 @@ class LawyerPointsEngine:
                 rating = context.get('rating', 0)
                 if rating > 0:
                     update_fields.append("""
-                        client_rating = (client_rating * cases_completed + %(rating)s) / (cases_completed + 1)
+                        client_rating = (client_rating * cases_completed + :rating) / (cases_completed + 1)
                     """)
                     update_params['rating'] = rating
             
@@ -265,13 +270,13 @@ class LawyerPointsEngine:
             
             elif action == 'ai_credit_used':
                 credits_used = context.get('credits_used', 1)
-                update_fields.append('total_ai_credits_used = total_ai_credits_used + %(credits_used)s')
+                update_fields.append('total_ai_credits_used = total_ai_credits_used + :credits_used')
                 update_params['credits_used'] = credits_used
             
             elif action.startswith('payment_'):
                 payment_amount = context.get('payment_amount', 0)
                 if payment_amount > 0:
-                    update_fields.append('total_paid_amount = total_paid_amount + %(payment_amount)s')
+                    update_fields.append('total_paid_amount = total_paid_amount + :payment_amount')
                     update_params['payment_amount'] = payment_amount
             
             # 更新成功率
@@ -289,30 +294,30 @@ class LawyerPointsEngine:
             update_sql = f"""
                 UPDATE lawyer_level_details 
                 SET {', '.join(update_fields)}
-                WHERE lawyer_id = %(lawyer_id)s
+                WHERE lawyer_id = :lawyer_id
             """
             
-            db.execute(update_sql, update_params)
+            await db.execute(text(update_sql), update_params)
             
         except Exception as e:
             logger.error(f"更新律师等级详情失败: {str(e)}")
             raise
     
-    async def _get_lawyer_level_details(self, lawyer_id: UUID, db: Session) -> Dict[str, Any]:
+    async def _get_lawyer_level_details(self, lawyer_id: UUID, db: AsyncSession) -> Dict[str, Any]:
         """获取律师等级详情"""
         try:
-            details = db.execute(
-                "SELECT * FROM lawyer_level_details WHERE lawyer_id = %s",
-                (str(lawyer_id),)
-            ).fetchone()
+            details = (await db.execute(
+                text("SELECT * FROM lawyer_level_details WHERE lawyer_id = :lawyer_id"),
+                {"lawyer_id": str(lawyer_id)}
+            )).mappings().fetchone()
             
             if not details:
                 # 如果没有记录，创建初始记录
                 await self.membership_service._initialize_lawyer_level_details(lawyer_id, db)
-                details = db.execute(
-                    "SELECT * FROM lawyer_level_details WHERE lawyer_id = %s",
-                    (str(lawyer_id),)
-                ).fetchone()
+                details = (await db.execute(
+                    text("SELECT * FROM lawyer_level_details WHERE lawyer_id = :lawyer_id"),
+                    {"lawyer_id": str(lawyer_id)}
+                )).mappings().fetchone()
             
             return dict(details) if details else {}
             
@@ -320,7 +325,7 @@ class LawyerPointsEngine:
             logger.error(f"获取律师等级详情失败: {str(e)}")
             return {}
     
-    async def _check_level_upgrade(self, lawyer_id: UUID, db: Session) -> Optional[Dict[str, Any]]:
+    async def _check_level_upgrade(self, lawyer_id: UUID, db: AsyncSession) -> Optional[Dict[str, Any]]:
         """检查律师等级升级"""
         try:
             lawyer_details = await self._get_lawyer_level_details(lawyer_id, db)
@@ -359,7 +364,7 @@ class LawyerPointsEngine:
             logger.error(f"检查等级升级失败: {str(e)}")
             return None
     
-    async def _upgrade_lawyer_level(self, lawyer_id: UUID, new_level: int, db: Session):
+    async def _upgrade_lawyer_level(self, lawyer_id: UUID, new_level: int, db: AsyncSession):
         """升级律师等级"""
         try:
             # 获取当前等级历史
@@ -377,15 +382,15 @@ class LawyerPointsEngine:
             level_history.append(upgrade_record)
             
             # 更新等级
-            db.execute("""
+            await db.execute(text("""
                 UPDATE lawyer_level_details 
-                SET current_level = %s,
-                    last_upgrade_date = %s,
-                    level_change_history = %s,
+                SET current_level = :new_level,
+                    last_upgrade_date = :today,
+                    level_change_history = :level_history,
                     upgrade_eligible = FALSE,
                     updated_at = NOW()
-                WHERE lawyer_id = %s
-            """, (new_level, date.today(), json.dumps(level_history), str(lawyer_id)))
+                WHERE lawyer_id = :lawyer_id
+            """), {"new_level": new_level, "today": date.today(), "level_history": json.dumps(level_history), "lawyer_id": str(lawyer_id)})
             
             logger.info(f"律师 {lawyer_id} 成功升级到等级 {new_level}")
             
@@ -398,7 +403,7 @@ class LawyerPointsEngine:
         lawyer_id: UUID, 
         old_level: int, 
         new_level: int,
-        db: Session
+        db: AsyncSession
     ):
         """发送等级升级通知"""
         try:
@@ -415,7 +420,8 @@ class LawyerPointsEngine:
             logger.error(f"发送升级通知失败: {str(e)}")
             # 不抛出异常，避免影响升级流程
     
-    async def get_lawyer_points_summary(self, lawyer_id: UUID, db: Session) -> Dict[str, Any]:
+    @cached(ttl=300, key_pattern="points:summary:{lawyer_id}", tags=["lawyer:{lawyer_id}"])
+    async def get_lawyer_points_summary(self, lawyer_id: UUID, db: AsyncSession) -> Dict[str, Any]:
         """获取律师积分汇总"""
         try:
             # 获取等级详情
@@ -441,13 +447,13 @@ class LawyerPointsEngine:
             membership = await self.membership_service.get_lawyer_membership(lawyer_id, db)
             
             # 获取最近积分变动
-            recent_transactions = db.execute("""
+            recent_transactions = (await db.execute(text("""
                 SELECT transaction_type, points_change, description, created_at
                 FROM lawyer_point_transactions 
-                WHERE lawyer_id = %s 
+                WHERE lawyer_id = :lawyer_id 
                 ORDER BY created_at DESC 
                 LIMIT 10
-            """, (str(lawyer_id),)).fetchall()
+            """), {"lawyer_id": str(lawyer_id)})).mappings().fetchall()
             
             return {
                 'current_level': current_level,
@@ -484,10 +490,10 @@ class LawyerPointsEngine:
             logger.error(f"获取律师积分汇总失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"获取积分汇总失败: {str(e)}")
     
-    async def get_points_leaderboard(self, db: Session, limit: int = 50) -> List[Dict[str, Any]]:
+    async def get_points_leaderboard(self, db: AsyncSession, limit: int = 50) -> List[Dict[str, Any]]:
         """获取积分排行榜"""
         try:
-            leaderboard = db.execute("""
+            leaderboard = (await db.execute(text("""
                 SELECT 
                     lld.lawyer_id,
                     u.username,
@@ -505,8 +511,8 @@ class LawyerPointsEngine:
                 LEFT JOIN lawyer_levels ll ON lld.current_level = ll.level
                 LEFT JOIN lawyer_memberships lm ON lld.lawyer_id = lm.lawyer_id
                 ORDER BY lld.level_points DESC, lld.current_level DESC
-                LIMIT %s
-            """, (limit,)).fetchall()
+                LIMIT :limit
+            """), {"limit": limit})).mappings().fetchall()
             
             return [
                 {
@@ -535,7 +541,7 @@ class LawyerPointsEngine:
         action: str, 
         points: int, 
         context: Dict[str, Any], 
-        db: Session
+        db: AsyncSession
     ):
         """记录审计日志"""
         try:
@@ -556,7 +562,7 @@ class LawyerPointsEngine:
             # 可以扩展到专门的审计日志表
             # audit_record = LawyerPointsAuditLog(**audit_log)
             # db.add(audit_record)
-            # db.commit()
+            # await db.commit()
             
         except Exception as e:
             logger.error(f"Error logging audit trail: {e}")
@@ -0,0 +1,351 @@
+"""
+律师业绩统计服务
+维护 lawyer_stats（见 migrations/024_lawyer_stats.sql）：每位律师的承办案件数、完成率、
+进行中的案件与金额、本月完成数、近30天成功率和收入。cases / transactions 的变更由触发器
+把律师写入 lawyer_stats_dirty，后台任务按批取出并只重算这些律师；定期全量校准，
+同时让近30天、本月这类随时间滚动的窗口保持准确。排行榜读这张表；
+工作量和分配打分读同一次重算写入的 lawyer_tenant_workload，只计当前租户的案件
+"""
+
+import asyncio
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# 全量校准在多个worker间互斥
+LAWYER_STATS_LOCK_KEY = 7301004
+
+# 排行类型 -> lawyer_stats 中带索引的排序列
+RANKING_COLUMNS = {
+    "cases": "cases_completed",
+    "revenue": "revenue",
+    "rating": "completion_rate",
+}
+
+STATS_COLUMNS = (
+    "cases_total", "cases_completed", "active_cases", "active_amount", "completed_this_month",
+    "cases_30d", "completed_30d", "completion_rate", "success_rate_30d", "revenue",
+)
+
+# 分租户工作量的列
+WORKLOAD_COLUMNS = ("active_cases", "active_amount", "completed_this_month")
+
+# 按律师重算：每位律师走 cases(assigned_to_user_id, status, created_at) 索引，
+# 收入经 transactions(case_id, status) 索引汇总
+_RECOMPUTE_SQL = """
+    INSERT INTO lawyer_stats (
+        lawyer_id, cases_total, cases_completed, active_cases, active_amount, completed_this_month,
+        cases_30d, completed_30d, completion_rate, success_rate_30d, revenue, computed_at
+    )
+    SELECT
+        l.lawyer_id,
+        c.cases_total, c.cases_completed, c.active_cases, c.active_amount, c.completed_this_month,
+        c.cases_30d, c.completed_30d,
+        CASE WHEN c.cases_total > 0 THEN ROUND(c.cases_completed::numeric / c.cases_total, 4) ELSE 0 END,
+        CASE WHEN c.cases_30d > 0 THEN ROUND(c.completed_30d::numeric / c.cases_30d, 4) ELSE 0 END,
+        r.revenue,
+        CURRENT_TIMESTAMP
+    FROM (
+        SELECT u.id AS lawyer_id
+        FROM users u
+        WHERE u.id = ANY(CAST(:lawyer_ids AS UUID[]))
+    ) l
+    CROSS JOIN LATERAL (
+        SELECT
+            COUNT(*) AS cases_total,
+            COUNT(*) FILTER (WHERE status = 'COMPLETED') AS cases_completed,
+            COUNT(*) FILTER (WHERE status IN ('ASSIGNED', 'IN_PROGRESS')) AS active_cases,
+            COALESCE(SUM(case_amount) FILTER (WHERE status IN ('ASSIGNED', 'IN_PROGRESS')), 0) AS active_amount,
+            COUNT(*) FILTER (
+                WHERE status = 'COMPLETED' AND completed_at >= date_trunc('month', CURRENT_TIMESTAMP)
+            ) AS completed_this_month,
+            COUNT(*) FILTER (WHERE created_at >= CURRENT_TIMESTAMP - INTERVAL '30 days') AS cases_30d,
+            COUNT(*) FILTER (
+                WHERE status = 'COMPLETED' AND created_at >= CURRENT_TIMESTAMP - INTERVAL '30 days'
+            ) AS completed_30d
+        FROM cases
+        WHERE assigned_to_user_id = l.lawyer_id
+    ) c
+    CROSS JOIN LATERAL (
+        SELECT COALESCE(SUM(t.amount), 0) AS revenue
+        FROM cases tc
+        JOIN transactions t ON t.case_id = tc.id
+        WHERE tc.assigned_to_user_id = l.lawyer_id
+          AND t.status = 'COMPLETED' AND t.transaction_type = 'PAYMENT'
+    ) r
+    ON CONFLICT (lawyer_id) DO UPDATE SET
+        cases_total = EXCLUDED.cases_total,
+        cases_completed = EXCLUDED.cases_completed,
+        active_cases = EXCLUDED.active_cases,
+        active_amount = EXCLUDED.active_amount,
+        completed_this_month = EXCLUDED.completed_this_month,
+        cases_30d = EXCLUDED.cases_30d,
+        completed_30d = EXCLUDED.completed_30d,
+        completion_rate = EXCLUDED.completion_rate,
+        success_rate_30d = EXCLUDED.success_rate_30d,
+        revenue = EXCLUDED.revenue,
+        computed_at = EXCLUDED.computed_at
+"""
+
+# 按律师重算分租户工作量：先删除旧行，再按 (律师, 租户) 汇总，律师不再有案件的租户不保留行
+_DELETE_WORKLOAD_SQL = """
+    DELETE FROM lawyer_tenant_workload WHERE lawyer_id = ANY(CAST(:lawyer_ids AS UUID[]))
+"""
+
+_RECOMPUTE_WORKLOAD_SQL = """
+    INSERT INTO lawyer_tenant_workload (
+        tenant_id, lawyer_id, active_cases, active_amount, completed_this_month, computed_at
+    )
+    SELECT
+        tenant_id,
+        assigned_to_user_id,
+        COUNT(*) FILTER (WHERE status IN ('ASSIGNED', 'IN_PROGRESS')),
+        COALESCE(SUM(case_amount) FILTER (WHERE status IN ('ASSIGNED', 'IN_PROGRESS')), 0),
+        COUNT(*) FILTER (
+            WHERE status = 'COMPLETED' AND completed_at >= date_trunc('month', CURRENT_TIMESTAMP)
+        ),
+        CURRENT_TIMESTAMP
+    FROM cases
+    WHERE assigned_to_user_id = ANY(CAST(:lawyer_ids AS UUID[]))
+    GROUP BY tenant_id, assigned_to_user_id
+"""
+
+# 取出一批待重算的律师；被写入方锁住的行跳过，留到下一轮
+_CLAIM_DIRTY_SQL = """
+    DELETE FROM lawyer_stats_dirty
+    WHERE lawyer_id IN (
+        SELECT lawyer_id FROM lawyer_stats_dirty
+        ORDER BY queued_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    RETURNING lawyer_id
+"""
+
+# 全量校准的律师：律师账号与所有被分配过案件的用户
+_ALL_LAWYERS_SQL = """
+    SELECT id FROM users WHERE user_type = 'lawyer'
+    UNION
+    SELECT DISTINCT assigned_to_user_id FROM cases WHERE assigned_to_user_id IS NOT NULL
+"""
+
+
+def chunked(items: List[Any], size: int) -> Iterable[List[Any]]:
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def empty_stats() -> Dict[str, Any]:
+    """没有统计行（从未分配过案件）的律师"""
+    return {column: 0 for column in STATS_COLUMNS}
+
+
+def empty_workload() -> Dict[str, Any]:
+    """在该租户下没有案件的律师"""
+    return {column: 0 for column in WORKLOAD_COLUMNS}
+
+
+async def recompute_lawyer_stats(db, lawyer_ids: Iterable[Any]) -> int:
+    """按当前案件与交易重算指定律师的统计，返回重算的律师数；由调用方提交"""
+    ids = sorted({str(lawyer_id) for lawyer_id in lawyer_ids if lawyer_id})
+    if not ids:
+        return 0
+    await db.execute(text(_RECOMPUTE_SQL), {'lawyer_ids': ids})
+    await db.execute(text(_DELETE_WORKLOAD_SQL), {'lawyer_ids': ids})
+    await db.execute(text(_RECOMPUTE_WORKLOAD_SQL), {'lawyer_ids': ids})
+    return len(ids)
+
+
+async def load_lawyer_stats(db, lawyer_ids: Iterable[Any]) -> Dict[str, Dict[str, Any]]:
+    """一次读取多位律师的统计 {律师ID字符串: 统计}，没有统计行的律师返回全零"""
+    ids = sorted({str(lawyer_id) for lawyer_id in lawyer_ids if lawyer_id})
+    if not ids:
+        return {}
+    result = await db.execute(text(f"""
+        SELECT lawyer_id, {', '.join(STATS_COLUMNS)}
+        FROM lawyer_stats
+        WHERE lawyer_id = ANY(CAST(:lawyer_ids AS UUID[]))
+    """), {'lawyer_ids': ids})
+    stats = {lawyer_id: empty_stats() for lawyer_id in ids}
+    for row in result.mappings():
+        stats[str(row['lawyer_id'])] = {column: row[column] for column in STATS_COLUMNS}
+    return stats
+
+
+async def load_lawyer_workload(db, lawyer_ids: Iterable[Any], tenant_id: Any) -> Dict[str, Dict[str, Any]]:
+    """一次读取多位律师在指定租户下的工作量 {律师ID字符串: 工作量}，没有案件的律师返回全零"""
+    ids = sorted({str(lawyer_id) for lawyer_id in lawyer_ids if lawyer_id})
+    if not ids:
+        return {}
+    result = await db.execute(text(f"""
+        SELECT lawyer_id, {', '.join(WORKLOAD_COLUMNS)}
+        FROM lawyer_tenant_workload
+        WHERE tenant_id = CAST(:tenant_id AS UUID) AND lawyer_id = ANY(CAST(:lawyer_ids AS UUID[]))
+    """), {'tenant_id': str(tenant_id), 'lawyer_ids': ids})
+    workload = {lawyer_id: empty_workload() for lawyer_id in ids}
+    for row in result.mappings():
+        workload[str(row['lawyer_id'])] = {column: row[column] for column in WORKLOAD_COLUMNS}
+    return workload
+
+
+async def load_lawyer_ranking(db, ranking_type: str, limit: int, offset: int) -> Dict[str, Any]:
+    """
+    按指标读取律师排行的一页 {'items': [...], 'total': n}
+
+    按 (指标 DESC, lawyer_id) 排序，与 lawyer_stats 上的索引一致，取一页只扫描 offset + limit 个索引项
+    """
+    if ranking_type not in RANKING_COLUMNS:
+        raise ValueError(f"未知的排行类型: {ranking_type}")
+    column = RANKING_COLUMNS[ranking_type]
+    result = await db.execute(text(f"""
+        SELECT s.lawyer_id, u.name, u.region, {', '.join('s.' + c for c in STATS_COLUMNS)}
+        FROM lawyer_stats s
+        JOIN users u ON u.id = s.lawyer_id
+        ORDER BY s.{column} DESC, s.lawyer_id
+        LIMIT :limit OFFSET :offset
+    """), {'limit': limit, 'offset': offset})
+    items = [dict(row) for row in result.mappings()]
+    total = (await db.execute(text("SELECT COUNT(*) FROM lawyer_stats"))).scalar() or 0
+    return {'items': items, 'total': total}
+
+
+class LawyerStatsRefresher:
+    """
+    律师统计的后台维护
+
+    每轮从 lawyer_stats_dirty 取一批律师，在同一事务内删除队列行并重算，失败回滚后队列行仍在；
+    写入方对队列行用 ON CONFLICT DO UPDATE，正被取走的行会让写入方等待并重新入队，变更不会丢失。
+    全量校准用 pg_try_advisory_xact_lock 只让一个worker执行，分批提交
+    """
+
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        reconcile_interval: Optional[int] = None,
+        batch_size: Optional[int] = None
+    ):
+        self.interval = interval if interval is not None else settings.LAWYER_STATS_REFRESH_INTERVAL
+        self.reconcile_interval = (
+            reconcile_interval if reconcile_interval is not None else settings.LAWYER_STATS_RECONCILE_INTERVAL
+        )
+        self.batch_size = batch_size or settings.LAWYER_STATS_BATCH_SIZE
+        self._task: Optional[asyncio.Task] = None
+        self._last_reconcile: Optional[float] = None
+        self.stats = {
+            'refresh_runs': 0,
+            'lawyers_refreshed': 0,
+            'reconciles': 0,
+            'skipped_reconciles': 0,
+            'lawyers_reconciled': 0,
+            'run_errors': 0,
+            'last_reconcile_seconds': 0.0,
+        }
+
+    @staticmethod
+    def _session_factory(session_factory):
+        if session_factory is None:
+            from app.core.database import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+        return session_factory
+
+    async def refresh_dirty(self, session_factory=None, max_batches: Optional[int] = None) -> int:
+        """重算队列中的律师直到队列为空，返回重算的律师数"""
+        session_factory = self._session_factory(session_factory)
+        refreshed = 0
+        batches = 0
+        async with session_factory() as db:
+            while max_batches is None or batches < max_batches:
+                result = await db.execute(text(_CLAIM_DIRTY_SQL), {'limit': self.batch_size})
+                lawyer_ids = [row[0] for row in result.fetchall()]
+                if not lawyer_ids:
+                    await db.rollback()
+                    break
+                await recompute_lawyer_stats(db, lawyer_ids)
+                await db.commit()
+                refreshed += len(lawyer_ids)
+                batches += 1
+        self.stats['refresh_runs'] += 1
+        self.stats['lawyers_refreshed'] += refreshed
+        return refreshed
+
+    async def reconcile(self, session_factory=None, wait: bool = False) -> Dict[str, Any]:
+        """
+        全量重算所有律师，修正触发器之外的漂移并滚动时间窗口
+
+        wait=False 时其他worker正在校准则跳过；手动执行用 wait=True 排队等待
+        """
+        session_factory = self._session_factory(session_factory)
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        lock_sql = "pg_advisory_xact_lock" if wait else "pg_try_advisory_xact_lock"
+        reconciled = 0
+
+        async with session_factory() as db:
+            lawyer_ids = [row[0] for row in (await db.execute(text(_ALL_LAWYERS_SQL))).fetchall()]
+            await db.commit()
+            for batch in chunked(lawyer_ids, self.batch_size):
+                locked = (await db.execute(
+                    text(f"SELECT {lock_sql}(:lock_key)"), {'lock_key': LAWYER_STATS_LOCK_KEY}
+                )).scalar()
+                if locked is False:
+                    await db.rollback()
+                    self.stats['skipped_reconciles'] += 1
+                    return {'skipped': True, 'lawyers': reconciled}
+                reconciled += await recompute_lawyer_stats(db, batch)
+                await db.commit()
+
+        self.stats['reconciles'] += 1
+        self.stats['lawyers_reconciled'] += reconciled
+        self.stats['last_reconcile_seconds'] = round(loop.time() - started, 3)
+        return {'skipped': False, 'lawyers': reconciled}
+
+    # ---------- 后台任务 ----------
+
+    def start(self) -> None:
+        if not self.interval:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"律师统计维护已启动（间隔 {self.interval}s，全量校准 {self.reconcile_interval}s）")
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def _reconcile_due(self, now: float) -> bool:
+        if not self.reconcile_interval:
+            return False
+        return self._last_reconcile is None or now - self._last_reconcile >= self.reconcile_interval
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            try:
+                if self._reconcile_due(loop.time()):
+                    self._last_reconcile = loop.time()
+                    await self.reconcile()
+                await self.refresh_dirty()
+            except Exception as e:
+                self.stats['run_errors'] += 1
+                logger.error(f"律师统计维护失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'running': self.running, 'interval': self.interval}
+
+
+lawyer_stats_refresher = LawyerStatsRefresher()
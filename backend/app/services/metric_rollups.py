@@ -0,0 +1,416 @@
+"""
+指标汇总服务
+按小时、按天维护注册数、收入、PV/UV、错误数和响应时间的汇总表（见 migrations/022_metric_rollups.sql）。
+后台任务从水位线开始增量汇总，每次都回看最近若干小时重算，迟到的数据会被重新计入；
+重算按时间范围覆盖写入，同一范围重复执行结果不变。所有原始数据查询都用
+created_at 的范围条件，可以走索引，不再使用 DATE(created_at)
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import text
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ROLLUP_NAME = "metrics"
+# 汇总任务各worker竞争的咨询锁
+ROLLUP_LOCK_KEY = 7301002
+HOUR = timedelta(hours=1)
+DAY = timedelta(days=1)
+
+# 图表可读取的指标：名称 -> 汇总表中的列表达式
+ROLLUP_METRICS = {
+    "signups": "signups",
+    "revenue": "revenue",
+    "paid_transactions": "paid_transactions",
+    "pv": "pv",
+    "uv": "uv",
+    "unique_ips": "unique_ips",
+    "mobile_visits": "mobile_visits",
+    "desktop_visits": "desktop_visits",
+    "errors": "client_errors + server_errors",
+    "server_errors": "server_errors",
+    "avg_latency_ms": "COALESCE(latency_sum_ms / NULLIF(latency_count, 0), 0)",
+    "max_latency_ms": "latency_max_ms",
+}
+
+_HOURLY_SQL = """
+    INSERT INTO metric_rollups_hourly (
+        bucket_start, signups, revenue, paid_transactions, pv, uv, unique_ips,
+        mobile_visits, desktop_visits, client_errors, server_errors,
+        latency_sum_ms, latency_count, latency_max_ms, updated_at
+    )
+    SELECT
+        h.bucket_start,
+        COALESCE(u.signups, 0), COALESCE(t.revenue, 0), COALESCE(t.paid_transactions, 0),
+        COALESCE(a.pv, 0), COALESCE(a.uv, 0), COALESCE(a.unique_ips, 0),
+        COALESCE(a.mobile_visits, 0), COALESCE(a.desktop_visits, 0),
+        COALESCE(a.client_errors, 0), COALESCE(a.server_errors, 0),
+        COALESCE(a.latency_sum_ms, 0), COALESCE(a.latency_count, 0), COALESCE(a.latency_max_ms, 0),
+        CURRENT_TIMESTAMP
+    FROM generate_series(
+        CAST(:start AS TIMESTAMP), CAST(:end AS TIMESTAMP) - INTERVAL '1 hour', INTERVAL '1 hour'
+    ) AS h(bucket_start)
+    LEFT JOIN (
+        SELECT
+            date_trunc('hour', created_at) AS bucket_start,
+            COUNT(*) AS pv,
+            COUNT(DISTINCT session_id) AS uv,
+            COUNT(DISTINCT ip_address) AS unique_ips,
+            COUNT(*) FILTER (WHERE device_type = 'mobile') AS mobile_visits,
+            COUNT(*) FILTER (WHERE device_type = 'desktop') AS desktop_visits,
+            COUNT(*) FILTER (WHERE status_code >= 400 AND status_code < 500) AS client_errors,
+            COUNT(*) FILTER (WHERE status_code >= 500) AS server_errors,
+            SUM(response_time) AS latency_sum_ms,
+            COUNT(response_time) AS latency_count,
+            MAX(response_time) AS latency_max_ms
+        FROM access_logs
+        WHERE created_at >= CAST(:start AS TIMESTAMP) AND created_at < CAST(:end AS TIMESTAMP)
+        GROUP BY 1
+    ) a USING (bucket_start)
+    LEFT JOIN (
+        SELECT CAST(date_trunc('hour', created_at) AS TIMESTAMP) AS bucket_start, COUNT(*) AS signups
+        FROM users
+        WHERE created_at >= CAST(:start AS TIMESTAMP) AND created_at < CAST(:end AS TIMESTAMP)
+        GROUP BY 1
+    ) u USING (bucket_start)
+    LEFT JOIN (
+        SELECT
+            CAST(date_trunc('hour', created_at) AS TIMESTAMP) AS bucket_start,
+            SUM(amount) AS revenue,
+            COUNT(*) AS paid_transactions
+        FROM transactions
+        WHERE status = 'COMPLETED'
+          AND created_at >= CAST(:start AS TIMESTAMP) AND created_at < CAST(:end AS TIMESTAMP)
+        GROUP BY 1
+    ) t USING (bucket_start)
+    ON CONFLICT (bucket_start) DO UPDATE SET
+        signups = EXCLUDED.signups,
+        revenue = EXCLUDED.revenue,
+        paid_transactions = EXCLUDED.paid_transactions,
+        pv = EXCLUDED.pv,
+        uv = EXCLUDED.uv,
+        unique_ips = EXCLUDED.unique_ips,
+        mobile_visits = EXCLUDED.mobile_visits,
+        desktop_visits = EXCLUDED.desktop_visits,
+        client_errors = EXCLUDED.client_errors,
+        server_errors = EXCLUDED.server_errors,
+        latency_sum_ms = EXCLUDED.latency_sum_ms,
+        latency_count = EXCLUDED.latency_count,
+        latency_max_ms = EXCLUDED.latency_max_ms,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+# 可加列由小时汇总相加；UV、独立IP 需要按整天去重，直接对当天的访问日志做范围扫描
+_DAILY_SQL = """
+    INSERT INTO metric_rollups_daily (
+        bucket_date, signups, revenue, paid_transactions, pv, uv, unique_ips,
+        mobile_visits, desktop_visits, client_errors, server_errors,
+        latency_sum_ms, latency_count, latency_max_ms, updated_at
+    )
+    SELECT
+        h.bucket_date, h.signups, h.revenue, h.paid_transactions, h.pv,
+        COALESCE(d.uv, 0), COALESCE(d.unique_ips, 0),
+        h.mobile_visits, h.desktop_visits, h.client_errors, h.server_errors,
+        h.latency_sum_ms, h.latency_count, h.latency_max_ms,
+        CURRENT_TIMESTAMP
+    FROM (
+        SELECT
+            CAST(bucket_start AS DATE) AS bucket_date,
+            SUM(signups) AS signups,
+            SUM(revenue) AS revenue,
+            SUM(paid_transactions) AS paid_transactions,
+            SUM(pv) AS pv,
+            SUM(mobile_visits) AS mobile_visits,
+            SUM(desktop_visits) AS desktop_visits,
+            SUM(client_errors) AS client_errors,
+            SUM(server_errors) AS server_errors,
+            SUM(latency_sum_ms) AS latency_sum_ms,
+            SUM(latency_count) AS latency_count,
+            MAX(latency_max_ms) AS latency_max_ms
+        FROM metric_rollups_hourly
+        WHERE bucket_start >= CAST(:start AS TIMESTAMP) AND bucket_start < CAST(:end AS TIMESTAMP)
+        GROUP BY 1
+    ) h
+    LEFT JOIN (
+        SELECT
+            CAST(created_at AS DATE) AS bucket_date,
+            COUNT(DISTINCT session_id) AS uv,
+            COUNT(DISTINCT ip_address) AS unique_ips
+        FROM access_logs
+        WHERE created_at >= CAST(:start AS TIMESTAMP) AND created_at < CAST(:end AS TIMESTAMP)
+        GROUP BY 1
+    ) d USING (bucket_date)
+    ON CONFLICT (bucket_date) DO UPDATE SET
+        signups = EXCLUDED.signups,
+        revenue = EXCLUDED.revenue,
+        paid_transactions = EXCLUDED.paid_transactions,
+        pv = EXCLUDED.pv,
+        uv = EXCLUDED.uv,
+        unique_ips = EXCLUDED.unique_ips,
+        mobile_visits = EXCLUDED.mobile_visits,
+        desktop_visits = EXCLUDED.desktop_visits,
+        client_errors = EXCLUDED.client_errors,
+        server_errors = EXCLUDED.server_errors,
+        latency_sum_ms = EXCLUDED.latency_sum_ms,
+        latency_count = EXCLUDED.latency_count,
+        latency_max_ms = EXCLUDED.latency_max_ms,
+        updated_at = CURRENT_TIMESTAMP
+"""
+
+
+def floor_hour(value: datetime) -> datetime:
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(value: datetime) -> datetime:
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def ceil_hour(value: datetime) -> datetime:
+    floored = floor_hour(value)
+    return floored if floored == value else floored + HOUR
+
+
+def rollup_window(
+    watermark: Optional[datetime],
+    now: datetime,
+    late_window: timedelta,
+    initial_lookback: timedelta
+) -> Tuple[datetime, datetime]:
+    """
+    本次增量汇总的时间范围 [start, end)
+
+    从水位线回看 late_window 开始，到当前小时结束（当前小时的数据不完整，下一次会再算）；
+    没有水位线时从 initial_lookback 之前开始，更早的历史由回填脚本生成
+    """
+    current_hour = floor_hour(now)
+    if watermark is None:
+        start = current_hour - initial_lookback
+    else:
+        start = min(floor_hour(watermark), current_hour) - late_window
+    return start, current_hour + HOUR
+
+
+def split_by_day(start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+    """把 [start, end) 按自然日切成若干段，每段单独提交，避免长事务"""
+    chunks = []
+    cursor = start
+    while cursor < end:
+        chunk_end = min(floor_day(cursor) + DAY, end)
+        chunks.append((cursor, chunk_end))
+        cursor = chunk_end
+    return chunks
+
+
+class MetricRollupEngine:
+    """
+    指标汇总引擎
+
+    每个时间段在一个事务内完成：重算该段的小时汇总，重算该段涉及的整天汇总，推进水位线。
+    多个worker同时运行时，定时任务用 pg_try_advisory_xact_lock 只让一个执行，
+    手动重算/回填用阻塞锁与定时任务串行
+    """
+
+    def __init__(
+        self,
+        interval: Optional[float] = None,
+        late_window_hours: Optional[int] = None,
+        initial_lookback_hours: Optional[int] = None
+    ):
+        self.interval = interval if interval is not None else settings.METRIC_ROLLUP_INTERVAL
+        self.late_window = timedelta(hours=(
+            late_window_hours if late_window_hours is not None else settings.METRIC_ROLLUP_LATE_WINDOW_HOURS
+        ))
+        self.initial_lookback = timedelta(hours=(
+            initial_lookback_hours if initial_lookback_hours is not None
+            else settings.METRIC_ROLLUP_INITIAL_LOOKBACK_HOURS
+        ))
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {
+            'runs': 0,
+            'skipped_runs': 0,
+            'run_errors': 0,
+            'hours_aggregated': 0,
+            'last_run_seconds': 0.0,
+            'last_watermark': None,
+        }
+
+    @staticmethod
+    def _session_factory(session_factory):
+        if session_factory is None:
+            from app.core.database import AsyncSessionLocal
+            session_factory = AsyncSessionLocal
+        return session_factory
+
+    # ---------- 汇总 ----------
+
+    async def get_watermark(self, db) -> Optional[datetime]:
+        result = await db.execute(
+            text("SELECT watermark FROM rollup_watermarks WHERE rollup_name = :name"), {'name': ROLLUP_NAME}
+        )
+        return result.scalar()
+
+    async def _set_watermark(self, db, watermark: datetime) -> None:
+        # 水位线只前进；回填更早的历史不会把它拉回去
+        await db.execute(text("""
+            INSERT INTO rollup_watermarks (rollup_name, watermark, updated_at)
+            VALUES (:name, CAST(:watermark AS TIMESTAMP), CURRENT_TIMESTAMP)
+            ON CONFLICT (rollup_name) DO UPDATE SET
+                watermark = GREATEST(rollup_watermarks.watermark, EXCLUDED.watermark),
+                updated_at = CURRENT_TIMESTAMP
+        """), {'name': ROLLUP_NAME, 'watermark': watermark})
+
+    async def aggregate_range(self, db, start: datetime, end: datetime) -> int:
+        """
+        重算 [start, end) 内的小时汇总及其涉及的整天汇总，返回重算的小时数；由调用方提交
+
+        范围向外取整到整小时；天汇总按涉及的整天重算，保证 UV 按天去重
+        """
+        start, end = floor_hour(start), ceil_hour(end)
+        if start >= end:
+            return 0
+        await db.execute(text(_HOURLY_SQL), {'start': start, 'end': end})
+        day_end = floor_day(end) if floor_day(end) == end else floor_day(end) + DAY
+        await db.execute(text(_DAILY_SQL), {'start': floor_day(start), 'end': day_end})
+        return int((end - start) / HOUR)
+
+    async def run_once(self, session_factory=None, now: Optional[datetime] = None) -> Dict[str, Any]:
+        """从水位线增量汇总一次；其他worker正在汇总时跳过"""
+        session_factory = self._session_factory(session_factory)
+        now = now or datetime.now()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        hours = 0
+
+        async with session_factory() as db:
+            watermark = await self.get_watermark(db)
+            await db.commit()
+            start, end = rollup_window(watermark, now, self.late_window, self.initial_lookback)
+            current_hour = floor_hour(now)
+            for chunk_start, chunk_end in split_by_day(start, end):
+                locked = (await db.execute(
+                    text("SELECT pg_try_advisory_xact_lock(:lock_key)"), {'lock_key': ROLLUP_LOCK_KEY}
+                )).scalar()
+                if not locked:
+                    await db.rollback()
+                    self.stats['skipped_runs'] += 1
+                    return {'skipped': True, 'hours': hours}
+                hours += await self.aggregate_range(db, chunk_start, chunk_end)
+                await self._set_watermark(db, min(chunk_end, current_hour))
+                await db.commit()
+
+        self.stats['runs'] += 1
+        self.stats['hours_aggregated'] += hours
+        self.stats['last_run_seconds'] = round(loop.time() - started, 3)
+        self.stats['last_watermark'] = current_hour.isoformat()
+        return {'skipped': False, 'start': start, 'end': end, 'hours': hours}
+
+    async def reaggregate(
+        self,
+        start: datetime,
+        end: datetime,
+        session_factory=None,
+        progress: Optional[Callable[[datetime, datetime], None]] = None
+    ) -> int:
+        """
+        重算任意时间范围（回填历史、修正超出回看窗口的迟到数据），返回重算的小时数
+
+        按天分段提交；重算不会改变水位线之后的增量进度
+        """
+        session_factory = self._session_factory(session_factory)
+        hours = 0
+        async with session_factory() as db:
+            for chunk_start, chunk_end in split_by_day(floor_hour(start), ceil_hour(end)):
+                await db.execute(text("SELECT pg_advisory_xact_lock(:lock_key)"), {'lock_key': ROLLUP_LOCK_KEY})
+                hours += await self.aggregate_range(db, chunk_start, chunk_end)
+                await db.commit()
+                if progress:
+                    progress(chunk_start, chunk_end)
+        self.stats['hours_aggregated'] += hours
+        return hours
+
+    # ---------- 后台任务 ----------
+
+    def start(self) -> None:
+        if not self.interval:
+            return
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+            logger.info(f"指标汇总已启动（间隔 {self.interval}s，回看 {self.late_window}）")
+
+    async def stop(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                self.stats['run_errors'] += 1
+                logger.error(f"指标汇总失败: {e}")
+            await asyncio.sleep(self.interval)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, 'running': self.running, 'interval': self.interval}
+
+
+async def load_rollup_series(
+    db,
+    metric: str,
+    days: int,
+    granularity: str = "day"
+) -> List[Tuple[datetime, float]]:
+    """
+    从汇总表读取最近 days 天的指标序列 [(时间, 值)]
+
+    day 粒度读 metric_rollups_daily（今天及之前 days 天），hour 粒度读 metric_rollups_hourly
+    """
+    if metric not in ROLLUP_METRICS:
+        raise ValueError(f"未知的汇总指标: {metric}")
+    column = ROLLUP_METRICS[metric]
+    if granularity == "hour":
+        query = f"""
+            SELECT bucket_start, {column} AS value
+            FROM metric_rollups_hourly
+            WHERE bucket_start >= CAST(:since AS TIMESTAMP)
+            ORDER BY bucket_start
+        """
+        params = {'since': floor_hour(datetime.now()) - timedelta(days=days)}
+    else:
+        query = f"""
+            SELECT bucket_date, {column} AS value
+            FROM metric_rollups_daily
+            WHERE bucket_date >= CAST(:since AS DATE)
+            ORDER BY bucket_date
+        """
+        params = {'since': date.today() - timedelta(days=days)}
+    result = await db.execute(text(query), params)
+    return [(row[0], float(row[1] or 0)) for row in result.fetchall()]
+
+
+async def load_daily_rollup(db, target_date: date) -> Optional[Dict[str, Any]]:
+    result = await db.execute(
+        text("SELECT * FROM metric_rollups_daily WHERE bucket_date = :target_date"),
+        {'target_date': target_date}
+    )
+    row = result.mappings().first()
+    return dict(row) if row else None
+
+
+metric_rollup_engine = MetricRollupEngine()
@@ -15,10 +15,12 @@ from uuid import UUID
 
 import httpx
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
 
 from app.services.config_service import SystemConfigService
 from app.core.database import get_db
+from app.core.pagination import SqlFilter, paginate_sql
 from app.models.finance import Transaction, Wallet, WithdrawalRequest, PaymentStatus, WithdrawalStatus
 from app.models.case import Case
 from app.models.user import User
@@ -637,53 +639,75 @@ class WithdrawalService:
     
     async def get_withdrawal_requests(
         self, 
-        user_id: UUID, 
-        status: Optional[str] = None, 
+        user_id: Optional[UUID], 
+        status: Optional[WithdrawalStatus] = None, 
         page: int = 1, 
         size: int = 20, 
-        db: Session = None
+        db: AsyncSession = None,
+        cursor: Optional[str] = None,
+        count: str = "auto"
     ) -> Dict[str, Any]:
-        """获取用户提现申请列表"""
-        try:
-            # 这里返回模拟数据，实际应该从数据库查询
-            items = []
-            for i in range(min(size, 5)):  # 返回最多5条模拟数据
-                items.append({
-                    "id": f"withdrawal_{i+1}",
-                    "request_number": f"WD{20240100 + i + 1}",
-                    "user_id": str(user_id),
-                    "user_name": "测试用户",
-                    "amount": 1000.0 + (i * 100),
-                    "fee": 10.0 + i,
-                    "actual_amount": 990.0 + (i * 100),
-                    "bank_account": f"****{1234 + i}",
-                    "bank_name": "测试银行",
-                    "account_holder": "测试用户",
-                    "status": "completed" if i % 2 == 0 else "pending",
-                    "risk_score": 15.5 + (i * 5),
-                    "auto_approved": i % 2 == 0,
-                    "admin_notes": None,
-                    "created_at": "2024-01-15T10:00:00",
-                    "processed_at": "2024-01-15T12:00:00" if i % 2 == 0 else None
-                })
-            
-            return {
-                "items": items,
-                "total": len(items),
-                "page": page,
-                "size": size,
-                "pages": 1
-            }
-            
-        except Exception as e:
-            logger.error(f"获取提现申请列表失败: {str(e)}")
-            return {
-                "items": [],
-                "total": 0,
-                "page": page,
-                "size": size,
-                "pages": 0
+        """获取提现申请列表（user_id 为空时返回所有用户的申请）"""
+        sql_filter = SqlFilter()
+        if user_id:
+            sql_filter.add("w.user_id = :user_id", user_id=str(user_id))
+        if status:
+            sql_filter.add("w.status = :status", status=status.value)
+        
+        result = await paginate_sql(
+            db,
+            columns="""
+                w.id, w.request_number, w.user_id, u.username AS user_name,
+                w.amount, w.fee, w.actual_amount, w.bank_account, w.bank_name,
+                w.account_holder, w.status, w.risk_score, w.auto_approved,
+                w.admin_notes, w.created_at, w.processed_at
+            """,
+            from_sql="FROM withdrawal_requests w LEFT JOIN users u ON u.id = w.user_id",
+            sql_filter=sql_filter,
+            created_column="w.created_at",
+            id_column="w.id",
+            cursor=cursor,
+            limit=size,
+            offset=(page - 1) * size,
+            count=count
+        )
+        
+        items = [
+            {
+                "id": str(row["id"]),
+                "request_number": row["request_number"],
+                "user_id": str(row["user_id"]),
+                "user_name": row["user_name"] or "",
+                "amount": float(row["amount"]),
+                "fee": float(row["fee"]),
+                "actual_amount": float(row["actual_amount"]),
+                "bank_account": self._mask_bank_account(row["bank_account"]),
+                "bank_name": row["bank_name"],
+                "account_holder": row["account_holder"],
+                "status": str(row["status"]),
+                "risk_score": float(row["risk_score"]) if row["risk_score"] is not None else None,
+                "auto_approved": row["auto_approved"],
+                "admin_notes": row["admin_notes"],
+                "created_at": row["created_at"].isoformat(),
+                "processed_at": row["processed_at"].isoformat() if row["processed_at"] else None
             }
+            for row in result.items
+        ]
+        
+        return {
+            "items": items,
+            "total": result.total or 0,
+            "page": page,
+            "size": size,
+            "pages": result.total_pages(size),
+            "next_cursor": result.next_cursor,
+            "has_more": result.has_more,
+            "total_is_estimate": result.total_is_estimate
+        }
+    
+    @staticmethod
+    def _mask_bank_account(bank_account: str) -> str:
+        return f"****{bank_account[-4:]}" if bank_account else ""
 
 
 # 服务实例工厂函数
@@ -101,7 +101,7 @@ class PerformanceOptimizationService:
             logger.error(f"Credits支付优化失败: {e}")
             raise
     
-    @cached(ttl=300, key_pattern="lawyer_levels:{}")
+    @cached(ttl=300, key_pattern="lawyer_levels")
     async def get_cached_lawyer_levels(self, fetch_func):
         """缓存律师等级数据"""
         try:
@@ -1,188 +1,469 @@
 """
 实时数据聚合服务
-定期聚合系统数据并推送到WebSocket客户端
+用内存计数维护管理员看板数据，按间隔向在线管理员推送变化的字段
+
+- 访问日志和用户活动写入数据库后由写入方调用 record_access_logs / record_activities 累加计数，
+  不再每次推送都对当天日志做全量聚合；计数定期与数据库对账，修正其他进程写入的数据和漂移
+- 没有管理员连接时暂停：不累加、不查询、不推送，再有管理员连接时先对账再恢复
+- 推送 stats_delta 消息，只包含变化的字段（JSON Merge Patch，RFC 7386），带递增的 seq；
+  客户端发现 seq 不连续时发送 {"type": "resync"}，收到 stats_snapshot 全量数据后继续应用增量
 """
 
 import asyncio
-import json
 import logging
-from datetime import datetime, timedelta
-from typing import Dict, Any
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
 
+from app.core.config import settings
 from app.core.database import AsyncSessionLocal
-from app.services.websocket_manager import broadcast_stats_update, broadcast_system_alert
+from app.services.websocket_manager import broadcast_system_alert, websocket_manager
 
 logger = logging.getLogger(__name__)
 
+SLOW_REQUEST_MS = 3000
+PERFORMANCE_WINDOW_MINUTES = 60
+
+
+def merge_diff(old: Dict[str, Any], new: Dict[str, Any]) -> Dict[str, Any]:
+    """计算把 old 变成 new 的 JSON Merge Patch，没有变化时返回空字典"""
+    patch: Dict[str, Any] = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            child = merge_diff(previous, value)
+            if child:
+                patch[key] = child
+        elif key not in old or previous != value:
+            patch[key] = value
+    for key in old:
+        if key not in new:
+            patch[key] = None
+    return patch
+
+
+def apply_merge_patch(document: Dict[str, Any], patch: Dict[str, Any]) -> Dict[str, Any]:
+    """按 JSON Merge Patch 更新文档（客户端的处理方式，返回新字典）"""
+    result = dict(document)
+    for key, value in patch.items():
+        if value is None:
+            result.pop(key, None)
+        elif isinstance(value, dict) and isinstance(result.get(key), dict):
+            result[key] = apply_merge_patch(result[key], value)
+        else:
+            result[key] = value
+    return result
+
+
+def _as_datetime(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None) if value.tzinfo else value
+    if isinstance(value, str):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+            return parsed.replace(tzinfo=None) if parsed.tzinfo else parsed
+        except ValueError:
+            pass
+    return datetime.now()
+
+
+class DashboardCounters:
+    """当天访问/活动计数和最近一小时按分钟的性能计数"""
+
+    def __init__(self, day: Optional[date] = None):
+        # {分钟: [请求数, 有响应时间的请求数, 响应时间合计, 最大响应时间, 慢请求数, 错误数]}，跨天保留
+        self.minutes: Dict[datetime, List[float]] = defaultdict(lambda: [0, 0, 0.0, 0, 0, 0])
+        self._reset_day(day or date.today())
+
+    def _reset_day(self, day: date) -> None:
+        self.day = day
+        self.visits = 0
+        self.visitor_ips: set = set()
+        self.visit_users: set = set()
+        self.response_sum = 0.0
+        self.response_count = 0
+        self.mobile_visits = 0
+        self.desktop_visits = 0
+        self.error_count = 0
+        self.activities = 0
+        self.activity_users: set = set()
+        self.login_count = 0
+        self.case_activities = 0
+        self.payment_activities = 0
+
+    def _roll_day(self, now: datetime) -> None:
+        if now.date() != self.day:
+            self._reset_day(now.date())
+
+    def add_access(self, log: Dict[str, Any], now: Optional[datetime] = None) -> None:
+        now = now or datetime.now()
+        self._roll_day(now)
+        created_at = _as_datetime(log.get("created_at"))
+        response_time = log.get("response_time")
+        status_code = log.get("status_code") or 0
+
+        if created_at.date() == self.day:
+            self.visits += 1
+            if log.get("ip_address"):
+                self.visitor_ips.add(str(log["ip_address"]))
+            if log.get("user_id"):
+                self.visit_users.add(str(log["user_id"]))
+            if response_time is not None:
+                self.response_sum += response_time
+                self.response_count += 1
+            if log.get("device_type") == "mobile":
+                self.mobile_visits += 1
+            elif log.get("device_type") == "desktop":
+                self.desktop_visits += 1
+            if status_code >= 400:
+                self.error_count += 1
+
+        if created_at >= now - timedelta(minutes=PERFORMANCE_WINDOW_MINUTES):
+            bucket = self.minutes[created_at.replace(second=0, microsecond=0)]
+            bucket[0] += 1
+            if response_time is not None:
+                bucket[1] += 1
+                bucket[2] += response_time
+                bucket[3] = max(bucket[3], response_time)
+                if response_time > SLOW_REQUEST_MS:
+                    bucket[4] += 1
+            if status_code >= 400:
+                bucket[5] += 1
+
+    def add_activity(self, activity: Dict[str, Any], now: Optional[datetime] = None) -> None:
+        now = now or datetime.now()
+        self._roll_day(now)
+        if _as_datetime(activity.get("created_at")).date() != self.day:
+            return
+        action = activity.get("action") or ""
+        self.activities += 1
+        if activity.get("user_id"):
+            self.activity_users.add(str(activity["user_id"]))
+        if action == "login":
+            self.login_count += 1
+        elif action.startswith("case_"):
+            self.case_activities += 1
+        elif action.startswith("payment_"):
+            self.payment_activities += 1
+
+    def window(self, minutes: int, now: Optional[datetime] = None) -> Dict[str, float]:
+        """最近 minutes 分钟的请求数、错误数、平均/最大响应时间和慢请求数"""
+        now = now or datetime.now()
+        start = (now - timedelta(minutes=minutes)).replace(second=0, microsecond=0)
+        stale = [minute for minute in self.minutes if minute < now - timedelta(minutes=PERFORMANCE_WINDOW_MINUTES + 1)]
+        for minute in stale:
+            del self.minutes[minute]
+
+        requests = timed = slow = errors = 0
+        total = peak = 0.0
+        for minute, bucket in self.minutes.items():
+            if minute < start:
+                continue
+            requests += bucket[0]
+            timed += bucket[1]
+            total += bucket[2]
+            peak = max(peak, bucket[3])
+            slow += bucket[4]
+            errors += bucket[5]
+        return {
+            "requests": requests,
+            "errors": errors,
+            "avg_response_time": total / timed if timed else 0,
+            "max_response_time": peak,
+            "slow_requests": slow,
+        }
+
+    def access_stats(self) -> Dict[str, Any]:
+        return {
+            "total_visits": self.visits,
+            "unique_visitors": len(self.visitor_ips),
+            "logged_users": len(self.visit_users),
+            "avg_response_time": self.response_sum / self.response_count if self.response_count else 0,
+            "mobile_visits": self.mobile_visits,
+            "desktop_visits": self.desktop_visits,
+            "error_count": self.error_count,
+            "error_rate": self.error_count / max(self.visits, 1)
+        }
+
+    def activity_stats(self) -> Dict[str, Any]:
+        return {
+            "total_activities": self.activities,
+            "active_users": len(self.activity_users),
+            "login_count": self.login_count,
+            "case_activities": self.case_activities,
+            "payment_activities": self.payment_activities
+        }
+
+    def performance_stats(self, now: Optional[datetime] = None) -> Dict[str, Any]:
+        window = self.window(PERFORMANCE_WINDOW_MINUTES, now)
+        return {
+            "avg_response_time": round(window["avg_response_time"], 2),
+            "max_response_time": window["max_response_time"],
+            "slow_requests": window["slow_requests"]
+        }
+
 
 class RealtimeDataAggregator:
     """实时数据聚合器"""
-    
+
     def __init__(self):
         self.running = False
-        self.update_interval = 30  # 30秒更新一次
+        self.active = False  # 有管理员在线、计数在维护中
+        self.update_interval = settings.REALTIME_PUSH_INTERVAL
+        self.reconcile_interval = settings.REALTIME_RECONCILE_INTERVAL
+        self.case_stats_interval = settings.REALTIME_CASE_STATS_INTERVAL
+        self.alert_interval = 30
         self.alert_thresholds = {
             "high_error_rate": 0.05,  # 5%错误率
             "low_response_time": 5000,  # 5秒响应时间
             "high_queue_length": 1000,  # 队列长度超过1000
             "low_disk_space": 0.1  # 磁盘空间低于10%
         }
-        
+        self.counters = DashboardCounters()
+        self.case_stats: Dict[str, Any] = {}
+        self.seq = 0
+        self.published: Dict[str, Any] = {}
+        self._lock = asyncio.Lock()
+        self._reconciling = False
+        self._pending: List[tuple] = []
+        self._last_reconcile: Optional[float] = None
+        self._last_case_stats: Optional[float] = None
+        self._last_alert_check: Optional[float] = None
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"pushes": 0, "reconciles": 0, "run_errors": 0}
+
     async def start_aggregation(self):
         """启动数据聚合循环"""
         self.running = True
         logger.info("实时数据聚合器启动")
-        
+
         while self.running:
             try:
-                # 聚合并推送数据
-                await self._aggregate_and_push_data()
-                
-                # 检查告警条件
-                await self._check_alerts()
-                
-                # 等待下次更新
+                if websocket_manager.admin_connection_count() == 0:
+                    if self.active:
+                        self._suspend()
+                else:
+                    await self.push_update()
+                    await self._check_alerts()
+
                 await asyncio.sleep(self.update_interval)
-                
+
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
+                self.stats["run_errors"] += 1
                 logger.error(f"数据聚合过程中发生错误: {str(e)}")
                 await asyncio.sleep(5)  # 错误时短暂等待
-    
+
     async def stop_aggregation(self):
         """停止数据聚合"""
         self.running = False
+        if self._task and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        self._task = None
         logger.info("实时数据聚合器停止")
-    
-    async def _aggregate_and_push_data(self):
-        """聚合数据并推送"""
-        try:
-            # 聚合各种统计数据
-            stats_data = await self._collect_system_stats()
-            
-            # 推送到WebSocket客户端
-            await broadcast_stats_update(stats_data)
-            
-            logger.debug("实时数据推送完成")
-            
-        except Exception as e:
-            logger.error(f"聚合和推送数据失败: {str(e)}")
-    
-    async def _collect_system_stats(self) -> Dict[str, Any]:
-        """收集系统统计数据"""
-        try:
+
+    def _suspend(self):
+        """最后一个管理员断开：停止计数，恢复时重新对账"""
+        self.active = False
+        self.counters = DashboardCounters()
+        self._last_reconcile = None
+        logger.info("没有管理员在线，实时数据聚合暂停")
+
+    def record_access_logs(self, logs: Iterable[Dict[str, Any]]):
+        """访问日志写入数据库后调用"""
+        if not self.active:
+            return
+        if self._reconciling:
+            self._pending.extend(("access", log) for log in logs)
+            return
+        for log in logs:
+            self.counters.add_access(log)
+
+    def record_activities(self, activities: Iterable[Dict[str, Any]]):
+        """用户活动写入数据库后调用"""
+        if not self.active:
+            return
+        if self._reconciling:
+            self._pending.extend(("activity", activity) for activity in activities)
+            return
+        for activity in activities:
+            self.counters.add_activity(activity)
+
+    def _due(self, last: Optional[float], interval: float) -> bool:
+        return last is None or asyncio.get_running_loop().time() - last >= interval
+
+    async def _refresh(self):
+        """按需对账和刷新案件统计（调用方持有锁）"""
+        if not self.active or self._due(self._last_reconcile, self.reconcile_interval):
+            await self.reconcile()
+        if self._due(self._last_case_stats, self.case_stats_interval):
             async with AsyncSessionLocal() as db:
-                # 今日访问统计
-                today_stats = await self._get_today_access_stats(db)
-                
-                # 用户活动统计
-                activity_stats = await self._get_user_activity_stats(db)
-                
-                # 案件统计
-                case_stats = await self._get_case_stats(db)
-                
-                # 系统性能指标
-                performance_stats = await self._get_performance_stats(db)
-                
-                return {
-                    "timestamp": datetime.now().isoformat(),
-                    "access": today_stats,
-                    "activities": activity_stats,
-                    "cases": case_stats,
-                    "performance": performance_stats
-                }
-                
-        except Exception as e:
-            logger.error(f"收集系统统计数据失败: {str(e)}")
-            return {"timestamp": datetime.now().isoformat(), "error": str(e)}
-    
-    async def _get_today_access_stats(self, db: AsyncSession) -> Dict[str, Any]:
-        """获取今日访问统计"""
-        try:
-            query = text("""
-                SELECT 
-                    COUNT(*) as total_visits,
-                    COUNT(DISTINCT ip_address) as unique_visitors,
-                    COUNT(DISTINCT user_id) as logged_users,
-                    AVG(response_time) as avg_response_time,
-                    COUNT(CASE WHEN device_type = 'mobile' THEN 1 END) as mobile_visits,
-                    COUNT(CASE WHEN device_type = 'desktop' THEN 1 END) as desktop_visits,
-                    COUNT(CASE WHEN status_code >= 400 THEN 1 END) as error_count
-                FROM access_logs 
-                WHERE DATE(created_at) = CURRENT_DATE
-            """)
-            
-            result = await db.execute(query)
-            row = result.fetchone()
-            
-            if row:
-                return {
-                    "total_visits": row.total_visits or 0,
-                    "unique_visitors": row.unique_visitors or 0,
-                    "logged_users": row.logged_users or 0,
-                    "avg_response_time": float(row.avg_response_time) if row.avg_response_time else 0,
-                    "mobile_visits": row.mobile_visits or 0,
-                    "desktop_visits": row.desktop_visits or 0,
-                    "error_count": row.error_count or 0,
-                    "error_rate": (row.error_count or 0) / max(row.total_visits or 1, 1)
-                }
-            else:
-                return {"total_visits": 0, "unique_visitors": 0, "error_rate": 0}
-                
-        except Exception as e:
-            logger.error(f"获取今日访问统计失败: {str(e)}")
-            return {"error": str(e)}
-    
-    async def _get_user_activity_stats(self, db: AsyncSession) -> Dict[str, Any]:
-        """获取用户活动统计"""
+                self.case_stats = await self._get_case_stats(db)
+            self._last_case_stats = asyncio.get_running_loop().time()
+
+    def current_stats(self) -> Dict[str, Any]:
+        """当前看板数据（不含时间戳，用于比较）"""
+        return {
+            "access": self.counters.access_stats(),
+            "activities": self.counters.activity_stats(),
+            "cases": self.case_stats,
+            "performance": self.counters.performance_stats()
+        }
+
+    async def push_update(self):
+        """向管理员推送自上次推送以来变化的字段"""
+        async with self._lock:
+            await self._refresh()
+            await self._push_delta()
+
+    async def _push_delta(self):
+        current = self.current_stats()
+        changes = merge_diff(self.published, current)
+        if not changes:
+            return
+        self.seq += 1
+        self.published = current
+        self.stats["pushes"] += 1
+        await websocket_manager.broadcast_to_admins({
+            "type": "stats_delta",
+            "seq": self.seq,
+            "prev_seq": self.seq - 1,
+            "changes": changes,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    async def send_snapshot(self, connection_id: str):
+        """向一个连接发送全量数据；新连接和客户端请求 resync 时调用"""
+        async with self._lock:
+            await self._refresh()
+            # 先把已有变化推给其他连接，快照与之后的增量从同一个 seq 衔接
+            await self._push_delta()
+            await websocket_manager._send_to_connection(connection_id, {
+                "type": "stats_snapshot",
+                "seq": self.seq,
+                "data": self.published,
+                "timestamp": datetime.now().isoformat()
+            })
+
+    async def reconcile(self):
+        """用数据库重建计数；对账期间写入的日志先缓存，完成后补记"""
+        self._reconciling = True
+        self.active = True
         try:
-            query = text("""
-                SELECT 
-                    COUNT(*) as total_activities,
-                    COUNT(DISTINCT user_id) as active_users,
-                    COUNT(CASE WHEN action = 'login' THEN 1 END) as login_count,
-                    COUNT(CASE WHEN action LIKE 'case_%' THEN 1 END) as case_activities,
-                    COUNT(CASE WHEN action LIKE 'payment_%' THEN 1 END) as payment_activities
-                FROM user_activity_logs 
-                WHERE DATE(created_at) = CURRENT_DATE
-            """)
-            
-            result = await db.execute(query)
-            row = result.fetchone()
-            
-            if row:
-                return {
-                    "total_activities": row.total_activities or 0,
-                    "active_users": row.active_users or 0,
-                    "login_count": row.login_count or 0,
-                    "case_activities": row.case_activities or 0,
-                    "payment_activities": row.payment_activities or 0
-                }
-            else:
-                return {"total_activities": 0, "active_users": 0}
-                
-        except Exception as e:
-            logger.error(f"获取用户活动统计失败: {str(e)}")
-            return {"error": str(e)}
-    
+            counters = DashboardCounters()
+            async with AsyncSessionLocal() as db:
+                # 几个查询共用一个快照，与补记的日志不重不漏
+                await db.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+                await self._load_today_access(db, counters)
+                await self._load_today_activities(db, counters)
+                await self._load_performance_minutes(db, counters)
+            self.counters = counters
+            self._last_reconcile = asyncio.get_running_loop().time()
+            self.stats["reconciles"] += 1
+        finally:
+            self._reconciling = False
+            pending, self._pending = self._pending, []
+            for kind, item in pending:
+                if kind == "access":
+                    self.counters.add_access(item)
+                else:
+                    self.counters.add_activity(item)
+
+    async def _load_today_access(self, db: AsyncSession, counters: DashboardCounters):
+        """今日访问计数；独立访客和登录用户取明细集合，之后的增量才能去重"""
+        today = "created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + INTERVAL '1 day'"
+        row = (await db.execute(text(f"""
+            SELECT
+                COUNT(*) as total_visits,
+                COUNT(response_time) as timed_visits,
+                COALESCE(SUM(response_time), 0) as response_sum,
+                COUNT(CASE WHEN device_type = 'mobile' THEN 1 END) as mobile_visits,
+                COUNT(CASE WHEN device_type = 'desktop' THEN 1 END) as desktop_visits,
+                COUNT(CASE WHEN status_code >= 400 THEN 1 END) as error_count
+            FROM access_logs
+            WHERE {today}
+        """))).fetchone()
+        counters.visits = row.total_visits or 0
+        counters.response_count = row.timed_visits or 0
+        counters.response_sum = float(row.response_sum or 0)
+        counters.mobile_visits = row.mobile_visits or 0
+        counters.desktop_visits = row.desktop_visits or 0
+        counters.error_count = row.error_count or 0
+
+        result = await db.execute(text(f"SELECT DISTINCT host(ip_address) FROM access_logs WHERE {today}"))
+        counters.visitor_ips = {r[0] for r in result}
+        result = await db.execute(text(
+            f"SELECT DISTINCT user_id::text FROM access_logs WHERE {today} AND user_id IS NOT NULL"
+        ))
+        counters.visit_users = {r[0] for r in result}
+
+    async def _load_today_activities(self, db: AsyncSession, counters: DashboardCounters):
+        """今日用户活动计数"""
+        today = "created_at >= CURRENT_DATE AND created_at < CURRENT_DATE + INTERVAL '1 day'"
+        row = (await db.execute(text(f"""
+            SELECT
+                COUNT(*) as total_activities,
+                COUNT(CASE WHEN action = 'login' THEN 1 END) as login_count,
+                COUNT(CASE WHEN action LIKE 'case_%' THEN 1 END) as case_activities,
+                COUNT(CASE WHEN action LIKE 'payment_%' THEN 1 END) as payment_activities
+            FROM user_activity_logs
+            WHERE {today}
+        """))).fetchone()
+        counters.activities = row.total_activities or 0
+        counters.login_count = row.login_count or 0
+        counters.case_activities = row.case_activities or 0
+        counters.payment_activities = row.payment_activities or 0
+
+        result = await db.execute(text(
+            f"SELECT DISTINCT user_id::text FROM user_activity_logs WHERE {today} AND user_id IS NOT NULL"
+        ))
+        counters.activity_users = {r[0] for r in result}
+
+    async def _load_performance_minutes(self, db: AsyncSession, counters: DashboardCounters):
+        """最近1小时按分钟的性能计数"""
+        result = await db.execute(text("""
+            SELECT
+                date_trunc('minute', created_at) as minute,
+                COUNT(*) as requests,
+                COUNT(response_time) as timed,
+                COALESCE(SUM(response_time), 0) as response_sum,
+                COALESCE(MAX(response_time), 0) as max_response_time,
+                COUNT(CASE WHEN response_time > :slow THEN 1 END) as slow_requests,
+                COUNT(CASE WHEN status_code >= 400 THEN 1 END) as errors
+            FROM access_logs
+            WHERE created_at >= NOW() - INTERVAL '1 hour'
+            GROUP BY 1
+        """), {"slow": SLOW_REQUEST_MS})
+        for row in result:
+            counters.minutes[_as_datetime(row.minute)] = [
+                row.requests, row.timed, float(row.response_sum), row.max_response_time,
+                row.slow_requests, row.errors
+            ]
+
     async def _get_case_stats(self, db: AsyncSession) -> Dict[str, Any]:
         """获取案件统计"""
         try:
             query = text("""
-                SELECT 
+                SELECT
                     COUNT(*) as total_cases,
                     COUNT(CASE WHEN status = 'PENDING' THEN 1 END) as pending_cases,
                     COUNT(CASE WHEN status = 'ASSIGNED' THEN 1 END) as assigned_cases,
                     COUNT(CASE WHEN status = 'COMPLETED' THEN 1 END) as completed_cases,
-                    COUNT(CASE WHEN DATE(created_at) = CURRENT_DATE THEN 1 END) as today_new_cases
+                    COUNT(CASE WHEN created_at >= CURRENT_DATE THEN 1 END) as today_new_cases
                 FROM cases
             """)
-            
+
             result = await db.execute(query)
             row = result.fetchone()
-            
+
             if row:
                 return {
                     "total_cases": row.total_cases or 0,
@@ -193,134 +474,85 @@ class RealtimeDataAggregator:
                 }
             else:
                 return {"total_cases": 0, "pending_cases": 0}
-                
+
         except Exception as e:
             logger.error(f"获取案件统计失败: {str(e)}")
             return {"error": str(e)}
-    
-    async def _get_performance_stats(self, db: AsyncSession) -> Dict[str, Any]:
-        """获取性能统计"""
-        try:
-            # 获取最近1小时的性能数据
-            query = text("""
-                SELECT 
-                    AVG(response_time) as avg_response_time,
-                    MAX(response_time) as max_response_time,
-                    COUNT(CASE WHEN response_time > 3000 THEN 1 END) as slow_requests
-                FROM access_logs 
-                WHERE created_at >= NOW() - INTERVAL '1 hour'
-            """)
-            
-            result = await db.execute(query)
-            row = result.fetchone()
-            
-            if row:
-                return {
-                    "avg_response_time": float(row.avg_response_time) if row.avg_response_time else 0,
-                    "max_response_time": row.max_response_time or 0,
-                    "slow_requests": row.slow_requests or 0
-                }
-            else:
-                return {"avg_response_time": 0, "max_response_time": 0, "slow_requests": 0}
-                
-        except Exception as e:
-            logger.error(f"获取性能统计失败: {str(e)}")
-            return {"error": str(e)}
-    
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            "active": self.active,
+            "seq": self.seq,
+            "admin_connections": websocket_manager.admin_connection_count()
+        }
+
     async def _check_alerts(self):
-        """检查告警条件"""
+        """检查告警条件（用内存中的分钟计数，不查询数据库）"""
+        if not self._due(self._last_alert_check, self.alert_interval):
+            return
+        self._last_alert_check = asyncio.get_running_loop().time()
         try:
-            async with AsyncSessionLocal() as db:
-                # 检查错误率
-                await self._check_error_rate_alert(db)
-                
-                # 检查响应时间
-                await self._check_response_time_alert(db)
-                
-                # 检查队列长度
-                await self._check_queue_length_alert()
-                
+            # 检查错误率
+            await self._check_error_rate_alert()
+
+            # 检查响应时间
+            await self._check_response_time_alert()
+
+            # 检查队列长度
+            await self._check_queue_length_alert()
+
         except Exception as e:
             logger.error(f"检查告警条件失败: {str(e)}")
-    
-    async def _check_error_rate_alert(self, db: AsyncSession):
+
+    async def _check_error_rate_alert(self):
         """检查错误率告警"""
-        try:
-            query = text("""
-                SELECT 
-                    COUNT(*) as total_requests,
-                    COUNT(CASE WHEN status_code >= 400 THEN 1 END) as error_requests
-                FROM access_logs 
-                WHERE created_at >= NOW() - INTERVAL '10 minutes'
-            """)
-            
-            result = await db.execute(query)
-            row = result.fetchone()
-            
-            if row and row.total_requests > 10:  # 至少有10个请求才检查
-                error_rate = row.error_requests / row.total_requests
-                
-                if error_rate > self.alert_thresholds["high_error_rate"]:
-                    await broadcast_system_alert({
-                        "type": "high_error_rate",
-                        "level": "warning",
-                        "message": f"错误率过高: {error_rate:.2%}",
-                        "details": {
-                            "error_rate": error_rate,
-                            "total_requests": row.total_requests,
-                            "error_requests": row.error_requests,
-                            "time_window": "10分钟"
-                        }
-                    })
-                    
-        except Exception as e:
-            logger.error(f"检查错误率告警失败: {str(e)}")
-    
-    async def _check_response_time_alert(self, db: AsyncSession):
+        window = self.counters.window(10)
+        if window["requests"] > 10:  # 至少有10个请求才检查
+            error_rate = window["errors"] / window["requests"]
+
+            if error_rate > self.alert_thresholds["high_error_rate"]:
+                await broadcast_system_alert({
+                    "type": "high_error_rate",
+                    "level": "warning",
+                    "message": f"错误率过高: {error_rate:.2%}",
+                    "details": {
+                        "error_rate": error_rate,
+                        "total_requests": window["requests"],
+                        "error_requests": window["errors"],
+                        "time_window": "10分钟"
+                    }
+                })
+
+    async def _check_response_time_alert(self):
         """检查响应时间告警"""
-        try:
-            query = text("""
-                SELECT AVG(response_time) as avg_response_time
-                FROM access_logs 
-                WHERE created_at >= NOW() - INTERVAL '5 minutes'
-                AND response_time IS NOT NULL
-            """)
-            
-            result = await db.execute(query)
-            row = result.fetchone()
-            
-            if row and row.avg_response_time:
-                avg_response_time = float(row.avg_response_time)
-                
-                if avg_response_time > self.alert_thresholds["low_response_time"]:
-                    await broadcast_system_alert({
-                        "type": "slow_response_time",
-                        "level": "warning",
-                        "message": f"平均响应时间过慢: {avg_response_time:.0f}ms",
-                        "details": {
-                            "avg_response_time": avg_response_time,
-                            "threshold": self.alert_thresholds["low_response_time"],
-                            "time_window": "5分钟"
-                        }
-                    })
-                    
-        except Exception as e:
-            logger.error(f"检查响应时间告警失败: {str(e)}")
-    
+        avg_response_time = self.counters.window(5)["avg_response_time"]
+
+        if avg_response_time > self.alert_thresholds["low_response_time"]:
+            await broadcast_system_alert({
+                "type": "slow_response_time",
+                "level": "warning",
+                "message": f"平均响应时间过慢: {avg_response_time:.0f}ms",
+                "details": {
+                    "avg_response_time": avg_response_time,
+                    "threshold": self.alert_thresholds["low_response_time"],
+                    "time_window": "5分钟"
+                }
+            })
+
     async def _check_queue_length_alert(self):
         """检查队列长度告警"""
         try:
             import redis.asyncio as redis
-            from app.core.config import settings
-            
+
             redis_client = redis.from_url(settings.REDIS_URL)
-            
+
             # 检查访问日志队列
             access_queue_length = await redis_client.llen("access_logs_queue")
             activity_queue_length = await redis_client.llen("user_activities_queue")
-            
+
             await redis_client.close()
-            
+
             if access_queue_length > self.alert_thresholds["high_queue_length"]:
                 await broadcast_system_alert({
                     "type": "high_queue_length",
@@ -332,7 +564,7 @@ class RealtimeDataAggregator:
                         "threshold": self.alert_thresholds["high_queue_length"]
                     }
                 })
-            
+
             if activity_queue_length > self.alert_thresholds["high_queue_length"]:
                 await broadcast_system_alert({
                     "type": "high_queue_length",
@@ -344,7 +576,7 @@ class RealtimeDataAggregator:
                         "threshold": self.alert_thresholds["high_queue_length"]
                     }
                 })
-                
+
         except Exception as e:
             logger.error(f"检查队列长度告警失败: {str(e)}")
 
@@ -355,9 +587,9 @@ realtime_data_aggregator = RealtimeDataAggregator()
 
 async def start_realtime_data_aggregator():
     """启动实时数据聚合器"""
-    asyncio.create_task(realtime_data_aggregator.start_aggregation())
+    realtime_data_aggregator._task = asyncio.create_task(realtime_data_aggregator.start_aggregation())
 
 
 async def stop_realtime_data_aggregator():
     """停止实时数据聚合器"""
-    await realtime_data_aggregator.stop_aggregation()
\ No newline at end of file
+    await realtime_data_aggregator.stop_aggregation()
@@ -0,0 +1,106 @@
+"""
+系统日志查询
+按级别、来源、分类和时间范围过滤，按 (created_at, id) 倒序键集分页，总数默认用查询计划估算
+（见 migrations/026_system_log_store.sql 的复合索引）。关键词检索用 system_log_search_vector 的
+GIN 索引给出候选行（与案件搜索相同的二元组切分），再用子串匹配复核
+"""
+
+import json
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.pagination import SqlFilter, paginate_sql
+from app.services.case_search import build_tsquery
+
+
+def _like_pattern(keyword: str) -> str:
+    """子串匹配模式，转义关键词中的 LIKE 通配符（配合 ESCAPE '\\'）"""
+    escaped = keyword.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def system_log_filter(
+    level: Optional[str] = None,
+    source: Optional[str] = None,
+    category: Optional[str] = None,
+    keyword: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None
+) -> SqlFilter:
+    """构造系统日志的过滤条件；level/source 为空或 all 时不过滤"""
+    sql_filter = SqlFilter()
+    if level and level != "all":
+        sql_filter.add("log_level = :level", level=level.upper())
+    if source and source != "all":
+        sql_filter.add("log_source = :source", source=source)
+    if category:
+        sql_filter.add("log_category = :category", category=category)
+    if since:
+        sql_filter.add("created_at >= :since", since=since)
+    if until:
+        sql_filter.add("created_at < :until", until=until)
+    if keyword:
+        tsquery = build_tsquery(keyword)
+        if tsquery is not None:
+            sql_filter.add(
+                "system_log_search_vector(log_message) @@ CAST(:search_query AS tsquery)", search_query=tsquery
+            )
+        sql_filter.add("log_message ILIKE :search_pattern ESCAPE '\\'", search_pattern=_like_pattern(keyword))
+    return sql_filter
+
+
+def _details(value: Any) -> Dict[str, Any]:
+    if isinstance(value, str):
+        return json.loads(value) if value else {}
+    return value or {}
+
+
+async def query_system_logs(
+    db: AsyncSession,
+    level: Optional[str] = None,
+    source: Optional[str] = None,
+    category: Optional[str] = None,
+    keyword: Optional[str] = None,
+    since: Optional[datetime] = None,
+    until: Optional[datetime] = None,
+    cursor: Optional[str] = None,
+    page: int = 1,
+    limit: int = 50,
+    count: str = "estimate"
+) -> Dict[str, Any]:
+    """分页查询系统日志；提供 cursor 时忽略 page"""
+    result = await paginate_sql(
+        db,
+        columns="id, log_level, log_source, log_category, log_message, created_at, log_details",
+        from_sql="FROM system_logs",
+        sql_filter=system_log_filter(level, source, category, keyword, since, until),
+        id_cast="BIGINT",
+        cursor=cursor,
+        limit=limit,
+        offset=(page - 1) * limit,
+        count=count
+    )
+
+    items = [
+        {
+            "id": row["id"],
+            "level": row["log_level"],
+            "source": row["log_source"],
+            "category": row["log_category"],
+            "message": row["log_message"],
+            "createdAt": row["created_at"].isoformat() if row["created_at"] else None,
+            "details": _details(row["log_details"])
+        }
+        for row in result.items
+    ]
+    return {
+        "items": items,
+        "total": result.total or 0,
+        "page": page,
+        "pages": result.total_pages(limit),
+        "next_cursor": result.next_cursor,
+        "has_more": result.has_more,
+        "total_is_estimate": result.total_is_estimate
+    }
@@ -16,7 +16,13 @@ from app.models.user import User, UserStatus, UserRole
 from app.models.unified_auth import WorkspaceMapping, DemoAccount
 from app.services.auth_service import AuthService
 from app.services.email_service import EmailService
-from app.core.security import hash_password, verify_password
+from app.core.security import (
+    hash_password,
+    verify_password,
+    password_overloaded_exception,
+    PasswordHasherOverloaded,
+)
+from app.services.workspace_auth_cache import workspace_auth_cache
 
 logger = structlog.get_logger()
 
@@ -73,7 +79,7 @@ class UnifiedAuthService:
             user_data = {
                 'username': email,  # 使用邮箱作为用户名
                 'email': email,
-                'password_hash': hash_password(password),
+                'password_hash': await hash_password(password),
                 'full_name': full_name,
                 'phone': phone,
                 'tenant_id': tenant_id,
@@ -105,6 +111,9 @@ class UnifiedAuthService:
             
         except HTTPException:
             raise
+        except PasswordHasherOverloaded:
+            await self.db.rollback()
+            raise password_overloaded_exception()
         except Exception as e:
             await self.db.rollback()
             logger.error("用户注册失败", error=str(e), email=email)
@@ -202,6 +211,7 @@ class UnifiedAuthService:
                 await self.create_workspace_mapping(user_id, user.workspace_id, 'lawyer')
                 
                 await self.db.commit()
+                workspace_auth_cache.invalidate(user_id)
                 
                 return {
                     'redirect_url': f'/lawyer/{user.workspace_id}',
@@ -223,6 +233,7 @@ class UnifiedAuthService:
                 await self.create_workspace_mapping(user_id, user.workspace_id, 'user')
                 
                 await self.db.commit()
+                workspace_auth_cache.invalidate(user_id)
                 
                 return {
                     'redirect_url': f'/user/{user.workspace_id}',
@@ -467,7 +478,7 @@ class UnifiedAuthService:
             user_data = {
                 'username': email,
                 'email': email,
-                'password_hash': hash_password(password),
+                'password_hash': await hash_password(password),
                 'full_name': full_name,
                 'phone': phone,
                 'tenant_id': tenant_id,
@@ -522,6 +533,9 @@ class UnifiedAuthService:
             
         except HTTPException:
             raise
+        except PasswordHasherOverloaded:
+            await self.db.rollback()
+            raise password_overloaded_exception()
         except Exception as e:
             await self.db.rollback()
             logger.error("优化注册失败", error=str(e), email=email)
@@ -561,6 +575,7 @@ class UnifiedAuthService:
                     .values(status=UserStatus.ACTIVE)
                 )
                 await self.db.commit()
+                workspace_auth_cache.invalidate(user_data.id)
                 
                 # 确定重定向URL
                 if user_data.account_type == 'lawyer_pending':
@@ -15,6 +15,7 @@ from sqlalchemy import text
 
 from app.core.database import AsyncSessionLocal
 from app.core.config import settings
+from app.services.realtime_data_aggregator import realtime_data_aggregator
 
 logger = logging.getLogger(__name__)
 
@@ -139,6 +140,7 @@ class UserActivityProcessor:
                 # 批量执行插入
                 await db.execute(insert_query, activities)
                 await db.commit()
+                realtime_data_aggregator.record_activities(activities)
                 
         except Exception as e:
             logger.error(f"批量插入用户活动到数据库失败: {str(e)}")
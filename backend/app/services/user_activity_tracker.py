@@ -16,6 +16,7 @@ from sqlalchemy import text
 
 from app.core.database import AsyncSessionLocal
 from app.core.config import settings
+from app.services.realtime_data_aggregator import realtime_data_aggregator
 
 logger = logging.getLogger(__name__)
 
@@ -192,6 +193,7 @@ class UserActivityTracker:
             
             await db.execute(insert_query, activities)
             await db.commit()
+            realtime_data_aggregator.record_activities(activities)
             
         except Exception as e:
             await db.rollback()
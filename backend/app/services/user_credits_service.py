@@ -4,19 +4,21 @@
 """
 
 import logging
-from datetime import datetime, date, timedelta
+from datetime import date, timedelta
 from typing import Dict, Any, Optional, List
 from decimal import Decimal
 from uuid import UUID
 import uuid
 
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text, and_, or_
 from fastapi import HTTPException
 
 from app.core.database import get_db
+from app.core.pagination import InvalidCursorError, SqlFilter, paginate_sql
 from app.services.payment_service import WeChatPayService
 from app.services.config_service import SystemConfigService
+from app.services.credits_ledger import CreditsLedger, CreditsBalanceCache
 
 logger = logging.getLogger(__name__)
 
@@ -33,7 +35,12 @@ class InsufficientCreditsError(Exception):
 class UserCreditsService:
     """用户Credits支付控制服务"""
     
-    def __init__(self, config_service: SystemConfigService = None, payment_service: WeChatPayService = None):
+    def __init__(
+        self,
+        config_service: SystemConfigService = None,
+        payment_service: WeChatPayService = None,
+        balance_cache: Optional[CreditsBalanceCache] = None
+    ):
         self.config_service = config_service
         self.payment_service = payment_service
         
@@ -42,7 +49,10 @@ class UserCreditsService:
         self.CREDIT_PRICE = Decimal('50.00')  # 50元/个Credit
         self.BATCH_UPLOAD_COST = 1  # 批量上传消耗1个Credit
         
-    async def initialize_user_credits(self, user_id: UUID, db: Session) -> Dict[str, Any]:
+        # 所有余额变动都经过账本的单语句条件更新
+        self.ledger = CreditsLedger(weekly_credits=self.CREDITS_PER_WEEK, balance_cache=balance_cache)
+        
+    async def initialize_user_credits(self, user_id: UUID, db: AsyncSession) -> Dict[str, Any]:
         """
         初始化用户Credits - 每周1个免费
         
@@ -59,7 +69,7 @@ class UserCreditsService:
                 SELECT user_id FROM user_credits WHERE user_id = :user_id
             """)
             
-            existing = db.execute(check_query, {"user_id": str(user_id)}).fetchone()
+            existing = (await db.execute(check_query, {"user_id": str(user_id)})).fetchone()
             
             if existing:
                 logger.info(f"用户 {user_id} Credits已初始化")
@@ -76,14 +86,14 @@ class UserCreditsService:
                 )
             """)
             
-            db.execute(insert_query, {
+            await db.execute(insert_query, {
                 "user_id": str(user_id),
                 "credits_weekly": self.CREDITS_PER_WEEK,
                 "credits_remaining": self.CREDITS_PER_WEEK,
                 "reset_date": date.today()
             })
             
-            db.commit()
+            await db.commit()
             
             logger.info(f"用户 {user_id} Credits初始化成功")
             
@@ -96,11 +106,11 @@ class UserCreditsService:
             }
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"初始化用户Credits失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"初始化Credits失败: {str(e)}")
     
-    async def get_user_credits(self, user_id: UUID, db: Session) -> Dict[str, Any]:
+    async def get_user_credits(self, user_id: UUID, db: AsyncSession) -> Dict[str, Any]:
         """
         获取用户Credits信息
         
@@ -112,6 +122,9 @@ class UserCreditsService:
             Credits信息
         """
         try:
+            # 每周重置是一条条件UPDATE，不需要重置时不修改任何行
+            await self._check_and_reset_weekly_credits(user_id, db)
+            
             query = text("""
                 SELECT 
                     credits_weekly,
@@ -125,18 +138,12 @@ class UserCreditsService:
                 WHERE user_id = :user_id
             """)
             
-            result = db.execute(query, {"user_id": str(user_id)}).fetchone()
+            result = (await db.execute(query, {"user_id": str(user_id)})).fetchone()
             
             if not result:
                 # 如果没有记录，自动初始化
                 return await self.initialize_user_credits(user_id, db)
             
-            # 检查是否需要每周重置
-            await self._check_and_reset_weekly_credits(user_id, db)
-            
-            # 重新查询最新数据
-            result = db.execute(query, {"user_id": str(user_id)}).fetchone()
-            
             return {
                 "user_id": str(user_id),
                 "credits_weekly": result[0],
@@ -153,7 +160,7 @@ class UserCreditsService:
             logger.error(f"获取用户Credits失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"获取Credits信息失败: {str(e)}")
     
-    async def _check_and_reset_weekly_credits(self, user_id: UUID, db: Session) -> bool:
+    async def _check_and_reset_weekly_credits(self, user_id: UUID, db: AsyncSession) -> bool:
         """
         检查并执行每周Credits重置
         
@@ -165,27 +172,17 @@ class UserCreditsService:
             是否执行了重置
         """
         try:
-            # 获取最后重置日期
-            query = text("""
-                SELECT last_reset_date FROM user_credits WHERE user_id = :user_id
-            """)
-            
-            result = db.execute(query, {"user_id": str(user_id)}).fetchone()
-            
-            if not result:
+            reset = await self.ledger.apply_weekly_reset(db, user_id=str(user_id))
+            if not reset:
                 return False
             
-            last_reset = result[0]
-            today = date.today()
-            
-            # 计算是否需要重置（每周一重置）
-            if self._should_reset_credits(last_reset, today):
-                await self._reset_user_credits(user_id, db)
-                return True
-            
-            return False
+            await db.commit()
+            self.ledger.publish_balance(reset[0]["user_id"], reset[0]["balance_after"])
+            logger.info(f"用户 {user_id} Credits重置成功")
+            return True
             
         except Exception as e:
+            await db.rollback()
             logger.error(f"检查Credits重置失败: {str(e)}")
             return False
     
@@ -238,50 +235,7 @@ class UserCreditsService:
         
         return next_monday
     
-    async def _reset_user_credits(self, user_id: UUID, db: Session) -> Dict[str, Any]:
-        """
-        重置用户每周Credits
-        
-        Args:
-            user_id: 用户ID
-            db: 数据库会话
-            
-        Returns:
-            重置结果
-        """
-        try:
-            update_query = text("""
-                UPDATE user_credits 
-                SET 
-                    credits_remaining = credits_remaining + :weekly_credits,
-                    last_reset_date = :reset_date,
-                    updated_at = NOW()
-                WHERE user_id = :user_id
-            """)
-            
-            db.execute(update_query, {
-                "user_id": str(user_id),
-                "weekly_credits": self.CREDITS_PER_WEEK,
-                "reset_date": date.today()
-            })
-            
-            db.commit()
-            
-            logger.info(f"用户 {user_id} Credits重置成功")
-            
-            return {
-                "status": "reset_success",
-                "user_id": str(user_id),
-                "credits_added": self.CREDITS_PER_WEEK,
-                "reset_date": date.today().isoformat()
-            }
-            
-        except Exception as e:
-            db.rollback()
-            logger.error(f"重置用户Credits失败: {str(e)}")
-            raise
-    
-    async def consume_credits_for_batch_upload(self, user_id: UUID, db: Session) -> Dict[str, Any]:
+    async def consume_credits_for_batch_upload(self, user_id: UUID, db: AsyncSession) -> Dict[str, Any]:
         """
         批量上传消耗Credits
         
@@ -293,59 +247,54 @@ class UserCreditsService:
             消耗结果
         """
         try:
-            # 检查并重置Credits
-            await self._check_and_reset_weekly_credits(user_id, db)
+            # 每周重置、余额校验、扣减、使用记录和审计记录在同一条语句中完成
+            result = await self.ledger.consume(
+                db,
+                user_id=str(user_id),
+                cost=self.BATCH_UPLOAD_COST,
+                usage_type='batch_upload',
+                context={'action': 'batch_upload'}
+            )
             
-            # 获取当前Credits
-            user_credits = await self.get_user_credits(user_id, db)
+            if result is None:
+                # 没有Credits记录时先初始化，再按正常流程扣减
+                await self.initialize_user_credits(user_id, db)
+                result = await self.ledger.consume(
+                    db,
+                    user_id=str(user_id),
+                    cost=self.BATCH_UPLOAD_COST,
+                    usage_type='batch_upload',
+                    context={'action': 'batch_upload'}
+                )
             
-            if user_credits['credits_remaining'] < self.BATCH_UPLOAD_COST:
+            if result is None or not result.success:
+                await db.rollback()
                 raise InsufficientCreditsError(
                     "Credits不足，请购买或等待每周重置",
-                    current_credits=user_credits['credits_remaining'],
+                    current_credits=result.available_before if result else 0,
                     required_credits=self.BATCH_UPLOAD_COST
                 )
             
-            # 扣除Credits
-            update_query = text("""
-                UPDATE user_credits 
-                SET 
-                    credits_remaining = credits_remaining - :cost,
-                    total_credits_used = total_credits_used + :cost,
-                    updated_at = NOW()
-                WHERE user_id = :user_id
-            """)
-            
-            db.execute(update_query, {
-                "user_id": str(user_id),
-                "cost": self.BATCH_UPLOAD_COST
-            })
-            
-            # 记录使用记录和审计日志
-            await self._record_credits_usage(
-                user_id, self.BATCH_UPLOAD_COST, 'batch_upload', db
-            )
-            await self._log_audit_trail(user_id, 'credits_consumed', self.BATCH_UPLOAD_COST, {'action': 'batch_upload'}, db)
-            
-            db.commit()
+            await db.commit()
+            self.ledger.publish_balance(str(user_id), result.balance_after, result.audit_id)
             
             logger.info(f"用户 {user_id} 批量上传消耗 {self.BATCH_UPLOAD_COST} Credits")
             
             return {
                 "status": "success",
                 "credits_consumed": self.BATCH_UPLOAD_COST,
-                "credits_remaining": user_credits['credits_remaining'] - self.BATCH_UPLOAD_COST,
+                "credits_remaining": result.balance_after,
                 "usage_type": "batch_upload"
             }
             
         except InsufficientCreditsError:
             raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"消耗Credits失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"消耗Credits失败: {str(e)}")
     
-    async def purchase_credits(self, user_id: UUID, credits_count: int, db: Session) -> Dict[str, Any]:
+    async def purchase_credits(self, user_id: UUID, credits_count: int, db: AsyncSession) -> Dict[str, Any]:
         """
         购买Credits - 50元/个
         
@@ -376,7 +325,7 @@ class UserCreditsService:
                 )
             """)
             
-            db.execute(insert_query, {
+            await db.execute(insert_query, {
                 "id": purchase_id,
                 "user_id": str(user_id),
                 "credits_count": credits_count,
@@ -405,7 +354,7 @@ class UserCreditsService:
                         WHERE id = :purchase_id
                     """)
                     
-                    db.execute(update_query, {
+                    await db.execute(update_query, {
                         "order_id": payment_order.get('order_no'),
                         "purchase_id": purchase_id
                     })
@@ -413,7 +362,7 @@ class UserCreditsService:
                 except Exception as e:
                     logger.warning(f"创建支付订单失败: {str(e)}")
             
-            db.commit()
+            await db.commit()
             
             return {
                 "status": "pending_payment",
@@ -425,11 +374,11 @@ class UserCreditsService:
             }
             
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"购买Credits失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"购买Credits失败: {str(e)}")
     
-    async def confirm_credits_purchase(self, purchase_id: str, db: Session) -> Dict[str, Any]:
+    async def confirm_credits_purchase(self, purchase_id: str, db: AsyncSession) -> Dict[str, Any]:
         """
         确认Credits购买（支付成功后调用）
         
@@ -441,140 +390,103 @@ class UserCreditsService:
             确认结果
         """
         try:
-            # 获取购买记录
-            query = text("""
-                SELECT user_id, credits_count, status 
-                FROM credit_purchase_records 
-                WHERE id = :purchase_id
-            """)
-            
-            result = db.execute(query, {"purchase_id": purchase_id}).fetchone()
-            
-            if not result:
-                raise HTTPException(status_code=404, detail="购买记录不存在")
-            
-            user_id, credits_count, status = result
-            
-            if status == 'paid':
-                return {"status": "already_confirmed", "message": "已经确认过"}
-            
-            if status != 'pending':
-                raise HTTPException(status_code=400, detail=f"购买记录状态异常: {status}")
-            
-            # 更新购买记录状态
-            update_purchase_query = text("""
-                UPDATE credit_purchase_records 
-                SET status = 'paid'
-                WHERE id = :purchase_id
-            """)
-            
-            db.execute(update_purchase_query, {"purchase_id": purchase_id})
-            
-            # 增加用户Credits
-            await self._add_user_credits(user_id, credits_count, db)
-            
-            db.commit()
-            
-            logger.info(f"用户 {user_id} Credits购买确认成功，增加 {credits_count} Credits")
+            # 状态切换与入账在同一条语句中完成，只有pending记录会被入账
+            confirmed = await self.ledger.confirm_purchase(db, purchase_id, context={'purchase_id': purchase_id})
+            
+            if confirmed is None:
+                await db.rollback()
+                query = text("""
+                    SELECT status FROM credit_purchase_records WHERE id = :purchase_id
+                """)
+                result = (await db.execute(query, {"purchase_id": purchase_id})).fetchone()
+                
+                if not result:
+                    raise HTTPException(status_code=404, detail="购买记录不存在")
+                
+                if result[0] == 'paid':
+                    return {"status": "already_confirmed", "message": "已经确认过"}
+                
+                raise HTTPException(status_code=400, detail=f"购买记录状态异常: {result[0]}")
+            
+            await db.commit()
+            self.ledger.publish_balance(confirmed["user_id"], confirmed["balance_after"], confirmed["audit_id"])
+            
+            logger.info(f"用户 {confirmed['user_id']} Credits购买确认成功，增加 {confirmed['credits_added']} Credits")
             
             return {
                 "status": "confirmed",
-                "user_id": user_id,
-                "credits_added": credits_count,
+                "user_id": confirmed["user_id"],
+                "credits_added": confirmed["credits_added"],
                 "purchase_id": purchase_id
             }
             
+        except HTTPException:
+            raise
         except Exception as e:
-            db.rollback()
+            await db.rollback()
             logger.error(f"确认Credits购买失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"确认购买失败: {str(e)}")
     
-    async def _add_user_credits(self, user_id: str, credits_count: int, db: Session):
-        """
-        增加用户Credits
-        
-        Args:
-            user_id: 用户ID
-            credits_count: 增加数量
-            db: 数据库会话
-        """
-        update_query = text("""
-            UPDATE user_credits 
-            SET 
-                credits_remaining = credits_remaining + :credits,
-                credits_purchased = credits_purchased + :credits,
-                updated_at = NOW()
-            WHERE user_id = :user_id
-        """)
-        
-        db.execute(update_query, {
-            "user_id": user_id,
-            "credits": credits_count
-        })
-    
-    async def _record_credits_usage(self, user_id: UUID, credits_used: int, usage_type: str, db: Session):
-        """
-        记录Credits使用记录
-        
-        Args:
-            user_id: 用户ID
-            credits_used: 使用数量
-            usage_type: 使用类型
-            db: 数据库会话
-        """
-        try:
-            # 这里可以创建一个使用记录表，暂时记录到日志
-            logger.info(f"Credits使用记录: 用户={user_id}, 数量={credits_used}, 类型={usage_type}")
-            
-            # 如果需要详细记录，可以创建 credit_usage_records 表
-            # insert_query = text("""
-            #     INSERT INTO credit_usage_records (
-            #         user_id, credits_used, usage_type, created_at
-            #     ) VALUES (
-            #         :user_id, :credits_used, :usage_type, NOW()
-            #     )
-            # """)
-            # 
-            # db.execute(insert_query, {
-            #     "user_id": str(user_id),
-            #     "credits_used": credits_used,
-            #     "usage_type": usage_type
-            # })
-            
-        except Exception as e:
-            logger.error(f"记录Credits使用失败: {str(e)}")
-    
-    async def get_credits_usage_history(self, user_id: UUID, page: int = 1, size: int = 20, db: Session = None) -> Dict[str, Any]:
+    async def get_credits_usage_history(
+        self,
+        user_id: UUID,
+        page: int = 1,
+        size: int = 20,
+        db: AsyncSession = None,
+        cursor: Optional[str] = None,
+        count: str = "auto"
+    ) -> Dict[str, Any]:
         """
         获取Credits使用历史
         
         Args:
             user_id: 用户ID
-            page: 页码
+            page: 页码（未提供游标时使用）
             size: 页大小
             db: 数据库会话
+            cursor: 上一页返回的 next_cursor
+            count: 总数计算方式
             
         Returns:
             使用历史
         """
         try:
-            # 暂时返回模拟数据，实际应该从 credit_usage_records 表查询
+            result = await paginate_sql(
+                db,
+                columns="id, credits_used, usage_type, balance_after, created_at",
+                from_sql="FROM credit_usage_records",
+                sql_filter=SqlFilter().add("user_id = :user_id", user_id=str(user_id)),
+                id_cast="BIGINT",
+                cursor=cursor,
+                limit=size,
+                offset=(page - 1) * size,
+                count=count
+            )
+            
+            items = []
+            for row in result.items:
+                items.append({
+                    "id": str(row["id"]),
+                    "credits_used": row["credits_used"],
+                    "usage_type": row["usage_type"],
+                    "description": "批量上传任务" if row["usage_type"] == 'batch_upload' else row["usage_type"],
+                    "balance_after": row["balance_after"],
+                    "created_at": row["created_at"].isoformat() if row["created_at"] else None
+                })
+            
             return {
-                "items": [
-                    {
-                        "id": "usage_1",
-                        "credits_used": 1,
-                        "usage_type": "batch_upload",
-                        "description": "批量上传任务",
-                        "created_at": datetime.now().isoformat()
-                    }
-                ],
-                "total": 1,
+                "items": items,
+                "total": result.total or 0,
                 "page": page,
                 "size": size,
-                "pages": 1
+                "pages": result.total_pages(size),
+                "next_cursor": result.next_cursor,
+                "has_more": result.has_more,
+                "total_is_estimate": result.total_is_estimate
             }
             
+        except InvalidCursorError:
+            raise
         except Exception as e:
             logger.error(f"获取Credits使用历史失败: {str(e)}")
             return {
@@ -582,10 +494,13 @@ class UserCreditsService:
                 "total": 0,
                 "page": page,
                 "size": size,
-                "pages": 0
+                "pages": 0,
+                "next_cursor": None,
+                "has_more": False,
+                "total_is_estimate": False
             }
     
-    async def get_credits_purchase_history(self, user_id: UUID, page: int = 1, size: int = 20, db: Session = None) -> Dict[str, Any]:
+    async def get_credits_purchase_history(self, user_id: UUID, page: int = 1, size: int = 20, db: AsyncSession = None) -> Dict[str, Any]:
         """
         获取Credits购买历史
         
@@ -616,13 +531,13 @@ class UserCreditsService:
                 WHERE user_id = :user_id
             """)
             
-            results = db.execute(query, {
+            results = (await db.execute(query, {
                 "user_id": str(user_id),
                 "size": size,
                 "offset": offset
-            }).fetchall()
+            })).fetchall()
             
-            total = db.execute(count_query, {"user_id": str(user_id)}).scalar()
+            total = (await db.execute(count_query, {"user_id": str(user_id)})).scalar()
             
             items = []
             for row in results:
@@ -653,7 +568,7 @@ class UserCreditsService:
                 "pages": 0
             }
     
-    async def weekly_credits_reset_batch(self, db: Session) -> Dict[str, Any]:
+    async def weekly_credits_reset_batch(self, db: AsyncSession) -> Dict[str, Any]:
         """
         批量重置所有用户的每周Credits（定时任务）
         
@@ -664,78 +579,38 @@ class UserCreditsService:
             重置结果
         """
         try:
-            # 获取需要重置的用户
             today = date.today()
             
-            # 计算本周一
-            days_since_monday = today.weekday()
-            this_monday = today - timedelta(days=days_since_monday)
+            # 所有需要重置的用户在一条语句中完成重置和审计记录
+            reset = await self.ledger.apply_weekly_reset(db, today=today)
+            await db.commit()
             
-            query = text("""
-                SELECT user_id, last_reset_date 
-                FROM user_credits 
-                WHERE last_reset_date < :this_monday
-            """)
-            
-            users_to_reset = db.execute(query, {"this_monday": this_monday}).fetchall()
+            for row in reset:
+                self.ledger.publish_balance(row["user_id"], row["balance_after"])
             
-            reset_count = 0
-            
-            for user_id, last_reset in users_to_reset:
-                try:
-                    await self._reset_user_credits(UUID(user_id), db)
-                    reset_count += 1
-                except Exception as e:
-                    logger.error(f"重置用户 {user_id} Credits失败: {str(e)}")
-            
-            logger.info(f"批量重置Credits完成，共重置 {reset_count} 个用户")
+            logger.info(f"批量重置Credits完成，共重置 {len(reset)} 个用户")
             
             return {
                 "status": "completed",
-                "reset_count": reset_count,
-                "total_users": len(users_to_reset),
+                "reset_count": len(reset),
+                "total_users": len(reset),
                 "reset_date": today.isoformat()
             }
             
         except Exception as e:
+            await db.rollback()
             logger.error(f"批量重置Credits失败: {str(e)}")
             raise HTTPException(status_code=500, detail=f"批量重置失败: {str(e)}")
-    
-    async def _log_audit_trail(
-        self, 
-        user_id: UUID, 
-        action: str, 
-        credits_amount: int, 
-        context: Dict[str, Any], 
-        db: Session
-    ):
-        """记录审计日志"""
-        try:
-            audit_log = {
-                'timestamp': datetime.now().isoformat(),
-                'user_id': str(user_id),
-                'action': action,
-                'credits_change': credits_amount,
-                'context': context,
-                'ip_address': context.get('ip_address'),
-                'user_agent': context.get('user_agent'),
-                'session_id': context.get('session_id')
-            }
-            
-            # 记录到安全日志
-            logger.info(f"AUDIT: User credits change - {json.dumps(audit_log)}")
-            
-            # 可以扩展到专门的审计日志表
-            # audit_record = UserCreditsAuditLog(**audit_log)
-            # db.add(audit_record)
-            # db.commit()
-            
-        except Exception as e:
-            logger.error(f"Error logging audit trail: {e}")
-            # 审计日志失败不应该影响主要业务流程
 
 
 # 服务实例工厂函数
-def create_user_credits_service(config_service: SystemConfigService = None, payment_service: WeChatPayService = None) -> UserCreditsService:
-    """创建用户Credits服务实例"""
-    return UserCreditsService(config_service, payment_service)
\ No newline at end of file
+def create_user_credits_service(
+    config_service: SystemConfigService = None,
+    payment_service: WeChatPayService = None,
+    balance_cache: Optional[CreditsBalanceCache] = None
+) -> UserCreditsService:
+    """创建用户Credits服务实例；未指定余额缓存时使用应用启动时创建的全局缓存"""
+    if balance_cache is None:
+        from app.services import credits_ledger
+        balance_cache = credits_ledger.credits_balance_cache
+    return UserCreditsService(config_service, payment_service, balance_cache)
\ No newline at end of file
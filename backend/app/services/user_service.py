@@ -13,7 +13,13 @@ import uuid
 
 from app.models.user import User, Role, UserRole, UserStatus
 from app.models.tenant import Tenant
-from app.core.security import get_password_hash, verify_password
+from app.core.security import (
+    hash_password,
+    verify_and_update_password,
+    password_overloaded_exception,
+    PasswordHasherOverloaded,
+)
+from app.services.workspace_auth_cache import workspace_auth_cache
 
 logger = structlog.get_logger()
 
@@ -68,7 +74,7 @@ class UserService:
                 )
             
             # 创建用户
-            hashed_password = get_password_hash(password)
+            hashed_password = await hash_password(password)
             user = User(
                 id=str(uuid.uuid4()),
                 email=email,
@@ -103,6 +109,9 @@ class UserService:
         except HTTPException:
             await self.db.rollback()
             raise
+        except PasswordHasherOverloaded:
+            await self.db.rollback()
+            raise password_overloaded_exception()
         except Exception as e:
             await self.db.rollback()
             logger.error("用户创建失败", error=str(e), email=email)
@@ -196,7 +205,8 @@ class UserService:
                 logger.info("用户不存在", username_or_email=username_or_email)
                 return None
             
-            if not verify_password(password, user.password_hash):
+            verified, new_hash = await verify_and_update_password(password, user.password_hash)
+            if not verified:
                 logger.info("密码验证失败", user_id=user.id, username_or_email=username_or_email)
                 return None
             
@@ -204,13 +214,32 @@ class UserService:
                 logger.info("用户状态非活跃", user_id=user.id, status=user.status, username_or_email=username_or_email)
                 return None
             
+            if new_hash:
+                await self._upgrade_password_hash(user, new_hash)
+            
             logger.info("用户认证成功", user_id=user.id, username=user.username, email=user.email)
             return user
             
+        except PasswordHasherOverloaded:
+            raise password_overloaded_exception()
         except Exception as e:
             logger.error("用户认证失败", error=str(e), username_or_email=username_or_email)
             return None
     
+    async def _upgrade_password_hash(self, user: User, new_hash: str) -> None:
+        """哈希成本参数调整后透明地写回新哈希，失败不影响本次登录"""
+        user_id = user.id
+        try:
+            # 在保存点中更新，失败回滚时不会使已加载的user对象过期
+            async with self.db.begin_nested():
+                await self.db.execute(
+                    update(User).where(User.id == user_id).values(password_hash=new_hash)
+                )
+            await self.db.commit()
+            logger.info("密码哈希已升级", user_id=user_id)
+        except Exception as e:
+            logger.warning("密码哈希升级失败", error=str(e), user_id=user_id)
+    
     async def update_user(self, user_id: str, **kwargs) -> Optional[User]:
         """
         更新用户信息
@@ -225,7 +254,7 @@ class UserService:
         try:
             # 如果包含密码，需要哈希处理
             if 'password' in kwargs:
-                kwargs['password_hash'] = get_password_hash(kwargs.pop('password'))
+                kwargs['password_hash'] = await hash_password(kwargs.pop('password'))
             
             stmt = (
                 update(User)
@@ -239,10 +268,14 @@ class UserService:
             
             if user:
                 await self.db.commit()
+                if 'status' in kwargs:
+                    workspace_auth_cache.invalidate(user_id)
                 logger.info("用户更新成功", user_id=user_id)
             
             return user
             
+        except PasswordHasherOverloaded:
+            raise password_overloaded_exception()
         except Exception as e:
             await self.db.rollback()
             logger.error("用户更新失败", error=str(e), user_id=user_id)
@@ -267,6 +300,7 @@ class UserService:
             
             await self.db.execute(stmt)
             await self.db.commit()
+            workspace_auth_cache.invalidate(user_id)
             
             logger.info("用户删除成功", user_id=user_id)
             return True
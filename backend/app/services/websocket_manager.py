@@ -17,6 +17,9 @@ from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
+# 接收看板数据和告警的角色
+ADMIN_ROLES = ("admin", "super_admin")
+
 
 class ConnectionInfo:
     """连接信息"""
@@ -203,7 +206,7 @@ class WebSocketManager:
             # 发送当前连接统计
             stats = {
                 "total_connections": len(self.active_connections),
-                "admin_connections": len(self.role_connections.get("admin", [])),
+                "admin_connections": self.admin_connection_count(),
                 "online_users": len(self.user_connections)
             }
             
@@ -273,6 +276,15 @@ class WebSocketManager:
         success_count = sum(1 for result in results if result is True)
         logger.info(f"向角色 {role} 广播消息: 成功 {success_count}/{len(tasks)}")
     
+    def admin_connection_count(self) -> int:
+        """管理员连接数"""
+        return sum(len(self.role_connections.get(role, [])) for role in ADMIN_ROLES)
+    
+    async def broadcast_to_admins(self, message: dict):
+        """向所有管理员角色广播消息"""
+        for role in ADMIN_ROLES:
+            await self.broadcast_to_role(role, message)
+    
     async def send_to_user(self, user_id: str, message: dict):
         """向特定用户发送消息"""
         if user_id not in self.user_connections:
@@ -297,7 +309,7 @@ class WebSocketManager:
             "data": data,
             "timestamp": datetime.now().isoformat()
         }
-        await self.broadcast_to_role("admin", message)
+        await self.broadcast_to_admins(message)
     
     async def _broadcast_alert(self, data: dict):
         """广播系统告警"""
@@ -307,7 +319,7 @@ class WebSocketManager:
             "timestamp": datetime.now().isoformat(),
             "priority": data.get("priority", "normal")
         }
-        await self.broadcast_to_role("admin", message)
+        await self.broadcast_to_admins(message)
     
     async def _broadcast_user_activity(self, data: dict):
         """广播用户活动通知"""
@@ -316,7 +328,7 @@ class WebSocketManager:
             "data": data,
             "timestamp": datetime.now().isoformat()
         }
-        await self.broadcast_to_role("admin", message)
+        await self.broadcast_to_admins(message)
     
     async def _broadcast_admin_notification(self, data: dict):
         """广播管理员通知"""
@@ -325,7 +337,7 @@ class WebSocketManager:
             "data": data,
             "timestamp": datetime.now().isoformat()
         }
-        await self.broadcast_to_role("admin", message)
+        await self.broadcast_to_admins(message)
     
     async def ping_all_connections(self):
         """向所有连接发送心跳"""
@@ -0,0 +1,170 @@
+"""
+工作台授权缓存
+按用户缓存 workspace_id / account_type / 账户状态，工作台中间件的权限判断变为内存比较；
+身份或账户状态变更（设置身份、律师认证通过、停用/封禁）后使对应用户失效，并通过缓存失效总线通知其他进程
+"""
+
+import time
+import asyncio
+import logging
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+# 兜底TTL：未收到跨进程失效消息时，授权信息最多滞后该时间
+WORKSPACE_AUTH_TTL_SECONDS = 60
+WORKSPACE_AUTH_CACHE_SIZE = 50000
+
+# 失效总线上的键前缀：workspace_auth:{user_id}
+WORKSPACE_AUTH_INVALIDATION_PREFIX = "workspace_auth:"
+
+# 工作台类型允许的账户类型
+WORKSPACE_ACCOUNT_TYPES = {
+    'user': ('user',),
+    'lawyer': ('lawyer', 'lawyer_pending'),
+    'admin': ('admin',),
+}
+
+
+def workspace_auth_invalidation_key(user_id: str) -> str:
+    """生成失效总线上使用的授权键"""
+    return f"{WORKSPACE_AUTH_INVALIDATION_PREFIX}{user_id}"
+
+
+@dataclass(frozen=True)
+class WorkspaceAuthorization:
+    """用户的工作台授权信息"""
+    user_id: str
+    workspace_id: Optional[str]
+    account_type: Optional[str]
+    loaded_at: float
+    status: Optional[str] = None
+
+    def owns_workspace(self, workspace_id: str) -> bool:
+        return self.workspace_id is not None and self.workspace_id == workspace_id
+
+    def matches_workspace_type(self, workspace_type: str) -> bool:
+        return self.account_type in WORKSPACE_ACCOUNT_TYPES.get(workspace_type, ())
+
+    def is_active(self) -> bool:
+        return self.status == 'active'
+
+
+# 加载函数：返回 {'workspace_id', 'account_type', 'status'}，用户不存在时返回None
+AuthorizationLoader = Callable[[], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class WorkspaceAuthCache:
+    """进程内工作台授权缓存"""
+
+    def __init__(self, ttl: float = WORKSPACE_AUTH_TTL_SECONDS, max_size: int = WORKSPACE_AUTH_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, WorkspaceAuthorization]" = OrderedDict()
+        # 仅记录加载中的用户在加载期间被失效的次数，用于丢弃过期的加载结果
+        self._versions: Dict[str, int] = {}
+        self._loading: Dict[str, asyncio.Future] = {}
+        self.stats = {
+            'hits': 0,
+            'loads': 0,
+            'invalidations': 0,
+            'discarded_loads': 0,
+        }
+
+    async def get(self, user_id: str, loader: AuthorizationLoader) -> Optional[WorkspaceAuthorization]:
+        """获取用户授权信息，未命中时加载一次（并发请求共享同一次加载）"""
+        user_id = str(user_id)
+
+        entry = self._entries.get(user_id)
+        if entry is not None and time.monotonic() - entry.loaded_at <= self.ttl:
+            self._entries.move_to_end(user_id)
+            self.stats['hits'] += 1
+            return entry
+
+        future = self._loading.get(user_id)
+        if future is not None:
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[user_id] = future
+        version = self._versions.get(user_id, 0)
+        try:
+            row = await loader()
+            self.stats['loads'] += 1
+            entry = None
+            if row is not None:
+                entry = WorkspaceAuthorization(
+                    user_id=user_id,
+                    workspace_id=row.get('workspace_id'),
+                    account_type=row.get('account_type'),
+                    loaded_at=time.monotonic(),
+                    status=row.get('status'),
+                )
+
+                # 加载期间身份发生变更时不缓存
+                if self._versions.get(user_id, 0) == version:
+                    self._entries[user_id] = entry
+                    self._entries.move_to_end(user_id)
+                    while len(self._entries) > self.max_size:
+                        self._entries.popitem(last=False)
+                else:
+                    self.stats['discarded_loads'] += 1
+
+            future.set_result(entry)
+            return entry
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            self._loading.pop(user_id, None)
+            self._versions.pop(user_id, None)
+
+    def invalidate(self, user_id: str, broadcast: bool = True) -> None:
+        """用户身份或账户状态变更后使其授权信息失效"""
+        user_id = str(user_id)
+        self._invalidate_user(user_id)
+
+        if broadcast:
+            self._broadcast([workspace_auth_invalidation_key(user_id)])
+
+    def invalidate_all(self) -> None:
+        """清空所有授权缓存"""
+        for user_id in set(self._entries) | set(self._loading):
+            self._invalidate_user(user_id)
+
+    def handle_invalidation(self, keys: Iterable[str], patterns: Iterable[str], tags: Iterable[str]) -> None:
+        """失效总线回调：处理其他进程广播的授权失效"""
+        for key in keys:
+            if key.startswith(WORKSPACE_AUTH_INVALIDATION_PREFIX):
+                self._invalidate_user(key[len(WORKSPACE_AUTH_INVALIDATION_PREFIX):])
+
+    def _invalidate_user(self, user_id: str) -> None:
+        if user_id in self._loading:
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+        self._entries.pop(user_id, None)
+        self.stats['invalidations'] += 1
+
+    def _broadcast(self, keys: Iterable[str]) -> None:
+        """通过缓存失效总线通知其他进程（未启用时忽略）"""
+        from app.core import advanced_cache
+
+        manager = advanced_cache.cache_manager
+        if manager is not None and manager.invalidation_bus is not None:
+            manager.invalidation_bus.publish(keys=keys)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            **self.stats,
+            'cached_users': len(self._entries),
+            'ttl_seconds': self.ttl,
+        }
+
+
+# 全局工作台授权缓存实例
+workspace_auth_cache = WorkspaceAuthCache()
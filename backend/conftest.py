@@ -0,0 +1,44 @@
+"""
+pytest 公共夹具
+"""
+
+import os
+import sys
+from contextlib import contextmanager
+
+import pytest
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.query_profiler import capture_request_profiles, profile_queries
+
+
+@pytest.fixture
+def query_budget():
+    """
+    断言代码块内执行的SQL语句数不超过上限，且没有N+1
+
+    经过 PerformanceMiddleware 的每个请求分别校验；同一上下文中直接调用的服务代码合并校验：
+
+        def test_dashboard(client, query_budget):
+            with query_budget(max_queries=10):
+                client.get("/api/v1/statistics/dashboard")
+    """
+    @contextmanager
+    def check(max_queries: int, allow_n_plus_one: bool = False):
+        with capture_request_profiles() as profiles, profile_queries("direct") as direct:
+            yield profiles
+
+        checked = profiles + ([direct] if direct.query_count else [])
+        for profile in checked:
+            assert profile.query_count <= max_queries, (
+                f"{profile.route} 执行了 {profile.query_count} 条SQL，上限 {max_queries}"
+            )
+            if not allow_n_plus_one:
+                suspects = profile.n_plus_one()
+                assert not suspects, (
+                    f"{profile.route} 疑似N+1: 同一语句执行 {suspects[0]['count']} 次 - {suspects[0]['sql']}"
+                )
+
+    return check
@@ -74,14 +74,17 @@ class SafeMigrationExecutor:
                 "migration_id": migration_result.migration_id,
                 "backup_path": migration_result.backup_path,
                 "error_message": migration_result.error_message,
-                "rollback_performed": migration_result.rollback_performed
+                "rollback_performed": migration_result.rollback_performed,
+                "fingerprint_path": migration_result.fingerprint_path,
+                "integrity_report": migration_result.integrity_report
             }
             
             if not migration_result.success:
                 raise Exception(f"迁移执行失败: {migration_result.error_message}")
             
-            # 阶段3: 迁移验证
+            # 阶段3: 迁移验证（与迁移前的数据指纹比对）
             logger.info("🔍 阶段3: 执行迁移验证...")
+            self.verifier.baseline_path = migration_result.fingerprint_path
             verification_success = await self.verifier.run_all_verifications()
             verification_report = await self.verifier.generate_verification_report()
             
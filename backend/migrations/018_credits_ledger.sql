@@ -0,0 +1,42 @@
+-- Credits账本
+-- 每次Credits变动（消耗、购买、每周重置）在同一条语句中追加使用记录和审计记录
+
+-- Credits使用记录表
+CREATE TABLE IF NOT EXISTS credit_usage_records (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    credits_used INTEGER NOT NULL,
+    usage_type VARCHAR(50) NOT NULL,
+    balance_after INTEGER NOT NULL,
+    weekly_reset_applied BOOLEAN NOT NULL DEFAULT FALSE, -- 本次消耗前是否执行了每周重置
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Credits审计日志表
+CREATE TABLE IF NOT EXISTS credit_audit_logs (
+    id BIGSERIAL PRIMARY KEY,
+    user_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    action VARCHAR(50) NOT NULL, -- credits_consumed, credits_purchased, credits_reset
+    credits_change INTEGER NOT NULL,
+    balance_after INTEGER NOT NULL,
+    reference_id VARCHAR(100), -- 关联的购买记录等
+    context JSONB,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_credit_usage_records_user_created
+    ON credit_usage_records(user_id, created_at DESC);
+CREATE INDEX IF NOT EXISTS idx_credit_audit_logs_user_created
+    ON credit_audit_logs(user_id, created_at DESC);
+
+-- 余额不允许为负（已有数据不回溯校验）
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'chk_user_credits_remaining_non_negative'
+    ) THEN
+        ALTER TABLE user_credits
+            ADD CONSTRAINT chk_user_credits_remaining_non_negative
+            CHECK (credits_remaining >= 0) NOT VALID;
+    END IF;
+END $$;
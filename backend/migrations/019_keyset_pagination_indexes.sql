@@ -0,0 +1,24 @@
+-- 键集分页索引
+-- 列表按 (created_at, id) 倒序翻页，游标条件 (created_at, id) < (:t, :id) 需要与排序一致的复合索引，
+-- 任意深度的翻页都只扫描一页数据
+
+CREATE INDEX IF NOT EXISTS idx_cases_tenant_created_id
+    ON cases(tenant_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_credit_usage_records_user_created_id
+    ON credit_usage_records(user_id, created_at DESC, id DESC);
+-- 已被上面的索引覆盖
+DROP INDEX IF EXISTS idx_credit_usage_records_user_created;
+
+CREATE INDEX IF NOT EXISTS idx_withdrawal_requests_user_created_id
+    ON withdrawal_requests(user_id, created_at DESC, id DESC);
+-- 管理员查看全部提现申请
+CREATE INDEX IF NOT EXISTS idx_withdrawal_requests_created_id
+    ON withdrawal_requests(created_at DESC, id DESC);
+
+-- 交易按案件归属到用户
+CREATE INDEX IF NOT EXISTS idx_transactions_case_created_id
+    ON transactions(case_id, created_at DESC, id DESC);
+
+CREATE INDEX IF NOT EXISTS idx_document_review_tasks_created_id
+    ON document_review_tasks(created_at DESC, id DESC);
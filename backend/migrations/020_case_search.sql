@@ -0,0 +1,90 @@
+-- 案件关键词搜索索引
+-- 关键词过滤原先对 case_number、description 和 debtor_info 文本做 ILIKE '%kw%'，每次都是全表扫描。
+-- 这里把债务人姓名、电话、证件号提取为独立列，并维护一个 tsvector 列：
+-- 中文没有空格分词，文本按字母数字片段切成相邻二元组（外加片段末字），
+-- 查询的二元组全部命中即为候选，GIN 索引可直接定位，不依赖 zhparser 等扩展
+
+-- 提取出的债务人字段
+ALTER TABLE cases ADD COLUMN IF NOT EXISTS debtor_name VARCHAR(100);
+ALTER TABLE cases ADD COLUMN IF NOT EXISTS debtor_phone VARCHAR(20);
+ALTER TABLE cases ADD COLUMN IF NOT EXISTS debtor_id_number VARCHAR(30);
+ALTER TABLE cases ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+
+-- 文本切分为检索词：小写后按非字母数字切成片段，每个片段取相邻二元组和末字
+-- 与 app/services/case_search.py 中的 index_tokens 保持一致
+CREATE OR REPLACE FUNCTION case_search_tokens(source TEXT) RETURNS TEXT[] AS $$
+DECLARE
+    segment TEXT;
+    tokens TEXT[] := '{}';
+    i INTEGER;
+BEGIN
+    IF source IS NULL THEN
+        RETURN tokens;
+    END IF;
+    FOREACH segment IN ARRAY regexp_split_to_array(lower(source), '[^[:alnum:]]+') LOOP
+        CONTINUE WHEN segment = '';
+        FOR i IN 1 .. char_length(segment) - 1 LOOP
+            tokens := tokens || substr(segment, i, 2);
+        END LOOP;
+        tokens := tokens || right(segment, 1);
+    END LOOP;
+    RETURN tokens;
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+-- 检索词转为带位置的 tsvector：array_to_tsvector 生成的词位没有位置，setweight 对其不起作用，
+-- 权重与 ts_rank 排序都依赖位置信息。检索词只含字母数字，simple 配置按空格切开后原样保留
+CREATE OR REPLACE FUNCTION case_search_vector(source TEXT) RETURNS TSVECTOR AS $$
+    SELECT to_tsvector('simple', array_to_string(case_search_tokens(source), ' '))
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 写入或相关字段变化时重新提取债务人字段并生成检索向量
+-- 权重：A 案件编号/债务人姓名/电话/证件号，B 工作单位，C 描述/地址
+CREATE OR REPLACE FUNCTION cases_search_refresh() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE' AND NEW.search_vector IS NOT NULL
+       AND NEW.case_number IS NOT DISTINCT FROM OLD.case_number
+       AND NEW.description IS NOT DISTINCT FROM OLD.description
+       AND NEW.debtor_info IS NOT DISTINCT FROM OLD.debtor_info THEN
+        RETURN NEW;
+    END IF;
+
+    NEW.debtor_name := NEW.debtor_info ->> 'name';
+    NEW.debtor_phone := left(regexp_replace(NEW.debtor_info ->> 'phone', '[^0-9+]', '', 'g'), 20);
+    NEW.debtor_id_number := left(upper(regexp_replace(NEW.debtor_info ->> 'id_card', '\s', '', 'g')), 30);
+
+    NEW.search_vector :=
+        setweight(case_search_vector(
+            concat_ws(' ', NEW.case_number, NEW.debtor_name, NEW.debtor_phone, NEW.debtor_id_number)
+        ), 'A') ||
+        setweight(case_search_vector(NEW.debtor_info ->> 'company'), 'B') ||
+        setweight(case_search_vector(
+            concat_ws(' ', NEW.description, NEW.debtor_info ->> 'address')
+        ), 'C');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_cases_search_refresh ON cases;
+CREATE TRIGGER trg_cases_search_refresh
+    BEFORE INSERT OR UPDATE ON cases
+    FOR EACH ROW EXECUTE FUNCTION cases_search_refresh();
+
+-- 已有数据的 search_vector 为空，由 app/scripts/backfill_case_search.py 分批回填，
+-- 回填期间关键词搜索对未回填的行退回 ILIKE 匹配
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cases_search_vector
+ON cases USING GIN (search_vector);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cases_tenant_debtor_phone
+ON cases(tenant_id, debtor_phone)
+WHERE debtor_phone IS NOT NULL;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cases_tenant_debtor_id_number
+ON cases(tenant_id, debtor_id_number)
+WHERE debtor_id_number IS NOT NULL;
+
+-- 回填进度查询
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_cases_search_pending
+ON cases(id)
+WHERE search_vector IS NULL;
@@ -0,0 +1,6 @@
+-- 系统指标历史
+-- 后台采样器每分钟把主机级指标的均值写入 system_metrics（每个 host_name 每分钟一份），
+-- 运维接口按指标名和时间范围读取历史
+
+CREATE INDEX IF NOT EXISTS idx_system_metrics_name_host_time
+    ON system_metrics(metric_name, host_name, created_at);
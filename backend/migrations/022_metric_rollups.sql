@@ -0,0 +1,54 @@
+-- 指标汇总表
+-- 注册数、收入、PV/UV、错误数和响应时间按小时、按天预聚合，
+-- 管理后台图表与访问趋势只读汇总表，不再对 users/transactions/access_logs 原始数据做 GROUP BY DATE(...)。
+-- 汇总由 app/services/metric_rollups.py 从水位线开始增量维护，迟到数据按时间窗口重算后覆盖写入
+
+-- 小时汇总：每小时一行，没有数据的小时也写入零值行
+CREATE TABLE IF NOT EXISTS metric_rollups_hourly (
+    bucket_start TIMESTAMP PRIMARY KEY,
+    signups INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(15,2) NOT NULL DEFAULT 0,
+    paid_transactions INTEGER NOT NULL DEFAULT 0,
+    pv BIGINT NOT NULL DEFAULT 0,
+    uv INTEGER NOT NULL DEFAULT 0,                 -- 小时内去重的 session_id 数
+    unique_ips INTEGER NOT NULL DEFAULT 0,
+    mobile_visits BIGINT NOT NULL DEFAULT 0,
+    desktop_visits BIGINT NOT NULL DEFAULT 0,
+    client_errors BIGINT NOT NULL DEFAULT 0,       -- 4xx
+    server_errors BIGINT NOT NULL DEFAULT 0,       -- 5xx
+    latency_sum_ms BIGINT NOT NULL DEFAULT 0,
+    latency_count BIGINT NOT NULL DEFAULT 0,
+    latency_max_ms INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 天汇总：可加列由小时汇总相加，UV/独立IP 按整天去重（不能由小时值相加）
+CREATE TABLE IF NOT EXISTS metric_rollups_daily (
+    bucket_date DATE PRIMARY KEY,
+    signups INTEGER NOT NULL DEFAULT 0,
+    revenue DECIMAL(15,2) NOT NULL DEFAULT 0,
+    paid_transactions INTEGER NOT NULL DEFAULT 0,
+    pv BIGINT NOT NULL DEFAULT 0,
+    uv INTEGER NOT NULL DEFAULT 0,
+    unique_ips INTEGER NOT NULL DEFAULT 0,
+    mobile_visits BIGINT NOT NULL DEFAULT 0,
+    desktop_visits BIGINT NOT NULL DEFAULT 0,
+    client_errors BIGINT NOT NULL DEFAULT 0,
+    server_errors BIGINT NOT NULL DEFAULT 0,
+    latency_sum_ms BIGINT NOT NULL DEFAULT 0,
+    latency_count BIGINT NOT NULL DEFAULT 0,
+    latency_max_ms INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 增量汇总的水位线：该时间之前的小时已完整汇总
+CREATE TABLE IF NOT EXISTS rollup_watermarks (
+    rollup_name VARCHAR(50) PRIMARY KEY,
+    watermark TIMESTAMP NOT NULL,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 按时间范围重算时各数据源走范围扫描（users、access_logs 的 created_at 索引已存在）
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_transactions_completed_created
+    ON transactions(created_at)
+    WHERE status = 'COMPLETED';
@@ -0,0 +1,31 @@
+-- 日志表分区
+-- access_logs、user_activity_logs、lawyer_activity_logs、system_logs 改为按时间范围分区，
+-- 由 app/scripts/partition_logs.py 在线转换：先建分区表并用触发器同步新写入，再分批复制历史数据，
+-- 最后短暂加锁切换表名。后台任务预建未来分区，超出保留期的分区分离后导出为压缩文件再删除
+
+-- 转换进度：按 (分区键, id) 顺序分批复制，中断后从记录的位置继续
+CREATE TABLE IF NOT EXISTS log_partition_conversions (
+    table_name VARCHAR(63) PRIMARY KEY,
+    status VARCHAR(20) NOT NULL DEFAULT 'copying',   -- copying, cut_over, done
+    last_key TEXT,
+    last_id TEXT,
+    copied_rows BIGINT NOT NULL DEFAULT 0,
+    started_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 已归档的分区：分离后状态为 detached，导出并删除后为 archived
+CREATE TABLE IF NOT EXISTS log_partition_archives (
+    partition_name VARCHAR(63) PRIMARY KEY,
+    parent_table VARCHAR(63) NOT NULL,
+    range_start DATE NOT NULL,
+    range_end DATE NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'detached',
+    row_count BIGINT,
+    archive_path TEXT,
+    detached_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    archived_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_log_partition_archives_parent
+    ON log_partition_archives(parent_table, range_start);
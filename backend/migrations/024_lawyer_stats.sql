@@ -0,0 +1,95 @@
+-- 律师业绩统计
+-- lawyer_stats 每位律师一行：承办案件数、完成率、进行中的工作量、近30天成功率和收入。
+-- cases / transactions 上的触发器把受影响的律师写入 lawyer_stats_dirty，
+-- 后台任务（app/services/lawyer_stats.py）按律师重算并定期全量校准；
+-- 排行榜直接读取该表，按索引顺序取一页。
+-- 案件按租户隔离，工作量查询和智能分配读取同时维护的 lawyer_tenant_workload（每位律师每个租户一行）
+
+CREATE TABLE IF NOT EXISTS lawyer_stats (
+    lawyer_id UUID PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    cases_total INTEGER NOT NULL DEFAULT 0,               -- 分配过的案件
+    cases_completed INTEGER NOT NULL DEFAULT 0,
+    active_cases INTEGER NOT NULL DEFAULT 0,              -- ASSIGNED / IN_PROGRESS
+    active_amount DECIMAL(18,2) NOT NULL DEFAULT 0,
+    completed_this_month INTEGER NOT NULL DEFAULT 0,
+    cases_30d INTEGER NOT NULL DEFAULT 0,                 -- 近30天创建的案件
+    completed_30d INTEGER NOT NULL DEFAULT 0,
+    completion_rate NUMERIC(5,4) NOT NULL DEFAULT 0,
+    success_rate_30d NUMERIC(5,4) NOT NULL DEFAULT 0,
+    revenue DECIMAL(18,2) NOT NULL DEFAULT 0,             -- 已完成的 PAYMENT 交易
+    computed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 排行榜按 (指标 DESC, lawyer_id) 分页
+CREATE INDEX IF NOT EXISTS idx_lawyer_stats_cases ON lawyer_stats(cases_completed DESC, lawyer_id);
+CREATE INDEX IF NOT EXISTS idx_lawyer_stats_revenue ON lawyer_stats(revenue DESC, lawyer_id);
+CREATE INDEX IF NOT EXISTS idx_lawyer_stats_completion ON lawyer_stats(completion_rate DESC, lawyer_id);
+
+-- 分租户的进行中工作量，与 lawyer_stats 在同一次重算中更新
+CREATE TABLE IF NOT EXISTS lawyer_tenant_workload (
+    tenant_id UUID NOT NULL,
+    lawyer_id UUID NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+    active_cases INTEGER NOT NULL DEFAULT 0,
+    active_amount DECIMAL(18,2) NOT NULL DEFAULT 0,
+    completed_this_month INTEGER NOT NULL DEFAULT 0,
+    computed_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (tenant_id, lawyer_id)
+);
+
+-- 重算时按律师删除旧行
+CREATE INDEX IF NOT EXISTS idx_lawyer_tenant_workload_lawyer ON lawyer_tenant_workload(lawyer_id);
+
+-- 待重算的律师
+CREATE TABLE IF NOT EXISTS lawyer_stats_dirty (
+    lawyer_id UUID PRIMARY KEY,
+    queued_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- 冲突时更新而不是忽略：正在被重算任务取走的行会被锁住，写入方等待其提交后重新入队，不会漏掉变更
+CREATE OR REPLACE FUNCTION lawyer_stats_mark_case() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.assigned_to_user_id IS NOT NULL THEN
+        INSERT INTO lawyer_stats_dirty (lawyer_id) VALUES (NEW.assigned_to_user_id)
+        ON CONFLICT (lawyer_id) DO UPDATE SET queued_at = CURRENT_TIMESTAMP;
+    END IF;
+    IF TG_OP = 'DELETE' OR (TG_OP = 'UPDATE' AND OLD.assigned_to_user_id IS DISTINCT FROM NEW.assigned_to_user_id) THEN
+        IF OLD.assigned_to_user_id IS NOT NULL THEN
+            INSERT INTO lawyer_stats_dirty (lawyer_id) VALUES (OLD.assigned_to_user_id)
+            ON CONFLICT (lawyer_id) DO UPDATE SET queued_at = CURRENT_TIMESTAMP;
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS cases_lawyer_stats ON cases;
+CREATE TRIGGER cases_lawyer_stats
+    AFTER INSERT OR DELETE OR UPDATE OF assigned_to_user_id, tenant_id, status, case_amount, completed_at ON cases
+    FOR EACH ROW EXECUTE FUNCTION lawyer_stats_mark_case();
+
+CREATE OR REPLACE FUNCTION lawyer_stats_mark_transaction() RETURNS trigger AS $$
+DECLARE
+    changed_case_ids UUID[];
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changed_case_ids := ARRAY[NEW.case_id];
+    ELSIF TG_OP = 'DELETE' THEN
+        changed_case_ids := ARRAY[OLD.case_id];
+    ELSE
+        changed_case_ids := ARRAY[NEW.case_id, OLD.case_id];
+    END IF;
+    INSERT INTO lawyer_stats_dirty (lawyer_id)
+    SELECT DISTINCT c.assigned_to_user_id FROM cases c
+    WHERE c.id = ANY(changed_case_ids) AND c.assigned_to_user_id IS NOT NULL
+    ON CONFLICT (lawyer_id) DO UPDATE SET queued_at = CURRENT_TIMESTAMP;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS transactions_lawyer_stats ON transactions;
+CREATE TRIGGER transactions_lawyer_stats
+    AFTER INSERT OR DELETE OR UPDATE OF status, amount, case_id, transaction_type ON transactions
+    FOR EACH ROW EXECUTE FUNCTION lawyer_stats_mark_transaction();
+
+-- 按律师重算时取交易
+CREATE INDEX IF NOT EXISTS idx_transactions_case_status ON transactions(case_id, status);
@@ -0,0 +1,14 @@
+-- 数据库备份进度与校验
+-- backup_records 由 app/core/database_backup.py 执行：pg_dump 目录格式并行导出，
+-- 进度按已导出的表数写回；完成后记录压缩方式和 manifest.json 的 SHA-256，校验结果另记
+
+ALTER TABLE backup_records ADD COLUMN IF NOT EXISTS backup_format VARCHAR(20);      -- directory
+ALTER TABLE backup_records ADD COLUMN IF NOT EXISTS compression VARCHAR(20);        -- zstd:3, gzip:6, none
+ALTER TABLE backup_records ADD COLUMN IF NOT EXISTS parallel_jobs SMALLINT;
+ALTER TABLE backup_records ADD COLUMN IF NOT EXISTS tables_total INTEGER;
+ALTER TABLE backup_records ADD COLUMN IF NOT EXISTS tables_done INTEGER;
+ALTER TABLE backup_records ADD COLUMN IF NOT EXISTS progress_percent SMALLINT DEFAULT 0;
+ALTER TABLE backup_records ADD COLUMN IF NOT EXISTS manifest_checksum VARCHAR(64);
+ALTER TABLE backup_records ADD COLUMN IF NOT EXISTS verify_status VARCHAR(20);      -- passed, failed
+ALTER TABLE backup_records ADD COLUMN IF NOT EXISTS verified_at TIMESTAMP;
+ALTER TABLE backup_records ADD COLUMN IF NOT EXISTS description TEXT;
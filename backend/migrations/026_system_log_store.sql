@@ -0,0 +1,37 @@
+-- 系统日志查询索引
+-- 运维日志列表按级别/来源过滤、按 (created_at, id) 倒序键集分页，原先只有单列索引，
+-- 过滤后仍需排序整批匹配行。这里建立以过滤列开头、以排序键结尾的复合索引，
+-- 并为 log_message 建立检索索引：复用 020_case_search.sql 的 case_search_tokens 切分规则
+-- （字母数字片段的相邻二元组和末字），不依赖 pg_trgm / zhparser 等扩展。
+-- system_logs 可能已转换为分区表（023_log_partitioning.sql），分区表不支持 CONCURRENTLY，
+-- 这里在父表上建索引，各分区自动建立对应索引
+
+-- 日志消息检索向量，与 app/services/system_logs.py 中的查询表达式保持一致
+CREATE OR REPLACE FUNCTION system_log_search_vector(message TEXT) RETURNS TSVECTOR AS $$
+    SELECT array_to_tsvector(case_search_tokens(left(message, 2000)))
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 级别 + 来源
+CREATE INDEX IF NOT EXISTS idx_system_logs_level_source_time
+ON system_logs(log_level, log_source, created_at DESC, id DESC);
+
+-- 仅按级别
+CREATE INDEX IF NOT EXISTS idx_system_logs_level_time
+ON system_logs(log_level, created_at DESC, id DESC);
+
+-- 仅按来源
+CREATE INDEX IF NOT EXISTS idx_system_logs_source_time
+ON system_logs(log_source, created_at DESC, id DESC);
+
+-- 无过滤
+CREATE INDEX IF NOT EXISTS idx_system_logs_time_id
+ON system_logs(created_at DESC, id DESC);
+
+-- 消息检索
+CREATE INDEX IF NOT EXISTS idx_system_logs_message_search
+ON system_logs USING GIN (system_log_search_vector(log_message));
+
+-- 单列索引已被复合索引的前导列覆盖
+DROP INDEX IF EXISTS idx_system_logs_level;
+DROP INDEX IF EXISTS idx_system_logs_source;
+DROP INDEX IF EXISTS idx_system_logs_time;
@@ -0,0 +1,205 @@
+-- 批量上传滥用检测计数
+-- 每次批量上传前的滥用检测原先对 batch_upload_tasks 做四次窗口扫描（24小时/7天/30天），
+-- 重复检测还要按 (file_name, file_size) GROUP BY。这里由触发器在写入任务时增量维护：
+--   batch_upload_user_hourly     每用户每小时一行的计数桶，检测时按窗口相加（最多约720行，走主键范围）
+--   batch_upload_content_hashes  每用户出现过的文件内容哈希（SHA-256），用于判定重复上传
+--   batch_upload_daily_rollups   按天、任务类型的上传数和滥用上传数，供滥用指标和趋势读取
+-- 上传接口把各文件的内容哈希写入 batch_upload_tasks.content_hashes；历史任务没有哈希，不参与重复比例。
+-- 计数逻辑见 app/services/batch_abuse_monitor.py
+
+ALTER TABLE batch_upload_tasks ADD COLUMN IF NOT EXISTS content_hashes TEXT[];
+ALTER TABLE batch_upload_tasks ADD COLUMN IF NOT EXISTS duplicate_files INTEGER NOT NULL DEFAULT 0;
+
+CREATE TABLE IF NOT EXISTS batch_upload_user_hourly (
+    user_id UUID NOT NULL,
+    bucket_start TIMESTAMPTZ NOT NULL,
+    uploads INTEGER NOT NULL DEFAULT 0,
+    small_uploads INTEGER NOT NULL DEFAULT 0,        -- file_size < 1024
+    failed_uploads INTEGER NOT NULL DEFAULT 0,       -- error_records > success_records
+    suspicious_uploads INTEGER NOT NULL DEFAULT 0,   -- 文件名含可疑关键词
+    files INTEGER NOT NULL DEFAULT 0,                -- 带内容哈希的文件数
+    duplicate_files INTEGER NOT NULL DEFAULT 0,      -- 其中30天内已上传过的文件数
+    PRIMARY KEY (user_id, bucket_start)
+);
+
+CREATE TABLE IF NOT EXISTS batch_upload_content_hashes (
+    user_id UUID NOT NULL,
+    content_hash VARCHAR(64) NOT NULL,
+    first_seen_at TIMESTAMPTZ NOT NULL,
+    last_seen_at TIMESTAMPTZ NOT NULL,
+    previous_seen_at TIMESTAMPTZ,                    -- 最近一次上传之前的出现时间
+    upload_count INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (user_id, content_hash)
+);
+
+CREATE INDEX IF NOT EXISTS idx_batch_upload_content_hashes_last_seen
+ON batch_upload_content_hashes(user_id, last_seen_at);
+
+-- 同一天的上传更新同一行，批量上传受 Credits 限制，写入频率低，行锁竞争可以忽略
+CREATE TABLE IF NOT EXISTS batch_upload_daily_rollups (
+    bucket_date DATE NOT NULL,
+    task_type VARCHAR(20) NOT NULL,
+    total_uploads INTEGER NOT NULL DEFAULT 0,
+    abusive_uploads INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (bucket_date, task_type)
+);
+
+-- 可疑文件名，关键词与 BatchAbuseMonitor.ABUSE_THRESHOLDS['suspicious_file_patterns'] 保持一致
+CREATE OR REPLACE FUNCTION batch_upload_suspicious_name(name TEXT) RETURNS BOOLEAN AS $$
+    SELECT LOWER(name) LIKE ANY (ARRAY['%test%', '%spam%', '%fake%', '%测试%', '%垃圾%', '%假的%'])
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 任务的计数标志位：1 小文件，2 失败多于成功，4 可疑文件名，8 滥用上传（与滥用指标的判定一致）
+CREATE OR REPLACE FUNCTION batch_upload_flags(task batch_upload_tasks) RETURNS INTEGER AS $$
+    SELECT (CASE WHEN task.file_size < 1024 THEN 1 ELSE 0 END)
+         | (CASE WHEN task.error_records > task.success_records THEN 2 ELSE 0 END)
+         | (CASE WHEN batch_upload_suspicious_name(task.file_name) THEN 4 ELSE 0 END)
+         | (CASE WHEN task.file_size < 1024
+                   OR (task.total_records > 0 AND task.error_records::float / task.total_records > 0.8)
+                   OR batch_upload_suspicious_name(task.file_name) THEN 8 ELSE 0 END)
+$$ LANGUAGE sql IMMUTABLE;
+
+-- 把一个任务的计数加到（delta = 1）或减出（delta = -1）小时桶和天汇总
+CREATE OR REPLACE FUNCTION batch_upload_apply_counters(task batch_upload_tasks, delta INTEGER) RETURNS VOID AS $$
+DECLARE
+    created TIMESTAMPTZ := COALESCE(task.created_at, CURRENT_TIMESTAMP);
+    flags INTEGER := batch_upload_flags(task);
+BEGIN
+    -- 检测窗口最长30天，更早的小时桶不再维护
+    IF created >= CURRENT_TIMESTAMP - INTERVAL '31 days' THEN
+        INSERT INTO batch_upload_user_hourly AS h (
+            user_id, bucket_start, uploads, small_uploads, failed_uploads, suspicious_uploads, files, duplicate_files
+        ) VALUES (
+            task.user_id, date_trunc('hour', created), delta,
+            CASE WHEN flags & 1 <> 0 THEN delta ELSE 0 END,
+            CASE WHEN flags & 2 <> 0 THEN delta ELSE 0 END,
+            CASE WHEN flags & 4 <> 0 THEN delta ELSE 0 END,
+            delta * COALESCE(cardinality(task.content_hashes), 0),
+            delta * task.duplicate_files
+        )
+        ON CONFLICT (user_id, bucket_start) DO UPDATE SET
+            uploads = h.uploads + EXCLUDED.uploads,
+            small_uploads = h.small_uploads + EXCLUDED.small_uploads,
+            failed_uploads = h.failed_uploads + EXCLUDED.failed_uploads,
+            suspicious_uploads = h.suspicious_uploads + EXCLUDED.suspicious_uploads,
+            files = h.files + EXCLUDED.files,
+            duplicate_files = h.duplicate_files + EXCLUDED.duplicate_files;
+    END IF;
+
+    INSERT INTO batch_upload_daily_rollups AS d (bucket_date, task_type, total_uploads, abusive_uploads)
+    VALUES (created::date, task.task_type, delta, CASE WHEN flags & 8 <> 0 THEN delta ELSE 0 END)
+    ON CONFLICT (bucket_date, task_type) DO UPDATE SET
+        total_uploads = d.total_uploads + EXCLUDED.total_uploads,
+        abusive_uploads = d.abusive_uploads + EXCLUDED.abusive_uploads,
+        updated_at = CURRENT_TIMESTAMP;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 写入前登记内容哈希，30天内出现过的哈希记为重复文件
+-- 并发上传同一文件时 ON CONFLICT 等待先写入的事务提交，previous_seen_at 取到的是已提交的出现时间
+CREATE OR REPLACE FUNCTION batch_upload_register_hashes() RETURNS trigger AS $$
+DECLARE
+    seen_at TIMESTAMPTZ := COALESCE(NEW.created_at, CURRENT_TIMESTAMP);
+    fresh INTEGER;
+BEGIN
+    IF NEW.content_hashes IS NULL OR cardinality(NEW.content_hashes) = 0 THEN
+        NEW.duplicate_files := 0;
+        RETURN NEW;
+    END IF;
+
+    WITH registered AS (
+        INSERT INTO batch_upload_content_hashes AS c (user_id, content_hash, first_seen_at, last_seen_at)
+        SELECT DISTINCT NEW.user_id, hash, seen_at, seen_at FROM unnest(NEW.content_hashes) AS hash
+        ON CONFLICT (user_id, content_hash) DO UPDATE SET
+            previous_seen_at = c.last_seen_at,
+            last_seen_at = GREATEST(c.last_seen_at, EXCLUDED.last_seen_at),
+            upload_count = c.upload_count + 1
+        RETURNING previous_seen_at
+    )
+    SELECT COUNT(*) INTO fresh FROM registered
+    WHERE previous_seen_at IS NULL OR previous_seen_at < seen_at - INTERVAL '30 days';
+
+    -- 同一次上传里重复的文件也计入
+    NEW.duplicate_files := cardinality(NEW.content_hashes) - fresh;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION batch_upload_abuse_counters() RETURNS trigger AS $$
+BEGIN
+    -- 处理进度更新频繁，计数相关的字段没有变化时跳过
+    IF TG_OP = 'UPDATE'
+       AND OLD.user_id = NEW.user_id
+       AND OLD.task_type = NEW.task_type
+       AND OLD.created_at IS NOT DISTINCT FROM NEW.created_at
+       AND OLD.content_hashes IS NOT DISTINCT FROM NEW.content_hashes
+       AND OLD.duplicate_files = NEW.duplicate_files
+       AND batch_upload_flags(OLD) = batch_upload_flags(NEW) THEN
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM batch_upload_apply_counters(OLD, -1);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        PERFORM batch_upload_apply_counters(NEW, 1);
+    END IF;
+
+    -- 上传时顺带清理该用户过期的小时桶和哈希，不需要单独的清理任务
+    IF TG_OP = 'INSERT' THEN
+        DELETE FROM batch_upload_user_hourly
+        WHERE user_id = NEW.user_id AND bucket_start < CURRENT_TIMESTAMP - INTERVAL '31 days';
+        DELETE FROM batch_upload_content_hashes
+        WHERE user_id = NEW.user_id AND last_seen_at < CURRENT_TIMESTAMP - INTERVAL '30 days';
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 重建计数期间阻止写入，避免触发器生效前后的任务漏计或重复计数
+LOCK TABLE batch_upload_tasks IN SHARE MODE;
+
+DROP TRIGGER IF EXISTS batch_upload_register_hashes ON batch_upload_tasks;
+CREATE TRIGGER batch_upload_register_hashes
+    BEFORE INSERT ON batch_upload_tasks
+    FOR EACH ROW EXECUTE FUNCTION batch_upload_register_hashes();
+
+DROP TRIGGER IF EXISTS batch_upload_abuse_counters ON batch_upload_tasks;
+CREATE TRIGGER batch_upload_abuse_counters
+    AFTER INSERT OR DELETE OR UPDATE OF
+        user_id, task_type, file_name, file_size, total_records, success_records, error_records,
+        content_hashes, duplicate_files, created_at
+    ON batch_upload_tasks
+    FOR EACH ROW EXECUTE FUNCTION batch_upload_abuse_counters();
+
+-- 由现有任务重建计数（可重复执行）
+TRUNCATE batch_upload_user_hourly, batch_upload_daily_rollups;
+
+INSERT INTO batch_upload_user_hourly (
+    user_id, bucket_start, uploads, small_uploads, failed_uploads, suspicious_uploads, files, duplicate_files
+)
+SELECT user_id,
+       date_trunc('hour', created_at),
+       COUNT(*),
+       COUNT(*) FILTER (WHERE batch_upload_flags(t) & 1 <> 0),
+       COUNT(*) FILTER (WHERE batch_upload_flags(t) & 2 <> 0),
+       COUNT(*) FILTER (WHERE batch_upload_flags(t) & 4 <> 0),
+       COALESCE(SUM(cardinality(content_hashes)), 0),
+       SUM(duplicate_files)
+FROM batch_upload_tasks t
+WHERE created_at >= CURRENT_TIMESTAMP - INTERVAL '31 days'
+GROUP BY user_id, date_trunc('hour', created_at);
+
+INSERT INTO batch_upload_daily_rollups (bucket_date, task_type, total_uploads, abusive_uploads)
+SELECT created_at::date,
+       task_type,
+       COUNT(*),
+       COUNT(*) FILTER (WHERE batch_upload_flags(t) & 8 <> 0)
+FROM batch_upload_tasks t
+WHERE created_at IS NOT NULL
+GROUP BY created_at::date, task_type;
+
+-- 命中可疑文件名时按用户取最近7天的文件名明细
+CREATE INDEX IF NOT EXISTS idx_batch_upload_tasks_user_created
+ON batch_upload_tasks(user_id, created_at DESC);
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+告警规则索引基准测试
+1000条规则 × 10000条告警，对比逐条匹配与索引匹配的耗时，并校验结果一致；
+告警管理器推送的告警（枚举类型的严重级别/状态）也能命中按字符串值建立的索引
+"""
+
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.alert_automation import AutomationRule, ActionType
+from app.services.alert_rule_index import AlertRuleIndex, CompiledRule
+from app.services.alert_manager import AlertData, AlertSeverity, AlertStatus
+
+RULE_COUNT = 1000
+ALERT_COUNT = 10000
+
+ALERT_NAMES = [f"alert_{i}" for i in range(300)]
+SEVERITIES = ["critical", "warning", "info"]
+INSTANCES = [f"10.0.0.{i}" for i in range(50)]
+
+
+def build_rules(rng: random.Random):
+    """生成混合类型的规则：名称精确匹配、标签匹配、严重级别+阈值、正则"""
+    rules = []
+    for i in range(RULE_COUNT):
+        kind = i % 10
+        if kind < 6:
+            conditions = {
+                "name": rng.choice(ALERT_NAMES),
+                "labels.instance": rng.choice(INSTANCES),
+            }
+        elif kind < 8:
+            conditions = {
+                "labels.instance": rng.choice(INSTANCES),
+                "metrics.value": {"operator": "gt", "value": rng.randint(50, 99)},
+            }
+        elif kind < 9:
+            conditions = {
+                "severity": rng.choice(SEVERITIES),
+                "metrics.value": {"operator": "gte", "value": 99},
+            }
+        else:
+            conditions = {
+                "message": f"regex:disk .* {rng.randint(0, 99)}%",
+            }
+
+        rules.append(AutomationRule(
+            id=f"rule_{i}",
+            name=f"规则{i}",
+            description="benchmark",
+            enabled=True,
+            conditions=conditions,
+            actions=[{"type": ActionType.CREATE_TICKET.value, "config": {}}],
+            priority=rng.randint(1, 10),
+        ))
+    return rules
+
+
+def build_alerts(rng: random.Random):
+    """生成告警数据"""
+    alerts = []
+    for i in range(ALERT_COUNT):
+        value = rng.randint(0, 100)
+        alerts.append({
+            "id": f"a{i}",
+            "name": rng.choice(ALERT_NAMES),
+            "severity": rng.choice(SEVERITIES),
+            "labels": {"instance": rng.choice(INSTANCES)},
+            "metrics": {"value": value},
+            "message": f"disk usage at {value}%",
+        })
+    return alerts
+
+
+def linear_match(compiled_rules, alert):
+    """基线：逐条评估所有规则"""
+    matched = [c for c in compiled_rules if c.rule.enabled and c.matches(alert)]
+    matched.sort(key=lambda c: (-c.rule.priority, c.sequence))
+    return [c.rule.id for c in matched]
+
+
+def test_rule_index_benchmark():
+    """索引匹配结果与逐条匹配一致，且更快"""
+    rng = random.Random(42)
+    rules = build_rules(rng)
+    alerts = build_alerts(rng)
+
+    compiled_rules = [CompiledRule(rule, seq) for seq, rule in enumerate(rules)]
+
+    start = time.perf_counter()
+    linear_results = [linear_match(compiled_rules, alert) for alert in alerts]
+    linear_time = time.perf_counter() - start
+
+    build_start = time.perf_counter()
+    index = AlertRuleIndex(rules)
+    build_time = time.perf_counter() - build_start
+
+    start = time.perf_counter()
+    indexed_results = [[rule.id for rule in index.match(alert)] for alert in alerts]
+    indexed_time = time.perf_counter() - start
+
+    assert indexed_results == linear_results
+
+    print("=" * 60)
+    print(f"规则数: {RULE_COUNT}, 告警数: {ALERT_COUNT}")
+    print(f"索引统计: {index.get_statistics()}")
+    print(f"索引构建耗时: {build_time * 1000:.1f} ms")
+    print(f"逐条匹配耗时: {linear_time:.3f} s ({ALERT_COUNT / linear_time:.0f} alerts/s)")
+    print(f"索引匹配耗时: {indexed_time:.3f} s ({ALERT_COUNT / indexed_time:.0f} alerts/s)")
+    print(f"加速比: {linear_time / indexed_time:.1f}x")
+    print("=" * 60)
+
+    assert indexed_time < linear_time
+
+
+def test_enum_alert_fields():
+    """AlertData.to_dict() 保留枚举成员，severity/status 条件仍应命中"""
+    alert = AlertData(
+        alert_id="alert-1",
+        name="HighMemoryUsage",
+        severity=AlertSeverity.WARNING,
+        status=AlertStatus.FIRING,
+        message="memory 92%",
+        description="",
+        service="backend",
+        timestamp=datetime.now(),
+        labels={"instance": "10.0.0.1"},
+        annotations={},
+    ).to_dict()
+
+    def rule(rule_id, conditions):
+        return AutomationRule(
+            id=rule_id, name=rule_id, description="", enabled=True,
+            conditions=conditions, actions=[],
+        )
+
+    rules = [
+        rule("severity_eq", {"severity": {"operator": "eq", "value": "warning"}}),
+        rule("severity_in", {"severity": {"operator": "in", "value": ["critical", "warning"]}}),
+        rule("severity_str", {"severity": "warning"}),
+        rule("status_eq", {"status": {"operator": "eq", "value": "firing"}}),
+        rule("status_other", {"status": {"operator": "eq", "value": "resolved"}}),
+    ]
+    matched = {matched_rule.id for matched_rule in AlertRuleIndex(rules).match(alert)}
+    assert matched == {"severity_eq", "severity_in", "severity_str", "status_eq"}
+    assert all(r.matches_alert(alert) == (r.id in matched) for r in rules)
+
+
+if __name__ == "__main__":
+    test_enum_alert_fields()
+    test_rule_index_benchmark()
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Credits账本并发测试
+1000个并发扣减争用同一用户的余额，验证条件扣减不会超扣、余额不为负，
+且每次成功扣减都恰好留下一条使用记录和一条审计记录。
+需要已执行迁移的 PostgreSQL：设置 CREDITS_LEDGER_TEST_DSN（可以是 postgresql+asyncpg:// 连接串，
+会转换为同步驱动）后运行，未设置时跳过
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from uuid import uuid4
+
+import pytest
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.threaded_session import sync_database_url, wrap_sync_session
+from app.services.user_credits_service import UserCreditsService, InsufficientCreditsError
+
+CONCURRENT_CONSUMES = 1000
+INITIAL_BALANCE = 300
+WORKERS = 32
+
+TEST_DSN = os.getenv("CREDITS_LEDGER_TEST_DSN")
+_session_factory = None
+
+
+def SessionLocal():
+    """同步会话；引擎在首次使用时创建，未设置连接串时导入本模块不连接数据库"""
+    global _session_factory
+    if _session_factory is None:
+        engine = create_engine(sync_database_url(TEST_DSN), pool_size=WORKERS, max_overflow=0)
+        _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return _session_factory()
+
+
+def create_test_user(user_id: str) -> None:
+    with SessionLocal() as db:
+        db.execute(text("""
+            INSERT INTO users (id, username, email, password_hash, created_at)
+            VALUES (:user_id, :username, :email, 'test_hash', NOW())
+            ON CONFLICT (id) DO NOTHING
+        """), {
+            "user_id": user_id,
+            "username": f"ledger_test_{user_id[:8]}",
+            "email": f"ledger_test_{user_id[:8]}@example.com",
+        })
+        # 本周已重置，扣减过程中不会叠加每周Credits
+        db.execute(text("""
+            INSERT INTO user_credits (
+                user_id, credits_weekly, credits_remaining,
+                credits_purchased, total_credits_used, last_reset_date
+            ) VALUES (:user_id, 1, :balance, 0, 0, :today)
+        """), {"user_id": user_id, "balance": INITIAL_BALANCE, "today": date.today()})
+        db.commit()
+
+
+def cleanup_test_user(user_id: str) -> None:
+    with SessionLocal() as db:
+        for query in [
+            "DELETE FROM credit_usage_records WHERE user_id = :user_id",
+            "DELETE FROM credit_audit_logs WHERE user_id = :user_id",
+            "DELETE FROM credit_purchase_records WHERE user_id = :user_id",
+            "DELETE FROM user_credits WHERE user_id = :user_id",
+            "DELETE FROM users WHERE id = :user_id",
+        ]:
+            db.execute(text(query), {"user_id": user_id})
+        db.commit()
+
+
+def consume_once(service: UserCreditsService, user_id: str):
+    """每个并发扣减使用独立的会话（独立连接和事务）"""
+    start = time.perf_counter()
+    with SessionLocal() as db:
+        try:
+            result = asyncio.run(service.consume_credits_for_batch_upload(user_id, wrap_sync_session(db)))
+            return True, result["credits_remaining"], (time.perf_counter() - start) * 1000
+        except InsufficientCreditsError as e:
+            return False, e.current_credits, (time.perf_counter() - start) * 1000
+
+
+@pytest.mark.skipif(not TEST_DSN, reason="未设置 CREDITS_LEDGER_TEST_DSN")
+def test_concurrent_consumes():
+    """并发扣减的成功次数应恰好等于初始余额"""
+    user_id = str(uuid4())
+    service = UserCreditsService()
+    create_test_user(user_id)
+
+    try:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+            results = list(executor.map(lambda _: consume_once(service, user_id), range(CONCURRENT_CONSUMES)))
+        elapsed = time.perf_counter() - started
+
+        successes = [r for r in results if r[0]]
+        latencies = sorted(r[2] for r in results)
+        p95 = latencies[int(len(latencies) * 0.95) - 1]
+
+        with SessionLocal() as db:
+            balance, used = db.execute(text("""
+                SELECT credits_remaining, total_credits_used FROM user_credits WHERE user_id = :user_id
+            """), {"user_id": user_id}).fetchone()
+            usage_rows = db.execute(text("""
+                SELECT COUNT(*), MIN(balance_after) FROM credit_usage_records WHERE user_id = :user_id
+            """), {"user_id": user_id}).fetchone()
+            audit_rows = db.execute(text("""
+                SELECT COUNT(*) FROM credit_audit_logs
+                WHERE user_id = :user_id AND action = 'credits_consumed'
+            """), {"user_id": user_id}).scalar()
+
+        print("=" * 60)
+        print(f"{CONCURRENT_CONSUMES} 个并发扣减（{WORKERS} 线程），初始余额 {INITIAL_BALANCE}")
+        print(f"耗时 {elapsed:.2f}s，吞吐 {CONCURRENT_CONSUMES / elapsed:.0f} 次/秒")
+        print(f"延迟: 平均 {statistics.mean(latencies):.2f} ms, "
+              f"P50 {statistics.median(latencies):.2f} ms, P95 {p95:.2f} ms")
+        print(f"成功 {len(successes)}，失败 {CONCURRENT_CONSUMES - len(successes)}，最终余额 {balance}")
+        print("=" * 60)
+
+        assert len(successes) == INITIAL_BALANCE
+        assert balance == 0
+        assert used == INITIAL_BALANCE
+        assert usage_rows[0] == INITIAL_BALANCE
+        assert usage_rows[1] == 0
+        assert audit_rows == INITIAL_BALANCE
+        # 每个成功扣减看到的剩余余额互不相同（没有两次扣减基于同一余额）
+        assert sorted(r[1] for r in successes) == list(range(INITIAL_BALANCE))
+    finally:
+        cleanup_test_user(user_id)
+
+
+if __name__ == "__main__":
+    if TEST_DSN:
+        test_concurrent_consumes()
+    else:
+        print("未设置 CREDITS_LEDGER_TEST_DSN，跳过并发测试")
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+事件循环延迟监控测试
+在被标记的处理器中执行同步阻塞调用，验证监控器记录到阻塞并定位到该处理器；
+同样的等待改为线程池执行时不应产生阻塞事件；
+开启慢回调检测后，阻塞应按调用位置聚合并带有调用栈
+"""
+
+import asyncio
+import os
+import sys
+import time
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.loop_monitor import EventLoopLagMonitor, SlowCallbackDetector
+
+BLOCK_SECONDS = 0.3
+
+
+async def blocking_handler(monitor: EventLoopLagMonitor):
+    with monitor.track("GET /api/v1/blocking"):
+        time.sleep(BLOCK_SECONDS)
+
+
+async def offloaded_handler(monitor: EventLoopLagMonitor):
+    with monitor.track("GET /api/v1/offloaded"):
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, time.sleep, BLOCK_SECONDS)
+
+
+async def run_with_monitor(handler) -> EventLoopLagMonitor:
+    monitor = EventLoopLagMonitor(interval=0.05, threshold_ms=100)
+    monitor.start()
+    try:
+        await asyncio.sleep(0.1)
+        await handler(monitor)
+        await asyncio.sleep(0.2)
+    finally:
+        await monitor.stop()
+    return monitor
+
+
+def test_blocking_handler_flagged():
+    """同步阻塞的处理器应被记录为阻塞者"""
+    monitor = asyncio.run(run_with_monitor(blocking_handler))
+    stats = monitor.get_stats()
+
+    print(f"同步阻塞: 最大延迟 {stats['max_lag_ms']:.0f} ms, 阻塞事件 {stats['blocked_events']}")
+    assert stats['blocked_events'] >= 1
+    assert stats['max_lag_ms'] >= BLOCK_SECONDS * 1000 * 0.8
+    assert stats['top_blocking_handlers'][0][0] == "GET /api/v1/blocking"
+
+
+def test_offloaded_handler_not_flagged():
+    """放到线程池执行的等待不应阻塞事件循环"""
+    monitor = asyncio.run(run_with_monitor(offloaded_handler))
+    stats = monitor.get_stats()
+
+    print(f"线程池执行: 最大延迟 {stats['max_lag_ms']:.0f} ms, 阻塞事件 {stats['blocked_events']}")
+    assert stats['blocked_events'] == 0
+    assert stats['samples'] > 0
+
+
+def render_report_synchronously():
+    time.sleep(BLOCK_SECONDS)
+
+
+async def slow_callback_handler(monitor: EventLoopLagMonitor):
+    with monitor.track("GET /api/v1/report"):
+        render_report_synchronously()
+
+
+async def run_slow_callbacks() -> EventLoopLagMonitor:
+    monitor = EventLoopLagMonitor(interval=0.05, threshold_ms=100)
+    monitor.slow_callbacks = SlowCallbackDetector(threshold_ms=100)
+    monitor.start()
+    monitor.enable_slow_callback_detection()
+    try:
+        await asyncio.sleep(0.1)
+        for _ in range(2):
+            await slow_callback_handler(monitor)
+            await asyncio.sleep(0.1)
+    finally:
+        await monitor.stop()
+    return monitor
+
+
+def test_slow_callback_location():
+    """慢回调检测应定位到阻塞的函数并累计阻塞时长"""
+    monitor = asyncio.run(run_slow_callbacks())
+    blockers = monitor.get_stats()['slow_callbacks']['top_blockers']
+    print(f"慢回调: {[(b['location'], b['count'], b['total_ms']) for b in blockers]}")
+    assert blockers
+    top = blockers[0]
+    assert "render_report_synchronously" in top['location']
+    assert top['count'] == 2
+    assert top['total_ms'] >= 2 * BLOCK_SECONDS * 1000 * 0.5
+    assert top['handlers'][0][0] == "GET /api/v1/report"
+    assert any("slow_callback_handler" in line for line in top['stack'])
+
+
+def test_inflight_snapshot_during_mutation():
+    """看门狗线程复制处理中的请求时，另一线程并发增删条目不应抛出异常"""
+    import threading
+
+    monitor = EventLoopLagMonitor()
+    stop = threading.Event()
+
+    def churn():
+        index = 0
+        while not stop.is_set():
+            with monitor.track(f"GET /api/v1/item/{index % 50}"):
+                pass
+            index += 1
+
+    worker = threading.Thread(target=churn, daemon=True)
+    worker.start()
+    try:
+        for _ in range(20000):
+            snapshot = monitor._inflight_snapshot()
+            assert isinstance(snapshot, list)
+    finally:
+        stop.set()
+        worker.join()
+
+    with monitor.track("GET /api/v1/report"):
+        assert monitor._inflight_snapshot() == ["GET /api/v1/report"]
+    assert monitor._inflight_snapshot() == []
+
+
+if __name__ == "__main__":
+    test_blocking_handler_flagged()
+    test_offloaded_handler_not_flagged()
+    test_slow_callback_location()
+    test_inflight_snapshot_during_mutation()
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+JWT验证吞吐基准测试
+对比原实现（每次把公钥序列化为PEM再由PyJWT解析）、预加载密钥对象、
+以及已验证令牌缓存命中三种情况下的验证吞吐，并校验kid密钥轮换。
+pytest 只做确定性的检查（签发和验证不再解析PEM、缓存命中、旧格式令牌可验证），
+吞吐对比只在直接运行本脚本时执行
+"""
+
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import jwt
+import jwt.algorithms
+from cryptography.hazmat.primitives import serialization
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.token_service import TokenService, JWT_ALGORITHM
+
+ITERATIONS = 2000
+SIGN_ITERATIONS = 100  # 原实现每次签发都解析私钥PEM（约数十毫秒），签发对比只跑少量次数
+TOKEN_COUNT = 200
+TEST_TOKEN_COUNT = 20
+
+
+def build_service(workdir: str) -> TokenService:
+    return TokenService(
+        private_key_path=os.path.join(workdir, "jwt_private_key.pem"),
+        retired_keys_dir=os.path.join(workdir, "jwt_keys"),
+    )
+
+
+def issue_tokens(service: TokenService, count: int = TOKEN_COUNT):
+    expire = datetime.utcnow() + timedelta(minutes=60)
+    return [
+        service.encode({"sub": f"user{i}@example.com", "user_id": str(i), "exp": expire, "type": "access"})
+        for i in range(count)
+    ]
+
+
+def legacy_verify(service: TokenService, token: str):
+    """原实现：每次验证都重新序列化并解析公钥"""
+    public_key_pem = service.private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.PEM,
+        format=serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    return jwt.decode(token, public_key_pem, algorithms=[JWT_ALGORITHM])
+
+
+def throughput(name: str, verify, tokens, iterations: int = ITERATIONS) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        verify(tokens[i % len(tokens)])
+    elapsed = time.perf_counter() - start
+    rate = iterations / elapsed
+    print(f"{name}: {rate:,.0f} 次/s ({elapsed / iterations * 1e6:.1f} µs/次)")
+    return rate
+
+
+def count_pem_loads(monkeypatch) -> dict:
+    """统计PEM密钥解析次数（PyJWT收到PEM字节时在 jwt.algorithms 中解析）"""
+    counts = {"loads": 0}
+    for module in (jwt.algorithms, serialization):
+        for name in ("load_pem_public_key", "load_pem_private_key"):
+            original = getattr(module, name, None)
+            if original is None:
+                continue
+
+            def counting(*args, _original=original, **kwargs):
+                counts["loads"] += 1
+                return _original(*args, **kwargs)
+
+            monkeypatch.setattr(module, name, counting)
+    return counts
+
+
+def test_jwt_verify_caching(monkeypatch):
+    """密钥只在构造时加载一次；签发和验证不再解析PEM，重复验证命中缓存，旧格式令牌仍可验证"""
+    with tempfile.TemporaryDirectory() as workdir:
+        service = build_service(workdir)
+        pem_loads = count_pem_loads(monkeypatch)
+
+        tokens = issue_tokens(service, TEST_TOKEN_COUNT)
+        first = [service.decode(token) for token in tokens]
+        second = [service.decode(token) for token in tokens]
+        assert pem_loads["loads"] == 0
+        assert first == second
+        assert service.stats["cache_misses"] == TEST_TOKEN_COUNT
+        assert service.stats["cache_hits"] == TEST_TOKEN_COUNT
+
+        # 缓存返回副本，调用方修改不影响后续验证
+        second[0]["user_id"] = "changed"
+        assert service.decode(tokens[0])["user_id"] == "0"
+
+        # 原实现的验证方式仍能验证新令牌（探针确实统计到了PEM解析）
+        assert legacy_verify(service, tokens[0]) == first[0]
+        assert pem_loads["loads"] > 0
+
+        # 原实现用PEM签发、没有kid头部的令牌仍可验证
+        legacy_token = jwt.encode(
+            {"user_id": "legacy", "exp": datetime.utcnow() + timedelta(minutes=5), "type": "access"},
+            service.private_key,
+            algorithm=JWT_ALGORITHM
+        )
+        assert service.decode(legacy_token)["user_id"] == "legacy"
+
+
+def run_benchmark():
+    """签发与验证吞吐对比：PEM逐次解析、预加载密钥对象、已验证缓存命中"""
+    with tempfile.TemporaryDirectory() as workdir:
+        service = build_service(workdir)
+        tokens = issue_tokens(service)
+
+        def uncached_verify(token):
+            service._verified.clear()
+            return service.decode(token)
+
+        claims = {"sub": "user@example.com", "exp": datetime.utcnow() + timedelta(minutes=60), "type": "access"}
+
+        def legacy_encode(_):
+            private_key_pem = service.private_key.private_bytes(
+                encoding=serialization.Encoding.PEM,
+                format=serialization.PrivateFormat.PKCS8,
+                encryption_algorithm=serialization.NoEncryption()
+            )
+            return jwt.encode(claims, private_key_pem, algorithm=JWT_ALGORITHM)
+
+        print("=" * 60)
+        legacy_sign = throughput("签发: PEM逐次解析", legacy_encode, tokens, SIGN_ITERATIONS)
+        preloaded_sign = throughput("签发: 预加载密钥对象", lambda _: service.encode(claims), tokens, SIGN_ITERATIONS)
+        legacy = throughput("PEM逐次解析", lambda t: legacy_verify(service, t), tokens)
+        preloaded = throughput("预加载密钥对象", uncached_verify, tokens)
+        cached = throughput("已验证缓存命中", service.decode, tokens)
+        print(f"签发提升 {preloaded_sign / legacy_sign:.2f}x，验证提升 {preloaded / legacy:.2f}x，"
+              f"缓存命中提升 {cached / legacy:.0f}x")
+        print(f"统计: {service.get_stats()}")
+        print("=" * 60)
+
+
+def test_key_rotation():
+    """轮换后旧令牌仍可验证，新令牌使用新kid；停用旧密钥后旧令牌被拒绝"""
+    with tempfile.TemporaryDirectory() as workdir:
+        service = build_service(workdir)
+        old_token = issue_tokens(service)[0]
+        old_kid = service.signing_kid
+        # 引入kid之前签发的令牌（无kid头部）
+        legacy_token = jwt.encode(
+            {"user_id": "legacy", "exp": datetime.utcnow() + timedelta(minutes=5), "type": "access"},
+            service.private_key,
+            algorithm=JWT_ALGORITHM
+        )
+
+        new_kid = service.rotate_signing_key()
+        assert new_kid != old_kid
+        new_token = issue_tokens(service)[0]
+        assert jwt.get_unverified_header(new_token)["kid"] == new_kid
+
+        # 另一个进程（重新从磁盘加载）同样能验证新旧令牌
+        other_worker = build_service(workdir)
+        assert other_worker.decode(old_token)["user_id"] == "0"
+        assert other_worker.decode(new_token)["user_id"] == "0"
+
+        assert service.decode(old_token)["user_id"] == "0"
+        assert service.decode(legacy_token)["user_id"] == "legacy"
+        service.retire_key(old_kid)
+        try:
+            service.decode(old_token)
+        except jwt.PyJWTError:
+            pass
+        else:
+            raise AssertionError("retired key still accepted")
+
+
+if __name__ == "__main__":
+    run_benchmark()
+    test_key_rotation()
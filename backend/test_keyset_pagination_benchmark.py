@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+键集分页基准测试
+20万行数据，对比第10000页的 OFFSET 分页与游标分页耗时，并校验游标逐页遍历不重不漏
+"""
+
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import Column, DateTime, Index, Integer, String, create_engine, insert, select
+from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.pagination import InvalidCursorError, decode_cursor, encode_cursor, paginate_select
+from app.core.threaded_session import wrap_sync_session
+
+ROW_COUNT = 200000
+PAGE_SIZE = 20
+DEEP_PAGE = 10000
+
+Base = declarative_base()
+
+
+class Record(Base):
+    __tablename__ = "records"
+    __table_args__ = (Index("idx_records_owner_created_id", "owner", "created_at", "id"),)
+
+    id = Column(Integer, primary_key=True)
+    owner = Column(String(10), nullable=False)
+    created_at = Column(DateTime, nullable=False)
+
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+Base.metadata.create_all(engine)
+SessionLocal = sessionmaker(bind=engine)
+
+# 每秒一条，每5条共用同一时间戳，验证 id 作为排序键的第二列
+base_time = datetime(2024, 1, 1)
+with engine.begin() as conn:
+    conn.execute(insert(Record), [
+        {"id": i, "owner": "u1", "created_at": base_time + timedelta(seconds=i // 5)}
+        for i in range(1, ROW_COUNT + 1)
+    ])
+
+CONDITIONS = [Record.owner == "u1"]
+
+
+async def fetch_page(db, count="exact", **kwargs):
+    return await paginate_select(
+        db, select(Record), CONDITIONS, Record.created_at, Record.id, limit=PAGE_SIZE, count=count, **kwargs
+    )
+
+
+def test_cursor_round_trip():
+    """游标编码可还原，篡改的游标报错"""
+    created_at = datetime(2024, 5, 1, 12, 30)
+    assert decode_cursor(encode_cursor(created_at, 42)) == (created_at, "42")
+    try:
+        decode_cursor("not-a-cursor")
+    except InvalidCursorError:
+        pass
+    else:
+        raise AssertionError("篡改的游标应报错")
+
+
+def test_cursor_walk_matches_offset():
+    """游标逐页遍历与 OFFSET 分页结果一致，最后一页无需计数"""
+    async def run():
+        db = wrap_sync_session(SessionLocal())
+        condition = [Record.owner == "u1", Record.id <= 95]
+        seen, cursor = [], None
+        while True:
+            page = await paginate_select(
+                db, select(Record), condition, Record.created_at, Record.id, cursor=cursor, limit=PAGE_SIZE, count="exact"
+            )
+            seen.extend(r.id for r in page.items)
+            assert page.total == 95
+            if not page.has_more:
+                break
+            cursor = page.next_cursor
+        await db.close()
+        return seen
+
+    assert asyncio.run(run()) == list(range(95, 0, -1))
+
+
+def test_keyset_pagination_benchmark():
+    """深分页时游标分页应明显快于 OFFSET 分页"""
+    async def run():
+        db = wrap_sync_session(SessionLocal())
+        offset = (DEEP_PAGE - 1) * PAGE_SIZE
+
+        start = time.perf_counter()
+        offset_page = await fetch_page(db, offset=offset)
+        offset_time = time.perf_counter() - start
+
+        # 取上一页最后一行的键作为游标
+        previous = await fetch_page(db, offset=offset - PAGE_SIZE)
+        cursor = previous.next_cursor
+
+        start = time.perf_counter()
+        cursor_page = await fetch_page(db, cursor=cursor, count="none")
+        cursor_time = time.perf_counter() - start
+
+        await db.close()
+        return offset_page, offset_time, cursor_page, cursor_time
+
+    offset_page, offset_time, cursor_page, cursor_time = asyncio.run(run())
+    assert [r.id for r in cursor_page.items] == [r.id for r in offset_page.items]
+
+    print("=" * 60)
+    print(f"数据行数: {ROW_COUNT}, 每页 {PAGE_SIZE} 条, 第 {DEEP_PAGE} 页")
+    print(f"OFFSET 分页耗时: {offset_time * 1000:.1f} ms（含精确计数）")
+    print(f"游标分页耗时: {cursor_time * 1000:.1f} ms")
+    print(f"加速比: {offset_time / cursor_time:.1f}x")
+    print("=" * 60)
+
+    assert cursor_time < offset_time
+
+
+if __name__ == "__main__":
+    test_cursor_round_trip()
+    test_cursor_walk_matches_offset()
+    test_keyset_pagination_benchmark()
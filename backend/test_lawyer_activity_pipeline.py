@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+律师活动事件管道测试
+批量跟踪50个活动时统计实际执行的SQL语句数，
+验证往返次数只与表数相关，并校验折叠后的每日活跃度与逐条累加一致。
+需要已执行迁移的 PostgreSQL：设置 LAWYER_ACTIVITY_TEST_DSN（可以是 postgresql+asyncpg:// 连接串，
+会转换为同步驱动）后运行，未设置时跳过
+"""
+
+import asyncio
+import os
+import sys
+import time
+from uuid import uuid4
+
+import pytest
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.threaded_session import sync_database_url, wrap_sync_session
+from app.services.config_service import SystemConfigService
+from app.services.lawyer_activity_tracker import LawyerActivityTracker
+from app.services.lawyer_membership_service import LawyerMembershipService
+from app.services.lawyer_points_engine import LawyerPointsEngine
+from app.services.payment_service import WeChatPayService
+
+BATCH_SIZE = 50
+ACTIVITY_TYPES = ['daily_login', 'case_response', 'ai_tool_usage', 'client_interaction', 'online_duration']
+
+TEST_DSN = os.getenv("LAWYER_ACTIVITY_TEST_DSN")
+_session_factory = None
+
+statement_count = 0
+
+
+def count_statements(conn, cursor, statement, parameters, context, executemany):
+    global statement_count
+    statement_count += 1
+
+
+def SessionLocal():
+    """同步会话；引擎在首次使用时创建并挂上语句计数，未设置连接串时导入本模块不连接数据库"""
+    global _session_factory
+    if _session_factory is None:
+        engine = create_engine(sync_database_url(TEST_DSN))
+        event.listen(engine, "before_cursor_execute", count_statements)
+        _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    return _session_factory()
+
+
+def create_tracker() -> LawyerActivityTracker:
+    config_service = SystemConfigService()
+    membership_service = LawyerMembershipService(config_service, WeChatPayService(config_service))
+    return LawyerActivityTracker(LawyerPointsEngine(membership_service), membership_service)
+
+
+def create_test_lawyer(db, lawyer_id: str) -> None:
+    db.execute(text("""
+        INSERT INTO users (id, username, email, password_hash, created_at)
+        VALUES (:id, :username, :email, 'test_hash', NOW())
+        ON CONFLICT (id) DO NOTHING
+    """), {"id": lawyer_id, "username": f"activity_{lawyer_id[:8]}", "email": f"activity_{lawyer_id[:8]}@example.com"})
+    db.commit()
+
+
+def cleanup_test_lawyer(db, lawyer_id: str) -> None:
+    for table in [
+        'lawyer_activity_logs', 'lawyer_daily_activity', 'lawyer_daily_task_completions',
+        'lawyer_activity_levels', 'lawyer_activity_milestones', 'lawyer_point_transactions',
+        'lawyer_level_details', 'lawyer_memberships'
+    ]:
+        db.execute(text(f"DELETE FROM {table} WHERE lawyer_id = :id"), {"id": lawyer_id})
+    db.execute(text("DELETE FROM users WHERE id = :id"), {"id": lawyer_id})
+    db.commit()
+
+
+@pytest.mark.skipif(not TEST_DSN, reason="未设置 LAWYER_ACTIVITY_TEST_DSN")
+def test_batch_track_round_trips():
+    """50个活动的批量跟踪语句数应远小于 活动数 × 步骤数"""
+    asyncio.run(_batch_track_round_trips())
+
+
+async def _batch_track_round_trips():
+    global statement_count
+    lawyer_id = str(uuid4())
+    tracker = create_tracker()
+    activities = [
+        (ACTIVITY_TYPES[i % len(ACTIVITY_TYPES)], {'quality_score': 85})
+        for i in range(BATCH_SIZE)
+    ]
+
+    db = SessionLocal()
+    try:
+        create_test_lawyer(db, lawyer_id)
+        # 预先分配会员和等级记录，只统计跟踪本身的语句
+        await tracker.membership_service.get_lawyer_membership(lawyer_id, wrap_sync_session(db))
+
+        statement_count = 0
+        start = time.perf_counter()
+        results = await tracker.track_lawyer_activities(lawyer_id, activities, wrap_sync_session(db))
+        elapsed = (time.perf_counter() - start) * 1000
+
+        row = db.execute(text("""
+            SELECT total_activity_score, activity_count FROM lawyer_daily_activity
+            WHERE lawyer_id = :id AND activity_date = CURRENT_DATE
+        """), {"id": lawyer_id}).fetchone()
+        logged = db.execute(text(
+            "SELECT COUNT(*) FROM lawyer_activity_logs WHERE lawyer_id = :id"
+        ), {"id": lawyer_id}).scalar()
+
+        print("=" * 60)
+        print(f"批量跟踪 {BATCH_SIZE} 个活动: {statement_count} 条SQL, {elapsed:.1f} ms")
+        print(f"今日活跃度: 得分 {row[0]}, 次数 {row[1]}, 活动日志 {logged} 条")
+        print("=" * 60)
+
+        assert len(results) == BATCH_SIZE
+        assert logged == BATCH_SIZE
+        assert row[1] == BATCH_SIZE
+        assert row[0] == sum(result['activity_score'] for result in results)
+        assert results[-1]['daily_activity']['total_score'] == row[0]
+        # 原实现每个活动约10条以上语句
+        assert statement_count <= 20
+    finally:
+        db.rollback()
+        cleanup_test_lawyer(db, lawyer_id)
+        db.close()
+
+
+if __name__ == "__main__":
+    if TEST_DSN:
+        test_batch_track_round_trips()
+    else:
+        print("未设置 LAWYER_ACTIVITY_TEST_DSN，跳过管道测试")
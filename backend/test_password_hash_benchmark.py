@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+密码哈希并发基准测试
+200个并发登录下，对比在事件循环中同步执行bcrypt与使用有界哈希线程池时的事件循环延迟，
+并校验过载快速失败和成本参数变化后的自动重新哈希
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+from passlib.context import CryptContext
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.password_hasher import AsyncPasswordHasher, PasswordHasherOverloaded
+
+CONCURRENT_LOGINS = 200
+BCRYPT_ROUNDS = 10  # 低于生产成本以缩短测试时间，结论不变
+TICK_INTERVAL = 0.005
+
+context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
+PASSWORD = "Lawsker2024!"
+PASSWORD_HASH = context.hash(PASSWORD)
+
+
+async def measure_loop_lag(stop: asyncio.Event):
+    """每隔TICK_INTERVAL醒来一次，记录实际唤醒延迟（毫秒）"""
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(TICK_INTERVAL)
+        lags.append((time.perf_counter() - start - TICK_INTERVAL) * 1000)
+    return lags
+
+
+async def run_logins(login):
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(measure_loop_lag(stop))
+    await asyncio.sleep(TICK_INTERVAL * 2)
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login() for _ in range(CONCURRENT_LOGINS)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    lags = await monitor
+    assert all(results)
+    return elapsed, lags
+
+
+def summarize(name: str, elapsed: float, lags):
+    lags = sorted(lags)
+    p99 = lags[max(0, int(len(lags) * 0.99) - 1)]
+    print(f"{name}: 总耗时 {elapsed:.2f} s, 事件循环延迟 "
+          f"P50 {statistics.median(lags):.1f} ms, P99 {p99:.1f} ms, 最大 {lags[-1]:.1f} ms")
+
+
+async def event_loop_lag_under_login_storm():
+    async def blocking_login():
+        return context.verify(PASSWORD, PASSWORD_HASH)
+
+    hasher = AsyncPasswordHasher(
+        context=context, max_workers=4, max_queue=CONCURRENT_LOGINS, queue_timeout=120
+    )
+
+    async def pooled_login():
+        return await hasher.verify(PASSWORD, PASSWORD_HASH)
+
+    blocking_elapsed, blocking_lags = await run_logins(blocking_login)
+    pooled_elapsed, pooled_lags = await run_logins(pooled_login)
+    hasher.shutdown()
+
+    print("=" * 60)
+    print(f"{CONCURRENT_LOGINS} 个并发登录, bcrypt rounds={BCRYPT_ROUNDS}")
+    summarize("同步bcrypt", blocking_elapsed, blocking_lags)
+    summarize("哈希线程池", pooled_elapsed, pooled_lags)
+    print(f"线程池统计: {hasher.get_stats()}")
+    print("=" * 60)
+
+    assert max(pooled_lags) < max(blocking_lags)
+
+
+async def fast_fail_when_overloaded():
+    hasher = AsyncPasswordHasher(context=context, max_workers=2, max_queue=8)
+
+    async def login():
+        try:
+            return await hasher.verify(PASSWORD, PASSWORD_HASH)
+        except PasswordHasherOverloaded:
+            return None
+
+    results = await asyncio.gather(*(login() for _ in range(50)))
+    hasher.shutdown()
+
+    accepted = [r for r in results if r is not None]
+    assert len(accepted) == 10
+    assert all(accepted)
+    assert hasher.get_stats()['rejected_queue_full'] == 40
+
+
+async def rehash_on_cost_change():
+    old_hash = CryptContext(schemes=["bcrypt"], bcrypt__rounds=BCRYPT_ROUNDS - 1).hash(PASSWORD)
+    hasher = AsyncPasswordHasher(context=context, max_workers=1, max_queue=1)
+
+    verified, new_hash = await hasher.verify_and_update(PASSWORD, old_hash)
+    assert verified and new_hash and context.verify(PASSWORD, new_hash)
+    assert f"${BCRYPT_ROUNDS:02d}$" in new_hash
+
+    verified, new_hash = await hasher.verify_and_update(PASSWORD, PASSWORD_HASH)
+    assert verified and new_hash is None
+
+    verified, new_hash = await hasher.verify_and_update("wrong", old_hash)
+    assert not verified and new_hash is None
+    hasher.shutdown()
+
+
+def test_event_loop_lag_under_login_storm():
+    """线程池哈希时事件循环延迟应远低于同步哈希"""
+    asyncio.run(event_loop_lag_under_login_storm())
+
+
+def test_fast_fail_when_overloaded():
+    """排队超过上限时立即拒绝"""
+    asyncio.run(fast_fail_when_overloaded())
+
+
+def test_rehash_on_cost_change():
+    """成本参数变化后，验证成功时返回新哈希"""
+    asyncio.run(rehash_on_cost_change())
+
+
+if __name__ == "__main__":
+    test_event_loop_lag_under_login_storm()
+    test_fast_fail_when_overloaded()
+    test_rehash_on_cost_change()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+请求级SQL查询分析器测试
+验证SQL归一化指纹、N+1判定、线程池会话的上下文传递，以及 query_budget 夹具
+"""
+
+import asyncio
+import os
+import sys
+
+import pytest
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from app.core.query_profiler import attach_query_profiler, fingerprint_sql, normalize_sql, profile_queries
+from app.core.threaded_session import wrap_sync_session
+
+engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+attach_query_profiler(engine)
+SessionLocal = sessionmaker(bind=engine)
+
+with engine.begin() as conn:
+    conn.execute(text("CREATE TABLE lawyers (id INTEGER PRIMARY KEY, name TEXT)"))
+    conn.execute(text("CREATE TABLE cases (id INTEGER PRIMARY KEY, lawyer_id INTEGER)"))
+    for i in range(10):
+        conn.execute(text("INSERT INTO lawyers VALUES (:id, :name)"), {"id": i, "name": f"lawyer_{i}"})
+        conn.execute(text("INSERT INTO cases VALUES (:id, :lawyer_id)"), {"id": i, "lawyer_id": i})
+
+
+def test_fingerprint_ignores_literals_and_list_lengths():
+    """字面量、绑定参数和IN列表长度不同的语句指纹相同"""
+    assert fingerprint_sql("SELECT * FROM cases WHERE id = 1") == fingerprint_sql("SELECT * FROM cases WHERE id = 42")
+    assert fingerprint_sql("SELECT * FROM users WHERE email = 'a@x.com'") == \
+        fingerprint_sql("SELECT * FROM users WHERE email = :email")
+    assert fingerprint_sql("SELECT * FROM cases WHERE id IN (1, 2)") == \
+        fingerprint_sql("SELECT * FROM cases WHERE id IN (%s, %s, %s)")
+    assert fingerprint_sql("SELECT * FROM cases") != fingerprint_sql("SELECT * FROM lawyers")
+    assert normalize_sql("SELECT id::text FROM t WHERE a = $1") == "SELECT id::text FROM t WHERE a = ?"
+
+
+def test_n_plus_one_detected():
+    """循环内逐条查询应被判定为N+1，批量查询不会"""
+    with SessionLocal() as db:
+        with profile_queries("GET /api/v1/lawyers") as looped:
+            lawyers = db.execute(text("SELECT id FROM lawyers")).fetchall()
+            for lawyer in lawyers:
+                db.execute(text("SELECT COUNT(*) FROM cases WHERE lawyer_id = :id"), {"id": lawyer[0]}).scalar()
+
+        with profile_queries("GET /api/v1/lawyers") as batched:
+            db.execute(text("""
+                SELECT l.id, COUNT(c.id) FROM lawyers l
+                LEFT JOIN cases c ON c.lawyer_id = l.id GROUP BY l.id
+            """)).fetchall()
+
+    print(f"逐条查询 {looped.query_count} 条, 批量查询 {batched.query_count} 条")
+    assert looped.query_count == 11
+    suspects = looped.n_plus_one(threshold=5)
+    assert len(suspects) == 1 and suspects[0]['count'] == 10
+    assert batched.query_count == 1
+    assert not batched.n_plus_one(threshold=5)
+
+
+def test_threaded_session_inherits_profile():
+    """线程池会话执行的语句计入调用方的统计"""
+    async def run():
+        db = wrap_sync_session(SessionLocal())
+        with profile_queries("GET /api/v1/cases") as profile:
+            await db.execute(text("SELECT COUNT(*) FROM cases"))
+            await db.execute(text("SELECT COUNT(*) FROM lawyers"))
+        await db.close()
+        return profile
+
+    profile = asyncio.run(run())
+    assert profile.query_count == 2
+    assert profile.db_time > 0
+
+
+def test_query_budget_fixture(query_budget):
+    """query_budget 在超出上限或出现N+1时失败"""
+    with SessionLocal() as db:
+        with query_budget(max_queries=2):
+            db.execute(text("SELECT COUNT(*) FROM cases")).scalar()
+
+        with pytest.raises(AssertionError):
+            with query_budget(max_queries=20):
+                for i in range(6):
+                    db.execute(text("SELECT name FROM lawyers WHERE id = :id"), {"id": i}).scalar()
+
+
+if __name__ == "__main__":
+    test_fingerprint_ignores_literals_and_list_lengths()
+    test_n_plus_one_detected()
+    test_threaded_session_inherits_profile()
+    print("✅ 查询分析器测试通过")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+实时看板增量推送测试
+验证 JSON Merge Patch 差异计算、内存计数（当天统计、分钟窗口、跨天）和推送协议：
+增量按 seq 连续、无变化不推送、新连接收到与增量衔接的快照、无管理员时暂停计数
+"""
+
+import asyncio
+import json
+import os
+import sys
+from datetime import date, datetime, timedelta
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.services.realtime_data_aggregator import (
+    DashboardCounters, RealtimeDataAggregator, apply_merge_patch, merge_diff
+)
+from app.services.websocket_manager import websocket_manager
+
+
+class RecordingWebSocket:
+    """记录发送内容的 WebSocket"""
+
+    def __init__(self):
+        self.messages = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data: str):
+        self.messages.append(json.loads(data))
+
+    def of_type(self, message_type: str):
+        return [m for m in self.messages if m["type"] == message_type]
+
+
+def test_merge_diff_roundtrip():
+    """差异只含变化字段，删除的字段为 null，应用后与新文档一致"""
+    old = {"access": {"total_visits": 10, "error_rate": 0.1}, "cases": {"total_cases": 3}, "extra": 1}
+    new = {"access": {"total_visits": 12, "error_rate": 0.1}, "cases": {"total_cases": 3}, "performance": {}}
+    patch = merge_diff(old, new)
+    assert patch == {"access": {"total_visits": 12}, "extra": None, "performance": {}}
+    assert apply_merge_patch(old, patch) == new
+    assert merge_diff(new, new) == {}
+    assert merge_diff({}, new) == new
+
+
+def test_counters():
+    """当天访问计数去重、分钟窗口统计、跨天重置"""
+    now = datetime(2024, 5, 1, 12, 30)
+    counters = DashboardCounters(date(2024, 5, 1))
+    logs = [
+        {"ip_address": "1.1.1.1", "user_id": "u1", "response_time": 100, "status_code": 200,
+         "device_type": "mobile", "created_at": now - timedelta(minutes=2)},
+        {"ip_address": "1.1.1.1", "user_id": None, "response_time": 4000, "status_code": 500,
+         "device_type": "desktop", "created_at": (now - timedelta(minutes=1)).isoformat()},
+        {"ip_address": "2.2.2.2", "user_id": "u1", "response_time": None, "status_code": 404,
+         "device_type": "desktop", "created_at": now - timedelta(minutes=30)},
+    ]
+    for log in logs:
+        counters.add_access(log, now)
+    counters.add_activity({"user_id": "u1", "action": "login", "created_at": now}, now)
+    counters.add_activity({"user_id": "u2", "action": "case_create", "created_at": now.isoformat()}, now)
+
+    access = counters.access_stats()
+    assert access["total_visits"] == 3
+    assert access["unique_visitors"] == 2
+    assert access["logged_users"] == 1
+    assert access["avg_response_time"] == 2050
+    assert (access["mobile_visits"], access["desktop_visits"], access["error_count"]) == (1, 2, 2)
+    assert counters.activity_stats() == {
+        "total_activities": 2, "active_users": 2, "login_count": 1, "case_activities": 1, "payment_activities": 0
+    }
+
+    recent = counters.window(5, now)
+    assert (recent["requests"], recent["errors"], recent["slow_requests"]) == (2, 1, 1)
+    assert recent["max_response_time"] == 4000
+    assert counters.performance_stats(now)["slow_requests"] == 1
+
+    # 跨天：当天计数清零，最近一小时的分钟计数保留
+    tomorrow = datetime(2024, 5, 2, 0, 5)
+    counters.add_access({"ip_address": "3.3.3.3", "status_code": 200, "created_at": tomorrow}, tomorrow)
+    assert counters.access_stats()["total_visits"] == 1
+    assert counters.window(60, tomorrow)["requests"] == 1
+
+
+def test_delta_protocol():
+    """新连接先收快照；之后只推送变化的字段，seq 连续；无管理员时暂停"""
+
+    async def run():
+        aggregator = RealtimeDataAggregator()
+        # 跳过数据库对账和案件查询
+        aggregator.active = True
+        aggregator._last_reconcile = aggregator._last_case_stats = asyncio.get_running_loop().time()
+        aggregator.case_stats = {"total_cases": 5}
+
+        first = RecordingWebSocket()
+        first_id = await websocket_manager.connect(first, "admin-1", "admin")
+        await aggregator.send_snapshot(first_id)
+        snapshot = first.of_type("stats_snapshot")[0]
+        assert snapshot["seq"] == 1
+        assert snapshot["data"]["cases"] == {"total_cases": 5}
+        view = snapshot["data"]
+        # 快照之前的增量客户端忽略，之后的增量从 seq 2 开始
+        pushed = len(first.of_type("stats_delta"))
+
+        # 没有变化不推送
+        await aggregator.push_update()
+        assert len(first.of_type("stats_delta")) == pushed
+
+        aggregator.record_access_logs([{"ip_address": "1.1.1.1", "status_code": 200, "response_time": 50,
+                                        "created_at": datetime.now()}])
+        await aggregator.push_update()
+        delta = first.of_type("stats_delta")[-1]
+        assert (delta["seq"], delta["prev_seq"]) == (2, 1)
+        assert delta["changes"]["access"]["total_visits"] == 1
+        assert "cases" not in delta["changes"]
+        view = apply_merge_patch(view, delta["changes"])
+
+        # 第二个管理员连接：快照与第一个连接应用增量后的视图一致
+        second = RecordingWebSocket()
+        second_id = await websocket_manager.connect(second, "admin-2", "super_admin")
+        await aggregator.send_snapshot(second_id)
+        assert second.of_type("stats_snapshot")[0]["seq"] == 2
+        assert second.of_type("stats_snapshot")[0]["data"] == view
+
+        aggregator.record_activities([{"user_id": "u1", "action": "login", "created_at": datetime.now()}])
+        await aggregator.push_update()
+        assert first.of_type("stats_delta")[-1]["seq"] == second.of_type("stats_delta")[-1]["seq"] == 3
+
+        # 所有管理员断开后暂停，计数不再累加
+        await websocket_manager.disconnect(first_id)
+        await websocket_manager.disconnect(second_id)
+        assert websocket_manager.admin_connection_count() == 0
+        aggregator._suspend()
+        aggregator.record_access_logs([{"ip_address": "9.9.9.9", "created_at": datetime.now()}])
+        assert aggregator.counters.access_stats()["total_visits"] == 0
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_merge_diff_roundtrip()
+    test_counters()
+    test_delta_protocol()
+    print("实时看板增量推送测试通过")
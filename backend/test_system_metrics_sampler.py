@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+系统指标采样器测试
+验证环形缓冲区的覆盖、按时间截取与抽样；
+采样器在后台按节拍采集且不阻塞事件循环，接口读取最新样本时不再现采
+"""
+
+import asyncio
+import os
+import sys
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.loop_monitor import EventLoopLagMonitor
+from app.core.system_metrics import MetricRingBuffer, SystemMetricsSampler
+
+
+def test_ring_buffer_wraps():
+    """写满后覆盖最旧的行，历史按时间正序返回"""
+    buffer = MetricRingBuffer(["cpu", "memory"], capacity=5)
+    assert buffer.latest() is None
+
+    for i in range(8):
+        buffer.append(float(i), {"cpu": i * 10.0, "memory": 50.0})
+
+    assert len(buffer) == 5
+    assert buffer.latest() == {"cpu": 70.0, "memory": 50.0, "timestamp": 7.0}
+
+    series = buffer.series(["cpu"])
+    assert series["timestamp"] == [3.0, 4.0, 5.0, 6.0, 7.0]
+    assert series["cpu"] == [30.0, 40.0, 50.0, 60.0, 70.0]
+
+    assert buffer.series(["cpu"], since=5.0)["cpu"] == [50.0, 60.0, 70.0]
+    assert buffer.series(["cpu"], since=100.0)["cpu"] == []
+    assert buffer.series(["cpu"], max_points=2)["timestamp"] == [3.0, 6.0]
+    assert buffer.average(["cpu", "memory"], since=6.0) == {"cpu": 65.0, "memory": 50.0}
+
+
+async def test_sampler_runs_in_background():
+    """后台采样填充缓冲区，期间事件循环没有阻塞"""
+    sampler = SystemMetricsSampler(interval=0.05, retention_seconds=1, persist_interval=0)
+    monitor = EventLoopLagMonitor(interval=0.02, threshold_ms=50)
+    monitor.start()
+    sampler.start()
+    try:
+        await asyncio.sleep(0.5)
+        samples_before = sampler.stats["samples"]
+        latest = await sampler.current()
+        # 样本新鲜时直接读取缓冲区，不再现采
+        assert sampler.stats["samples"] == samples_before
+    finally:
+        await sampler.stop()
+        await monitor.stop()
+
+    stats = sampler.get_stats()
+    print(f"采样 {stats['samples']} 次, 单次耗时 {stats['last_sample_ms']:.1f} ms, "
+          f"CPU {latest['cpu_percent']:.1f}%, 内存 {latest['memory_percent']:.1f}%")
+    assert stats["samples"] >= 5
+    assert stats["sample_errors"] == 0
+    assert sampler.buffer.capacity == 20
+    assert set(SystemMetricsSampler.FIELDS) <= set(latest)
+    assert 0.0 <= latest["cpu_percent"] <= 100.0
+    assert latest["process_rss_mb"] > 0
+    assert monitor.get_stats()["blocked_events"] == 0
+
+
+async def test_current_samples_when_stale():
+    """采样器未运行时读取最新值会在线程池中现采一次"""
+    sampler = SystemMetricsSampler(interval=5, retention_seconds=60, persist_interval=0)
+    latest = await sampler.current()
+    assert sampler.stats["samples"] == 1
+    assert latest["memory_total_mb"] > 0
+
+
+if __name__ == "__main__":
+    test_ring_buffer_wraps()
+    asyncio.run(test_sampler_runs_in_background())
+    asyncio.run(test_current_samples_when_stale())
+    print("✅ 系统指标采样器测试通过")
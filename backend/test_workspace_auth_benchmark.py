@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+工作台授权基准测试
+对比原实现（每次页面加载分别查询 workspace_id 和 account_type 两次）
+与授权缓存命中时的权限判断延迟，并校验身份变更后的失效；
+账户停用后失效缓存，中间件应立即拒绝访问
+"""
+
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import pytest
+from sqlalchemy import select
+
+# 添加项目路径
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.database import AsyncSessionLocal
+from app.middlewares.workspace_middleware import WorkspaceMiddleware
+from app.models.user import User
+from app.services.workspace_auth_cache import WorkspaceAuthCache, workspace_auth_cache, WORKSPACE_ACCOUNT_TYPES
+
+ITERATIONS = 500
+
+
+async def legacy_check(user_id: str, workspace_id: str, workspace_type: str) -> bool:
+    """原实现：两次独立查询users表"""
+    async with AsyncSessionLocal() as db:
+        result = await db.execute(select(User.workspace_id).where(User.id == user_id))
+        if result.scalar_one_or_none() != workspace_id:
+            return False
+        result = await db.execute(select(User.account_type).where(User.id == user_id))
+        return result.scalar_one_or_none() in WORKSPACE_ACCOUNT_TYPES.get(workspace_type, ())
+
+
+async def cached_check(middleware: WorkspaceMiddleware, user_id: str, workspace_id: str, workspace_type: str) -> bool:
+    return (
+        await middleware.check_workspace_permission(user_id, workspace_id)
+        and await middleware.check_user_type_match(user_id, workspace_type)
+    )
+
+
+def summarize(name: str, latencies):
+    latencies = sorted(latencies)
+    p95 = latencies[int(len(latencies) * 0.95) - 1]
+    print(f"{name}: 平均 {statistics.mean(latencies):.3f} ms, "
+          f"P50 {statistics.median(latencies):.3f} ms, P95 {p95:.3f} ms")
+
+
+async def workspace_auth_benchmark():
+    try:
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(
+                select(User.id, User.workspace_id, User.account_type)
+                .where(User.workspace_id.isnot(None), User.account_type.in_(['user', 'lawyer', 'admin']))
+                .limit(1)
+            )
+            row = result.first()
+    except Exception as e:
+        pytest.skip(f"数据库不可用: {e}")
+
+    if row is None:
+        pytest.skip("没有可用于测试的工作台用户")
+
+    user_id, workspace_id = str(row.id), row.workspace_id
+    workspace_type = 'lawyer' if row.account_type == 'lawyer' else row.account_type
+    middleware = WorkspaceMiddleware(app=None)
+
+    legacy, cached = [], []
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        assert await legacy_check(user_id, workspace_id, workspace_type)
+        legacy.append((time.perf_counter() - start) * 1000)
+
+    for _ in range(ITERATIONS):
+        start = time.perf_counter()
+        assert await cached_check(middleware, user_id, workspace_id, workspace_type)
+        cached.append((time.perf_counter() - start) * 1000)
+
+    print("=" * 60)
+    print(f"工作台权限判断 ({workspace_type}) × {ITERATIONS}")
+    summarize("原实现(2次查询)", legacy)
+    summarize("授权缓存", cached)
+    print(f"缓存统计: {workspace_auth_cache.get_stats()}")
+    print("=" * 60)
+
+    assert statistics.median(cached) < statistics.median(legacy)
+
+    # 身份变更后失效，下一次判断重新加载
+    loads = workspace_auth_cache.stats['loads']
+    workspace_auth_cache.invalidate(user_id, broadcast=False)
+    assert await cached_check(middleware, user_id, workspace_id, workspace_type)
+    assert workspace_auth_cache.stats['loads'] == loads + 1
+
+
+def test_workspace_auth_benchmark():
+    """缓存命中的工作台权限判断应明显快于逐次查询"""
+    asyncio.run(workspace_auth_benchmark())
+
+
+def test_deactivated_user_denied():
+    """账户状态随授权信息缓存；停用后失效缓存，下一次判断即拒绝"""
+    async def run():
+        cache = WorkspaceAuthCache()
+        user = {"workspace_id": "ws-test", "account_type": "user", "status": "active"}
+
+        async def load():
+            return dict(user)
+
+        assert (await cache.get("u1", load)).is_active()
+
+        user["status"] = "banned"
+        # TTL 内未失效时仍是缓存的旧状态
+        assert (await cache.get("u1", load)).is_active()
+        cache.invalidate("u1", broadcast=False)
+        authorization = await cache.get("u1", load)
+        assert not authorization.is_active()
+        assert authorization.owns_workspace("ws-test")
+
+    asyncio.run(run())
+
+
+if __name__ == "__main__":
+    test_deactivated_user_denied()
+    test_workspace_auth_benchmark()